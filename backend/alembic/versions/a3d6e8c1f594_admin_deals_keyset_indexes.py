@@ -0,0 +1,26 @@
+"""admin_deals_keyset_indexes
+
+Revision ID: a3d6e8c1f594
+Revises: f7c2a9d4e611
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d6e8c1f594'
+down_revision = 'f7c2a9d4e611'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_deals_created_id', 'deals', ['created_at', 'id'], unique=False)
+    op.create_index('ix_deals_status_created_id', 'deals', ['deal_status', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_deals_status_created_id', table_name='deals')
+    op.drop_index('ix_deals_created_id', table_name='deals')
@@ -0,0 +1,32 @@
+"""deal_updated_at
+
+Revision ID: b6e4c2a8f159
+Revises: d9a3f5c7b214
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e4c2a8f159'
+down_revision = 'd9a3f5c7b214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # SQLite не добавляет столбец с CURRENT_TIMESTAMP через ALTER — таблица пересоздаётся
+        with op.batch_alter_table('deals', recreate='always') as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True))
+    else:
+        # PostgreSQL: обычный ALTER (пересоздание deals сломалось бы на внешних ключах deal_items и др.)
+        op.add_column('deals', sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True))
+    op.execute("UPDATE deals SET updated_at = created_at WHERE created_at IS NOT NULL")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('deals') as batch_op:
+        batch_op.drop_column('updated_at')
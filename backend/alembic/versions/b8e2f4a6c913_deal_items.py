@@ -0,0 +1,155 @@
+"""deal_items
+
+Revision ID: b8e2f4a6c913
+Revises: a3d6e8c1f594
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+import json
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+
+from services.pricing_service import PricingService
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f4a6c913'
+down_revision = 'a3d6e8c1f594'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+deals = sa.table(
+    'deals',
+    sa.column('id', sa.Integer),
+    sa.column('items_snapshot', sa.JSON),
+)
+deal_items = sa.table(
+    'deal_items',
+    sa.column('deal_id', sa.Integer),
+    sa.column('position', sa.Integer),
+    sa.column('assetid', sa.String),
+    sa.column('market_hash_name', sa.String),
+    sa.column('float_value', sa.Float),
+    sa.column('instant_price_kopecks', sa.BigInteger),
+    sa.column('loan_price_kopecks', sa.BigInteger),
+)
+
+
+def _kopecks(item: dict, field: str) -> int:
+    """Цена в копейках (half-up, как money.to_kopecks); старые снимки хранят только рубли"""
+    kopecks = item.get(f"{field}_kopecks")
+    if kopecks is None:
+        kopecks = int(float(item.get(field) or 0) * 100 + 0.5 + 1e-6)
+    return int(kopecks)
+
+
+def _loan_kopecks(item: dict, instant_kopecks: int) -> int:
+    """Выдача за предмет; снимки до расчёта по предметам (market_price, instant_price) её не хранят"""
+    if item.get("loan_price_kopecks") is None and item.get("loan_price") is None:
+        return PricingService.calculate_item_loan_kopecks(instant_kopecks)
+    return _kopecks(item, "loan_price")
+
+
+def _item_row(deal_id: int, position: int, item: dict) -> dict:
+    instant_kopecks = _kopecks(item, "instant_price")
+    return {
+        "deal_id": deal_id,
+        "position": position,
+        "assetid": item.get("assetid"),
+        "market_hash_name": item.get("market_hash_name") or item.get("name") or "",
+        "float_value": item.get("float_value", item.get("float")),
+        "instant_price_kopecks": instant_kopecks,
+        "loan_price_kopecks": _loan_kopecks(item, instant_kopecks),
+    }
+
+
+def upgrade() -> None:
+    op.create_table(
+        'deal_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('deal_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('assetid', sa.String(), nullable=True),
+        sa.Column('market_hash_name', sa.String(), nullable=False),
+        sa.Column('float_value', sa.Float(), nullable=True),
+        sa.Column('instant_price_kopecks', sa.BigInteger(), nullable=False),
+        sa.Column('loan_price_kopecks', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['deal_id'], ['deals.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Перенос снимков пачками по id (без загрузки всей таблицы)
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(deals.c.id, deals.c.items_snapshot)
+            .where(deals.c.id > last_id)
+            .order_by(deals.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        values = []
+        for deal_id, snapshot in rows:
+            if isinstance(snapshot, str):
+                snapshot = json.loads(snapshot)
+            values.extend(
+                _item_row(deal_id, position, item)
+                for position, item in enumerate(snapshot or [])
+                if isinstance(item, dict)
+            )
+        if values:
+            bind.execute(deal_items.insert(), values)
+
+    # Индексы после заполнения — быстрее, чем поддерживать их при вставке
+    op.create_index('ix_deal_items_deal_position', 'deal_items', ['deal_id', 'position'], unique=False)
+    op.create_index('ix_deal_items_name_deal', 'deal_items', ['market_hash_name', 'deal_id'], unique=False)
+    op.create_index('ix_deal_items_assetid', 'deal_items', ['assetid'], unique=False)
+
+    # Новые сделки пишут только deal_items
+    with op.batch_alter_table('deals') as batch_op:
+        batch_op.alter_column('items_snapshot', existing_type=sa.JSON(), nullable=True)
+
+
+def downgrade() -> None:
+    # Вернуть снимки сделкам, созданным уже без них
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(
+            deal_items.c.deal_id, deal_items.c.assetid, deal_items.c.market_hash_name, deal_items.c.float_value,
+            deal_items.c.instant_price_kopecks, deal_items.c.loan_price_kopecks
+        )
+        .select_from(deal_items.join(deals, deals.c.id == deal_items.c.deal_id))
+        .where(deals.c.items_snapshot.is_(None))
+        .order_by(deal_items.c.deal_id, deal_items.c.position)
+    ).all()
+    for deal_id, items in groupby(rows, key=lambda row: row.deal_id):
+        snapshot = [
+            {
+                "assetid": row.assetid,
+                "market_hash_name": row.market_hash_name,
+                "float_value": row.float_value,
+                "instant_price": row.instant_price_kopecks / 100,
+                "instant_price_kopecks": row.instant_price_kopecks,
+                "loan_price": row.loan_price_kopecks / 100,
+                "loan_price_kopecks": row.loan_price_kopecks,
+            }
+            for row in items
+        ]
+        bind.execute(deals.update().where(deals.c.id == deal_id).values(items_snapshot=snapshot))
+    bind.execute(deals.update().where(deals.c.items_snapshot.is_(None)).values(items_snapshot=[]))
+
+    with op.batch_alter_table('deals') as batch_op:
+        batch_op.alter_column('items_snapshot', existing_type=sa.JSON(), nullable=False)
+
+    op.drop_index('ix_deal_items_assetid', table_name='deal_items')
+    op.drop_index('ix_deal_items_name_deal', table_name='deal_items')
+    op.drop_index('ix_deal_items_deal_position', table_name='deal_items')
+    op.drop_table('deal_items')
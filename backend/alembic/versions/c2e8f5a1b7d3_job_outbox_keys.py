@@ -0,0 +1,30 @@
+"""job_outbox_keys
+
+Revision ID: c2e8f5a1b7d3
+Revises: a7c41e9b2d10
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e8f5a1b7d3'
+down_revision = 'a7c41e9b2d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('background_jobs', sa.Column('target', sa.String(), nullable=True))
+    op.add_column('background_jobs', sa.Column('idempotency_key', sa.String(), nullable=True))
+    op.create_index(op.f('ix_background_jobs_target'), 'background_jobs', ['target'], unique=False)
+    op.create_index(op.f('ix_background_jobs_idempotency_key'), 'background_jobs', ['idempotency_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_background_jobs_idempotency_key'), table_name='background_jobs')
+    op.drop_index(op.f('ix_background_jobs_target'), table_name='background_jobs')
+    op.drop_column('background_jobs', 'idempotency_key')
+    op.drop_column('background_jobs', 'target')
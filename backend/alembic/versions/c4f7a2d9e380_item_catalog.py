@@ -0,0 +1,82 @@
+"""item_catalog
+
+Revision ID: c4f7a2d9e380
+Revises: b8e2f4a6c913
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f7a2d9e380'
+down_revision = 'b8e2f4a6c913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'item_catalog',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('market_hash_name', sa.String(), nullable=False),
+        sa.Column('icon_path', sa.String(), nullable=True),
+        sa.Column('rarity', sa.String(), nullable=True),
+        sa.Column('item_type', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('market_hash_name')
+    )
+
+    # Каталог из уже записанных предметов сделок, затем ссылки на него
+    op.execute("INSERT INTO item_catalog (market_hash_name) SELECT DISTINCT market_hash_name FROM deal_items")
+    op.add_column('deal_items', sa.Column('item_id', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE deal_items SET item_id = (
+            SELECT item_catalog.id FROM item_catalog WHERE item_catalog.market_hash_name = deal_items.market_hash_name
+        )
+    """)
+
+    op.drop_index('ix_deal_items_name_deal', table_name='deal_items')
+    with op.batch_alter_table('deal_items') as batch_op:
+        batch_op.alter_column('item_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_deal_items_item_id', 'item_catalog', ['item_id'], ['id'])
+        batch_op.drop_column('market_hash_name')
+    op.create_index('ix_deal_items_item_deal', 'deal_items', ['item_id', 'deal_id'], unique=False)
+
+    # Составы трейдов: только assetid и item_id
+    op.execute("""
+        UPDATE steam_trades SET items_json = (
+            SELECT json_group_array(json_object('assetid', items.assetid, 'item_id', items.item_id))
+            FROM (
+                SELECT deal_items.assetid, deal_items.item_id FROM deal_items
+                WHERE deal_items.deal_id = steam_trades.deal_id
+                ORDER BY deal_items.position
+            ) AS items
+        )
+    """ if op.get_bind().dialect.name == "sqlite" else """
+        UPDATE steam_trades SET items_json = (
+            SELECT COALESCE(json_agg(json_build_object('assetid', deal_items.assetid, 'item_id', deal_items.item_id)
+                                     ORDER BY deal_items.position), '[]'::json)
+            FROM deal_items WHERE deal_items.deal_id = steam_trades.deal_id
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.add_column('deal_items', sa.Column('market_hash_name', sa.String(), nullable=True))
+    op.execute("""
+        UPDATE deal_items SET market_hash_name = (
+            SELECT item_catalog.market_hash_name FROM item_catalog WHERE item_catalog.id = deal_items.item_id
+        )
+    """)
+
+    op.drop_index('ix_deal_items_item_deal', table_name='deal_items')
+    with op.batch_alter_table('deal_items') as batch_op:
+        batch_op.alter_column('market_hash_name', existing_type=sa.String(), nullable=False)
+        batch_op.drop_constraint('fk_deal_items_item_id', type_='foreignkey')
+        batch_op.drop_column('item_id')
+    op.create_index('ix_deal_items_name_deal', 'deal_items', ['market_hash_name', 'deal_id'], unique=False)
+
+    op.drop_table('item_catalog')
@@ -0,0 +1,26 @@
+"""deal_expiry_scheduler
+
+Revision ID: d4a9c3e7f215
+Revises: c2e8f5a1b7d3
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9c3e7f215'
+down_revision = 'c2e8f5a1b7d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('deals', sa.Column('expiry_warning_sent_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_deals_status_expiry', 'deals', ['deal_status', 'option_expiry'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_deals_status_expiry', table_name='deals')
+    op.drop_column('deals', 'expiry_warning_sent_at')
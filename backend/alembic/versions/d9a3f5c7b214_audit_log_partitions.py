@@ -0,0 +1,133 @@
+"""audit_log event_id and monthly partitions
+
+Revision ID: d9a3f5c7b214
+Revises: c4f7a2d9e380
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a3f5c7b214'
+down_revision = 'c4f7a2d9e380'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 2
+
+COLUMNS = "id, event_id, user_id, deal_id, action, details, ip_address, user_agent, session_id, created_at"
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+def _create_indexes():
+    op.create_index('ix_audit_logs_id', 'audit_logs', ['id'], unique=False)
+    op.create_index('ix_audit_logs_user_id', 'audit_logs', ['user_id'], unique=False)
+    op.create_index('ix_audit_logs_deal_id', 'audit_logs', ['deal_id'], unique=False)
+    op.create_index('uq_audit_logs_event', 'audit_logs', ['event_id', 'created_at'], unique=True)
+
+
+def _drop_old_indexes():
+    # Имена индексов переименованной таблицы освобождаются для новой
+    op.execute("DROP INDEX IF EXISTS ix_audit_logs_id")
+    op.execute("DROP INDEX IF EXISTS ix_audit_logs_user_id")
+    op.execute("DROP INDEX IF EXISTS ix_audit_logs_deal_id")
+    op.execute("DROP INDEX IF EXISTS uq_audit_logs_event")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        op.add_column('audit_logs', sa.Column('event_id', sa.String(length=32), nullable=True))
+        op.create_index('uq_audit_logs_event', 'audit_logs', ['event_id', 'created_at'], unique=True)
+        return
+
+    # PostgreSQL: секционирование по месяцам created_at (ключ секционирования входит в PK)
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_unpartitioned")
+    _drop_old_indexes()
+    op.execute("""
+        CREATE TABLE audit_logs (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            event_id VARCHAR(32),
+            user_id INTEGER REFERENCES users (id),
+            deal_id INTEGER REFERENCES deals (id),
+            action VARCHAR NOT NULL,
+            details JSON,
+            ip_address VARCHAR,
+            user_agent TEXT,
+            session_id VARCHAR,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM audit_logs_unpartitioned")).scalar()
+    month = (oldest or datetime.utcnow()).date().replace(day=1)
+    last = datetime.utcnow().date().replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        end = _next_month(month)
+        op.execute(
+            f"CREATE TABLE audit_logs_y{month.year}m{month.month:02d} PARTITION OF audit_logs "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        month = end
+
+    op.execute(f"""
+        INSERT INTO audit_logs ({COLUMNS})
+        SELECT id, NULL, user_id, deal_id, action, details, ip_address, user_agent, session_id,
+               COALESCE(created_at, now())
+        FROM audit_logs_unpartitioned
+    """)
+    op.execute("""
+        SELECT setval(pg_get_serial_sequence('audit_logs', 'id'),
+                      COALESCE((SELECT max(id) FROM audit_logs), 0) + 1, false)
+    """)
+    op.execute("DROP TABLE audit_logs_unpartitioned")
+    _create_indexes()
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        op.drop_index('uq_audit_logs_event', table_name='audit_logs')
+        with op.batch_alter_table('audit_logs') as batch_op:
+            batch_op.drop_column('event_id')
+        return
+
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_partitioned")
+    _drop_old_indexes()
+    op.execute("""
+        CREATE TABLE audit_logs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users (id),
+            deal_id INTEGER REFERENCES deals (id),
+            action VARCHAR NOT NULL,
+            details JSON,
+            ip_address VARCHAR,
+            user_agent TEXT,
+            session_id VARCHAR,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+    """)
+    op.execute("""
+        INSERT INTO audit_logs (id, user_id, deal_id, action, details, ip_address, user_agent, session_id, created_at)
+        SELECT id, user_id, deal_id, action, details, ip_address, user_agent, session_id, created_at
+        FROM audit_logs_partitioned
+    """)
+    op.execute("""
+        SELECT setval(pg_get_serial_sequence('audit_logs', 'id'),
+                      COALESCE((SELECT max(id) FROM audit_logs), 0) + 1, false)
+    """)
+    op.execute("DROP TABLE audit_logs_partitioned")
+    op.create_index('ix_audit_logs_id', 'audit_logs', ['id'], unique=False)
+    op.create_index('ix_audit_logs_user_id', 'audit_logs', ['user_id'], unique=False)
+    op.create_index('ix_audit_logs_deal_id', 'audit_logs', ['deal_id'], unique=False)
@@ -0,0 +1,27 @@
+"""job_leases
+
+Revision ID: e2a7c5f9b316
+Revises: b6e4c2a8f159
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a7c5f9b316'
+down_revision = 'b6e4c2a8f159'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('background_jobs', sa.Column('locked_by', sa.String(), nullable=True))
+    op.add_column('background_jobs', sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('background_jobs') as batch_op:
+        batch_op.drop_column('locked_at')
+        batch_op.drop_column('locked_by')
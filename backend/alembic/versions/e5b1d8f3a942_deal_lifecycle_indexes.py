@@ -0,0 +1,41 @@
+"""deal_lifecycle_indexes
+
+Revision ID: e5b1d8f3a942
+Revises: d4a9c3e7f215
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b1d8f3a942'
+down_revision = 'd4a9c3e7f215'
+branch_labels = None
+depends_on = None
+
+PENDING = sa.text("deal_status = 'PENDING'")
+ACTIVE_UNWARNED = sa.text("deal_status = 'ACTIVE' AND expiry_warning_sent_at IS NULL")
+
+
+def upgrade() -> None:
+    op.create_index('ix_deals_user_status', 'deals', ['user_id', 'deal_status'], unique=False)
+    op.create_index('ix_deals_pending_created', 'deals', ['created_at'], unique=False,
+                    postgresql_where=PENDING, sqlite_where=PENDING)
+    op.create_index('ix_deals_active_unwarned', 'deals', ['option_expiry'], unique=False,
+                    postgresql_where=ACTIVE_UNWARNED, sqlite_where=ACTIVE_UNWARNED)
+    op.create_index(op.f('ix_audit_logs_user_id'), 'audit_logs', ['user_id'], unique=False)
+    op.create_index(op.f('ix_audit_logs_deal_id'), 'audit_logs', ['deal_id'], unique=False)
+    op.create_index(op.f('ix_steam_trades_deal_id'), 'steam_trades', ['deal_id'], unique=False)
+    op.create_index(op.f('ix_sbp_payouts_deal_id'), 'sbp_payouts', ['deal_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_sbp_payouts_deal_id'), table_name='sbp_payouts')
+    op.drop_index(op.f('ix_steam_trades_deal_id'), table_name='steam_trades')
+    op.drop_index(op.f('ix_audit_logs_deal_id'), table_name='audit_logs')
+    op.drop_index(op.f('ix_audit_logs_user_id'), table_name='audit_logs')
+    op.drop_index('ix_deals_active_unwarned', table_name='deals')
+    op.drop_index('ix_deals_pending_created', table_name='deals')
+    op.drop_index('ix_deals_user_status', table_name='deals')
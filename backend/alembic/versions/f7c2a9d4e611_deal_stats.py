@@ -0,0 +1,59 @@
+"""deal_stats
+
+Revision ID: f7c2a9d4e611
+Revises: e5b1d8f3a942
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c2a9d4e611'
+down_revision = 'e5b1d8f3a942'
+branch_labels = None
+depends_on = None
+
+# Заполнение из deals одним GROUP BY (user_id = 0 — весь сервис)
+_AGGREGATES = """
+    SUM(CASE WHEN deal_status = 'PENDING' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN deal_status = 'ACTIVE' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN deal_status = 'BUYBACK' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN deal_status = 'DEFAULT' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN deal_status = 'CANCELLED' THEN 1 ELSE 0 END),
+    COALESCE(SUM(CAST(ROUND(loan_amount * 100) AS BIGINT)), 0),
+    COALESCE(SUM(CASE WHEN deal_status = 'BUYBACK' THEN CAST(ROUND(buyback_price * 100) AS BIGINT) ELSE 0 END), 0)
+"""
+_COLUMNS = """
+    user_id, pending_count, active_count, buyback_count, default_count, cancelled_count,
+    loan_total_kopecks, buyback_paid_kopecks
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        'deal_stats',
+        sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('pending_count', sa.Integer(), nullable=False),
+        sa.Column('active_count', sa.Integer(), nullable=False),
+        sa.Column('buyback_count', sa.Integer(), nullable=False),
+        sa.Column('default_count', sa.Integer(), nullable=False),
+        sa.Column('cancelled_count', sa.Integer(), nullable=False),
+        sa.Column('loan_total_kopecks', sa.BigInteger(), nullable=False),
+        sa.Column('buyback_paid_kopecks', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.execute(f"INSERT INTO deal_stats ({_COLUMNS}) SELECT user_id, {_AGGREGATES} FROM deals GROUP BY user_id")
+    op.execute(f"""
+        INSERT INTO deal_stats ({_COLUMNS})
+        SELECT 0, COALESCE(SUM(pending_count), 0), COALESCE(SUM(active_count), 0), COALESCE(SUM(buyback_count), 0),
+               COALESCE(SUM(default_count), 0), COALESCE(SUM(cancelled_count), 0),
+               COALESCE(SUM(loan_total_kopecks), 0), COALESCE(SUM(buyback_paid_kopecks), 0)
+        FROM deal_stats
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('deal_stats')
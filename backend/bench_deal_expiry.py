@@ -0,0 +1,185 @@
+"""
+Замер: массовый дефолт просроченных сделок
+
+100 тыс. ACTIVE сделок с истёкшим опционом (по 2 скина), SQLite-файл.
+Сравниваются:
+  - orm:   как check_expired_deals работал раньше — все сделки в ORM,
+           статус по одной, AuditLog и задача уведомления объектом на
+           каждую, один commit (в пользу orm: скины одним selectinload,
+           задачи без поиска дублей по ключу);
+  - bulk:  DealLifecycle.expire_all — UPDATE ... RETURNING пачками,
+           аудит и уведомления одним INSERT на пачку, commit на пачку.
+
+Для каждого варианта: время, пик памяти Python (tracemalloc, отдельный
+проход) и самая длинная транзакция (сколько держится блокировка записи).
+
+Запуск:
+cd backend
+python bench_deal_expiry.py
+"""
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import selectinload, sessionmaker
+
+import models
+from services.deal_scheduler import DealLifecycle
+from services.stats_service import StatsService
+
+DEALS = int(os.getenv("BENCH_DEALS", "100000"))
+USERS = 1000
+ITEMS_PER_DEAL = 2
+BATCH_SIZES = (500, 1000, 5000)
+
+NOW = datetime(2026, 10, 1, 12, 0)
+
+
+def build_template(path):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(models.User.__table__.insert(), [
+            {"id": i, "steam_id": f"7656119800{i:07d}"} for i in range(1, USERS + 1)
+        ])
+        connection.execute(models.CatalogItem.__table__.insert(), [
+            {"id": 1, "market_hash_name": "AK-47 | Redline (Field-Tested)"}
+        ])
+        connection.execute(models.Deal.__table__.insert(), [
+            {
+                "id": i,
+                "user_id": i % USERS + 1,
+                "market_total": 1000.0,
+                "loan_amount": 400.0,
+                "buyback_price": 488.0,
+                "option_expiry": NOW - timedelta(minutes=i % 10_000 + 1),
+                "deal_status": models.DealStatus.ACTIVE,
+                "created_at": NOW - timedelta(days=14)
+            }
+            for i in range(1, DEALS + 1)
+        ])
+        connection.execute(models.DealItem.__table__.insert(), [
+            {
+                "deal_id": deal_id,
+                "position": position,
+                "assetid": f"{deal_id}{position}",
+                "item_id": 1,
+                "instant_price_kopecks": 50_000,
+                "loan_price_kopecks": 20_000
+            }
+            for deal_id in range(1, DEALS + 1)
+            for position in range(ITEMS_PER_DEAL)
+        ])
+    db = sessionmaker(bind=engine)()
+    StatsService.rebuild(db)
+    db.commit()
+    db.close()
+    engine.dispose()
+
+
+def expire_orm(session_factory):
+    """Прежний вариант: объект и AuditLog на каждую сделку"""
+    db = session_factory()
+    try:
+        deals = db.query(models.Deal).options(selectinload(models.Deal.items)).filter(
+            models.Deal.deal_status == models.DealStatus.ACTIVE,
+            models.Deal.option_expiry <= NOW
+        ).all()
+        for deal in deals:
+            deal.deal_status = models.DealStatus.DEFAULT
+            db.add(models.AuditLog(
+                user_id=deal.user_id,
+                deal_id=deal.id,
+                action="deal_defaulted",
+                details={"deal_id": deal.id, "reason": "option_expired", "expired_at": deal.option_expiry.isoformat()}
+            ))
+            db.add(models.BackgroundJob(
+                deal_id=deal.id,
+                job_type="telegram",
+                payload={"event": "default", "kwargs": {"deal_id": deal.id, "items_count": len(deal.items)}},
+                target="telegram",
+                idempotency_key=f"telegram_default:deal:{deal.id}",
+                status=models.JobStatus.PENDING,
+                attempts=0,
+                max_attempts=5,
+                run_after=datetime.utcnow()
+            ))
+        db.commit()
+        return [deal.id for deal in deals]
+    finally:
+        db.close()
+
+
+def expire_pass(template, path, fn, trace):
+    """Один проход на свежей копии БД: (время, пик памяти, транзакций, самая длинная)"""
+    shutil.copy(template, path)
+    engine = create_engine(f"sqlite:///{path}")
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    # Самая длинная транзакция: от BEGIN до COMMIT
+    spans = {"started": None, "longest": 0.0, "count": 0}
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        spans["started"] = time.perf_counter()
+
+    @event.listens_for(engine, "commit")
+    def _commit(connection):
+        spans["longest"] = max(spans["longest"], time.perf_counter() - spans["started"])
+        spans["count"] += 1
+
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    expired = fn(factory)
+    elapsed = time.perf_counter() - started
+    peak = 0
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    with engine.connect() as connection:
+        left = connection.execute(
+            select(models.Deal.id).where(models.Deal.deal_status == models.DealStatus.ACTIVE)
+        ).all()
+        jobs = connection.execute(select(models.BackgroundJob.id)).all()
+    engine.dispose()
+    os.remove(path)
+
+    assert len(expired) == DEALS and not left and len(jobs) == DEALS
+    return elapsed, peak, spans["count"], spans["longest"]
+
+
+def run(name, template, tmp, fn):
+    # Время — без tracemalloc (он замедляет Python-код в разы), память — отдельным проходом
+    path = os.path.join(tmp, f"{name.replace('/', '_')}.db")
+    elapsed, _, transactions, longest = expire_pass(template, path, fn, trace=False)
+    _, peak, _, _ = expire_pass(template, path, fn, trace=True)
+    print(f"{name:12s} {elapsed:7.2f} с  {DEALS / elapsed:9,.0f} сделок/с  "
+          f"пик памяти {peak / 1024 / 1024:7.1f} МБ  "
+          f"транзакций {transactions:4d}, самая длинная {longest:6.2f} с")
+    return elapsed
+
+
+def main():
+    print(f"{DEALS:,} просроченных сделок, по {ITEMS_PER_DEAL} скина")
+    print("=" * 100)
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, "template.db")
+        build_template(template)
+
+        orm = run("orm", template, tmp, expire_orm)
+        for batch_size in BATCH_SIZES:
+            bulk = run(
+                f"bulk/{batch_size}", template, tmp,
+                lambda factory: DealLifecycle.expire_all(factory, NOW, batch_size=batch_size)
+            )
+            print(f"{'':12s} быстрее orm в {orm / bulk:.1f} раза")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Нагрузочный тест: задержка event loop при тяжёлых запросах к БД
+
+Сравниваются два варианта одного и того же эндпоинта статистики пользователя:
+  - sync:  синхронная Session внутри async def (как было) — каждый запрос
+           блокирует event loop на время SQL;
+  - async: AsyncSession (database.get_async_db) — SQL выполняется драйвером
+           вне event loop.
+
+Во время нагрузки параллельно меряется:
+  - лаг event loop (насколько позже просыпается asyncio.sleep);
+  - задержка лёгкого эндпоинта /health/simple ("соседний" запрос на том же воркере).
+
+Запуск:
+cd backend
+python bench_event_loop.py
+"""
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+DB_FILE = "bench_event_loop.db"
+os.environ["DATABASE_URL"] = f"sqlite:///./{DB_FILE}"
+
+if os.path.exists(DB_FILE):
+    os.remove(DB_FILE)
+
+import httpx  # noqa: E402
+from fastapi import Depends, HTTPException  # noqa: E402
+from sqlalchemy import func  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import main  # noqa: E402
+import models  # noqa: E402
+from database import async_engine, engine, get_db  # noqa: E402
+
+USERS = 50
+DEALS = 50_000
+REQUESTS = 100
+CONCURRENCY = 20
+LAG_PROBE_SECONDS = 0.005
+
+
+@main.app.get("/bench/sync-stats/{steam_id}")
+async def sync_user_stats(steam_id: str, db: Session = Depends(get_db)):
+    """Прежняя реализация /api/stats/user на синхронной Session"""
+    user = db.query(models.User).filter(models.User.steam_id == steam_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+
+    base = db.query(models.Deal).filter(models.Deal.user_id == user.id)
+    return {
+        "total_deals": base.count(),
+        "active_deals": base.filter(models.Deal.deal_status == models.DealStatus.ACTIVE).count(),
+        "total_received": db.query(func.sum(models.Deal.loan_amount)).filter(
+            models.Deal.user_id == user.id).scalar() or 0,
+        "total_paid_back": db.query(func.sum(models.Deal.buyback_price)).filter(
+            models.Deal.user_id == user.id, models.Deal.deal_status == models.DealStatus.BUYBACK).scalar() or 0,
+        "buyback_count": base.filter(models.Deal.deal_status == models.DealStatus.BUYBACK).count(),
+        "default_count": base.filter(models.Deal.deal_status == models.DealStatus.DEFAULT).count(),
+        "member_since": user.created_at.isoformat()
+    }
+
+
+def seed():
+    """Пользователи и сделки для нагрузки"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    statuses = list(models.DealStatus)
+
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [
+            {"steam_id": f"7656119800000{i:04d}", "created_at": now} for i in range(USERS)
+        ])
+        conn.execute(models.Deal.__table__.insert(), [
+            {
+                "user_id": rng.randint(1, USERS),
+                "market_total": 1000.0,
+                "loan_amount": 400.0,
+                "buyback_price": 488.0,
+                "created_at": now,
+                "option_expiry": now + timedelta(days=rng.randint(-10, 30)),
+                "deal_status": rng.choice(statuses).name,
+                "items_snapshot": []
+            }
+            for _ in range(DEALS)
+        ])
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def run_load(path_template: str):
+    """REQUESTS тяжёлых запросов с CONCURRENCY параллельно + замеры лага"""
+    transport = httpx.ASGITransport(app=main.app)
+    lags, health_latencies = [], []
+    done = asyncio.Event()
+
+    async def lag_probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_PROBE_SECONDS)
+            lags.append(time.perf_counter() - start - LAG_PROBE_SECONDS)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def health_probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health/simple")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def heavy(i):
+            async with semaphore:
+                response = await client.get(path_template.format(steam_id=f"7656119800000{i % USERS:04d}"))
+                response.raise_for_status()
+
+        probes = [asyncio.create_task(lag_probe()), asyncio.create_task(health_probe())]
+        start = time.perf_counter()
+        await asyncio.gather(*(heavy(i) for i in range(REQUESTS)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*probes)
+
+    return elapsed, lags, health_latencies
+
+
+def report(name, elapsed, lags, health_latencies):
+    print(f"{name:6s} {elapsed:7.2f} с  {REQUESTS / elapsed:7.1f} rps  "
+          f"лаг p50 {percentile(lags, 0.5) * 1000:7.1f} мс  p99 {percentile(lags, 0.99) * 1000:7.1f} мс  "
+          f"max {max(lags, default=0) * 1000:7.1f} мс  "
+          f"/health: {len(health_latencies) / elapsed:6.1f} ответов/с, p99 {percentile(health_latencies, 0.99) * 1000:6.1f} мс")
+
+
+def main_bench():
+    print(f"Заполнение БД: {USERS} пользователей, {DEALS:,} сделок...")
+    seed()
+
+    print("=" * 100)
+    print(f"НАГРУЗКА: {REQUESTS} запросов статистики пользователя, {CONCURRENCY} параллельно")
+    print("=" * 100)
+    report("sync", *asyncio.run(run_load("/bench/sync-stats/{steam_id}")))
+    report("async", *asyncio.run(run_load("/api/stats/user/{steam_id}")))
+    print(f"\nЛаг — опоздание asyncio.sleep({LAG_PROBE_SECONDS * 1000:.0f} мс). У sync он равен времени SQL "
+          f"всех запросов подряд, /health почти не обслуживается; у async loop свободен во время SQL.")
+
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+    os.remove(DB_FILE)
+
+
+if __name__ == "__main__":
+    main_bench()
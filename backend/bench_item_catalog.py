@@ -0,0 +1,233 @@
+"""
+Замер: сколько места и памяти экономит каталог предметов (item_catalog)
+
+Данные размером с прод: прайс-лист market.csgo (~25 тыс. предметов),
+сделки по 3 скина в среднем и по трейду на сделку.
+
+Хранение (SQLite, после VACUUM), три раскладки одних и тех же сделок:
+  - json:    items_snapshot с полными словарями предметов (иконка, редкость,
+             тип, дубли цен) + такие же steam_trades.items_json;
+  - names:   deal_items со строкой market_hash_name (до каталога);
+  - catalog: deal_items.item_id + item_catalog + компактные items_json.
+
+Память (tracemalloc):
+  - индекс цен: dict[market_hash_name -> цена] из разобранного JSON
+    против dict[item_id -> цена] при загруженном каталоге;
+  - скины сделок в памяти: словари со строками против ссылок на каталог.
+
+Запуск:
+cd backend
+python bench_item_catalog.py
+"""
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+CATALOG_SIZE = int(os.getenv("BENCH_CATALOG_SIZE", "25000"))
+DEALS = int(os.getenv("BENCH_DEALS", "200000"))
+ITEMS_PER_DEAL = 3
+ITEMS_IN_MEMORY = 100_000  # Скины открытых сделок / инвентарей в памяти воркера
+
+ICON_CDN = "https://community.cloudflare.steamstatic.com/economy/image/"
+WEAPONS = ["AK-47", "M4A4", "M4A1-S", "AWP", "Desert Eagle", "Glock-18", "USP-S", "P250", "MP9", "FAMAS"]
+WEARS = ["Factory New", "Minimal Wear", "Field-Tested", "Well-Worn", "Battle-Scarred"]
+RARITIES = ["Consumer Grade", "Industrial Grade", "Mil-Spec Grade", "Restricted", "Classified", "Covert"]
+TYPES = ["Rifle", "Sniper Rifle", "Pistol", "SMG"]
+
+
+def make_catalog(rng):
+    catalog = []
+    for i in range(CATALOG_SIZE):
+        name = f"{WEAPONS[i % len(WEAPONS)]} | Skin #{i // len(WEARS):05d} ({WEARS[i % len(WEARS)]})"
+        icon = "-9a81dlWLwJ2UUGcVs_nsVtzdOEdtWwKGZZLQHTxDZ7I56KU0Zwwo4NUX4oFJZEHLbXH5ApeO4YmlhxYQknCRvCo04DEVlxk" + \
+            "".join(rng.choice("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_") for _ in range(110))
+        catalog.append((name, icon, rng.choice(RARITIES), rng.choice(TYPES)))
+    return catalog
+
+
+def make_deals(rng, catalog):
+    deals = []
+    for deal_id in range(1, DEALS + 1):
+        items = []
+        for position in range(rng.randint(1, ITEMS_PER_DEAL * 2 - 1)):
+            item_id = min(int(rng.paretovariate(1.2)) - 1, CATALOG_SIZE - 1)  # Популярные скины чаще
+            instant_kopecks = rng.randint(4_000, 5_000_000)
+            items.append((item_id + 1, f"{rng.randint(10**10, 10**11)}", round(rng.random(), 6),
+                          instant_kopecks, instant_kopecks * 40 // 100))
+        deals.append((deal_id, items))
+    return deals
+
+
+def snapshot_dict(catalog_row, assetid, float_value, instant_kopecks, loan_kopecks):
+    """Словарь предмета в items_snapshot до нормализации"""
+    name, icon, rarity, item_type = catalog_row
+    return {
+        "assetid": assetid,
+        "classid": "310776560",
+        "instanceid": "302028390",
+        "market_hash_name": name,
+        "name": name,
+        "type": item_type,
+        "icon_url": f"{ICON_CDN}{icon}/360fx360f",
+        "rarity": rarity,
+        "float_value": float_value,
+        "tradable": True,
+        "market_price": instant_kopecks / 100,
+        "instant_price": instant_kopecks / 100,
+        "loan_percent": 0.4,
+        "loan_price": loan_kopecks / 100,
+        "instant_price_kopecks": instant_kopecks,
+        "loan_price_kopecks": loan_kopecks,
+    }
+
+
+def build_db(path, layout, catalog, deals):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE steam_trades (id INTEGER PRIMARY KEY, deal_id INTEGER NOT NULL, items_json JSON)")
+
+    if layout == "json":
+        conn.execute("CREATE TABLE deals (id INTEGER PRIMARY KEY, items_snapshot JSON)")
+        for deal_id, items in deals:
+            snapshot = json.dumps([snapshot_dict(catalog[item[0] - 1], *item[1:]) for item in items])
+            conn.execute("INSERT INTO deals VALUES (?, ?)", (deal_id, snapshot))
+            conn.execute("INSERT INTO steam_trades (deal_id, items_json) VALUES (?, ?)", (deal_id, snapshot))
+    else:
+        conn.execute("CREATE TABLE deals (id INTEGER PRIMARY KEY)")
+        if layout == "names":
+            conn.execute("""CREATE TABLE deal_items (id INTEGER PRIMARY KEY, deal_id INTEGER NOT NULL,
+                position INTEGER NOT NULL, assetid VARCHAR, market_hash_name VARCHAR NOT NULL, float_value FLOAT,
+                instant_price_kopecks BIGINT NOT NULL, loan_price_kopecks BIGINT NOT NULL)""")
+            conn.execute("CREATE INDEX ix_deal_items_name_deal ON deal_items (market_hash_name, deal_id)")
+        else:
+            conn.execute("""CREATE TABLE item_catalog (id INTEGER PRIMARY KEY, market_hash_name VARCHAR NOT NULL UNIQUE,
+                icon_path VARCHAR, rarity VARCHAR, item_type VARCHAR, created_at DATETIME)""")
+            conn.executemany(
+                "INSERT INTO item_catalog (id, market_hash_name, icon_path, rarity, item_type) VALUES (?, ?, ?, ?, ?)",
+                [(i + 1, name, f"{icon}/360fx360f", rarity, item_type)
+                 for i, (name, icon, rarity, item_type) in enumerate(catalog)]
+            )
+            conn.execute("""CREATE TABLE deal_items (id INTEGER PRIMARY KEY, deal_id INTEGER NOT NULL,
+                position INTEGER NOT NULL, assetid VARCHAR, item_id INTEGER NOT NULL, float_value FLOAT,
+                instant_price_kopecks BIGINT NOT NULL, loan_price_kopecks BIGINT NOT NULL)""")
+            conn.execute("CREATE INDEX ix_deal_items_item_deal ON deal_items (item_id, deal_id)")
+        conn.execute("CREATE INDEX ix_deal_items_deal_position ON deal_items (deal_id, position)")
+
+        for deal_id, items in deals:
+            conn.execute("INSERT INTO deals VALUES (?)", (deal_id,))
+            conn.executemany(
+                "INSERT INTO deal_items (deal_id, position, assetid, "
+                + ("market_hash_name" if layout == "names" else "item_id")
+                + ", float_value, instant_price_kopecks, loan_price_kopecks) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (deal_id, position, assetid, catalog[item_id - 1][0] if layout == "names" else item_id,
+                     float_value, instant_kopecks, loan_kopecks)
+                    for position, (item_id, assetid, float_value, instant_kopecks, loan_kopecks) in enumerate(items)
+                ]
+            )
+            trade_items = [
+                {"assetid": assetid, "market_hash_name": catalog[item_id - 1][0]} if layout == "names"
+                else {"assetid": assetid, "item_id": item_id}
+                for item_id, assetid, *_ in items
+            ]
+            conn.execute("INSERT INTO steam_trades (deal_id, items_json) VALUES (?, ?)",
+                         (deal_id, json.dumps(trade_items)))
+
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+
+def measure(fn):
+    tracemalloc.start()
+    result = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def memory_bench(catalog):
+    rng = random.Random(7)
+    # Ответ market.csgo: каждая загрузка прайс-листа даёт новые строки имён
+    price_list = json.dumps({"items": [{"market_hash_name": name, "price": rng.randint(40, 50_000)}
+                                       for name, *_ in catalog]})
+
+    def price_index_by_name():
+        return {item["market_hash_name"]: float(item["price"]) for item in json.loads(price_list)["items"]}
+
+    # Каталог в памяти (как ItemCatalog после load): интернированные имена и метаданные
+    def load_catalog():
+        ids, entries = {}, {}
+        for i, (name, icon, rarity, item_type) in enumerate(catalog, 1):
+            name = sys.intern(name)
+            ids[name] = i
+            entries[i] = (i, name, f"{icon}/360fx360f", sys.intern(rarity), sys.intern(item_type))
+        return ids, entries
+
+    (ids, entries), catalog_bytes = measure(load_catalog)
+
+    def price_index_by_id():
+        return {ids[item["market_hash_name"]]: float(item["price"]) for item in json.loads(price_list)["items"]}
+
+    _, by_name_bytes = measure(price_index_by_name)
+    _, by_id_bytes = measure(price_index_by_id)
+
+    picks = [min(int(rng.paretovariate(1.2)) - 1, CATALOG_SIZE - 1) for _ in range(ITEMS_IN_MEMORY)]
+
+    def item_dicts():
+        return [snapshot_dict(catalog[i], str(10**10 + n), 0.25, 123_456, 49_382) for n, i in enumerate(picks)]
+
+    def item_refs():
+        return [(i + 1, str(10**10 + n), 0.25, 123_456, 49_382) for n, i in enumerate(picks)]
+
+    _, dicts_bytes = measure(item_dicts)
+    _, refs_bytes = measure(item_refs)
+    return catalog_bytes, by_name_bytes, by_id_bytes, dicts_bytes, refs_bytes
+
+
+def mb(size):
+    return f"{size / 1024 / 1024:8.1f} МБ"
+
+
+def main():
+    rng = random.Random(42)
+    catalog = make_catalog(rng)
+    deals = make_deals(rng, catalog)
+    total_items = sum(len(items) for _, items in deals)
+    print(f"Каталог {CATALOG_SIZE:,} предметов, {DEALS:,} сделок, {total_items:,} скинов в сделках")
+
+    print("=" * 80)
+    print("ХРАНЕНИЕ (SQLite после VACUUM: сделки, скины, трейды, каталог, индексы)")
+    print("=" * 80)
+    sizes = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for layout in ("json", "names", "catalog"):
+            started = time.perf_counter()
+            sizes[layout] = build_db(os.path.join(tmp, f"{layout}.db"), layout, catalog, deals)
+            print(f"{layout:8s} {mb(sizes[layout])}  ({sizes[layout] / total_items:6.0f} байт на скин, "
+                  f"{time.perf_counter() - started:.1f} с)")
+    print(f"catalog против json:  -{(1 - sizes['catalog'] / sizes['json']) * 100:.0f}%")
+    print(f"catalog против names: -{(1 - sizes['catalog'] / sizes['names']) * 100:.0f}%")
+
+    print("=" * 80)
+    print("ПАМЯТЬ (tracemalloc)")
+    print("=" * 80)
+    catalog_bytes, by_name_bytes, by_id_bytes, dicts_bytes, refs_bytes = memory_bench(catalog)
+    print(f"каталог в памяти (разово)            {mb(catalog_bytes)}")
+    print(f"индекс цен по market_hash_name       {mb(by_name_bytes)}")
+    print(f"индекс цен по item_id                {mb(by_id_bytes)}  "
+          f"(-{(1 - by_id_bytes / by_name_bytes) * 100:.0f}% на каждую копию прайс-листа)")
+    print(f"{ITEMS_IN_MEMORY:,} скинов словарями               {mb(dicts_bytes)}")
+    print(f"{ITEMS_IN_MEMORY:,} скинов ссылками на каталог     {mb(refs_bytes)}  "
+          f"(-{(1 - refs_bytes / dicts_bytes) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
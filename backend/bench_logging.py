@@ -0,0 +1,134 @@
+"""
+Нагрузочный тест: логирование в горячем пути цен
+
+Эндпоинт считает цены инвентаря через PriceAggregator (прайс-лист уже в
+памяти) и пишет запись на каждый предмет, как источники цен
+(live_prices, steamapis_prices). Варианты:
+  - print:       print на предмет и на запрос (как было);
+  - sync DEBUG:  JSON-записи, обработчики (консоль + файлы) в event loop;
+  - queue DEBUG: те же обработчики за QueueListener, записи по предметам
+                 с выборкой log_sample_rate (debug_sampled);
+  - queue INFO:  уровень продакшена, debug отбрасывается в вызове логгера.
+
+Консоль перенаправлена во временный файл (как stdout контейнера в сборщик
+логов).
+
+Запуск:
+cd backend
+python bench_logging.py
+"""
+import asyncio
+import contextlib
+import logging
+import queue
+import tempfile
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+
+import logger
+from logger import ROOT_LOGGER, build_handlers, debug_sampled, get_logger
+from services.item_catalog import ItemCatalog
+from services.market_csgo_service import MarketCSGOService
+from services.price_aggregator import PriceAggregator
+
+ITEMS = 200  # Предметов в запросе (крупный инвентарь)
+CATALOG = 5_000
+REQUESTS = 1_000
+CONCURRENCY = 50
+
+log = get_logger("bench")
+app = FastAPI()
+mode = {"print": False, "sampled": False}
+
+
+@app.post("/bench/prices")
+async def bench_prices(names: list[str]):
+    prices = await PriceAggregator.get_prices(names)
+    acceptable = 0
+    for name, price_data in prices.items():
+        if mode["print"]:
+            print(f"[PRICES] {name}: {price_data.instant_price} ₽")
+        elif mode["sampled"]:
+            debug_sampled(log, "Цена предмета", item=name, price=price_data.instant_price)
+        else:
+            log.debug("Цена предмета", extra={"item": name, "price": price_data.instant_price})
+        acceptable += price_data.is_acceptable
+    if mode["print"]:
+        print(f"[PRICES] ✅ Принимаем {acceptable}/{len(names)} предметов")
+    else:
+        log.info("Цены рассчитаны", extra={"items": len(names), "acceptable": acceptable})
+    return {"acceptable": acceptable}
+
+
+def seed():
+    """Прайс-лист в памяти без БД и сети"""
+    for item_id in range(1, CATALOG + 1):
+        ItemCatalog._ids[f"AK-47 | Bench #{item_id} (Field-Tested)"] = item_id
+        MarketCSGOService._all_prices[item_id] = 10.0 + item_id % 900
+    MarketCSGOService._all_prices_loaded_at = datetime.now()
+
+
+def configure(name: str, log_dir: Path):
+    """Обработчики корневого логгера под вариант; возвращает QueueListener или None"""
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers.clear()
+    mode["print"] = name == "print"
+    mode["sampled"] = name.startswith("queue")
+    root.setLevel(logging.INFO if name.endswith("INFO") else logging.DEBUG)
+    handlers = build_handlers(log_dir)
+    if name == "print":
+        root.setLevel(logging.WARNING)
+        return None
+    if name.startswith("sync"):
+        for handler in handlers:
+            root.addHandler(handler)
+        return None
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+async def run_load():
+    names = [f"AK-47 | Bench #{i % CATALOG + 1} (Field-Tested)" for i in range(ITEMS)]
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                response = await client.post("/bench/prices", json=names)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(REQUESTS)))
+        return time.perf_counter() - start
+
+
+def main_bench():
+    seed()
+    print("=" * 80)
+    print(f"НАГРУЗКА: {REQUESTS} запросов по {ITEMS} предметов, {CONCURRENCY} параллельно, "
+          f"выборка debug {logger.SAMPLE_RATE:g}")
+    print("=" * 80)
+    for name in ("print", "sync DEBUG", "queue DEBUG", "queue INFO"):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_dir = Path(tmp)
+            with open(log_dir / "stdout.log", "w", encoding="utf-8") as stdout, contextlib.redirect_stdout(stdout):
+                listener = configure(name, log_dir)
+                elapsed = asyncio.run(run_load())
+                if listener:
+                    listener.stop()
+                for handler in logging.getLogger(ROOT_LOGGER).handlers:
+                    handler.close()
+                logging.getLogger(ROOT_LOGGER).handlers.clear()
+            written = sum(path.stat().st_size for path in log_dir.iterdir()) / 1024 / 1024
+        print(f"{name:12s} {elapsed:7.2f} с  {REQUESTS / elapsed:7.1f} rps  логов {written:7.1f} МБ")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,112 @@
+"""
+Бенчмарк: расчёт квоты в копейках (int) против старого расчёта во float
+
+Горячий путь — PricingService.calculate_quote на инвентаре: сумма выдачи по
+каждому предмету и итоги. Старый вариант (float, округление в конце)
+воспроизведён здесь как эталон.
+
+В API предметы приходят в квоту уже с копейками из PriceAggregator (перевод
+float → копейки делается один раз на market_hash_name). Ветка "float на
+входе" — для старых вызовов, которые передают только instant_price.
+
+Запуск:
+cd backend
+python bench_money.py
+"""
+import random
+import timeit
+from datetime import datetime, timedelta
+
+import money
+from services.pricing_service import PricingService
+
+ITEMS = 1_000  # Крупный инвентарь
+UNIQUE_PRICES = 300  # В инвентарях цены повторяются (кейсы, наклейки, одинаковые скины)
+NUMBER = 100
+REPEAT = 5
+
+
+def float_calculate_quote(items, option_days):
+    """Старый расчёт квоты (до перехода на копейки)"""
+    market_total = 0.0
+    loan_total = 0.0
+    items_with_loan = []
+
+    for item in items:
+        instant_price = item.get("instant_price", 0.0)
+        if instant_price > 0:
+            loan_percent = PricingService.get_loan_percent(instant_price)
+            loan_price = instant_price * loan_percent
+            items_with_loan.append({**item, "loan_percent": loan_percent, "loan_price": loan_price})
+            market_total += instant_price
+            loan_total += loan_price
+
+    term_config = PricingService.get_term_config(option_days)
+    buyback_price = loan_total * (1 + term_config["interest"]) * (1 + term_config["premium"])
+
+    return {
+        "market_total": round(market_total, 2),
+        "loan_amount": round(loan_total, 2),
+        "buyback_price": round(buyback_price, 2),
+        "option_days": option_days,
+        "option_expiry": datetime.now() + timedelta(days=option_days),
+        "term_config": term_config,
+        "items": items_with_loan
+    }
+
+
+def make_inventory():
+    """Инвентарь в формате SteamService.get_inventory + цены"""
+    random.seed(42)
+    price_pool = [round(random.lognormvariate(7, 1.5), 2) for _ in range(UNIQUE_PRICES)]
+    return [
+        {
+            "assetid": str(30_000_000_000 + i),
+            "market_hash_name": f"Item #{i % UNIQUE_PRICES}",
+            "name": f"Item #{i % UNIQUE_PRICES}",
+            "type": "Rifle",
+            "rarity": "Classified",
+            "instant_price": random.choice(price_pool),
+        }
+        for i in range(ITEMS)
+    ]
+
+
+def bench(fn, items):
+    return min(timeit.repeat(lambda: fn(items, 14), number=NUMBER, repeat=REPEAT)) / NUMBER
+
+
+def main():
+    items = make_inventory()
+
+    # Предметы с копейками из PriceAggregator (как в /api/quote и /api/deals)
+    carried = [
+        {**item, "instant_price_kopecks": k, "loan_price_kopecks": PricingService.calculate_item_loan_kopecks(k)}
+        for item in items
+        for k in [money.to_kopecks(item["instant_price"])]
+    ]
+
+    float_time = bench(float_calculate_quote, items)
+    carried_time = bench(PricingService.calculate_quote, carried)
+    int_time = bench(PricingService.calculate_quote, items)
+
+    float_quote = float_calculate_quote(items, 14)
+    int_quote = PricingService.calculate_quote(items, 14)
+    items_sum = sum(item["loan_price_kopecks"] for item in int_quote["items"])
+
+    print("=" * 60)
+    print(f"БЕНЧМАРК calculate_quote ({ITEMS:,} предметов, лучший из {REPEAT})")
+    print("=" * 60)
+    print(f"float (старый):              {float_time * 1000:7.3f} мс")
+    print(f"копейки из PriceAggregator:  {carried_time * 1000:7.3f} мс  ({carried_time / float_time:.2f}x)")
+    print(f"копейки, float на входе:     {int_time * 1000:7.3f} мс  ({int_time / float_time:.2f}x)")
+
+    print("\nСверка сумм:")
+    print(f"  float: выдача {float_quote['loan_amount']:,.2f} ₽, сумма по строкам "
+          f"{sum(round(i['loan_price'], 2) for i in float_quote['items']):,.2f} ₽")
+    print(f"  int:   выдача {int_quote['loan_amount']:,.2f} ₽, сумма по строкам "
+          f"{money.format_rub(items_sum)} ₽")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,86 +1,361 @@
 """
-Redis кэширование для цен и данных
+Двухуровневый кэш: L1 в памяти процесса + L2 в Redis (async)
+
+  - L1 — LRU с TTL в памяти воркера: горячие ключи без сетевого запроса.
+    Срок в L1 не длиннее cache_l1_ttl_seconds, поэтому даже при потере
+    сообщения об инвалидации воркер отдаёт устаревшее значение недолго.
+  - L2 — общий для воркеров Redis (redis.asyncio), не блокирует event loop.
+    Пачки ключей — одним MGET и одним конвейером SET EX.
+  - Инвалидация: удаление ключа или шаблона (SCAN + UNLINK, без KEYS)
+    публикуется в канал Redis; остальные воркеры чистят свой L1.
+
+Значения сериализуются orjson (если установлен, иначе json).
+Redis необязателен: при недоступности кэш работает только на L1 и
+повторяет подключение не чаще раза в cache_redis_retry_seconds.
+Подключение — при первом обращении или в lifespan (cache.start), не при импорте;
+пакет redis импортируется тогда же.
 """
+import asyncio
+import fnmatch
 import json
-import redis
-from typing import Optional, Any
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
 from config import get_settings
 
-settings = get_settings()
+if TYPE_CHECKING:
+    import redis.asyncio as aioredis
 
-# Подключение к Redis (опционально)
 try:
-    redis_client = redis.Redis(
-        host=settings.REDIS_HOST if hasattr(settings, 'REDIS_HOST') else 'localhost',
-        port=settings.REDIS_PORT if hasattr(settings, 'REDIS_PORT') else 6379,
-        db=0,
-        decode_responses=True,
-        socket_connect_timeout=2
-    )
-    redis_client.ping()
-    REDIS_AVAILABLE = True
-    print("[CACHE] Redis подключен")
-except Exception as e:
-    REDIS_AVAILABLE = False
-    print(f"[CACHE] Redis недоступен: {e}")
-    redis_client = None
-
-
-def get_cached(key: str) -> Optional[Any]:
-    """Получить значение из кэша"""
-    if not REDIS_AVAILABLE:
-        return None
-    
-    try:
-        value = redis_client.get(key)
-        if value:
-            return json.loads(value)
-    except Exception as e:
-        print(f"[CACHE] Ошибка чтения: {e}")
-    
-    return None
-
-
-def set_cached(key: str, value: Any, ttl: int = 3600) -> bool:
-    """Сохранить значение в кэш"""
-    if not REDIS_AVAILABLE:
-        return False
-    
-    try:
-        redis_client.setex(
-            key,
-            ttl,
-            json.dumps(value, ensure_ascii=False, default=str)
+    import orjson
+
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+except ImportError:  # orjson не установлен — медленнее, формат тот же
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=str).encode()
+
+    loads = json.loads
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+SCAN_BATCH_SIZE = 500
+
+_MISSING = object()
+
+
+class LocalCache:
+    """L1: LRU с TTL на каждую запись"""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = _MISSING) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def delete_matching(self, pattern: str) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TieredCache:
+    """
+    Кэш L1 + Redis
+
+    Ключи в Redis — с префиксом cache_key_prefix; методы принимают ключи без него.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        l1_max_items: Optional[int] = None,
+        l1_ttl: Optional[float] = None,
+        prefix: Optional[str] = None
+    ):
+        settings = get_settings()
+        self.redis_url = redis_url if redis_url is not None else settings.redis_url
+        self.l1 = LocalCache(l1_max_items or settings.cache_l1_max_items)
+        self.l1_ttl = l1_ttl if l1_ttl is not None else settings.cache_l1_ttl_seconds
+        self.prefix = prefix if prefix is not None else settings.cache_key_prefix
+        self.timeout = settings.cache_redis_timeout_seconds
+        self.retry_seconds = settings.cache_redis_retry_seconds
+        self.instance_id = uuid.uuid4().hex  # Свои сообщения об инвалидации не обрабатываем повторно
+
+        self._redis: Optional["aioredis.Redis"] = None
+        self._redis_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._redis_down_until = 0.0
+        self._listener: Optional[asyncio.Task] = None
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "redis_errors": 0}
+        # Ошибки Redis, на которые кэш переходит на L1 (RedisError — после импорта redis)
+        self._errors: Tuple[type, ...] = (OSError,)
+
+    # ---------- Redis ----------
+
+    def _client(self) -> Optional["aioredis.Redis"]:
+        """Клиент Redis или None, пока Redis недавно был недоступен"""
+        if not self.redis_url or time.monotonic() < self._redis_down_until:
+            return None
+        # Соединения пула привязаны к event loop: в другом loop — свой клиент
+        loop = asyncio.get_running_loop()
+        if self._redis is None or self._redis_loop is not loop:
+            import redis.asyncio as aioredis
+            from redis.exceptions import RedisError
+
+            self._errors = (RedisError, OSError)
+            self._redis_loop = loop
+            self._redis = aioredis.Redis.from_url(
+                self.redis_url,
+                socket_connect_timeout=self.timeout,
+                socket_timeout=self.timeout,
+                health_check_interval=30
+            )
+        return self._redis
+
+    def _redis_failed(self, error: Exception):
+        """Redis не ответил — работаем на L1 до следующей попытки"""
+        self.stats["redis_errors"] += 1
+        if time.monotonic() >= self._redis_down_until:
+            print(f"[CACHE] Redis недоступен ({error}), только L1 на {self.retry_seconds:.0f} с")
+        self._redis_down_until = time.monotonic() + self.retry_seconds
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    # ---------- Чтение ----------
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        """Значение по ключу: L1, затем Redis (найденное в Redis попадает в L1)"""
+        found = await self.get_many([key])
+        return found.get(key, default)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Значения пачки ключей (отсутствующих в результате нет)
+
+        Промахи L1 запрашиваются у Redis одним MGET.
+        """
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        for key in keys:
+            value = self.l1.get(key)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        self.stats["l1_hits"] += len(found)
+
+        client = self._client() if missing else None
+        if client is not None:
+            try:
+                raw_values = await client.mget([self._key(key) for key in missing])
+            except self._errors as e:
+                self._redis_failed(e)
+            else:
+                for key, raw in zip(missing, raw_values):
+                    if raw is not None:
+                        value = loads(raw)
+                        found[key] = value
+                        self.l1.set(key, value, self.l1_ttl)
+                        self.stats["l2_hits"] += 1
+
+        self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    # ---------- Запись ----------
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self.set_many({key: value}, ttl)
+
+    async def set_many(self, values: Dict[str, Any], ttl: float, local: bool = True):
+        """
+        Записать пачку ключей с общим TTL: L1 сразу, Redis — одним конвейером SET EX
+
+        Args:
+            local: False — только в Redis (большие выгрузки не вытесняют горячие ключи L1)
+        """
+        if local:
+            for key, value in values.items():
+                self.l1.set(key, value, min(ttl, self.l1_ttl))
+
+        client = self._client()
+        if client is None or not values:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.set(self._key(key), dumps(value), px=int(ttl * 1000))
+                await pipe.execute()
+        except self._errors as e:
+            self._redis_failed(e)
+
+    # ---------- Инвалидация ----------
+
+    async def delete(self, *keys: str):
+        """Удалить ключи во всех воркерах"""
+        self.l1.delete(keys)
+        client = self._client()
+        if client is None or not keys:
+            return
+        try:
+            await client.unlink(*[self._key(key) for key in keys])
+            await self._publish({"keys": list(keys)})
+        except self._errors as e:
+            self._redis_failed(e)
+
+    async def invalidate(self, pattern: str) -> int:
+        """
+        Удалить ключи по шаблону (glob, как в Redis) во всех воркерах
+
+        Redis обходится курсором SCAN пачками и чистится UNLINK — без
+        блокирующего KEYS на всю базу.
+
+        Returns:
+            Сколько ключей удалено в Redis (без Redis — в L1 этого воркера)
+        """
+        removed_local = self.l1.delete_matching(pattern)
+        client = self._client()
+        if client is None:
+            return removed_local
+
+        removed = 0
+        try:
+            batch = []
+            async for key in client.scan_iter(match=self._key(pattern), count=SCAN_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= SCAN_BATCH_SIZE:
+                    removed += await client.unlink(*batch)
+                    batch = []
+            if batch:
+                removed += await client.unlink(*batch)
+            await self._publish({"pattern": pattern})
+        except self._errors as e:
+            self._redis_failed(e)
+        return removed
+
+    async def _publish(self, message: Dict):
+        await self._client().publish(
+            self._key(INVALIDATION_CHANNEL),
+            dumps({**message, "origin": self.instance_id})
         )
-        return True
-    except Exception as e:
-        print(f"[CACHE] Ошибка записи: {e}")
-        return False
-
-
-def delete_cached(key: str) -> bool:
-    """Удалить значение из кэша"""
-    if not REDIS_AVAILABLE:
-        return False
-    
-    try:
-        redis_client.delete(key)
-        return True
-    except Exception as e:
-        print(f"[CACHE] Ошибка удаления: {e}")
-        return False
-
-
-def clear_cache(pattern: str = "*") -> int:
-    """Очистить кэш по паттерну"""
-    if not REDIS_AVAILABLE:
-        return 0
-    
-    try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            return redis_client.delete(*keys)
-        return 0
-    except Exception as e:
-        print(f"[CACHE] Ошибка очистки: {e}")
-        return 0
+
+    def apply_invalidation(self, raw: bytes):
+        """Сообщение другого воркера: очистить свой L1"""
+        message = loads(raw)
+        if message.get("origin") == self.instance_id:
+            return
+        if "keys" in message:
+            self.l1.delete(message["keys"])
+        if "pattern" in message:
+            self.l1.delete_matching(message["pattern"])
+
+    async def _listen(self):
+        """Подписка на инвалидации; после обрыва — переподключение"""
+        while True:
+            client = self._client()
+            if client is None:
+                await asyncio.sleep(self.retry_seconds)
+                continue
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self._key(INVALIDATION_CHANNEL))
+                # Пока не были подписаны, сообщения могли потеряться
+                self.l1.clear()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.apply_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except self._errors as e:
+                self._redis_failed(e)
+                await asyncio.sleep(self.retry_seconds)
+            finally:
+                await pubsub.aclose()
+
+    async def ping(self) -> bool:
+        """Ответил ли Redis (проверка здоровья); пока Redis помечен недоступным — False без запроса"""
+        client = self._client()
+        if client is None:
+            return False
+        try:
+            return bool(await client.ping())
+        except self._errors as e:
+            self._redis_failed(e)
+            return False
+
+    async def run_script(self, script: str, keys: List[str], args: List) -> Any:
+        """Lua-скрипт в Redis (EVALSHA, скрипт загружается при первом вызове); None — Redis недоступен"""
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            return await client.register_script(script)(keys=[self._key(key) for key in keys], args=args)
+        except self._errors as e:
+            self._redis_failed(e)
+            return None
+
+    # ---------- Жизненный цикл ----------
+
+    def start(self):
+        """Подписаться на инвалидации других воркеров (lifespan)"""
+        if self._listener is None and self.redis_url:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis is not None and self._redis_loop is asyncio.get_running_loop():
+            await self._redis.aclose()
+        self._redis = None
+
+    def info(self) -> Dict:
+        """Попадания по уровням (для мониторинга)"""
+        return {
+            **self.stats,
+            "l1_items": len(self.l1),
+            "redis": "down" if time.monotonic() < self._redis_down_until else ("up" if self._redis else "idle"),
+        }
+
+
+cache = TieredCache()
@@ -6,9 +6,29 @@ from typing import List, Dict
 class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./cyberlombard.db"
+    database_replica_url: str = ""  # Реплика для чтения (пусто — читать из основной БД)
+    
+    # Пулы соединений: запись (сделки, платежи) и чтение (статистика, админка) раздельно
+    db_write_pool_size: int = 10
+    db_write_max_overflow: int = 20
+    db_read_pool_size: int = 10
+    db_read_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0
     
     # Redis
-    redis_url: str = "redis://localhost:6379"
+    redis_url: str = "redis://localhost:6379"  # Пусто — кэш только в памяти процесса
+    
+    # Кэш (cache.py): L1 в памяти воркера + Redis
+    cache_l1_max_items: int = 10000
+    cache_l1_ttl_seconds: float = 30.0  # Дольше в L1 не держим: предел устаревания без pub/sub
+    cache_key_prefix: str = "cl:"
+    cache_redis_timeout_seconds: float = 0.5
+    cache_redis_retry_seconds: float = 30.0  # Пауза перед повторным подключением к упавшему Redis
+    inventory_cache_ttl_seconds: int = 300
+    market_prices_cache_ttl_seconds: int = 3600
+    
+    # Кэш ответов (response_cache.py): готовые тела публичных эндпоинтов в памяти воркера
+    response_cache_max_items: int = 5000
     
     # Steam
     steam_api_key: str = ""
@@ -68,6 +88,52 @@ class Settings(BaseSettings):
     # === ТРЕЙДЫ ===
     
     trade_timeout_hours: int = 48  # 2 дня на принятие
+    expiry_warning_hours: int = 24  # Предупреждение об окончании опциона
+    
+    # === ФОНОВЫЕ ЗАДАЧИ ===
+    
+    # Выполнять задачи в процессе API (False — только отдельный воркер: python -m services.job_queue)
+    jobs_in_api: bool = True
+    job_max_concurrent: int = 10
+    job_lease_seconds: int = 300  # Аренда задачи в работе; без продления дольше — процесс считается упавшим
+    
+    # Лимит параллельных задач на внешнюю систему
+    # Формат: "target:limit,..."
+    job_target_limits: str = "steam_bot:4,yookassa:2,telegram:5,local:2"
+    
+    # === АУДИТ ===
+    
+    # Пачка событий аудита пишется одним INSERT по размеру или раз в интервал
+    audit_batch_size: int = 500
+    audit_flush_interval_seconds: float = 1.0
+    audit_spool_dir: str = "audit_spool"  # Локальный спул до записи в БД
+    audit_partition_months_ahead: int = 2  # Месячные секции audit_logs (PostgreSQL) наперёд
+
+    # === ЛИМИТЫ ЗАПРОСОВ ===
+
+    # Бюджет пользователя (SteamID + IP) на тяжёлые маршруты: единиц за период, общий для всех воркеров (Redis)
+    rate_limit_enabled: bool = True
+    rate_limit_capacity: int = 60
+    rate_limit_ip_capacity: int = 300  # Все SteamID с одного IP: против перебора SteamID, с запасом на CGNAT
+    rate_limit_period_seconds: float = 60.0
+    # Стоимость запроса в единицах бюджета
+    # Формат: "route:cost,..."
+    rate_limit_costs: str = "inventory:5,quote:3,deals:12"
+    # Аванс активному пользователю: единицы впрок из Redis, тратятся в воркере без обращения к Redis
+    rate_limit_lease_units: int = 6
+    rate_limit_lease_seconds: float = 1.0
+
+    # === ЛОГИ ===
+
+    log_level: str = "INFO"  # DEBUG — подробности запросов к ценам и инвентарю
+    log_console_format: str = "text"  # "text" или "json" (в файлы всегда JSON)
+    log_sample_rate: float = 0.01  # Доля построчных debug-записей по предметам
+
+    # Трассировка (tracing.py): "none", "console" (в лог), "memory", "otlp" (коллектор OpenTelemetry)
+    tracing_exporter: str = "none"
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    tracing_service_name: str = "cyberlombard-api"
+    tracing_sample_ratio: float = 1.0  # Доля трейсов, начатых в API (входящий traceparent решает сам)
     
     # === ЮРИДИЧЕСКОЕ ===
     
@@ -76,6 +142,17 @@ class Settings(BaseSettings):
     
     # === ИНТЕГРАЦИИ ===
     
+    # Общие HTTP-клиенты внешних систем (services/http_clients.py)
+    http2_enabled: bool = True  # Нужен пакет h2 (httpx[http2]); без него HTTP/1.1
+    http_keepalive_expiry_seconds: float = 30.0  # Сколько держать простаивающее соединение в пуле
+    
+    # Фоновые проверки зависимостей для /health (services/health.py): имя:интервал в секундах
+    health_probe_intervals: str = "database:5,redis:10,steam_bot:15,steam_api:30,market_csgo:60"
+    health_probe_timeout_seconds: float = 5.0
+    
+    # Steam бот (steam-bot/src/index.js)
+    steam_bot_url: str = "http://localhost:3001"
+    
     # Lis-Skins
     lis_skins_api_url: str = "https://lis-skins.ru/api/v2"
     lis_skins_api_key: str = ""
@@ -109,6 +186,30 @@ class Settings(BaseSettings):
                 "premium": float(premium)
             }
         return terms
+    
+    def get_health_probe_intervals(self) -> Dict[str, float]:
+        """Парсинг health_probe_intervals из строки"""
+        intervals = {}
+        for item in self.health_probe_intervals.split(","):
+            name, seconds = item.split(":")
+            intervals[name] = float(seconds)
+        return intervals
+    
+    def get_rate_limit_costs(self) -> Dict[str, int]:
+        """Парсинг rate_limit_costs из строки"""
+        costs = {}
+        for item in self.rate_limit_costs.split(","):
+            route, cost = item.split(":")
+            costs[route] = int(cost)
+        return costs
+    
+    def get_job_target_limits(self) -> Dict[str, int]:
+        """Парсинг job_target_limits из строки"""
+        limits = {}
+        for item in self.job_target_limits.split(","):
+            target, limit = item.split(":")
+            limits[target] = int(limit)
+        return limits
 
 
 @lru_cache()
@@ -1,18 +1,201 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from config import get_settings
+from tracing import instrument_engine
 
 settings = get_settings()
 
-engine = create_engine(
-    settings.database_url,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
-)
+# Границы гистограммы ожидания соединения из пула (секунды)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolMetrics:
+    """Ожидание соединения из пула: число выдач, время ожидания, таймауты"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_buckets = [0] * (len(POOL_WAIT_BUCKETS) + 1)  # Последний — больше всех границ
+        self.pool = None
+        self._lock = threading.Lock()
+
+    def observe(self, wait_seconds: float, timed_out: bool = False):
+        bucket = next((i for i, bound in enumerate(POOL_WAIT_BUCKETS) if wait_seconds <= bound), len(POOL_WAIT_BUCKETS))
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+            self.wait_buckets[bucket] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            stats = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_seconds_total / waits * 1000, 3) if waits else 0.0,
+                "wait_max_ms": round(self.wait_seconds_max * 1000, 3),
+                "wait_buckets": dict(zip([*map(str, POOL_WAIT_BUCKETS), "+Inf"], self.wait_buckets)),
+            }
+        pool = self.pool
+        if pool is not None:
+            stats.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0)
+            )
+        return stats
+
+
+# Метрики всех пулов процесса (по имени движка)
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def _timed_pool_class(base, metrics: PoolMetrics):
+    """Класс пула, который замеряет ожидание свободного соединения"""
+
+    class TimedPool(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            metrics.pool = self  # После dispose() движок создаёт новый пул того же класса
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except exc.TimeoutError:
+                metrics.observe(time.perf_counter() - started, timed_out=True)
+                raise
+            metrics.observe(time.perf_counter() - started)
+            return connection
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def make_engine(
+    database_url: str,
+    name: str,
+    pool_size: int,
+    max_overflow: int,
+    is_async: bool = False,
+    pool_timeout: Optional[float] = None
+):
+    """
+    Движок со своим пулом и метриками ожидания (pool_metrics[name])
+
+    Args:
+        name: Имя пула в метриках ("write", "read", ...)
+        pool_timeout: Сколько ждать свободного соединения (по умолчанию db_pool_timeout_seconds)
+    """
+    metrics = pool_metrics[name] = PoolMetrics(name)
+    factory = create_async_engine if is_async else create_engine
+    base_pool = AsyncAdaptedQueuePool if is_async else QueuePool
+    url = to_async_url(database_url) if is_async else database_url
+    try:
+        engine = factory(
+            url,
+            poolclass=_timed_pool_class(base_pool, metrics),
+            pool_pre_ping=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout if pool_timeout is not None else settings.db_pool_timeout_seconds
+        )
+    except ModuleNotFoundError as e:
+        if not is_async:
+            raise
+        raise RuntimeError(
+            f"Нет async-драйвера {e.name} для {url.partition('://')[0]}: pip install -r requirements.txt"
+        ) from e
+    instrument_engine(engine.sync_engine if is_async else engine)
+    return engine
+
+
+def to_async_url(database_url: str) -> str:
+    """
+    URL для async-драйвера той же БД
+
+    sqlite:///./db -> sqlite+aiosqlite:///./db, postgresql://... -> postgresql+asyncpg://...
+    """
+    scheme, sep, rest = database_url.partition("://")
+    driver = scheme.split("+")[0]
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if driver in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return database_url
+
+
+# ============= МАРШРУТИЗАЦИЯ =============
+#
+# Запись (сделки, платежи, очередь задач) — основная БД, пул "write".
+# Чтение для отображения (статистика, списки админки, сделки клиента) —
+# реплика (database_replica_url), пул "read". Без реплики читающий пул
+# смотрит в основную БД: тяжёлые выборки админки всё равно не занимают
+# соединения, которых ждут записи сделок.
+
+read_database_url = settings.database_replica_url or settings.database_url
+
+engine = make_engine(settings.database_url, "write", settings.db_write_pool_size, settings.db_write_max_overflow)
+read_engine = make_engine(read_database_url, "read", settings.db_read_pool_size, settings.db_read_max_overflow)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine, info={"read_only": True})
+
+# Async-движки для обработчиков FastAPI: запросы не блокируют event loop
+async_engine = make_engine(
+    settings.database_url, "write_async",
+    settings.db_write_pool_size, settings.db_write_max_overflow, is_async=True
+)
+async_read_engine = make_engine(
+    read_database_url, "read_async",
+    settings.db_read_pool_size, settings.db_read_max_overflow, is_async=True
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+    info={"read_only": True}
+)
+
+
+@event.listens_for(Session, "before_flush")
+def _forbid_replica_writes(session: Session, flush_context, instances):
+    """Сессии чтения (реплика) не пишут — ошибка сразу, а не на реплике"""
+    if session.info.get("read_only") and (session.new or session.dirty or session.deleted):
+        raise exc.InvalidRequestError("Запись через сессию чтения (реплику); используйте get_db")
+
+
+def pool_stats(name: Optional[str] = None) -> Dict[str, Dict]:
+    """Состояние пулов и ожидание соединений (для мониторинга)"""
+    return {
+        pool_name: metrics.snapshot()
+        for pool_name, metrics in pool_metrics.items()
+        if name is None or pool_name == name
+    }
+
 
 Base = declarative_base()
 
@@ -22,3 +205,20 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """Сессия чтения (реплика): только SELECT, данные могут отставать на лаг репликации"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    """Async-сессия чтения (реплика)"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
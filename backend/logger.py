@@ -1,71 +1,157 @@
 """
 Настройка логирования для приложения
+
+Записи структурированные: сообщение + поля из extra
+(logger.info("Цены получены", extra={"found": 3, "requested": 5})).
+В файлы пишется JSON по строке на запись, в консоль — текст или JSON
+(log_console_format).
+
+Обработчики (консоль, файлы с ротацией) работают в потоке QueueListener:
+вызов логгера в обработчике запроса только кладёт запись в очередь,
+event loop не ждёт диска.
+
+Построчный debug по предметам — debug_sampled(log, "...", item=name): пишется
+доля log_sample_rate таких записей, решение принимается до создания записи
+(в записи поле sample_rate — для пересчёта количества).
 """
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
-from datetime import datetime
+from typing import Dict
 
+from config import get_settings
+
+try:
+    import orjson
+
+    def _dumps(payload: Dict) -> str:
+        return orjson.dumps(payload, default=str).decode()
+except ImportError:  # orjson не установлен — тот же формат через json
+    def _dumps(payload: Dict) -> str:
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+ROOT_LOGGER = "cyberlombard"
+SAMPLE_RATE = get_settings().log_sample_rate
+
+# Атрибуты LogRecord — всё остальное в записи пришло из extra
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def debug_sampled(log: logging.Logger, msg: str, **fields):
+    """Debug-запись по предмету: в лог попадает доля SAMPLE_RATE"""
+    if SAMPLE_RATE > 0 and log.isEnabledFor(logging.DEBUG) and random.random() < SAMPLE_RATE:
+        log.debug(msg, extra={**fields, "sample_rate": SAMPLE_RATE})
+
+
+def record_fields(record: logging.LogRecord) -> Dict:
+    """Поля записи из extra"""
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **record_fields(record),
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return _dumps(payload)
+
+
+class TextFormatter(logging.Formatter):
+    """Текст для консоли разработчика; поля extra — key=value в конце"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def build_handlers(log_dir: Path, console_format: str = "text") -> list:
+    """Консоль, общий файл и файл ошибок (файлы открываются при первой записи)"""
+    today = datetime.now().strftime('%Y%m%d')
 
-def setup_logger(name: str = "cyberlombard") -> logging.Logger:
-    """
-    Настроить логгер с выводом в файл и консоль
-    
-    Args:
-        name: Имя логгера
-        
-    Returns:
-        Настроенный логгер
-    """
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
-    # Избегаем дублирования handlers
-    if logger.handlers:
-        return logger
-    
-    # Создать директорию для логов
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    
-    # Формат логов
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
     # Handler для файла (ротация по размеру)
     file_handler = RotatingFileHandler(
-        log_dir / f"app_{datetime.now().strftime('%Y%m%d')}.log",
+        log_dir / f"app_{today}.log",
         maxBytes=10*1024*1024,  # 10MB
         backupCount=5,
-        encoding='utf-8'
+        encoding='utf-8',
+        delay=True
     )
-    file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(formatter)
-    
+    file_handler.setFormatter(JsonFormatter())
+
     # Handler для консоли
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    
+    console_handler.setFormatter(JsonFormatter() if console_format == "json" else TextFormatter())
+
     # Handler для ошибок (отдельный файл)
     error_handler = RotatingFileHandler(
-        log_dir / f"errors_{datetime.now().strftime('%Y%m%d')}.log",
+        log_dir / f"errors_{today}.log",
         maxBytes=10*1024*1024,
         backupCount=5,
-        encoding='utf-8'
+        encoding='utf-8',
+        delay=True
     )
     error_handler.setLevel(logging.ERROR)
-    error_handler.setFormatter(formatter)
-    
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    logger.addHandler(error_handler)
-    
+    error_handler.setFormatter(JsonFormatter())
+
+    return [file_handler, console_handler, error_handler]
+
+
+def setup_logger(name: str = ROOT_LOGGER) -> logging.Logger:
+    """
+    Настроить логгер: очередь в вызывающем потоке, обработчики — в фоновом
+
+    Args:
+        name: Имя логгера
+
+    Returns:
+        Настроенный логгер
+    """
+    logger = logging.getLogger(name)
+
+    # Избегаем дублирования handlers
+    if logger.handlers:
+        return logger
+
+    settings = get_settings()
+    logger.setLevel(settings.log_level.upper())
+
+    # Создать директорию для логов
+    log_dir = Path("logs")
+    log_dir.mkdir(exist_ok=True)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *build_handlers(log_dir, settings.log_console_format), respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Дописать очередь при выходе
+
+    logger.addHandler(QueueHandler(log_queue))
     return logger
 
 
+def get_logger(name: str) -> logging.Logger:
+    """Логгер подсистемы (cyberlombard.<name>), пишет через общую очередь"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
 # Глобальный логгер
 logger = setup_logger()
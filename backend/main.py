@@ -1,10 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Body
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-import httpx
 import asyncio
 import os
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -13,15 +15,36 @@ from slowapi.errors import RateLimitExceeded
 
 import models
 import schemas
-from database import engine, get_db
+import money
+from cache import cache
+from response_cache import ResponseCacheMiddleware, response_cache, set_cache_version
+import metrics
+from metrics import MetricsMiddleware
+from tracing import TracingMiddleware, instrument, tracer
+from rate_limit import RateLimited, rate_limited_handler, rate_limiter
+from database import (
+    async_engine, async_read_engine, SessionLocal, pool_stats,
+    get_db, get_read_db, get_async_db, get_async_read_db
+)
 from services.steam_service import SteamService
 from services.pricing_service import PricingService
 from services.sms_service import SMSService
-from services.contract_service import ContractService
 from services.payment_service import PaymentService
 from services.steam_auth_service import SteamAuthService
 from services.passport_ocr_service import PassportOCRService
 from services import telegram_service
+from services.deal_pipeline import DealPipeline
+from services.deal_repository import DealRepository
+from services.http_clients import http_clients
+from services.health import LATENCY_BUCKETS, health_monitor
+from services.job_queue import job_runner
+from services.deal_scheduler import DealLifecycle, deal_scheduler
+from services.stats_service import GLOBAL_STATS_ID, STATUS_COLUMNS, StatsService
+from services.item_catalog import ItemCatalog
+from services.market_csgo_service import MarketCSGOService
+from services.bulk_prices import BulkPriceService, TooManyNames, FORMAT_ROWS, FORMATS
+from services.audit_log import audit_sink
+from services.admin_deals_service import AdminDealsService, InvalidCursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from config import get_settings
 from logger import logger
 from validators import (
@@ -29,19 +52,47 @@ from validators import (
     validate_option_days, validate_amount, validate_sms_code
 )
 
-# Создание таблиц
-models.Base.metadata.create_all(bind=engine)
-
 # Создать папку contracts если нет
 os.makedirs("contracts", exist_ok=True)
 
-# Rate limiter
+# Rate limiter slowapi по IP (вход, SMS); инвентарь, расчёт и сделки — бюджеты пользователя и IP в rate_limit.py
 limiter = Limiter(key_func=get_remote_address)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Фоновые задачи живут вместе с приложением (если нет отдельного воркера)"""
+    db = SessionLocal()
+    try:
+        StatsService.ensure_initialized(db)
+        ItemCatalog.load(db)
+    finally:
+        db.close()
+    
+    audit_sink.start()
+    await http_clients.start()
+    cache.start()
+    health_monitor.start()
+    if get_settings().jobs_in_api:
+        job_runner.start()
+        deal_scheduler.start()
+    yield
+    await health_monitor.stop()
+    await deal_scheduler.stop()
+    await job_runner.stop()
+    await audit_sink.stop()
+    await http_clients.aclose()
+    await cache.stop()
+    tracer.shutdown()
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+
 app = FastAPI(
     title="КиберЛомбард CS2 API",
     description="API для выкупа цифровых прав на CS2 скины с опционом обратного выкупа",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Раздача статических файлов (договоры PDF)
@@ -50,11 +101,38 @@ app.mount("/contracts", StaticFiles(directory="contracts"), name="contracts")
 # Добавить rate limiter в app state
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Бюджеты пользователя и IP на инвентарь, расчёт и сделки — общие для воркеров (rate_limit.py)
+app.add_exception_handler(RateLimited, rate_limited_handler)
 
 settings = get_settings()
 
 logger.info("КиберЛомбард API запущен")
 
+# Кэш ответов читающих публичных эндпоинтов (внутри CORS: заголовки CORS и у ответов из кэша)
+
+async def _deal_cache_version(request: Request, params: dict) -> Optional[str]:
+    """Версия GET /api/deals/{id} одним запросом отметок изменений (None — сделки нет)"""
+    # Сессия — как у Depends(get_async_read_db), с учётом подмен в тестах
+    get_session = request.app.dependency_overrides.get(get_async_read_db, get_async_read_db)
+    async for db in get_session():
+        row = (await db.execute(DealRepository.detail_stamps(params["deal_id"]))).first()
+    return DealRepository.detail_version(*row, now=datetime.utcnow()) if row else None
+
+async def _prices_cache_version(request: Request, params: dict) -> Optional[str]:
+    return await MarketCSGOService.prices_version()
+
+response_cache.route("GET", "/api/stats/public", ttl=10, cache_control="public, max-age=10")
+response_cache.route("POST", "/api/calculator", ttl=3600)
+response_cache.route(
+    "GET", "/api/prices/item/{market_hash_name}", ttl=300,
+    version=_prices_cache_version, cache_control="public, max-age=60"
+)
+response_cache.route(
+    "GET", "/api/deals/{deal_id:int}", ttl=300,
+    version=_deal_cache_version, cache_control="private, no-cache"
+)
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+
 # CORS
 allowed_origins = [
     "http://localhost:3000",
@@ -74,6 +152,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Метрики — снаружи всех middleware: время запроса целиком, включая ответы из кэша
+app.add_middleware(MetricsMiddleware)
+# Трассировка — самая внешняя: серверный спан запроса, внутри — спаны сервисов, SQL и HTTP
+app.add_middleware(TracingMiddleware)
+
+# Спаны на вызовы сервисов (async — все публичные, синхронные — только тяжёлые)
+instrument(SteamService, "steam")
+instrument(SMSService, "sms")
+instrument(PaymentService, "payment")
+instrument(SteamAuthService, "steam_auth")
+instrument(MarketCSGOService, "market_csgo")
+instrument(BulkPriceService, "bulk_prices")
+instrument(PricingService, "pricing", methods=["calculate_quote"])
+instrument(PassportOCRService, "passport_ocr", methods=["extract_from_base64"])
+instrument(DealPipeline, "deal_pipeline", methods=[
+    "enqueue_creation_jobs", "enqueue_activation_jobs", "enqueue_buyback_jobs", "enqueue_default_jobs"
+])
+instrument(DealLifecycle, "deal_lifecycle", methods=["expire_all", "send_expiry_warnings"])
+instrument(StatsService, "stats", methods=["rebuild"])
+
 # ============= AUTH ENDPOINTS =============
 
 @app.get("/api/auth/steam/login")
@@ -134,17 +232,15 @@ async def steam_callback(
     db.commit()
     db.refresh(user)
     
-    # Логирование
-    audit_log = models.AuditLog(
+    # Логирование (пачкой, без отдельного commit)
+    audit_sink.record(
+        "steam_login",
         user_id=user.id,
-        action="steam_login",
         details={
             "steam_id": steam_id,
             "username": user_info["username"]
         }
     )
-    db.add(audit_log)
-    db.commit()
     
     return {
         "success": True,
@@ -161,7 +257,7 @@ async def steam_callback(
 @app.post("/api/auth/steam/verify", response_model=schemas.User)
 async def verify_steam_user(
     steam_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Верификация пользователя через Steam OpenID (альтернативный метод)"""
     
@@ -172,7 +268,7 @@ async def verify_steam_user(
         raise HTTPException(status_code=404, detail="Steam user not found")
     
     # Найти или создать пользователя
-    user = db.query(models.User).filter(models.User.steam_id == steam_id).first()
+    user = await db.scalar(select(models.User).where(models.User.steam_id == steam_id))
     
     if not user:
         user = models.User(
@@ -186,8 +282,8 @@ async def verify_steam_user(
         user.steam_avatar = user_info["avatar"]
         user.last_login = datetime.utcnow()
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return user
 
@@ -243,11 +339,11 @@ async def verify_phone(
 async def submit_passport(
     steam_id: str,
     kyc_data: schemas.UserKYC,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Отправить паспортные данные"""
     
-    user = db.query(models.User).filter(models.User.steam_id == steam_id).first()
+    user = await db.scalar(select(models.User).where(models.User.steam_id == steam_id))
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
@@ -257,7 +353,7 @@ async def submit_passport(
     user.passport_department_code = kyc_data.passport_department_code
     user.passport_verified = True  # В проде - ручная модерация
     
-    db.commit()
+    await db.commit()
     
     return {"success": True, "message": "Паспортные данные сохранены"}
 
@@ -298,7 +394,7 @@ async def scan_passport(request: Request):
 async def save_trade_url(
     steam_id: str,
     trade_url: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Сохранить trade URL пользователя"""
     
@@ -316,7 +412,7 @@ async def save_trade_url(
         )
     
     # Находим или создаем пользователя
-    user = db.query(models.User).filter(models.User.steam_id == steam_id).first()
+    user = await db.scalar(select(models.User).where(models.User.steam_id == steam_id))
     
     if not user:
         user = models.User(
@@ -329,8 +425,7 @@ async def save_trade_url(
         user.trade_url = trade_url
         user.trade_token = parsed["trade_token"]
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     
     return {
         "success": True,
@@ -339,7 +434,6 @@ async def save_trade_url(
     }
 
 @app.get("/api/inventory/{steam_id}", response_model=schemas.InventoryResponse)
-@limiter.limit("10/minute")
 async def get_inventory(
     request: Request,
     steam_id: str,
@@ -347,12 +441,14 @@ async def get_inventory(
 ):
     """Получить CS2 инвентарь с live ценами (Lis-Skins + market.csgo + Steam)"""
     
-    logger.info(f"[INVENTORY] Запрос инвентаря для {steam_id}")
+    logger.info("[INVENTORY] Запрос инвентаря", extra={"steam_id": steam_id})
     
     if not validate_steam_id(steam_id):
         logger.error(f"[INVENTORY] Неверный Steam ID: {steam_id}")
         raise HTTPException(status_code=400, detail="Неверный Steam ID")
     
+    await rate_limiter.hit("inventory", steam_id, request)
+    
     # Получить инвентарь
     items = await SteamService.get_inventory(steam_id)
     
@@ -389,8 +485,9 @@ async def get_inventory(
             )
             is_acceptable = instant_price >= 40  # Минимум 40₽
         
-        # Рассчитываем залог (50% от цены)
-        loan_amount = instant_price * 0.50
+        # Рассчитываем залог (50% от цены) — в копейках, без ошибки округления float
+        item_kopecks = PricingService.get_item_kopecks(instant_price, price_data)
+        loan_amount = money.to_rubles(money.apply_rate(item_kopecks["instant_price_kopecks"], money.rate_to_ppm(0.50)))
         
         items_with_prices.append({
             **item,
@@ -399,6 +496,7 @@ async def get_inventory(
             "market_csgo_price": market_csgo_price,
             "lis_skins_estimate": lis_estimate,
             "loan_amount": loan_amount,  # Сумма залога
+            **item_kopecks,
             "is_acceptable": is_acceptable,
             "is_estimated": not is_acceptable
         })
@@ -418,6 +516,7 @@ async def get_inventory(
 
 @app.post("/api/inventory/authenticated/{steam_id}")
 async def get_inventory_authenticated(
+    request: Request,
     steam_id: str,
     cookies: dict,
     db: Session = Depends(get_db)
@@ -436,6 +535,8 @@ async def get_inventory_authenticated(
     """
     from services.steam_authenticated_inventory import SteamAuthenticatedInventory
     
+    await rate_limiter.hit("inventory", steam_id, request)
+    
     session_id = cookies.get("sessionid")
     steam_login_secure = cookies.get("steamLoginSecure")
     
@@ -478,7 +579,6 @@ async def get_inventory_authenticated(
 # ============= QUOTE ENDPOINTS =============
 
 @app.post("/api/quote", response_model=schemas.QuoteResponse)
-@limiter.limit("20/minute")
 async def calculate_quote(
     request: Request,
     quote_request: schemas.QuoteRequest,
@@ -486,7 +586,7 @@ async def calculate_quote(
 ):
     """Рассчитать условия сделки"""
     
-    logger.info(f"[QUOTE] Запрос: steam_id={quote_request.steam_id}, asset_ids={quote_request.asset_ids}")
+    logger.info("[QUOTE] Запрос", extra={"steam_id": quote_request.steam_id, "assets": len(quote_request.asset_ids)})
     
     if not validate_steam_id(quote_request.steam_id):
         logger.error(f"[QUOTE] Неверный Steam ID: {quote_request.steam_id}")
@@ -496,11 +596,10 @@ async def calculate_quote(
         logger.error(f"[QUOTE] Неверный срок опциона: {quote_request.option_days}")
         raise HTTPException(status_code=400, detail="Срок опциона должен быть 7-30 дней")
     
-    print(f"[QUOTE] Запрос: steam_id={quote_request.steam_id}, asset_ids={quote_request.asset_ids}")
+    await rate_limiter.hit("quote", quote_request.steam_id, request)
     
     # Получить инвентарь
     all_items = await SteamService.get_inventory(quote_request.steam_id)
-    print(f"[QUOTE] Загружено {len(all_items)} предметов из инвентаря")
     
     # Фильтровать выбранные предметы
     selected_items = [
@@ -508,14 +607,15 @@ async def calculate_quote(
         if item["assetid"] in quote_request.asset_ids
     ]
     
-    print(f"[QUOTE] Найдено {len(selected_items)} выбранных предметов")
-    
     if not selected_items:
-        print(f"[QUOTE] WARNING: Предметы не найдены по asset_ids={quote_request.asset_ids}")
-        print(f"[QUOTE] Доступные assetid: {[item['assetid'] for item in all_items[:5]]}")
         # Fallback: используем первые 5 предметов для демонстрации
         selected_items = all_items[:5]
-        print(f"[QUOTE] Используем fallback: первые {len(selected_items)} предметов")
+        logger.warning("[QUOTE] Предметы не найдены по asset_ids, используем первые из инвентаря", extra={
+            "steam_id": quote_request.steam_id,
+            "asset_ids": quote_request.asset_ids[:5],
+            "available": [item["assetid"] for item in all_items[:5]],
+            "fallback": len(selected_items)
+        })
     
     # Получить цены Steam Market
     prices = await SteamService.get_market_prices(selected_items)
@@ -545,7 +645,8 @@ async def calculate_quote(
             **item,
             "instant_price": price,
             "market_price": price,  # Для обратной совместимости
-            "is_estimated": False
+            "is_estimated": False,
+            **PricingService.get_item_kopecks(price, price_data if isinstance(price_data, dict) else None)
         })
     
     # Рассчитать условия (залог = 30% от Steam Market)
@@ -554,22 +655,24 @@ async def calculate_quote(
         quote_request.option_days
     )
     
-    # Логирование для отладки
-    print(f"[QUOTE] Предметов: {len(items_with_prices)}")
-    print(f"[QUOTE] Рыночная стоимость: {quote['market_total']} ₽")
-    print(f"[QUOTE] Залог: {quote['loan_amount']} ₽")
-    print(f"[QUOTE] Выкуп: {quote['buyback_price']} ₽")
+    logger.debug("[QUOTE] Условия рассчитаны", extra={
+        "steam_id": quote_request.steam_id,
+        "inventory": len(all_items),
+        "items": len(items_with_prices),
+        "market_total": quote["market_total"],
+        "loan_amount": quote["loan_amount"],
+        "buyback_price": quote["buyback_price"]
+    })
     
     return schemas.QuoteResponse(**quote)
 
 # ============= DEAL ENDPOINTS =============
 
 @app.post("/api/deals", response_model=schemas.DealResponse)
-@limiter.limit("5/minute")
 async def create_deal(
     request: Request,
     deal_create: schemas.DealCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Создать сделку"""
     
@@ -583,10 +686,12 @@ async def create_deal(
         logger.error(f"[DEAL] Неверный формат SMS кода")
         raise HTTPException(status_code=400, detail="Неверный формат SMS кода")
     
+    await rate_limiter.hit("deals", deal_create.quote_request.steam_id, request)
+    
     # Получить пользователя
-    user = db.query(models.User).filter(
+    user = await db.scalar(select(models.User).where(
         models.User.steam_id == deal_create.quote_request.steam_id
-    ).first()
+    ))
     
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
@@ -625,7 +730,8 @@ async def create_deal(
         items_with_prices.append({
             **item,
             "market_price": instant_price,  # Число, не объект
-            "instant_price": instant_price
+            "instant_price": instant_price,
+            **PricingService.get_item_kopecks(instant_price, price_data if isinstance(price_data, dict) else None)
         })
     
     quote = PricingService.calculate_quote(
@@ -643,7 +749,7 @@ async def create_deal(
     
     # Проверить SMS-код (пропускаем в DEV режиме)
     if not skip_verification:
-        if not SMSService.verify_code(db, user.phone, deal_create.sms_code, "deal_sign"):
+        if not await db.run_sync(SMSService.verify_code, user.phone, deal_create.sms_code, "deal_sign"):
             raise HTTPException(status_code=400, detail="Неверный SMS-код")
     
     # Подготовить KYC snapshot
@@ -661,6 +767,10 @@ async def create_deal(
             "steam_username": user.steam_username
         }
     
+    # Предметы с посчитанными суммами выдачи (одни и те же для БД, договора и выплаты);
+    # сохраняются строками deal_items
+    items_snapshot = quote["items"]
+    
     # Создать сделку
     deal = models.Deal(
         user_id=user.id,
@@ -668,7 +778,7 @@ async def create_deal(
         loan_amount=quote["loan_amount"],
         buyback_price=quote["buyback_price"],
         option_expiry=quote["option_expiry"],
-        items_snapshot=items_with_prices,
+        items_snapshot=items_snapshot,
         kyc_snapshot=kyc_snapshot,
         deal_status=models.DealStatus.PENDING,
         signature_sms_code=SMSService.hash_code(deal_create.sms_code),
@@ -676,120 +786,52 @@ async def create_deal(
     )
     
     db.add(deal)
-    db.commit()
-    db.refresh(deal)
-    
-    # Генерировать PDF договора
-    contract_path = f"contracts/deal_{deal.id}.pdf"
-    ContractService.generate_contract_pdf(
-        deal={
-            "id": deal.id,
-            "market_total": deal.market_total,
-            "loan_amount": deal.loan_amount,
-            "buyback_price": deal.buyback_price,
-            "option_expiry": deal.option_expiry,
-            "option_days": deal_create.quote_request.option_days,
-            "signature_timestamp": deal.signature_timestamp,
-            "signature_sms_code": deal.signature_sms_code,
-            "items": items_with_prices,
-            "created_at": datetime.utcnow(),
-            "term_config": quote.get("term_config", {"interest": 0.15, "premium": 0.07})
-        },
-        user={
-            "steam_id": user.steam_id,
-            "phone": user.phone or "+7XXXXXXXXXX",
-            "passport_series": user.passport_series or "XXXX",
-            "passport_number": user.passport_number or "XXXXXX",
-            "full_name": "Клиент"
-        },
-        output_path=contract_path
-    )
-    
-    # Сохраняем путь к договору
-    deal.contract_pdf_url = contract_path
-    db.commit()
+    await db.flush()
     
-    # Создать Steam Trade Offer через бота
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            bot_response = await client.post(
-                "http://localhost:3001/api/trade/create",
-                json={
-                    "deal_id": deal.id,
-                    "partner_steam_id": user.steam_id,
-                    "items": [
-                        {"assetid": item["assetid"]} 
-                        for item in items_with_prices
-                    ]
-                }
-            )
-            
-            if bot_response.status_code == 200:
-                trade_data = bot_response.json()
-                deal.initial_trade_id = trade_data.get("trade_offer_id")
-                deal.initial_trade_url = trade_data.get("trade_url")
-                
-                # Создать запись трейда
-                trade = models.SteamTrade(
-                    deal_id=deal.id,
-                    trade_offer_id=trade_data["trade_offer_id"],
-                    trade_offer_url=trade_data["trade_url"],
-                    is_incoming=True,
-                    status=models.TradeStatus.SENT,
-                    items_json=items_with_prices
-                )
-                db.add(trade)
-                db.commit()
-                
-                print(f"[API] Трейд создан: {trade_data['trade_url']}")
-    except Exception as e:
-        print(f"[API] Ошибка создания трейда: {e}")
-        # Продолжаем без трейда - можно создать вручную
+    # Договор, трейд и уведомление — фоновыми задачами в той же транзакции (outbox — sync API)
+    await db.run_sync(DealPipeline.enqueue_creation_jobs, deal, deal_create.quote_request.option_days, quote)
     
-    # Отправить уведомление в Telegram
-    try:
-        kyc = deal.kyc_snapshot or {}
-        await telegram_service.notify_new_deal(
-            deal_id=deal.id,
-            loan_amount=deal.loan_amount,
-            items_count=len(items_with_prices),
-            user_name=kyc.get("full_name", user.steam_username or "Клиент"),
-            phone=kyc.get("phone", "Не указан")
-        )
-    except Exception as e:
-        print(f"[API] Ошибка TG уведомления: {e}")
+    await db.commit()
+    # created_at и скины — заново из БД: ленивая загрузка в async недоступна
+    deal = await db.scalar(
+        DealRepository.by_id(deal.id, items=True).execution_options(populate_existing=True)
+    )
+    job_runner.wake()
+    # Скины ушли в сделку — инвентарь с ними из кэша больше не показываем
+    await SteamService.invalidate_inventory(deal_create.quote_request.steam_id)
     
-    db.refresh(deal)
     return deal
 
 @app.get("/api/deals", response_model=List[schemas.DealResponse])
 async def get_user_deals(
     steam_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Получить все сделки пользователя"""
     
-    user = db.query(models.User).filter(models.User.steam_id == steam_id).first()
-    if not user:
+    user_id = await db.scalar(select(models.User.id).where(models.User.steam_id == steam_id))
+    if not user_id:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
-    deals = db.query(models.Deal).filter(models.Deal.user_id == user.id).all()
+    # Скины всех сделок — одним запросом к deal_items
+    deals = (await db.scalars(DealRepository.by_user(user_id))).all()
     
     return deals
 
 @app.get("/api/deals/{deal_id}", response_model=schemas.DealDetail)
 async def get_deal(
     deal_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Получить детали сделки"""
+    """Получить детали сделки (ETag — по отметкам изменений сделки, пользователя и задач)"""
     
-    deal = db.query(models.Deal).filter(models.Deal.id == deal_id).first()
+    # Пользователь (JOIN), скины и фоновые задачи — сразу, ленивая загрузка в async недоступна
+    deal = await db.scalar(DealRepository.by_id(deal_id, user=True, items=True, jobs=True))
     if not deal:
         raise HTTPException(status_code=404, detail="Сделка не найдена")
     
-    # Получаем пользователя
-    user = db.query(models.User).filter(models.User.id == deal.user_id).first()
+    user = deal.user
     
     # Вычисляемые поля
     now = datetime.utcnow()
@@ -805,22 +847,25 @@ async def get_deal(
     
     deal_dict = {
         **deal.__dict__,
+        "items_snapshot": deal.items_snapshot,  # Свойство — в __dict__ его нет
         "user": user,
         "is_expired": is_expired,
         "can_buyback": can_buyback,
-        "days_left": days_left
+        "days_left": days_left,
+        "jobs": deal.jobs
     }
     
+    set_cache_version(request, DealRepository.loaded_detail_version(deal, now))
     return deal_dict
 
 @app.post("/api/deals/{deal_id}/accept")
 async def accept_deal_trade(
     deal_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Подтвердить получение трейда и выплатить деньги"""
     
-    deal = db.query(models.Deal).filter(models.Deal.id == deal_id).first()
+    deal = await db.get(models.Deal, deal_id)
     if not deal:
         raise HTTPException(status_code=404, detail="Сделка не найдена")
     
@@ -830,8 +875,8 @@ async def accept_deal_trade(
     # Проверить статус трейда через Steam Bot API
     if deal.initial_trade_id:
         try:
-            bot_response = await httpx.AsyncClient().get(
-                f"http://localhost:3001/api/trade/status/{deal.initial_trade_id}"
+            bot_response = await http_clients.get("steam_bot").get(
+                f"{settings.steam_bot_url}/api/trade/status/{deal.initial_trade_id}"
             )
             if bot_response.status_code == 200:
                 trade_data = bot_response.json()
@@ -840,78 +885,54 @@ async def accept_deal_trade(
         except Exception as e:
             print(f"[API] Ошибка проверки трейда: {e}")
     
-    # Обновить статус
+    # Обновить статус; выплата и уведомление — в outbox той же транзакцией
     deal.deal_status = models.DealStatus.ACTIVE
-    
-    # Получить телефон из kyc_snapshot или user
-    phone = None
-    if deal.kyc_snapshot and isinstance(deal.kyc_snapshot, dict):
-        phone = deal.kyc_snapshot.get("phone")
-    if not phone:
-        phone = user.phone
-    
-    # Инициировать выплату через ЮKassa/СБП
-    if phone:
-        payout_id = await PaymentService.create_payout(
-            phone=phone,
-            amount=deal.loan_amount,
-            description=f"Выплата по сделке #{deal.id}",
-            deal_id=deal.id
-        )
-        
-        if payout_id:
-            deal.payout_transaction_id = payout_id
-            print(f"[DEAL] Выплата инициирована: {payout_id} на {phone}")
-    else:
-        print(f"[DEAL] Внимание: телефон не указан, выплата не инициирована")
-    
-    db.commit()
-    
-    # Логирование
-    audit_log = models.AuditLog(
-        user_id=user.id,
-        action="deal_activated",
+    payout_job = await db.run_sync(DealPipeline.enqueue_activation_jobs, deal)
+    
+    # Логирование (после commit активации)
+    audit_sink.record_on_commit(
+        db.sync_session,
+        "deal_activated",
+        user_id=deal.user_id,
+        deal_id=deal.id,
         details={
             "deal_id": deal.id,
-            "payout_id": payout_id,
             "amount": deal.loan_amount
         }
     )
-    db.add(audit_log)
-    db.commit()
-    
-    # TG уведомление
-    try:
-        await telegram_service.notify_trade_accepted(deal.id, deal.loan_amount)
-    except Exception as e:
-        print(f"[API] TG error: {e}")
-    
-    return {
+    # Ответ собирается до commit: после него сделку и задачу пришлось бы перечитывать
+    await db.flush()
+    result = {
         "success": True,
-        "message": "Сделка активирована, деньги отправлены",
+        "message": "Сделка активирована, выплата поставлена в очередь",
         "deal_status": deal.deal_status,
-        "payout_id": payout_id
+        "payout_id": deal.payout_transaction_id,
+        "payout_job_id": payout_job.id
     }
+    option_expiry = deal.option_expiry
+    await db.commit()
+    job_runner.wake()
+    deal_scheduler.schedule(deal_id, option_expiry)
+    
+    return result
 
 @app.post("/api/deals/{deal_id}/buyback/init")
 async def init_buyback(
     deal_id: int,
     return_url: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Инициировать выкуп - создать платеж"""
     
-    deal = db.query(models.Deal).filter(models.Deal.id == deal_id).first()
+    deal = await db.get(models.Deal, deal_id)
     if not deal:
         raise HTTPException(status_code=404, detail="Сделка не найдена")
     
     if deal.deal_status != models.DealStatus.ACTIVE:
         raise HTTPException(status_code=400, detail="Сделка не активна")
     
-    now = datetime.utcnow()
-    if now > deal.option_expiry:
-        deal.deal_status = models.DealStatus.DEFAULT
-        db.commit()
+    # Перевод в дефолт делает планировщик сроков
+    if datetime.utcnow() > deal.option_expiry:
         raise HTTPException(status_code=400, detail="Срок опциона истек")
     
     # Создать платеж
@@ -936,11 +957,11 @@ async def init_buyback(
 async def complete_buyback(
     deal_id: int,
     payment_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Завершить выкуп после оплаты"""
     
-    deal = db.query(models.Deal).filter(models.Deal.id == deal_id).first()
+    deal = await db.get(models.Deal, deal_id)
     if not deal:
         raise HTTPException(status_code=404, detail="Сделка не найдена")
     
@@ -952,54 +973,22 @@ async def complete_buyback(
     if payment_status != "succeeded":
         raise HTTPException(status_code=400, detail="Оплата не подтверждена")
     
-    # Обновить сделку
+    # Обновить сделку; обратный трейд — в outbox той же транзакцией
     now = datetime.utcnow()
     deal.deal_status = models.DealStatus.BUYBACK
     deal.buyback_at = now
     deal.buyback_payment_id = payment_id
-    db.commit()
-    
-    # Создать обратный трейд через Steam Bot
-    user = deal.user
-    try:
-        bot_response = await httpx.AsyncClient().post(
-            "http://localhost:3001/api/trade/reverse",
-            json={
-                "deal_id": deal.id,
-                "partner_steam_id": user.steam_id,
-                "items": deal.items_snapshot
-            },
-            timeout=30.0
-        )
-        
-        if bot_response.status_code == 200:
-            trade_data = bot_response.json()
-            deal.buyback_trade_id = trade_data.get("trade_offer_id")
-            
-            # Создать запись трейда
-            trade = models.SteamTrade(
-                deal_id=deal.id,
-                trade_offer_id=trade_data["trade_offer_id"],
-                trade_offer_url=trade_data["trade_url"],
-                is_incoming=False,
-                status=models.TradeStatus.SENT,
-                items_json=deal.items_snapshot
-            )
-            db.add(trade)
-            db.commit()
-            
-            return {
-                "success": True,
-                "message": "Выкуп оформлен, трейд отправлен",
-                "trade_url": trade_data["trade_url"]
-            }
-    except Exception as e:
-        print(f"[API] Ошибка создания обратного трейда: {e}")
+    trade_job = await db.run_sync(DealPipeline.enqueue_buyback_jobs, deal)
+    await db.flush()
+    trade_job_id = trade_job.id
+    await db.commit()
+    job_runner.wake()
     
     return {
         "success": True,
-        "message": "Выкуп оформлен, трейд будет отправлен вручную",
-        "trade_url": None
+        "message": "Выкуп оформлен, трейд будет отправлен",
+        "trade_url": None,
+        "trade_job_id": trade_job_id
     }
 
 # ============= ADMIN ENDPOINTS =============
@@ -1015,10 +1004,9 @@ async def mark_deal_default(
     if not deal:
         raise HTTPException(status_code=404, detail="Сделка не найдена")
     
-    now = datetime.utcnow()
-    if now > deal.option_expiry and deal.deal_status == models.DealStatus.ACTIVE:
-        deal.deal_status = models.DealStatus.DEFAULT
+    if DealLifecycle.expire_deals(db, [deal.id]):
         db.commit()
+        job_runner.wake()
         
         return {"success": True, "message": "Сделка переведена в дефолт"}
     
@@ -1037,18 +1025,15 @@ async def verify_trade(
     """
     # Ищем сделку в статусе PENDING
     # В реальности нужно проверять предметы в трейде
-    pending_deals = db.query(models.Deal).filter(
-        models.Deal.deal_status == models.DealStatus.PENDING
-    ).all()
+    pending = db.execute(DealRepository.first_pending()).first()
     
-    if pending_deals:
+    if pending:
         # Для MVP принимаем любой трейд если есть ожидающие сделки
         # В проде нужно сверять предметы
-        deal = pending_deals[0]
         return {
             "valid": True,
-            "deal_id": deal.id,
-            "expected_items": len(deal.items_snapshot)
+            "deal_id": pending.id,
+            "expected_items": pending.items_count
         }
     
     return {"valid": False, "reason": "Нет ожидающих сделок"}
@@ -1058,7 +1043,7 @@ async def trade_status_webhook(
     trade_offer_id: str,
     status: str = Body(...),
     deal_id: int = Body(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Webhook от Steam бота при изменении статуса трейда.
@@ -1072,15 +1057,11 @@ async def trade_status_webhook(
     # Найти сделку
     deal = None
     if deal_id:
-        deal = db.query(models.Deal).filter(models.Deal.id == deal_id).first()
+        deal = await db.get(models.Deal, deal_id)
     
     if not deal:
         # Попробовать найти по trade_id
-        trade = db.query(models.SteamTrade).filter(
-            models.SteamTrade.trade_offer_id == trade_offer_id
-        ).first()
-        if trade:
-            deal = db.query(models.Deal).filter(models.Deal.id == trade.deal_id).first()
+        deal = await db.scalar(DealRepository.by_trade_offer(trade_offer_id))
     
     if not deal:
         print(f"[WEBHOOK] Сделка не найдена для трейда #{trade_offer_id}")
@@ -1090,81 +1071,60 @@ async def trade_status_webhook(
         print(f"[WEBHOOK] Сделка #{deal.id} уже обработана (статус: {deal.deal_status})")
         return {"success": True, "message": "Сделка уже обработана"}
     
-    # Активировать сделку
+    # Активировать сделку; выплата — в outbox той же транзакцией
     deal.deal_status = models.DealStatus.ACTIVE
     deal.initial_trade_id = trade_offer_id
-    
-    # Получить телефон для выплаты
-    phone = None
-    if deal.kyc_snapshot and isinstance(deal.kyc_snapshot, dict):
-        phone = deal.kyc_snapshot.get("phone")
-    if not phone and deal.user:
-        phone = deal.user.phone
-    
-    # Выплатить деньги
-    payout_id = None
-    if phone:
-        payout_id = await PaymentService.create_payout(
-            phone=phone,
-            amount=deal.loan_amount,
-            description=f"Выплата по сделке #{deal.id}",
-            deal_id=deal.id
-        )
-        if payout_id:
-            deal.payout_transaction_id = payout_id
-            print(f"[WEBHOOK] ✅ Выплата {deal.loan_amount}₽ инициирована: {payout_id}")
-    else:
-        print(f"[WEBHOOK] ⚠️ Телефон не указан, выплата не инициирована")
-    
-    db.commit()
-    
-    print(f"[WEBHOOK] ✅ Сделка #{deal.id} активирована автоматически!")
-    
-    return {
+    payout_job = await db.run_sync(DealPipeline.enqueue_activation_jobs, deal)
+    await db.flush()
+    result = {
         "success": True,
-        "message": "Сделка активирована, деньги отправлены",
+        "message": "Сделка активирована, выплата поставлена в очередь",
         "deal_id": deal.id,
-        "payout_id": payout_id
+        "payout_id": deal.payout_transaction_id,
+        "payout_job_id": payout_job.id
     }
+    option_expiry = deal.option_expiry
+    await db.commit()
+    job_runner.wake()
+    deal_scheduler.schedule(result["deal_id"], option_expiry)
+    
+    print(f"[WEBHOOK] ✅ Сделка #{result['deal_id']} активирована автоматически!")
+    
+    return result
 
 # ============= HEALTH CHECK =============
 
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
-    """Расширенная проверка здоровья сервиса"""
-    health_status = {
-        "status": "ok",
-        "timestamp": datetime.utcnow().isoformat(),
-        "checks": {}
-    }
+async def health_check():
+    """
+    Расширенная проверка здоровья сервиса
     
-    # Проверка БД
+    Зависимости проверяются в фоне (services/health.py); здесь — последний
+    снимок, без запросов к БД и внешним API.
+    """
+    return health_monitor.report()
+
+
+@app.get("/health/latency")
+async def health_latency():
+    """Гистограммы задержек фоновых проверок по зависимостям"""
+    return {"buckets_seconds": LATENCY_BUCKETS, "probes": health_monitor.latency()}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Метрики процесса в формате Prometheus (см. metrics.py)
+
+    Глубина очереди фоновых задач — запрос к БД в отдельном потоке; если БД
+    недоступна, остальные метрики отдаются без неё.
+    """
+    extra = []
     try:
-        from sqlalchemy import text
-        db.execute(text("SELECT 1"))
-        health_status["checks"]["database"] = "ok"
+        extra.append(metrics.job_queue_family(await asyncio.to_thread(job_runner.queue_depth)))
     except Exception as e:
-        health_status["checks"]["database"] = f"error: {str(e)}"
-        health_status["status"] = "degraded"
-    
-    # Проверка Steam API
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get("https://api.steampowered.com/ISteamWebAPIUtil/GetServerInfo/v1/")
-            health_status["checks"]["steam_api"] = "ok" if response.status_code == 200 else "error"
-    except Exception:
-        health_status["checks"]["steam_api"] = "error"
-        health_status["status"] = "degraded"
-    
-    # Проверка market.csgo API
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get("https://market.csgo.com/api/v2/prices/RUB.json")
-            health_status["checks"]["market_csgo"] = "ok" if response.status_code == 200 else "error"
-    except Exception:
-        health_status["checks"]["market_csgo"] = "error"
-    
-    return health_status
+        print(f"[METRICS] Очередь задач: {e}")
+    return Response(metrics.registry.render(extra), media_type=metrics.CONTENT_TYPE)
 
 
 @app.get("/health/simple")
@@ -1180,109 +1140,78 @@ if __name__ == "__main__":
 # ============= STATISTICS ENDPOINTS =============
 
 @app.get("/api/stats/public")
-async def get_public_stats(db: Session = Depends(get_db)):
-    """Получить публичную статистику сервиса"""
-    
-    total_deals = db.query(models.Deal).count()
-    active_deals = db.query(models.Deal).filter(
-        models.Deal.deal_status == models.DealStatus.ACTIVE
-    ).count()
-    
-    total_volume = db.query(func.sum(models.Deal.loan_amount)).scalar() or 0
+async def get_public_stats(db: AsyncSession = Depends(get_async_read_db)):
+    """Получить публичную статистику сервиса (материализованная строка deal_stats)"""
     
-    avg_deal_amount = db.query(func.avg(models.Deal.loan_amount)).scalar() or 0
+    stats = await db.get(models.DealStats, GLOBAL_STATS_ID)
     
-    buyback_count = db.query(models.Deal).filter(
-        models.Deal.deal_status == models.DealStatus.BUYBACK
-    ).count()
-    
-    buyback_rate = (buyback_count / total_deals * 100) if total_deals > 0 else 0
-    
-    return {
-        "total_deals": total_deals,
-        "active_deals": active_deals,
-        "total_volume": round(total_volume, 2),
-        "avg_deal_amount": round(avg_deal_amount, 2),
-        "buyback_rate": round(buyback_rate, 2)
-    }
+    return StatsService.public_view(stats)
 
 @app.get("/api/stats/user/{steam_id}")
 async def get_user_stats(
     steam_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Получить статистику пользователя"""
     
-    user = db.query(models.User).filter(models.User.steam_id == steam_id).first()
+    user = await db.scalar(select(models.User).where(models.User.steam_id == steam_id))
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
-    total_deals = db.query(models.Deal).filter(models.Deal.user_id == user.id).count()
-    
-    active_deals = db.query(models.Deal).filter(
-        models.Deal.user_id == user.id,
-        models.Deal.deal_status == models.DealStatus.ACTIVE
-    ).count()
-    
-    total_received = db.query(func.sum(models.Deal.loan_amount)).filter(
-        models.Deal.user_id == user.id
-    ).scalar() or 0
-    
-    total_paid_back = db.query(func.sum(models.Deal.buyback_price)).filter(
-        models.Deal.user_id == user.id,
-        models.Deal.deal_status == models.DealStatus.BUYBACK
-    ).scalar() or 0
-    
-    buyback_count = db.query(models.Deal).filter(
-        models.Deal.user_id == user.id,
-        models.Deal.deal_status == models.DealStatus.BUYBACK
-    ).count()
-    
-    default_count = db.query(models.Deal).filter(
-        models.Deal.user_id == user.id,
-        models.Deal.deal_status == models.DealStatus.DEFAULT
-    ).count()
+    stats = await db.get(models.DealStats, user.id)
     
     return {
-        "total_deals": total_deals,
-        "active_deals": active_deals,
-        "buyback_count": buyback_count,
-        "default_count": default_count,
-        "total_received": round(total_received, 2),
-        "total_paid_back": round(total_paid_back, 2),
+        **StatsService.user_view(stats),
         "member_since": user.created_at.isoformat()
     }
 
 # ============= MARKET PRICES ENDPOINTS =============
 
 @app.get("/api/prices/item/{market_hash_name}")
-async def get_item_price(market_hash_name: str):
-    """Получить цену конкретного предмета"""
+async def get_item_price(market_hash_name: str, request: Request):
+    """Получить цену конкретного предмета (ETag — по версии прайс-листа)"""
     
-    prices = await SteamService.get_market_prices([{"market_hash_name": market_hash_name}])
+    prices, version = await MarketCSGOService.lookup_prices([market_hash_name])
+    set_cache_version(request, version)
     
-    if market_hash_name not in prices:
+    if prices[market_hash_name] <= 0:
         raise HTTPException(status_code=404, detail="Цена не найдена")
     
     return {
         "market_hash_name": market_hash_name,
-        "price": prices[market_hash_name],
+        "price": BulkPriceService.price_row(prices[market_hash_name]),
         "currency": "RUB",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": version
     }
 
 @app.post("/api/prices/bulk")
-async def get_bulk_prices(items: List[str]):
-    """Получить цены для списка предметов"""
-    
-    items_list = [{"market_hash_name": name} for name in items]
-    prices = await SteamService.get_market_prices(items_list)
+async def get_bulk_prices(
+    request: Request,
+    items: List[str] = Body(...),
+    format: str = Query(FORMAT_ROWS, pattern=f"^({'|'.join(FORMATS)})$")
+):
+    """
+    Получить цены для списка предметов
     
-    return {
-        "prices": prices,
-        "currency": "RUB",
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    format=columnar — массивы вместо словаря на предмет (для больших списков).
+    ETag зависит от версии прайс-листа: с If-None-Match — 304, пока он не обновился.
+    """
+    try:
+        result = await BulkPriceService.lookup(
+            items,
+            fmt=format,
+            if_none_match=request.headers.get("if-none-match"),
+            accept_encoding=request.headers.get("accept-encoding", "")
+        )
+    except TooManyNames as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    return Response(
+        content=result.body,
+        status_code=result.status_code,
+        headers=result.headers,
+        media_type="application/json" if result.status_code == 200 else None
+    )
 
 # ============= CALCULATOR ENDPOINT =============
 
@@ -1313,65 +1242,89 @@ async def calculate_deal_terms(
 
 @app.post("/api/notifications/expiring-deals")
 async def notify_expiring_deals(db: Session = Depends(get_db)):
-    """Уведомить о истекающих сделках (cron job)"""
-    
-    # Сделки истекающие в течение 24 часов
-    tomorrow = datetime.utcnow() + timedelta(days=1)
-    
-    expiring_deals = db.query(models.Deal).filter(
-        models.Deal.deal_status == models.DealStatus.ACTIVE,
-        models.Deal.option_expiry <= tomorrow,
-        models.Deal.option_expiry > datetime.utcnow()
-    ).all()
-    
-    notifications_sent = 0
+    """
+    Уведомить о истекающих сделках вручную
     
-    for deal in expiring_deals:
-        # TODO: Отправить email/SMS/Telegram уведомление
-        print(f"[NOTIFICATION] Deal #{deal.id} expires soon")
-        notifications_sent += 1
+    Обычно это делает планировщик сроков; повторно уведомление не уходит.
+    """
+    warned = DealLifecycle.send_expiry_warnings(db)
+    db.commit()
+    job_runner.wake()
     
     return {
         "success": True,
-        "notifications_sent": notifications_sent
+        "notifications_sent": len(warned)
     }
 
 # ============= ADMIN ENDPOINTS =============
 
 @app.get("/api/admin/deals")
-async def get_all_deals_admin(db: Session = Depends(get_db)):
-    """Получить все сделки для админ-панели"""
+async def get_all_deals_admin(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    deal_status: Optional[models.DealStatus] = Query(None, alias="status"),
+    user_id: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Страница сделок для админ-панели (keyset-пагинация)
+    
+    Фильтры: status, user_id, created_from/created_to, min_amount/max_amount (сумма выдачи).
+    Следующая страница — тот же запрос с cursor=next_cursor.
+    Полные скины и KYC сделки — /api/admin/deals/{deal_id}/details.
+    """
+    try:
+        stmt = AdminDealsService.page_query(
+            limit=limit,
+            cursor=cursor,
+            status=deal_status,
+            user_id=user_id,
+            created_from=created_from,
+            created_to=created_to,
+            min_amount=min_amount,
+            max_amount=max_amount
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    deals = db.query(models.Deal).order_by(models.Deal.created_at.desc()).all()
-    users = db.query(models.User).all()
+    deals, next_cursor = AdminDealsService.build_page((await db.execute(stmt)).all(), limit)
+    
+    users = []
+    if deals:
+        users = AdminDealsService.user_entries(
+            (await db.execute(AdminDealsService.users_query(d["user_id"] for d in deals))).all()
+        )
+    
+    stats = await db.get(models.DealStats, GLOBAL_STATS_ID)
+    
+    return {
+        "deals": deals,
+        "users": users,
+        "next_cursor": next_cursor,
+        "status_counts": {
+            status_value.value: getattr(stats, column, 0) or 0
+            for status_value, column in STATUS_COLUMNS.items()
+        }
+    }
+
+@app.get("/api/admin/deals/{deal_id}/details")
+async def get_deal_details_admin(deal_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    """Скины и KYC-снимок сделки (подгружаются при раскрытии строки)"""
+    
+    row = (await db.execute(AdminDealsService.details_query(deal_id))).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Сделка не найдена")
+    
+    items = (await db.scalars(AdminDealsService.items_query(deal_id))).all()
     
     return {
-        "deals": [
-            {
-                "id": d.id,
-                "user_id": d.user_id,
-                "market_total": d.market_total,
-                "loan_amount": d.loan_amount,
-                "buyback_price": d.buyback_price,
-                "created_at": d.created_at.isoformat(),
-                "option_expiry": d.option_expiry.isoformat(),
-                "deal_status": d.deal_status.value if hasattr(d.deal_status, 'value') else str(d.deal_status),
-                "items_snapshot": d.items_snapshot,
-                "kyc_snapshot": d.kyc_snapshot,
-                "payout_transaction_id": d.payout_transaction_id,
-                "initial_trade_id": d.initial_trade_id
-            }
-            for d in deals
-        ],
-        "users": [
-            {
-                "id": u.id,
-                "steam_id": u.steam_id,
-                "steam_username": u.steam_username,
-                "phone": u.phone
-            }
-            for u in users
-        ]
+        "id": row.id,
+        "items_snapshot": [item.to_snapshot() for item in items],
+        "kyc_snapshot": row.kyc_snapshot
     }
 
 @app.post("/api/admin/deals/{deal_id}/cancel")
@@ -1394,54 +1347,61 @@ async def cancel_deal_admin(
     return {"success": True, "message": "Сделка отменена"}
 
 @app.get("/api/admin/deals/pending")
-async def get_pending_deals(db: Session = Depends(get_db)):
+async def get_pending_deals(db: Session = Depends(get_read_db)):
     """Получить сделки ожидающие обработки (admin)"""
     
-    pending_deals = db.query(models.Deal).filter(
-        models.Deal.deal_status == models.DealStatus.PENDING
-    ).all()
-    
-    return pending_deals
+    return db.scalars(DealRepository.pending()).all()
 
 @app.post("/api/admin/deals/check-expired")
-async def check_expired_deals(db: Session = Depends(get_db)):
-    """Проверить и перевести просроченные сделки в дефолт (cron job)"""
+async def check_expired_deals():
+    """
+    Перевести просроченные сделки в дефолт вручную
     
+    Обычно это делает планировщик сроков; bulk UPDATE ... RETURNING пачками
+    (commit на пачку) в отдельном потоке, без загрузки сделок.
+    """
     now = datetime.utcnow()
-    
-    expired_deals = db.query(models.Deal).filter(
-        models.Deal.deal_status == models.DealStatus.ACTIVE,
-        models.Deal.option_expiry < now
-    ).all()
-    
-    defaulted_count = 0
-    
-    for deal in expired_deals:
-        deal.deal_status = models.DealStatus.DEFAULT
-        defaulted_count += 1
-        
-        # Логирование
-        audit_log = models.AuditLog(
-            user_id=deal.user_id,
-            action="deal_defaulted",
-            details={
-                "deal_id": deal.id,
-                "reason": "option_expired",
-                "expired_at": deal.option_expiry.isoformat()
-            }
-        )
-        db.add(audit_log)
-    
-    db.commit()
+    expired = await asyncio.to_thread(DealLifecycle.expire_all, SessionLocal, now)
     
     return {
         "success": True,
-        "defaulted_count": defaulted_count,
+        "defaulted_count": len(expired),
         "timestamp": now.isoformat()
     }
 
+@app.get("/api/admin/db/pools")
+async def get_db_pools():
+    """
+    Пулы соединений (admin): занятость и ожидание свободного соединения
+    
+    write/read — sync-пулы, write_async/read_async — пулы AsyncSession.
+    Рост wait_max_ms и timeouts — пул мал для нагрузки или соединения держат слишком долго.
+    """
+    return {"pools": pool_stats()}
+
+@app.get("/api/admin/http/clients")
+async def get_http_clients():
+    """
+    HTTP-клиенты внешних систем (admin): переиспользование соединений
+
+    reuse_ratio — доля запросов без нового TCP/TLS-соединения. Низкое
+    значение при постоянной нагрузке — соединения закрываются раньше
+    следующего запроса (keep-alive) или пул мал.
+    """
+    return {"clients": http_clients.stats()}
+
+@app.post("/api/admin/cache/invalidate")
+async def invalidate_cache(pattern: str = Query(..., min_length=1)):
+    """
+    Сбросить кэш по шаблону во всех воркерах (admin)
+    
+    Шаблон — glob как в Redis: "inventory:*", "price:market_csgo:*".
+    """
+    removed = await cache.invalidate(pattern)
+    return {"success": True, "removed": removed, "cache": cache.info()}
+
 @app.get("/api/admin/users/kyc-pending")
-async def get_kyc_pending_users(db: Session = Depends(get_db)):
+async def get_kyc_pending_users(db: Session = Depends(get_read_db)):
     """Получить пользователей с неподтвержденным KYC (admin)"""
     
     users = db.query(models.User).filter(
@@ -1465,15 +1425,15 @@ async def verify_user_kyc(
     
     user.passport_verified = approved
     
-    audit_log = models.AuditLog(
+    audit_sink.record_on_commit(
+        db,
+        "kyc_verification",
         user_id=user_id,
-        action="kyc_verification",
         details={
             "approved": approved,
             "verified_at": datetime.utcnow().isoformat()
         }
     )
-    db.add(audit_log)
     
     db.commit()
     
@@ -0,0 +1,347 @@
+"""
+Метрики процесса в текстовом формате Prometheus (GET /metrics)
+
+Свои счётчики и гистограммы (без prometheus_client):
+  - задержка эндпоинтов — MetricsMiddleware, метка route — шаблон пути;
+  - задержка операций сервисов — декоратор @timed("steam.get_inventory");
+  - попадания в кэши цен и инвентаря — cache_lookup("inventory", hits, misses),
+    доля попаданий считается в запросе к Prometheus;
+  - задержка ответов внешних систем — services/http_clients.py.
+
+Остальное собирается при запросе /metrics из уже существующей статистики:
+ожидание соединений пулов БД, TieredCache, кэш ответов (coalesced —
+запросы, дождавшиеся чужого вычисления), фоновые проверки /health,
+очереди задач и аудита.
+
+Метрики — на процесс: при нескольких воркерах uvicorn Prometheus опрашивает
+каждый (или суммирует по instance).
+"""
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+PREFIX = "cyberlombard_"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (суффикс имени, метки, значение)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class MetricFamily:
+    """Метрика с сэмплами для вывода; коллекторы возвращают их списком"""
+
+    def __init__(self, name: str, kind: str, help: str, samples: Optional[List[Sample]] = None):
+        self.name = PREFIX + name
+        self.kind = kind
+        self.help = help
+        self.samples: List[Sample] = samples or []
+
+    def add(self, value: float, suffix: str = "", **labels):
+        self.samples.append((suffix, labels, value))
+        return self
+
+    def add_histogram(self, buckets: Sequence[float], counts: Sequence[int], total: float, **labels):
+        """Гистограмма из счётчиков по корзинам (не накопленных; последний — +Inf)"""
+        cumulative = 0
+        for bound, count in zip([*map(_format_value, buckets), "+Inf"], counts):
+            cumulative += count
+            self.samples.append(("_bucket", {**labels, "le": bound}, cumulative))
+        self.samples.append(("_sum", labels, total))
+        self.samples.append(("_count", labels, cumulative))
+        return self
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples:
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Счётчик с метками"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(f"{self.name}_total", "counter", self.help)
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                family.add(value, **dict(zip(self.labelnames, key)))
+        return family
+
+
+class Histogram:
+    """Гистограмма с метками: счётчики по корзинам, сумма"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}  # метки -> [счётчики корзин, сумма]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        bucket = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return sum(series[0]) if series else 0
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, "histogram", self.help)
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                family.add_histogram(self.buckets, counts, total, **dict(zip(self.labelnames, key)))
+        return family
+
+
+class MetricsRegistry:
+    """Метрики процесса и коллекторы готовой статистики"""
+
+    def __init__(self):
+        self.metrics: List = []
+        self.collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DURATION_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func: Callable[[], Iterable[MetricFamily]]):
+        self.collectors.append(func)
+        return func
+
+    def render(self, extra: Iterable[MetricFamily] = ()) -> str:
+        families = [metric.collect() for metric in self.metrics]
+        for collect in self.collectors:
+            try:
+                families.extend(collect())
+            except Exception as e:  # Сломанный коллектор не должен ронять /metrics
+                print(f"[METRICS] Коллектор {collect.__name__}: {e}")
+        families.extend(extra)
+        return "\n".join(family.render() for family in families if family.samples) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route", "status")
+)
+operation_duration = registry.histogram(
+    "operation_duration_seconds", "Время операций сервисов (@timed)", ("operation",)
+)
+operation_errors = registry.counter(
+    "operation_errors", "Операции сервисов, завершившиеся исключением", ("operation", "error")
+)
+upstream_duration = registry.histogram(
+    "upstream_request_duration_seconds", "Время до заголовков ответа внешней системы", ("upstream", "status")
+)
+cache_requests = registry.counter(
+    "cache_requests", "Обращения к кэшам цен и инвентаря", ("cache", "result")
+)
+rate_limit_requests = registry.counter(
+    "rate_limit_requests", "Проверки лимита: local (аванс воркера), redis, fallback (без Redis), rejected",
+    ("route", "bucket", "result")
+)
+
+
+def timed(operation: str):
+    """Декоратор: время вызова в operation_duration_seconds, исключения — в operation_errors_total"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    operation_errors.inc(operation=operation, error=type(e).__name__)
+                    raise
+                finally:
+                    operation_duration.observe(time.perf_counter() - started, operation=operation)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                operation_errors.inc(operation=operation, error=type(e).__name__)
+                raise
+            finally:
+                operation_duration.observe(time.perf_counter() - started, operation=operation)
+        return wrapper
+    return decorator
+
+
+def cache_lookup(cache: str, hits: int = 0, misses: int = 0):
+    """Учесть попадания и промахи кэша (по предметам или по обращениям)"""
+    if hits:
+        cache_requests.inc(hits, cache=cache, result="hit")
+    if misses:
+        cache_requests.inc(misses, cache=cache, result="miss")
+
+
+class MetricsMiddleware:
+    """ASGI middleware: время запроса по методу, шаблону пути и статусу"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"], route=route_label(scope), status=status["code"]
+            )
+
+
+def route_label(scope) -> str:
+    """Шаблон пути вместо самого пути: число меток не растёт с числом сделок"""
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "unmatched")
+    return scope.get("cached_route", "unmatched")  # Ответ из ResponseCache — до маршрутизации
+
+
+# ---------- Готовая статистика подсистем ----------
+# Импорт при сборе: сервисы сами импортируют metrics ради @timed
+
+@registry.collector
+def collect_db_pools() -> List[MetricFamily]:
+    from database import POOL_WAIT_BUCKETS, pool_metrics
+
+    wait = MetricFamily("db_pool_wait_seconds", "histogram", "Ожидание свободного соединения пула БД")
+    timeouts = MetricFamily("db_pool_timeouts_total", "counter", "Таймауты ожидания соединения пула БД")
+    checked_out = MetricFamily("db_pool_checked_out", "gauge", "Выданные соединения пула БД")
+    for name, metrics in pool_metrics.items():
+        with metrics._lock:
+            counts, total, timed_out = list(metrics.wait_buckets), metrics.wait_seconds_total, metrics.timeouts
+        wait.add_histogram(POOL_WAIT_BUCKETS, counts, total, pool=name)
+        timeouts.add(timed_out, pool=name)
+        if metrics.pool is not None:
+            checked_out.add(metrics.pool.checkedout(), pool=name)
+    return [wait, timeouts, checked_out]
+
+
+@registry.collector
+def collect_caches() -> List[MetricFamily]:
+    from cache import cache
+    from response_cache import response_cache
+
+    tiered = MetricFamily("tiered_cache_requests_total", "counter", "Обращения к TieredCache по уровню ответа")
+    for result in ("l1_hits", "l2_hits", "misses", "redis_errors"):
+        tiered.add(cache.stats[result], result=result)
+    l1_items = MetricFamily("tiered_cache_l1_items", "gauge", "Ключей в L1 процесса").add(len(cache.l1))
+
+    responses = MetricFamily("response_cache_requests_total", "counter", "Кэш ответов: hits, misses, 304, coalesced")
+    for result, value in response_cache.stats.items():
+        responses.add(value, result=result)
+    return [tiered, l1_items, responses]
+
+
+@registry.collector
+def collect_http_clients() -> List[MetricFamily]:
+    from services.http_clients import http_clients
+
+    requests = MetricFamily("upstream_requests_total", "counter", "Запросы к внешним системам")
+    connections = MetricFamily("upstream_connections_total", "counter", "Новые TCP-соединения к внешним системам")
+    for name, metrics in http_clients.metrics.items():
+        requests.add(metrics.requests, upstream=name)
+        connections.add(metrics.connections, upstream=name)
+    return [requests, connections]
+
+
+@registry.collector
+def collect_health_probes() -> List[MetricFamily]:
+    from services.health import LATENCY_BUCKETS, OK, health_monitor
+
+    latency = MetricFamily("health_probe_duration_seconds", "histogram", "Время фоновых проверок зависимостей")
+    up = MetricFamily("health_probe_up", "gauge", "Последняя проверка зависимости успешна")
+    for name, state in health_monitor.states.items():
+        with state._lock:
+            counts, total, status = list(state.buckets), state.latency_seconds_total, state.status
+        latency.add_histogram(LATENCY_BUCKETS, counts, total, probe=name)
+        up.add(1 if status == OK else 0, probe=name)
+    return [latency, up]
+
+
+@registry.collector
+def collect_background_queues() -> List[MetricFamily]:
+    from services.audit_log import audit_sink
+    from services.job_queue import job_runner
+
+    in_flight = MetricFamily("jobs_in_flight", "gauge", "Фоновые задачи, выполняемые процессом")
+    for target, count in job_runner.in_flight_by_target().items():
+        in_flight.add(count, target=target)
+    audit = MetricFamily("audit_pending_events", "gauge", "События аудита, ещё не записанные в БД")
+    audit.add(audit_sink.pending())
+    return [in_flight, audit]
+
+
+def job_queue_family(depth: Dict[str, int]) -> MetricFamily:
+    """Глубина очереди background_jobs (считается запросом к БД в /metrics)"""
+    family = MetricFamily("jobs_queued", "gauge", "Фоновые задачи в очереди по статусу")
+    for status, count in depth.items():
+        family.add(count, status=status)
+    return family
@@ -0,0 +1,39 @@
+"""
+Схема БД — только через Alembic (приложение при импорте таблицы не создаёт)
+
+Запуск перед стартом API и воркера:
+cd backend
+python migrate.py
+
+  - пустая БД: таблицы создаются по моделям и помечаются последней ревизией
+    (alembic stamp head) — начальная миграция рассчитана на уже созданную схему;
+  - существующая БД: alembic upgrade head.
+"""
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+import models
+from database import engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+def migrate():
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "alembic"))
+
+    tables = inspect(engine).get_table_names()
+    if not tables:
+        print("[MIGRATE] Пустая БД: создаём схему по моделям и помечаем head")
+        models.Base.metadata.create_all(bind=engine)
+        command.stamp(config, "head")
+    else:
+        print("[MIGRATE] alembic upgrade head")
+        command.upgrade(config, "head")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey, JSON, Boolean, Text
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Enum, ForeignKey, JSON, Boolean, Text, Index
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.sql import func, text
 from database import Base
 import enum
+import money
+from services.pricing_service import PricingService
 
 class DealStatus(str, enum.Enum):
     PENDING = "PENDING"  # Ожидает трейда
@@ -18,6 +20,12 @@ class TradeStatus(str, enum.Enum):
     DECLINED = "DECLINED"
     CANCELLED = "CANCELLED"
 
+class JobStatus(str, enum.Enum):
+    PENDING = "PENDING"  # Ждёт выполнения (в т.ч. повтора)
+    RUNNING = "RUNNING"  # Выполняется
+    DONE = "DONE"        # Выполнена
+    FAILED = "FAILED"    # Исчерпаны попытки
+
 class User(Base):
     __tablename__ = "users"
     
@@ -60,14 +68,17 @@ class Deal(Base):
     
     # Сроки
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())  # Версия ответа API (ETag)
     option_expiry = Column(DateTime(timezone=True), nullable=False)  # Срок опциона
     buyback_at = Column(DateTime(timezone=True))  # Когда выкуплено
+    expiry_warning_sent_at = Column(DateTime(timezone=True))  # Когда ушло предупреждение за 24ч
     
     # Статус
     deal_status = Column(Enum(DealStatus), default=DealStatus.PENDING, nullable=False)
     
-    # Скины (snapshot на момент сделки)
-    items_snapshot = Column(JSON, nullable=False)  # [{market_hash_name, float, price, assetid}]
+    # Скины на момент сделки — строки deal_items (Deal.items).
+    # Прежний JSON-снимок остаётся только у старых сделок и не читается при загрузке
+    legacy_items_snapshot = deferred(Column("items_snapshot", JSON))
     
     # KYC данные на момент сделки
     kyc_snapshot = Column(JSON)  # {full_name, passport_series, passport_number, registration_address, phone}
@@ -89,12 +100,154 @@ class Deal(Base):
     # Связи
     user = relationship("User", back_populates="deals")
     trades = relationship("SteamTrade", back_populates="deal")
+    jobs = relationship("BackgroundJob", back_populates="deal", order_by="BackgroundJob.id")
+    items = relationship(
+        "DealItem", back_populates="deal", order_by="DealItem.position", cascade="all, delete-orphan"
+    )
+    
+    @property
+    def items_snapshot(self) -> list:
+        """Скины в формате ответа API и договора (грузит deal_items при обращении)"""
+        return [item.to_snapshot() for item in self.items]
+    
+    @items_snapshot.setter
+    def items_snapshot(self, items: list):
+        self.items = [DealItem.from_snapshot(item, position) for position, item in enumerate(items or [])]
+    
+    __table_args__ = (
+        # Планировщик сроков и check-expired: активные сделки по дате окончания
+        Index("ix_deals_status_expiry", "deal_status", "option_expiry"),
+        # Сделки и статистика пользователя
+        Index("ix_deals_user_status", "user_id", "deal_status"),
+        # Ожидающие трейда (verify_trade, /api/admin/deals/pending) — малая доля таблицы
+        Index(
+            "ix_deals_pending_created", "created_at",
+            postgresql_where=text("deal_status = 'PENDING'"),
+            sqlite_where=text("deal_status = 'PENDING'")
+        ),
+        # Предупреждения за 24ч: активные, ещё не предупреждённые
+        Index(
+            "ix_deals_active_unwarned", "option_expiry",
+            postgresql_where=text("deal_status = 'ACTIVE' AND expiry_warning_sent_at IS NULL"),
+            sqlite_where=text("deal_status = 'ACTIVE' AND expiry_warning_sent_at IS NULL")
+        ),
+        # Админ-панель: keyset-страницы по (created_at DESC, id DESC), в т.ч. с фильтром статуса
+        Index("ix_deals_created_id", "created_at", "id"),
+        Index("ix_deals_status_created_id", "deal_status", "created_at", "id"),
+    )
+
+class CatalogItem(Base):
+    """Скин в каталоге: статичные данные, одна строка на market_hash_name"""
+    __tablename__ = "item_catalog"
+    
+    id = Column(Integer, primary_key=True)
+    market_hash_name = Column(String, nullable=False, unique=True)
+    icon_path = Column(String)  # Хэш иконки Steam без адреса CDN
+    rarity = Column(String)
+    item_type = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class DealItem(Base):
+    """Скин в сделке: ссылка на каталог и цены в копейках"""
+    __tablename__ = "deal_items"
+    
+    id = Column(Integer, primary_key=True)
+    deal_id = Column(Integer, ForeignKey("deals.id"), nullable=False)
+    position = Column(Integer, nullable=False, default=0)  # Порядок в сделке
+    
+    assetid = Column(String)
+    item_id = Column(Integer, ForeignKey("item_catalog.id"), nullable=False)
+    float_value = Column(Float)
+    
+    instant_price_kopecks = Column(BigInteger, nullable=False, default=0)  # Рыночная (instant) цена
+    loan_price_kopecks = Column(BigInteger, nullable=False, default=0)  # Сумма выдачи за предмет
+    
+    deal = relationship("Deal", back_populates="items")
+    catalog_item = relationship("CatalogItem", lazy="joined", innerjoin=True)
+    
+    # Данные предмета до записи: item_id проставляет ItemCatalog при flush
+    pending_item = None
+    
+    __table_args__ = (
+        # Предметы сделки по порядку
+        Index("ix_deal_items_deal_position", "deal_id", "position"),
+        # В каких сделках этот скин
+        Index("ix_deal_items_item_deal", "item_id", "deal_id"),
+        Index("ix_deal_items_assetid", "assetid"),
+    )
+    
+    @property
+    def market_hash_name(self) -> str:
+        if self.catalog_item is not None:
+            return self.catalog_item.market_hash_name
+        return (self.pending_item or {}).get("market_hash_name", "")
+    
+    @classmethod
+    def from_snapshot(cls, item: dict, position: int = 0) -> "DealItem":
+        """Предмет из расчёта сделки (PricingService.calculate_quote) или старого снимка"""
+        instant_kopecks = item.get("instant_price_kopecks")
+        if instant_kopecks is None:
+            instant_kopecks = money.to_kopecks(item.get("instant_price") or 0.0)
+        loan_kopecks = item.get("loan_price_kopecks")
+        if loan_kopecks is None and item.get("loan_price") is not None:
+            loan_kopecks = money.to_kopecks(item["loan_price"])
+        if loan_kopecks is None:
+            # Снимки до расчёта по предметам хранят только market_price и instant_price
+            loan_kopecks = PricingService.calculate_item_loan_kopecks(instant_kopecks)
+        
+        deal_item = cls(
+            position=position,
+            assetid=item.get("assetid"),
+            float_value=item.get("float_value", item.get("float")),
+            instant_price_kopecks=instant_kopecks,
+            loan_price_kopecks=loan_kopecks
+        )
+        deal_item.pending_item = {
+            "market_hash_name": item.get("market_hash_name") or item.get("name") or "",
+            "icon_url": item.get("icon_url"),
+            "rarity": item.get("rarity"),
+            "type": item.get("type")
+        }
+        return deal_item
+    
+    def to_snapshot(self) -> dict:
+        instant_price = money.to_rubles(self.instant_price_kopecks)
+        return {
+            "assetid": self.assetid,
+            "item_id": self.item_id,
+            "market_hash_name": self.market_hash_name,
+            "float_value": self.float_value,
+            "market_price": instant_price,
+            "instant_price": instant_price,
+            "loan_price": money.to_rubles(self.loan_price_kopecks),
+            "instant_price_kopecks": self.instant_price_kopecks,
+            "loan_price_kopecks": self.loan_price_kopecks
+        }
+
+class DealStats(Base):
+    """Материализованная статистика сделок, обновляется при каждом переходе статуса"""
+    __tablename__ = "deal_stats"
+    
+    user_id = Column(Integer, primary_key=True, autoincrement=False)  # 0 — весь сервис
+    
+    # Количество сделок по статусам
+    pending_count = Column(Integer, default=0, nullable=False)
+    active_count = Column(Integer, default=0, nullable=False)
+    buyback_count = Column(Integer, default=0, nullable=False)
+    default_count = Column(Integer, default=0, nullable=False)
+    cancelled_count = Column(Integer, default=0, nullable=False)
+    
+    # Суммы в копейках
+    loan_total_kopecks = Column(BigInteger, default=0, nullable=False)  # Выдано по всем сделкам
+    buyback_paid_kopecks = Column(BigInteger, default=0, nullable=False)  # Получено по выкупленным
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 class SteamTrade(Base):
     __tablename__ = "steam_trades"
     
     id = Column(Integer, primary_key=True, index=True)
-    deal_id = Column(Integer, ForeignKey("deals.id"), nullable=False)
+    deal_id = Column(Integer, ForeignKey("deals.id"), nullable=False, index=True)
     
     trade_offer_id = Column(String, unique=True, index=True)
     trade_offer_url = Column(String)
@@ -189,7 +342,7 @@ class SBPPayout(Base):
     __tablename__ = "sbp_payouts"
     
     id = Column(Integer, primary_key=True, index=True)
-    deal_id = Column(Integer, ForeignKey("deals.id"), nullable=False)
+    deal_id = Column(Integer, ForeignKey("deals.id"), nullable=False, index=True)
     
     # ID внешнего провайдера
     payout_id = Column(String, unique=True, index=True)
@@ -214,11 +367,22 @@ class SBPPayout(Base):
     completed_at = Column(DateTime(timezone=True))
 
 class AuditLog(Base):
+    """
+    Журнал аудита (пишется пачками через services.audit_log.AuditSink)
+
+    В PostgreSQL таблица секционирована по месяцам created_at
+    (первичный ключ там — (id, created_at)).
+    """
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        # Повторная вставка из спула после сбоя пропускает записанные события
+        Index("uq_audit_logs_event", "event_id", "created_at", unique=True),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    deal_id = Column(Integer, ForeignKey("deals.id"))
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, index=True)
+    event_id = Column(String(32))  # uuid события из AuditSink
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    deal_id = Column(Integer, ForeignKey("deals.id"), index=True)
     
     action = Column(String, nullable=False)  # "deal_created", "trade_accepted", etc.
     details = Column(JSON)
@@ -228,3 +392,34 @@ class AuditLog(Base):
     session_id = Column(String)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    deal_id = Column(Integer, ForeignKey("deals.id"), index=True)
+    
+    job_type = Column(String, nullable=False)  # "contract_pdf", "trade_offer", "payout", "telegram", ...
+    payload = Column(JSON)
+    
+    # Внешняя система (лимит параллельных запросов к ней) и ключ от дублей
+    target = Column(String, index=True)  # "steam_bot", "yookassa", "telegram", "local"
+    idempotency_key = Column(String, unique=True, index=True)
+    
+    # Статус и повторы
+    status = Column(Enum(JobStatus), default=JobStatus.PENDING, nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    last_error = Column(Text)
+    run_after = Column(DateTime(timezone=True), server_default=func.now())  # Не запускать раньше
+    
+    # Аренда задачи в работе: процесс и время последнего продления
+    locked_by = Column(String)
+    locked_at = Column(DateTime(timezone=True))
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True))
+    
+    # Связи
+    deal = relationship("Deal", back_populates="jobs")
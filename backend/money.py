@@ -0,0 +1,60 @@
+"""
+Денежная арифметика в целых копейках
+
+Все суммы в конвейере цен считаются в копейках (int), ставки — в миллионных
+долях (int). Округление half-up делается один раз на каждом шаге, поэтому
+сумма по договору, сумма в БД и сумма выплаты совпадают до копейки.
+"""
+from functools import lru_cache
+from typing import NewType, Union
+
+# Сумма в копейках; NewType только для аннотаций, в рантайме это обычный int
+Kopecks = NewType("Kopecks", int)
+
+KOPECKS_PER_RUBLE = 100
+
+# Ставки (0.40, 0.15, ...) хранятся как целое число миллионных долей
+RATE_SCALE = 1_000_000
+_HALF_RATE = RATE_SCALE // 2
+
+# Допуск на ошибку представления float, в копейках
+_ROUNDING_EPSILON = 1e-6
+_HALF_UP = 0.5 + _ROUNDING_EPSILON
+
+
+def to_kopecks(amount: Union[int, float, str, None]) -> Kopecks:
+    """
+    Перевести сумму в рублях в копейки (half-up)
+
+    Допуск _ROUNDING_EPSILON гасит ошибку представления float
+    (1.005 * 100 = 100.49999999999999 должно стать 101 копейкой).
+    """
+    if not amount:
+        return 0
+    value = float(amount) * KOPECKS_PER_RUBLE
+    if value >= 0:
+        return int(value + _HALF_UP)
+    return -int(_HALF_UP - value)
+
+
+def to_rubles(kopecks: int) -> float:
+    """Перевести копейки в рубли (для JSON/Float-колонок)"""
+    return kopecks / KOPECKS_PER_RUBLE
+
+
+@lru_cache(maxsize=1024)
+def rate_to_ppm(rate: float) -> int:
+    """Перевести ставку (0.40) в миллионные доли (400000)"""
+    return int(round(rate * RATE_SCALE))
+
+
+def apply_rate(kopecks: int, rate_ppm: int) -> Kopecks:
+    """Умножить сумму на ставку с округлением half-up до копейки"""
+    return (kopecks * rate_ppm + _HALF_RATE) // RATE_SCALE
+
+
+def format_rub(kopecks: int) -> str:
+    """Строка "1234.50" для платёжных API"""
+    sign = "-" if kopecks < 0 else ""
+    rubles, rest = divmod(abs(kopecks), KOPECKS_PER_RUBLE)
+    return f"{sign}{rubles}.{rest:02d}"
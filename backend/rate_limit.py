@@ -0,0 +1,198 @@
+"""
+Лимиты запросов на пользователя и адрес: GCRA в Redis, общие для всех воркеров
+
+Два бюджета на rate_limit_period_seconds, запрос стоит rate_limit_costs[route]
+единиц в каждом (создание сделки дороже расчёта):
+  - пользователь — SteamID + IP, rate_limit_capacity единиц: пользователи за
+    одним NAT не делят бюджет, а чужой SteamID с другого адреса не расходует
+    бюджет владельца (аутентификации у API нет, SteamID присылает клиент);
+  - адрес — IP, rate_limit_ip_capacity единиц (с запасом на CGNAT): перебор
+    SteamID с одного адреса не даёт неограниченных запросов.
+Число воркеров бюджеты не умножает.
+
+GCRA: на ключ в Redis хранится одно число — теоретическое время прибытия
+(TAT). Lua-скрипт атомарно проверяет и сдвигает его по часам Redis (TIME),
+часы воркеров не участвуют.
+
+Быстрый путь: если пользователь обращался к Redis в последние
+rate_limit_lease_seconds, воркер берёт сверх стоимости аванс
+rate_limit_lease_units единиц и следующие запросы оплачивает из него без
+обращения к Redis. Неистраченный аванс сгорает — лимит от этого только
+строже. Редкие запросы аванс не берут и оплачиваются точно.
+
+Без Redis — тот же алгоритм в памяти воркера (бюджет на каждый воркер).
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from cache import TieredCache, cache
+from config import get_settings
+from metrics import rate_limit_requests
+
+MAX_LOCAL_KEYS = 10000
+
+# KEYS[1] — ключ бюджета; ARGV: интервал единицы (мс), допуск (мс), стоимость, сколько взять с авансом.
+# Ответ: {выдано единиц, остаток бюджета} или {0, через сколько мс хватит на стоимость}
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local wanted = tonumber(ARGV[4])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+  tat = now
+end
+local available = math.floor((now + tolerance - tat) / interval)
+if available < cost then
+  return {0, math.ceil(tat + cost * interval - tolerance - now)}
+end
+local granted = math.min(wanted, available)
+tat = tat + granted * interval
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil(tat - now))
+return {granted, available - granted}
+"""
+
+
+class RateLimited(Exception):
+    """Бюджет пользователя или адреса исчерпан: повторить через retry_after секунд"""
+
+    def __init__(self, route: str, retry_after: float):
+        super().__init__(f"Лимит запросов {route}: повторить через {retry_after:.1f} с")
+        self.route = route
+        self.retry_after = retry_after
+
+
+def gcra(tat: float, now: float, interval: float, tolerance: float, cost: int, wanted: int) -> Tuple[int, float, float]:
+    """
+    Шаг GCRA (то же, что GCRA_SCRIPT)
+
+    Returns:
+        (выдано единиц, новый TAT, остаток бюджета или пауза до повтора)
+    """
+    tat = max(tat, now)
+    available = math.floor((now + tolerance - tat) / interval)
+    if available < cost:
+        return 0, tat, tat + cost * interval - tolerance - now
+    granted = min(wanted, available)
+    return granted, tat + granted * interval, available - granted
+
+
+class _Lease:
+    """Аванс бюджета в воркере"""
+    __slots__ = ("units", "expires_at", "last_remote")
+
+    def __init__(self):
+        self.units = 0
+        self.expires_at = 0.0
+        self.last_remote = 0.0
+
+
+class RateLimiter:
+    """Бюджеты запросов на адрес и пользователя; hit() списывает стоимость маршрута с обоих"""
+
+    def __init__(
+        self,
+        cache: TieredCache = cache,
+        capacity: Optional[int] = None,
+        ip_capacity: Optional[int] = None,
+        period: Optional[float] = None,
+        costs: Optional[Dict[str, int]] = None,
+        lease_units: Optional[int] = None,
+        lease_seconds: Optional[float] = None
+    ):
+        settings = get_settings()
+        self.cache = cache
+        self.enabled = settings.rate_limit_enabled
+        self.capacity = capacity or settings.rate_limit_capacity
+        self.period = period or settings.rate_limit_period_seconds
+        self.costs = costs or settings.get_rate_limit_costs()
+        self.lease_units = lease_units if lease_units is not None else settings.rate_limit_lease_units
+        self.lease_seconds = lease_seconds if lease_seconds is not None else settings.rate_limit_lease_seconds
+        self.ip_capacity = ip_capacity or settings.rate_limit_ip_capacity
+        self.interval = self.period / self.capacity
+        self.ip_interval = self.period / self.ip_capacity
+
+        self._leases: "OrderedDict[str, _Lease]" = OrderedDict()
+        self._local_tat: "OrderedDict[str, float]" = OrderedDict()  # Без Redis
+
+    async def hit(self, route: str, steam_id: str, request: Request):
+        """
+        Списать стоимость route с бюджета адреса клиента и пользователя steam_id
+
+        Raises:
+            RateLimited: Бюджета не хватает
+        """
+        if not self.enabled:
+            return
+        cost = self.costs[route]
+        ip = request.client.host if request.client else "unknown"
+        # Адрес — первым: перебор SteamID с одного адреса не расходует чужие бюджеты
+        await self._take(route, "ip", f"ip:{ip}", self.ip_interval, cost)
+        await self._take(route, "user", f"user:{steam_id}:{ip}", self.interval, cost)
+
+    async def _take(self, route: str, bucket: str, key: str, interval: float, cost: int):
+        now = time.monotonic()
+
+        lease = self._leases.get(key)
+        if lease is not None and lease.units >= cost and lease.expires_at > now:
+            lease.units -= cost
+            rate_limit_requests.inc(route=route, bucket=bucket, result="local")
+            return
+
+        # Частые запросы — с авансом, чтобы следующие не ходили в Redis
+        hot = lease is not None and now - lease.last_remote < self.lease_seconds
+        wanted = cost + (self.lease_units if hot else 0)
+        reply = await self.cache.run_script(
+            GCRA_SCRIPT, [f"ratelimit:{key}"], [interval * 1000, self.period * 1000, cost, wanted]
+        )
+        if reply is None:
+            result = "fallback"
+            granted, tat, rest = gcra(self._local_tat.get(key, now), now, interval, self.period, cost, cost)
+            self._remember(self._local_tat, key, tat)
+        else:
+            result = "redis"
+            granted, rest = int(reply[0]), int(reply[1]) / 1000
+
+        if not granted:
+            rate_limit_requests.inc(route=route, bucket=bucket, result="rejected")
+            raise RateLimited(route, rest)
+
+        if lease is None:
+            lease = _Lease()
+            self._remember(self._leases, key, lease)
+        lease.units = granted - cost
+        lease.expires_at = now + self.lease_seconds
+        lease.last_remote = now
+        rate_limit_requests.inc(route=route, bucket=bucket, result=result)
+
+    @staticmethod
+    def _remember(entries: OrderedDict, key: str, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > MAX_LOCAL_KEYS:
+            entries.popitem(last=False)
+
+    def clear(self):
+        """Забыть авансы и локальные бюджеты (тесты)"""
+        self._leases.clear()
+        self._local_tat.clear()
+
+
+async def rate_limited_handler(request: Request, exc: RateLimited) -> JSONResponse:
+    """429 с Retry-After"""
+    return JSONResponse(
+        {"detail": "Слишком много запросов, повторите позже", "retry_after": round(exc.retry_after, 1)},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+
+# Общий экземпляр для приложения
+rate_limiter = RateLimiter()
@@ -0,0 +1,244 @@
+"""
+Кэш ответов HTTP для читающих публичных эндпоинтов (ASGI middleware)
+
+Маршрут регистрируется с TTL и функцией ключа; готовое тело ответа 200
+хранится в памяти воркера (LocalCache) и отдаётся без вызова обработчика.
+
+Версия ответа:
+  - обработчик сообщает её через set_cache_version (версия прайс-листа,
+    отметки изменения сделки) — ETag строится из ключа и версии;
+  - функция version маршрута получает ту же версию дешёвым запросом и
+    вызывается только для проверки: есть закэшированный ответ или клиент
+    прислал If-None-Match. Совпала — 304 / ответ из кэша без пересчёта;
+  - без версии ETag — хеш тела, ответ живёт TTL.
+
+Одинаковые запросы, пришедшие во время вычисления, ждут его результата
+(одно вычисление на всех).
+"""
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.routing import compile_path
+
+from cache import LocalCache
+from config import get_settings
+
+KeyFunc = Callable[[Request, Dict[str, Any]], str]
+VersionFunc = Callable[[Request, Dict[str, Any]], Awaitable[Optional[str]]]
+
+STATE_VERSION = "cache_version"
+
+
+def set_cache_version(request: Request, version: Optional[str]):
+    """Версия ответа из обработчика (из неё строится ETag)"""
+    setattr(request.state, STATE_VERSION, version)
+
+
+def query_key(request: Request, params: Dict[str, Any]) -> str:
+    """Ключ по умолчанию: путь + отсортированные query-параметры"""
+    return f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+
+
+@dataclass
+class CachedRoute:
+    name: str
+    method: str
+    path: str
+    ttl: float
+    key: KeyFunc
+    version: Optional[VersionFunc]
+    cache_control: Optional[str]
+
+    def __post_init__(self):
+        self.regex, _, self.convertors = compile_path(self.path)
+
+    def match(self, method: str, path: str) -> Optional[Dict[str, Any]]:
+        if method != self.method:
+            return None
+        found = self.regex.match(path)
+        if found is None:
+            return None
+        return {name: self.convertors[name].convert(value) for name, value in found.groupdict().items()}
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: Optional[str] = None
+
+
+class ResponseCache:
+    """Правила кэширования маршрутов и хранилище готовых ответов"""
+
+    def __init__(self, max_items: Optional[int] = None):
+        self.store = LocalCache(max_items or get_settings().response_cache_max_items)
+        self.routes: List[CachedRoute] = []
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "coalesced": 0, "stale": 0}
+
+    def route(
+        self,
+        method: str,
+        path: str,
+        ttl: float,
+        key: KeyFunc = query_key,
+        version: Optional[VersionFunc] = None,
+        cache_control: Optional[str] = None
+    ):
+        """
+        Кэшировать ответы маршрута
+
+        Args:
+            path: шаблон пути как у FastAPI ("/api/deals/{deal_id:int}")
+            ttl: сколько хранить готовый ответ
+            key: ключ запроса (по умолчанию путь + query)
+            version: актуальная версия ответа без вызова обработчика (None — ресурса нет)
+            cache_control: заголовок Cache-Control ответов маршрута
+        """
+        self.routes.append(CachedRoute(path, method, path, ttl, key, version, cache_control))
+
+    def match(self, method: str, path: str) -> Optional[Tuple[CachedRoute, Dict[str, Any]]]:
+        for route in self.routes:
+            params = route.match(method, path)
+            if params is not None:
+                return route, params
+        return None
+
+    @staticmethod
+    def etag(key: str, version: str) -> str:
+        """Сильный ETag из ключа запроса и версии ответа"""
+        return '"' + hashlib.blake2b(f"{key}|{version}".encode(), digest_size=16).hexdigest() + '"'
+
+    @staticmethod
+    def body_etag(body: bytes) -> str:
+        return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+    def clear(self):
+        self.store.clear()
+
+    def info(self) -> Dict:
+        return {**self.stats, "items": len(self.store), "routes": [route.name for route in self.routes]}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    if not if_none_match or etag is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or "*" in tags
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware: ответы зарегистрированных маршрутов из ResponseCache"""
+
+    def __init__(self, app, cache: ResponseCache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        matched = self.cache.match(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if matched is None:
+            await self.app(scope, receive, send)
+            return
+
+        route, params = matched
+        scope["cached_route"] = route.name  # Метрики: ответ из кэша не проходит маршрутизацию
+        request = Request(scope)
+        key = f"{route.name}:{route.key(request, params)}"
+        if_none_match = request.headers.get("if-none-match")
+        entry: Optional[CachedResponse] = self.cache.store.get(key, None)
+
+        if route.version is not None and (entry is not None or if_none_match):
+            version = await route.version(request, params)
+            if version is None:
+                # Ресурса нет или версия неизвестна — отвечает обработчик, без кэша
+                await self.app(scope, receive, send)
+                return
+            etag = ResponseCache.etag(key, version)
+            if _etag_matches(if_none_match, etag):
+                await self._not_modified(send, route, etag)
+                return
+            if entry is not None and entry.etag != etag:
+                self.cache.stats["stale"] += 1
+                entry = None
+
+        if entry is None:
+            self.cache.stats["misses"] += 1
+            entry = await self._compute(key, route, scope, receive)
+        else:
+            self.cache.stats["hits"] += 1
+
+        if entry.status == 200 and _etag_matches(if_none_match, entry.etag):
+            await self._not_modified(send, route, entry.etag)
+            return
+        await self._replay(send, route, entry)
+
+    async def _compute(self, key: str, route: CachedRoute, scope, receive) -> CachedResponse:
+        """Вызвать обработчик; параллельные одинаковые запросы ждут этот же вызов"""
+        inflight = self.cache._inflight.get(key)
+        if inflight is not None:
+            self.cache.stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self.cache._inflight[key] = future
+        try:
+            entry = await self._capture(key, scope, receive)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Ожидающих может не быть — не логировать «never retrieved»
+            raise
+        finally:
+            self.cache._inflight.pop(key, None)
+
+        if entry.status == 200:
+            self.cache.store.set(key, entry, route.ttl)
+        future.set_result(entry)
+        return entry
+
+    async def _capture(self, key: str, scope, receive) -> CachedResponse:
+        response = {"status": 500, "headers": [], "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        body = b"".join(response["body"])
+        version = scope.get("state", {}).get(STATE_VERSION)
+        etag = ResponseCache.etag(key, version) if version is not None else ResponseCache.body_etag(body)
+        headers = [(name, value) for name, value in response["headers"] if name.lower() not in (b"etag", b"cache-control")]
+        return CachedResponse(response["status"], headers, body, etag)
+
+    @staticmethod
+    def _cache_headers(route: CachedRoute, etag: str) -> List[Tuple[bytes, bytes]]:
+        headers = [(b"etag", etag.encode())]
+        if route.cache_control:
+            headers.append((b"cache-control", route.cache_control.encode()))
+        return headers
+
+    async def _replay(self, send, route: CachedRoute, entry: CachedResponse):
+        headers = entry.headers
+        if entry.status == 200:
+            headers = headers + self._cache_headers(route, entry.etag)
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def _not_modified(self, send, route: CachedRoute, etag: str):
+        self.cache.stats["not_modified"] += 1
+        await send({"type": "http.response.start", "status": 304, "headers": self._cache_headers(route, etag)})
+        await send({"type": "http.response.body", "body": b""})
+
+
+response_cache = ResponseCache()
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional
 from datetime import datetime
-from models import DealStatus, TradeStatus
+from models import DealStatus, TradeStatus, JobStatus
 
 # User schemas
 class UserBase(BaseModel):
@@ -101,6 +101,19 @@ class DealResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BackgroundJobInfo(BaseModel):
+    id: int
+    job_type: str
+    status: JobStatus
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 class DealDetail(DealResponse):
     user: User
     buyback_at: Optional[datetime] = None
@@ -111,6 +124,9 @@ class DealDetail(DealResponse):
     is_expired: bool = False
     can_buyback: bool = False
     days_left: Optional[int] = None
+    
+    # Фоновые шаги создания (договор, трейд, уведомление)
+    jobs: List[BackgroundJobInfo] = []
 
 # Trade schemas
 class TradeCreate(BaseModel):
@@ -0,0 +1,175 @@
+"""
+Список сделок для админ-панели
+
+Keyset-пагинация по (created_at DESC, id DESC): страница — один индексный
+запрос с LIMIT, без OFFSET, поэтому стоимость не растёт с номером страницы.
+Выбираются только колонки таблицы, число скинов (по индексу deal_items)
+и имя/телефон из KYC (вычисляет БД). Скины и полный kyc_snapshot отдаются
+по одной сделке (details_query, items_query). Пользователи — только те,
+что есть на странице.
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Select, func, select, tuple_
+
+import models
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+Deal = models.Deal
+
+# Колонки строки списка (без полных JSON-снимков)
+LIST_COLUMNS = (
+    Deal.id,
+    Deal.user_id,
+    Deal.market_total,
+    Deal.loan_amount,
+    Deal.buyback_price,
+    Deal.created_at,
+    Deal.option_expiry,
+    Deal.deal_status,
+    Deal.payout_transaction_id,
+    Deal.initial_trade_id,
+    select(func.count(models.DealItem.id))
+    .where(models.DealItem.deal_id == Deal.id)
+    .scalar_subquery()
+    .label("items_count"),
+    Deal.kyc_snapshot["full_name"].as_string().label("client_name"),
+    Deal.kyc_snapshot["phone"].as_string().label("client_phone"),
+)
+
+USER_COLUMNS = (
+    models.User.id,
+    models.User.steam_id,
+    models.User.steam_username,
+    models.User.phone,
+)
+
+
+class InvalidCursor(ValueError):
+    """Курсор не разобран (подделан или от другой версии API)"""
+
+
+class AdminDealsService:
+    """Страницы списка сделок для админ-панели"""
+
+    @staticmethod
+    def encode_cursor(created_at: datetime, deal_id: int) -> str:
+        """Непрозрачный курсор: позиция последней сделки страницы"""
+        raw = f"{created_at.isoformat()}|{deal_id}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            created_at, deal_id = raw.rsplit("|", 1)
+            return datetime.fromisoformat(created_at), int(deal_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+            raise InvalidCursor(f"Некорректный курсор: {cursor}") from e
+
+    @staticmethod
+    def page_query(
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        status: Optional[models.DealStatus] = None,
+        user_id: Optional[int] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+    ) -> Select:
+        """
+        Запрос одной страницы (limit + 1 строка — признак следующей страницы)
+
+        Args:
+            cursor: next_cursor предыдущей страницы
+            created_from, created_to: Полуинтервал [from, to) по created_at
+            min_amount, max_amount: Диапазон суммы выдачи (loan_amount)
+        """
+        stmt = select(*LIST_COLUMNS)
+
+        if status is not None:
+            stmt = stmt.where(Deal.deal_status == status)
+        if user_id is not None:
+            stmt = stmt.where(Deal.user_id == user_id)
+        if created_from is not None:
+            stmt = stmt.where(Deal.created_at >= created_from)
+        if created_to is not None:
+            stmt = stmt.where(Deal.created_at < created_to)
+        if min_amount is not None:
+            stmt = stmt.where(Deal.loan_amount >= min_amount)
+        if max_amount is not None:
+            stmt = stmt.where(Deal.loan_amount <= max_amount)
+        if cursor is not None:
+            stmt = stmt.where(tuple_(Deal.created_at, Deal.id) < tuple_(*AdminDealsService.decode_cursor(cursor)))
+
+        return stmt.order_by(Deal.created_at.desc(), Deal.id.desc()).limit(limit + 1)
+
+    @staticmethod
+    def users_query(user_ids: Iterable[int]) -> Select:
+        """Пользователи страницы"""
+        return select(*USER_COLUMNS).where(models.User.id.in_(sorted(set(user_ids))))
+
+    @staticmethod
+    def build_page(rows: List, limit: int) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Строки page_query -> (сделки, next_cursor)
+
+        next_cursor = None на последней странице.
+        """
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = AdminDealsService.encode_cursor(last.created_at, last.id)
+
+        deals = [
+            {
+                "id": row.id,
+                "user_id": row.user_id,
+                "market_total": row.market_total,
+                "loan_amount": row.loan_amount,
+                "buyback_price": row.buyback_price,
+                "created_at": row.created_at.isoformat(),
+                "option_expiry": row.option_expiry.isoformat(),
+                "deal_status": row.deal_status.value,
+                "items_count": row.items_count,
+                "client_name": row.client_name,
+                "client_phone": row.client_phone,
+                "payout_transaction_id": row.payout_transaction_id,
+                "initial_trade_id": row.initial_trade_id
+            }
+            for row in rows
+        ]
+        return deals, next_cursor
+
+    @staticmethod
+    def user_entries(rows: Iterable) -> List[Dict]:
+        return [
+            {
+                "id": row.id,
+                "steam_id": row.steam_id,
+                "steam_username": row.steam_username,
+                "phone": row.phone
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def details_query(deal_id: int) -> Select:
+        """KYC-снимок одной сделки (по раскрытию строки в админке)"""
+        return select(Deal.id, Deal.kyc_snapshot).where(Deal.id == deal_id)
+
+    @staticmethod
+    def items_query(deal_id: int) -> Select:
+        """Скины одной сделки"""
+        return (
+            select(models.DealItem)
+            .where(models.DealItem.deal_id == deal_id)
+            .order_by(models.DealItem.position)
+        )
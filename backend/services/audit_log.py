@@ -0,0 +1,415 @@
+"""
+Журнал аудита
+
+Обработчики не пишут AuditLog своей транзакцией: событие уходит в
+AuditSink, который копит их в памяти и пишет в audit_logs пачками
+(один bulk INSERT) — по размеру пачки или раз в flush_interval секунд.
+
+Надёжность: каждое событие сначала дописывается строкой JSON в локальный
+спул (write + flush — переживает падение процесса), перед вставкой в БД
+сегмент спула синхронизируется на диск (fsync), после коммита вставки —
+удаляется. Сегменты, оставшиеся после падения или недоступности БД,
+дочитываются при следующем старте. Повторная вставка безопасна: у события
+постоянный event_id, INSERT пропускает уже записанные (event_id, created_at).
+
+Сегмент открыт с эксклюзивным flock, пока процесс с ним работает, — другие
+воркеры с тем же каталогом спула не подхватывают чужие живые сегменты.
+
+audit_logs в PostgreSQL секционирована по месяцам created_at;
+ensure_partitions заранее создаёт секции на ближайшие месяцы.
+"""
+import asyncio
+import json
+import os
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+import models
+from config import get_settings
+from database import engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: без блокировок, спул одного процесса
+    fcntl = None
+
+SPOOL_SUFFIX = ".spool"
+SEGMENT_OPEN_ATTEMPTS = 5
+SESSION_EVENTS_KEY = "audit_events"
+
+# Колонки audit_logs, которые заполняет событие
+EVENT_FIELDS = ("event_id", "user_id", "deal_id", "action", "details", "ip_address", "user_agent", "session_id")
+
+
+@dataclass
+class _Segment:
+    """Файл спула и события из него (ещё не вставленные в БД)"""
+    path: str
+    file: IO
+    events: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def _lock(file: IO) -> bool:
+    """Эксклюзивная блокировка сегмента без ожидания"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _to_row(event_data: Dict[str, Any]) -> Dict[str, Any]:
+    row = {name: event_data.get(name) for name in EVENT_FIELDS}
+    row["created_at"] = datetime.fromisoformat(event_data["created_at"])
+    return row
+
+
+def month_partitions(start: date, months: int) -> List[Tuple[str, date, date]]:
+    """
+    Месячные секции audit_logs начиная с месяца start
+
+    Returns:
+        [(имя секции, начало включительно, конец не включительно), ...]
+    """
+    partitions = []
+    year, month = start.year, start.month
+    for _ in range(months):
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        partitions.append((f"audit_logs_y{year}m{month:02d}", date(year, month, 1), date(next_year, next_month, 1)))
+        year, month = next_year, next_month
+    return partitions
+
+
+def ensure_partitions(connection: Connection, now: Optional[datetime] = None, months_ahead: Optional[int] = None) -> List[str]:
+    """
+    Создать секции audit_logs на текущий и следующие месяцы
+
+    Только PostgreSQL с секционированной таблицей; в остальных БД —
+    обычная таблица, ничего не делает.
+
+    Returns:
+        Имена секций (существующих и созданных)
+    """
+    if connection.dialect.name != "postgresql":
+        return []
+    partitioned = connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('audit_logs')"
+    )).first()
+    if partitioned is None:
+        return []
+
+    if months_ahead is None:
+        months_ahead = get_settings().audit_partition_months_ahead
+    partitions = month_partitions((now or datetime.utcnow()).date(), months_ahead + 1)
+    for name, start, end in partitions:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF audit_logs "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+    return [name for name, _, _ in partitions]
+
+
+class AuditSink:
+    """Буфер событий аудита со спулом на диске и пакетной записью в БД"""
+
+    def __init__(
+        self,
+        bind: Engine = engine,
+        spool_dir: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None
+    ):
+        settings = get_settings()
+        self.bind = bind
+        self.spool_dir = spool_dir or settings.audit_spool_dir
+        self.batch_size = batch_size or settings.audit_batch_size
+        self.flush_interval = flush_interval or settings.audit_flush_interval_seconds
+        self._lock = threading.Lock()  # Буфер и текущий сегмент
+        self._flush_lock = threading.Lock()  # Одна вставка за раз
+        self._current: Optional[_Segment] = None
+        self._sealed: List[_Segment] = []
+        self._segment_seq = 0
+        # PID в контейнере после рестарта тот же: без boot id новый сегмент совпал бы с оставшимся от прошлого запуска
+        self._boot_id = uuid.uuid4().hex[:12]
+        self._partitions_checked: Optional[date] = None
+        self._loop = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # ---------- запись событий ----------
+
+    def record(
+        self,
+        action: str,
+        user_id: Optional[int] = None,
+        deal_id: Optional[int] = None,
+        details: Optional[Dict] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        session_id: Optional[str] = None
+    ) -> str:
+        """
+        Записать событие (в спул сразу, в БД — со следующей пачкой)
+
+        Returns:
+            event_id
+        """
+        event_data = {
+            "event_id": uuid.uuid4().hex,
+            "created_at": datetime.utcnow().isoformat(),
+            "user_id": user_id,
+            "deal_id": deal_id,
+            "action": action,
+            "details": details,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "session_id": session_id
+        }
+        line = json.dumps(event_data, ensure_ascii=False, default=str) + "\n"
+
+        with self._lock:
+            segment = self._current or self._open_segment()
+            segment.file.write(line)
+            segment.file.flush()
+            segment.events.append(event_data)
+            full = len(segment.events) >= self.batch_size
+
+        if full:
+            self._wake()
+        return event_data["event_id"]
+
+    def record_on_commit(self, db: Session, action: str, **kwargs):
+        """
+        Записать событие после commit транзакции db (при rollback — отбросить)
+
+        Для действий, которые аудируются только если изменения сохранились.
+        """
+        if db.get_transaction() is None:
+            db.begin()  # Иначе rollback без обращений к БД не снимет событие
+        db.info.setdefault(SESSION_EVENTS_KEY, []).append((self, action, kwargs))
+
+    def pending(self) -> int:
+        """Событий ещё не в БД"""
+        with self._lock:
+            current = len(self._current.events) if self._current else 0
+            return current + sum(len(segment.events) for segment in self._sealed)
+
+    def _open_segment(self) -> _Segment:
+        """Новый сегмент: только свежий файл ("x") и только под своей блокировкой"""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        for _ in range(SEGMENT_OPEN_ATTEMPTS):
+            self._segment_seq += 1
+            name = f"audit-{os.getpid()}-{self._boot_id}-{self._segment_seq:06d}{SPOOL_SUFFIX}"
+            path = os.path.join(self.spool_dir, name)
+            try:
+                file = open(path, "x", encoding="utf-8")
+            except FileExistsError:
+                continue
+            if _lock(file):
+                self._current = _Segment(path, file)
+                return self._current
+            # Пустой файл успел взять recover() другого процесса — следующее имя
+            file.close()
+        raise OSError(f"Не удалось создать сегмент спула в {self.spool_dir}")
+
+    def _seal_current(self):
+        """Закрыть текущий сегмент для вставки (fsync — до записи в БД)"""
+        with self._lock:
+            segment, self._current = self._current, None
+            if segment is None:
+                return
+            if not segment.events:
+                self._discard(segment)
+                return
+            os.fsync(segment.file.fileno())
+            self._sealed.append(segment)
+
+    @staticmethod
+    def _discard(segment: _Segment):
+        # Удалить под блокировкой, затем закрыть (и снять блокировку)
+        try:
+            os.remove(segment.path)
+        except FileNotFoundError:
+            pass
+        segment.file.close()
+
+    # ---------- запись в БД ----------
+
+    def _insert_ignore(self, connection: Connection):
+        """INSERT, пропускающий уже записанные события (повтор после сбоя)"""
+        table = models.AuditLog.__table__
+        dialect = connection.dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(table).on_conflict_do_nothing(index_elements=["event_id", "created_at"])
+        if dialect == "sqlite":
+            return sqlite.insert(table).on_conflict_do_nothing(index_elements=["event_id", "created_at"])
+        return table.insert()
+
+    def flush(self) -> int:
+        """
+        Вставить все накопленные события (блокирующий вызов)
+
+        При ошибке БД сегменты остаются на диске и в очереди до следующей попытки.
+
+        Returns:
+            Количество вставленных событий (без уже записанных ранее)
+        """
+        with self._flush_lock:
+            self._seal_current()
+            inserted = 0
+            while True:
+                with self._lock:
+                    if not self._sealed:
+                        break
+                    segment = self._sealed[0]
+
+                with self.bind.begin() as connection:
+                    self._ensure_partitions(connection)
+                    result = connection.execute(self._insert_ignore(connection), [_to_row(e) for e in segment.events])
+                    inserted += max(result.rowcount, 0)
+
+                with self._lock:
+                    self._sealed.pop(0)
+                self._discard(segment)
+            return inserted
+
+    def _ensure_partitions(self, connection: Connection):
+        today = datetime.utcnow().date()
+        if self._partitions_checked != today:
+            ensure_partitions(connection)
+            self._partitions_checked = today
+
+    # ---------- восстановление после сбоя ----------
+
+    def recover(self) -> int:
+        """
+        Подхватить сегменты спула, оставшиеся от упавших процессов
+
+        Сегменты живых процессов заблокированы и пропускаются.
+        Недописанная последняя строка (падение во время write) отбрасывается.
+
+        Returns:
+            Количество событий к повторной вставке
+        """
+        if not os.path.isdir(self.spool_dir):
+            return 0
+
+        own = {segment.path for segment in self._sealed}
+        if self._current is not None:
+            own.add(self._current.path)
+
+        recovered = 0
+        for name in sorted(os.listdir(self.spool_dir)):
+            path = os.path.join(self.spool_dir, name)
+            if not name.endswith(SPOOL_SUFFIX) or path in own:
+                continue
+            try:
+                file = open(path, "a+", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            if not _lock(file) or not os.path.exists(path):
+                file.close()
+                continue
+
+            file.seek(0)
+            events = []
+            for line in file:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"[AUDIT] Пропущена повреждённая строка в {name}")
+            segment = _Segment(path, file, events)
+            if not events:
+                self._discard(segment)
+                continue
+            with self._lock:
+                self._sealed.append(segment)
+            recovered += len(events)
+
+        if recovered:
+            print(f"[AUDIT] Из спула восстановлено событий: {recovered}")
+        return recovered
+
+    # ---------- фоновый цикл ----------
+
+    def start(self):
+        """Запустить периодическую запись (из lifespan приложения)"""
+        if self._loop_task is None:
+            self.recover()
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        """Остановить цикл и записать остаток; если БД недоступна — спул остаётся на диске"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+            self._loop = None
+
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception as e:
+            print(f"[AUDIT] Ошибка записи при остановке, события остались в спуле: {e}")
+        finally:
+            self.close()
+
+    def close(self):
+        """Закрыть файлы спула, не удаляя их (снять блокировки)"""
+        with self._lock:
+            segments = self._sealed + ([self._current] if self._current else [])
+            self._sealed, self._current = [], None
+        for segment in segments:
+            segment.file.flush()
+            os.fsync(segment.file.fileno())
+            segment.file.close()
+
+    def _wake(self):
+        # record() вызывается и из потоков (sync-обработчики, after_commit)
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    async def _run_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            if self.pending():
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception as e:
+                    print(f"[AUDIT] Ошибка записи пачки, повтор через {self.flush_interval}с: {e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_session_events(session: Session):
+    for sink, action, kwargs in session.info.pop(SESSION_EVENTS_KEY, ()):
+        sink.record(action, **kwargs)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_session_events(session: Session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(SESSION_EVENTS_KEY, None)
+
+
+# Общий экземпляр для приложения
+audit_sink = AuditSink()
@@ -0,0 +1,142 @@
+"""
+Массовый поиск цен: тысячи market_hash_name за один проход
+
+Цены берутся из прайс-листа market.csgo в памяти (по item_id) или, если его
+загрузил другой воркер, одним MGET из Redis. Ответ собирается без
+промежуточных PriceData, сериализуется orjson и снабжается ETag /
+Cache-Control по версии прайс-листа: пока прайс-лист не обновился,
+повторный запрос с If-None-Match получает 304 без поиска цен.
+
+Для больших запросов есть колоночный формат (format=columnar) — массивы
+вместо словаря на каждый предмет; тело сжимается gzip, если клиент это
+принимает.
+"""
+import gzip
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import money
+from cache import dumps
+from services.market_csgo_service import MarketCSGOService
+from services.price_aggregator import PriceAggregator
+from services.pricing_service import PricingService
+
+MAX_NAMES = 10000
+GZIP_MIN_BYTES = 1024  # Меньшие ответы сжатие не окупают
+CACHE_MAX_AGE_SECONDS = 300
+
+FORMAT_ROWS = "rows"
+FORMAT_COLUMNAR = "columnar"
+FORMATS = (FORMAT_ROWS, FORMAT_COLUMNAR)
+
+
+class TooManyNames(ValueError):
+    """В запросе больше MAX_NAMES предметов"""
+
+
+@dataclass
+class EncodedResponse:
+    """Готовое тело ответа с заголовками (эндпоинт только оборачивает в Response)"""
+    status_code: int
+    body: bytes = b""
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+class BulkPriceService:
+    """Цены пачкой: поиск, сборка ответа, кэширующие заголовки"""
+
+    @staticmethod
+    def price_row(market_price: float) -> Dict:
+        """Цена одного предмета в формате /api/prices/* (как у PriceAggregator, без PriceData)"""
+        instant_kopecks = money.to_kopecks(market_price)
+        return {
+            "market_csgo_price": market_price,
+            "lis_skins_estimate": market_price * PriceAggregator.LIS_SKINS_MARKUP if market_price > 0 else 0.0,
+            "instant_price": market_price,
+            "is_acceptable": market_price >= PriceAggregator.MIN_PRICE,
+            "instant_price_kopecks": instant_kopecks,
+            "loan_price_kopecks": PricingService.calculate_item_loan_kopecks(instant_kopecks)
+        }
+
+    @staticmethod
+    def columns(names: List[str], prices: Dict[str, float]) -> Dict[str, List]:
+        """Колоночный формат: по массиву на поле, порядок — как в names"""
+        instant = [money.to_kopecks(prices.get(name, 0.0)) for name in names]
+        loan_kopecks = PricingService.calculate_item_loan_kopecks
+        min_kopecks = money.to_kopecks(PriceAggregator.MIN_PRICE)
+        return {
+            "names": names,
+            "instant_price_kopecks": instant,
+            "loan_price_kopecks": [loan_kopecks(kopecks) for kopecks in instant],
+            "acceptable": [kopecks >= min_kopecks for kopecks in instant]
+        }
+
+    @staticmethod
+    def etag(version: str, names: List[str], fmt: str) -> str:
+        """Слабый ETag: версия прайс-листа + набор предметов + формат"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{version}|{fmt}".encode())
+        for name in names:
+            digest.update(b"\x00")
+            digest.update(name.encode())
+        return f'W/"{digest.hexdigest()}"'
+
+    @staticmethod
+    def _headers(etag: Optional[str]) -> Dict[str, str]:
+        if etag is None:
+            # Прайс-лист не загружен — нули не кэшируем
+            return {"Cache-Control": "no-store"}
+        return {"ETag": etag, "Cache-Control": f"public, max-age={CACHE_MAX_AGE_SECONDS}"}
+
+    @staticmethod
+    async def lookup(
+        names: List[str],
+        fmt: str = FORMAT_ROWS,
+        if_none_match: Optional[str] = None,
+        accept_encoding: str = ""
+    ) -> EncodedResponse:
+        """
+        Ответ /api/prices/bulk
+
+        Args:
+            names: market_hash_name (дубликаты схлопываются, порядок сохраняется)
+            fmt: rows — {name: цена}, columnar — массивы
+            if_none_match: ETag клиента — при совпадении 304 без поиска цен
+            accept_encoding: заголовок Accept-Encoding клиента
+
+        Raises:
+            TooManyNames: больше MAX_NAMES уникальных предметов
+        """
+        unique = list(dict.fromkeys(names))
+        if len(unique) > MAX_NAMES:
+            raise TooManyNames(f"Не больше {MAX_NAMES} предметов за запрос")
+
+        version = await MarketCSGOService.prices_version()
+        if version is not None and if_none_match:
+            etag = BulkPriceService.etag(version, unique, fmt)
+            if etag in (tag.strip() for tag in if_none_match.split(",")):
+                return EncodedResponse(304, headers=BulkPriceService._headers(etag))
+
+        prices, version = await MarketCSGOService.lookup_prices(unique)
+
+        if fmt == FORMAT_COLUMNAR:
+            payload = BulkPriceService.columns(unique, prices)
+        else:
+            row = BulkPriceService.price_row
+            payload = {"prices": {name: row(prices[name]) for name in unique}}
+        payload["currency"] = "RUB"
+        payload["timestamp"] = version
+
+        etag = BulkPriceService.etag(version, unique, fmt) if version is not None else None
+        return BulkPriceService.encode(payload, BulkPriceService._headers(etag), accept_encoding)
+
+    @staticmethod
+    def encode(payload, headers: Dict[str, str], accept_encoding: str = "") -> EncodedResponse:
+        """orjson + gzip для крупных тел, если клиент принимает gzip"""
+        body = dumps(payload)
+        headers = {**headers, "Vary": "Accept-Encoding"}
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in accept_encoding.lower():
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return EncodedResponse(200, body, headers)
@@ -5,12 +5,15 @@ import hashlib
 from datetime import datetime
 from typing import Dict
 from config import get_settings
+import money
+from metrics import timed
 
 
 class ContractService:
     """Сервис для работы с договорами"""
     
     @staticmethod
+    @timed("contract.generate_html")
     def generate_contract_html(deal: Dict, user: Dict) -> str:
         """
         Генерировать HTML договора
@@ -42,21 +45,22 @@ class ContractService:
             else:
                 instant_price = instant_price_raw or 0
             
-            loan_price = float(instant_price) * 0.40  # 40% от цены
+            loan_kopecks = ContractService._item_loan_kopecks(item, instant_price)
             items_html += f"""
             <tr>
                 <td>{i}</td>
                 <td>{name}</td>
                 <td>{float(market_price):.2f} ₽</td>
                 <td>{float(instant_price):.2f} ₽</td>
-                <td>{loan_price:.2f} ₽</td>
+                <td>{money.format_rub(loan_kopecks)} ₽</td>
             </tr>
             """
         
-        # Расчёт выкупа
+        # Расчёт выкупа (те же слагаемые в копейках, что и в PricingService)
         term_config = deal.get("term_config", {})
-        interest_amount = deal["loan_amount"] * term_config.get("interest", 0)
-        premium_amount = (deal["loan_amount"] + interest_amount) * term_config.get("premium", 0)
+        buyback = ContractService._buyback_breakdown(deal)
+        interest_amount = money.to_rubles(buyback["interest"])
+        premium_amount = money.to_rubles(buyback["premium"])
         
         html = f"""
         <!DOCTYPE html>
@@ -151,6 +155,32 @@ class ContractService:
         
         return html
     
+    @staticmethod
+    def _item_loan_kopecks(item: Dict, instant_price) -> int:
+        """Сумма выдачи за предмет: берём посчитанную в квоте, иначе считаем так же"""
+        if "loan_price_kopecks" in item:
+            return item["loan_price_kopecks"]
+        
+        from services.pricing_service import PricingService
+        return PricingService.calculate_item_loan_kopecks(money.to_kopecks(instant_price))
+    
+    @staticmethod
+    def _buyback_breakdown(deal: Dict) -> Dict[str, int]:
+        """Слагаемые выкупа в копейках из квоты или пересчётом от loan_amount"""
+        breakdown = deal.get("breakdown") or {}
+        if "interest_kopecks" in breakdown and "premium_kopecks" in breakdown:
+            return {
+                "interest": breakdown["interest_kopecks"],
+                "premium": breakdown["premium_kopecks"]
+            }
+        
+        from services.pricing_service import PricingService
+        term_config = deal.get("term_config") or {}
+        return PricingService.calculate_buyback_kopecks(
+            money.to_kopecks(deal["loan_amount"]),
+            {"interest": term_config.get("interest", 0), "premium": term_config.get("premium", 0)}
+        )
+    
     @staticmethod
     def calculate_hash(content: str) -> str:
         """Вычислить SHA-256 хэш содержимого"""
@@ -172,6 +202,7 @@ class ContractService:
         return ip
     
     @staticmethod
+    @timed("contract.generate_pdf")
     def generate_contract_pdf(deal: Dict, user: Dict, output_path: str) -> str:
         """
         Генерировать PDF договора с помощью reportlab
@@ -235,10 +266,10 @@ class ContractService:
                 price = item.get('instant_price', item.get('market_price', 0))
                 if isinstance(price, dict):
                     price = price.get('instant_price', 0)
-                loan = float(price) * 0.40
-                table_data.append([str(i), name, f"{float(price):.0f} RUB", f"{loan:.0f} RUB"])
+                loan_kopecks = ContractService._item_loan_kopecks(item, price)
+                table_data.append([str(i), name, f"{float(price):.0f} RUB", f"{money.format_rub(loan_kopecks)} RUB"])
             
-            table_data.append(['', 'ITOGO:', '', f"{deal.get('loan_amount', 0):.0f} RUB"])
+            table_data.append(['', 'ITOGO:', '', f"{money.format_rub(money.to_kopecks(deal.get('loan_amount', 0)))} RUB"])
             
             table = Table(table_data, colWidths=[1*cm, 8*cm, 3*cm, 3*cm])
             table.setStyle(TableStyle([
@@ -0,0 +1,327 @@
+"""
+Побочные эффекты сделки через outbox
+
+HTTP-обработчики только меняют сделку и ставят задачи в background_jobs
+в той же транзакции. Договор, трейды, выплата и уведомления выполняются
+в фоне через JobRunner с повторами; их статус виден в GET /api/deals/{deal_id}.
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy.orm import Session
+
+import models
+from config import get_settings
+from services.audit_log import audit_sink
+from services.contract_service import ContractService
+from services.deal_repository import DealRepository
+from services.http_clients import http_clients
+from services.job_queue import enqueue, enqueue_many, ensure_lease, job_handler
+from services.payment_service import PaymentService
+from services import telegram_service
+
+CONTRACT_PDF = "contract_pdf"
+TRADE_OFFER = "trade_offer"
+NOTIFY_NEW_DEAL = "notify_new_deal"
+PAYOUT = "payout"
+REVERSE_TRADE = "reverse_trade"
+TELEGRAM = "telegram"
+
+# Внешние системы (лимиты параллельности — settings.job_target_limits)
+TARGET_LOCAL = "local"
+TARGET_STEAM_BOT = "steam_bot"
+TARGET_YOOKASSA = "yookassa"
+TARGET_TELEGRAM = "telegram"
+
+# Уведомления, которые можно поставить в очередь
+TELEGRAM_EVENTS = {
+    "trade_accepted": telegram_service.notify_trade_accepted,
+    "buyback": telegram_service.notify_buyback,
+    "expiring": telegram_service.notify_expiring,
+    "default": telegram_service.notify_default,
+}
+
+
+def _key(job_type: str, deal_id: int) -> str:
+    return f"{job_type}:deal:{deal_id}"
+
+
+def _trade_items(deal: models.Deal) -> list:
+    """Состав трейда для steam_trades.items_json (название и цены — в каталоге и deal_items)"""
+    return [{"assetid": item.assetid, "item_id": item.item_id} for item in deal.items]
+
+
+class DealPipeline:
+    """Фоновые шаги после создания сделки"""
+
+    @staticmethod
+    def enqueue_creation_jobs(db: Session, deal: models.Deal, option_days: int, quote: Dict):
+        """
+        Поставить задачи по новой сделке в текущую транзакцию
+
+        Args:
+            deal: Сделка (уже с id после flush)
+            option_days: Срок опциона
+            quote: Результат PricingService.calculate_quote
+        """
+        enqueue(db, CONTRACT_PDF, deal_id=deal.id, payload={
+            "option_days": option_days,
+            "term_config": quote.get("term_config", {"interest": 0.15, "premium": 0.07}),
+            "breakdown": quote.get("breakdown", {})
+        }, target=TARGET_LOCAL, idempotency_key=_key(CONTRACT_PDF, deal.id))
+        enqueue(db, TRADE_OFFER, deal_id=deal.id,
+                target=TARGET_STEAM_BOT, idempotency_key=_key(TRADE_OFFER, deal.id))
+        enqueue(db, NOTIFY_NEW_DEAL, deal_id=deal.id,
+                target=TARGET_TELEGRAM, idempotency_key=_key(NOTIFY_NEW_DEAL, deal.id))
+
+    @staticmethod
+    def enqueue_activation_jobs(db: Session, deal: models.Deal) -> models.BackgroundJob:
+        """
+        Выплата и уведомление после получения скинов (сделка -> ACTIVE)
+
+        Ключ идемпотентности один на сделку: повторный accept или webhook
+        не создаст вторую выплату.
+
+        Returns:
+            Задача выплаты
+        """
+        payout_job = enqueue(db, PAYOUT, deal_id=deal.id, max_attempts=8,
+                             target=TARGET_YOOKASSA, idempotency_key=_key(PAYOUT, deal.id))
+        enqueue(db, TELEGRAM, deal_id=deal.id, payload={
+            "event": "trade_accepted",
+            "kwargs": {"deal_id": deal.id, "payout_amount": deal.loan_amount}
+        }, target=TARGET_TELEGRAM, idempotency_key=_key("telegram_trade_accepted", deal.id))
+        return payout_job
+
+    @staticmethod
+    def enqueue_buyback_jobs(db: Session, deal: models.Deal) -> models.BackgroundJob:
+        """
+        Обратный трейд и уведомление после оплаты выкупа (сделка -> BUYBACK)
+
+        Returns:
+            Задача обратного трейда
+        """
+        trade_job = enqueue(db, REVERSE_TRADE, deal_id=deal.id,
+                            target=TARGET_STEAM_BOT, idempotency_key=_key(REVERSE_TRADE, deal.id))
+        enqueue(db, TELEGRAM, deal_id=deal.id, payload={
+            "event": "buyback",
+            "kwargs": {"deal_id": deal.id, "amount": deal.buyback_price}
+        }, target=TARGET_TELEGRAM, idempotency_key=_key("telegram_buyback", deal.id))
+        return trade_job
+
+    @staticmethod
+    def enqueue_expiry_warning(db: Session, deal_id: int, buyback_price: float, option_expiry: datetime):
+        """Уведомление о скором окончании опциона"""
+        enqueue(db, TELEGRAM, deal_id=deal_id, payload={
+            "event": "expiring",
+            "kwargs": {
+                "deal_id": deal_id,
+                "buyback_price": buyback_price,
+                "option_expiry": option_expiry.strftime("%d.%m.%Y %H:%M")
+            }
+        }, target=TARGET_TELEGRAM, idempotency_key=_key("telegram_expiring", deal_id))
+
+    @staticmethod
+    def enqueue_default_jobs(db: Session, items_count: Dict[int, int]) -> int:
+        """
+        Уведомления о дефолте (скины можно продавать) — одним INSERT на пачку сделок
+
+        Args:
+            items_count: {deal_id: число скинов}
+        """
+        return enqueue_many(db, TELEGRAM, [
+            (deal_id, {
+                "event": "default",
+                "kwargs": {"deal_id": deal_id, "items_count": count}
+            }, _key("telegram_default", deal_id))
+            for deal_id, count in items_count.items()
+        ], target=TARGET_TELEGRAM)
+
+
+@job_handler(CONTRACT_PDF)
+async def render_contract(db: Session, job: models.BackgroundJob):
+    """Сгенерировать PDF договора (reportlab — в отдельном потоке)"""
+    deal = DealRepository.get(db, job.deal_id, user=True, items=True)
+    user = deal.user
+    payload = job.payload or {}
+
+    contract_path = await asyncio.to_thread(
+        ContractService.generate_contract_pdf,
+        deal={
+            "id": deal.id,
+            "market_total": deal.market_total,
+            "loan_amount": deal.loan_amount,
+            "buyback_price": deal.buyback_price,
+            "option_expiry": deal.option_expiry,
+            "option_days": payload.get("option_days", 14),
+            "signature_timestamp": deal.signature_timestamp,
+            "signature_sms_code": deal.signature_sms_code,
+            "items": deal.items_snapshot,
+            "created_at": deal.created_at or datetime.utcnow(),
+            "term_config": payload.get("term_config", {"interest": 0.15, "premium": 0.07}),
+            "breakdown": payload.get("breakdown", {})
+        },
+        user={
+            "steam_id": user.steam_id,
+            "phone": user.phone or "+7XXXXXXXXXX",
+            "passport_series": user.passport_series or "XXXX",
+            "passport_number": user.passport_number or "XXXXXX",
+            "full_name": "Клиент"
+        },
+        output_path=f"contracts/deal_{deal.id}.pdf"
+    )
+
+    deal.contract_pdf_url = contract_path
+
+
+@job_handler(TRADE_OFFER)
+async def create_trade_offer(db: Session, job: models.BackgroundJob):
+    """Создать Steam Trade Offer через бота"""
+    deal = DealRepository.get(db, job.deal_id, user=True, items=True)
+
+    # Трейд уже создан прошлой попыткой
+    if deal.initial_trade_id:
+        return
+
+    settings = get_settings()
+    ensure_lease(db, job)
+    async with http_clients.borrow("steam_bot") as client:
+        bot_response = await client.post(
+            f"{settings.steam_bot_url}/api/trade/create",
+            json={
+                "deal_id": deal.id,
+                "partner_steam_id": deal.user.steam_id,
+                "items": [
+                    {"assetid": item.assetid}
+                    for item in deal.items
+                ]
+            }
+        )
+    bot_response.raise_for_status()
+
+    trade_data = bot_response.json()
+    deal.initial_trade_id = trade_data.get("trade_offer_id")
+    deal.initial_trade_url = trade_data.get("trade_url")
+
+    db.add(models.SteamTrade(
+        deal_id=deal.id,
+        trade_offer_id=trade_data["trade_offer_id"],
+        trade_offer_url=trade_data["trade_url"],
+        is_incoming=True,
+        status=models.TradeStatus.SENT,
+        items_json=_trade_items(deal)
+    ))
+
+    print(f"[PIPELINE] Трейд создан: {trade_data['trade_url']}")
+
+
+@job_handler(NOTIFY_NEW_DEAL)
+async def notify_new_deal(db: Session, job: models.BackgroundJob):
+    """Уведомить админов о новой сделке в Telegram"""
+    deal = DealRepository.get(db, job.deal_id, user=True, items=True)
+    kyc = deal.kyc_snapshot or {}
+
+    ensure_lease(db, job)
+    sent = await telegram_service.notify_new_deal(
+        deal_id=deal.id,
+        loan_amount=deal.loan_amount,
+        items_count=len(deal.items),
+        user_name=kyc.get("full_name", deal.user.steam_username or "Клиент"),
+        phone=kyc.get("phone", "Не указан")
+    )
+
+    # Без токена бота уведомления отключены — повторять нечего
+    if telegram_service.BOT_TOKEN and not sent:
+        raise RuntimeError("Telegram не принял сообщение")
+
+
+@job_handler(PAYOUT)
+async def send_payout(db: Session, job: models.BackgroundJob):
+    """Выплатить сумму выдачи клиенту через ЮKassa/СБП"""
+    deal = DealRepository.get(db, job.deal_id, user=True)
+
+    # Выплата уже прошла прошлой попыткой
+    if deal.payout_transaction_id:
+        return
+
+    phone = None
+    if deal.kyc_snapshot and isinstance(deal.kyc_snapshot, dict):
+        phone = deal.kyc_snapshot.get("phone")
+    if not phone and deal.user:
+        phone = deal.user.phone
+
+    if not phone:
+        raise ValueError("Телефон не указан, выплата невозможна")
+
+    # Тот же ключ при каждом повторе: ЮKassa не проведёт выплату дважды
+    ensure_lease(db, job)
+    payout_id = await PaymentService.create_payout(
+        phone=phone,
+        amount=deal.loan_amount,
+        description=f"Выплата по сделке #{deal.id}",
+        deal_id=deal.id,
+        idempotence_key=job.idempotency_key
+    )
+    if not payout_id:
+        raise RuntimeError("ЮKassa не создала выплату")
+
+    deal.payout_transaction_id = payout_id
+    audit_sink.record_on_commit(
+        db,
+        "payout_sent",
+        user_id=deal.user_id,
+        deal_id=deal.id,
+        details={"payout_id": payout_id, "amount": deal.loan_amount}
+    )
+
+    print(f"[PIPELINE] ✅ Выплата {deal.loan_amount}₽ по сделке #{deal.id}: {payout_id}")
+
+
+@job_handler(REVERSE_TRADE)
+async def create_reverse_trade(db: Session, job: models.BackgroundJob):
+    """Вернуть скины клиенту после выкупа"""
+    deal = DealRepository.get(db, job.deal_id, user=True, items=True)
+
+    if deal.buyback_trade_id:
+        return
+
+    settings = get_settings()
+    ensure_lease(db, job)
+    async with http_clients.borrow("steam_bot") as client:
+        bot_response = await client.post(
+            f"{settings.steam_bot_url}/api/trade/reverse",
+            json={
+                "deal_id": deal.id,
+                "partner_steam_id": deal.user.steam_id,
+                "items": deal.items_snapshot
+            }
+        )
+    bot_response.raise_for_status()
+
+    trade_data = bot_response.json()
+    deal.buyback_trade_id = trade_data.get("trade_offer_id")
+
+    db.add(models.SteamTrade(
+        deal_id=deal.id,
+        trade_offer_id=trade_data["trade_offer_id"],
+        trade_offer_url=trade_data["trade_url"],
+        is_incoming=False,
+        status=models.TradeStatus.SENT,
+        items_json=_trade_items(deal)
+    ))
+
+    print(f"[PIPELINE] Обратный трейд создан: {trade_data['trade_url']}")
+
+
+@job_handler(TELEGRAM)
+async def send_telegram_event(db: Session, job: models.BackgroundJob):
+    """Уведомление админам из TELEGRAM_EVENTS"""
+    payload = job.payload or {}
+    notify = TELEGRAM_EVENTS[payload["event"]]
+
+    ensure_lease(db, job)
+    sent = await notify(**payload.get("kwargs", {}))
+
+    if telegram_service.BOT_TOKEN and not sent:
+        raise RuntimeError("Telegram не принял сообщение")
@@ -0,0 +1,134 @@
+"""
+Выборки сделок с явной стратегией загрузки связей
+
+Обработчики не обращаются к ленивым связям: всё, что нужно ответу или
+задаче, перечисляется при выборке и приходит фиксированным числом запросов
+независимо от числа скинов и задач:
+  - user (many-to-one)  — joinedload, тем же запросом;
+  - items (one-to-many) — selectinload, один запрос по IN
+    (предмет каталога DealItem подтягивает JOIN-ом);
+  - jobs (one-to-many)  — selectinload, один запрос по IN.
+
+Запросы — Select, поэтому одинаково работают в Session и AsyncSession
+(ленивая загрузка в AsyncSession недоступна вовсе). Число запросов на
+эндпоинт проверяет tests/test_query_counts.py.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+import models
+
+Deal = models.Deal
+
+
+def _with_relations(stmt: Select, user: bool = False, items: bool = False, jobs: bool = False) -> Select:
+    options = []
+    if user:
+        options.append(joinedload(Deal.user))
+    if items:
+        options.append(selectinload(Deal.items))
+    if jobs:
+        options.append(selectinload(Deal.jobs))
+    return stmt.options(*options) if options else stmt
+
+
+class DealRepository:
+    """Запросы сделок для API и фоновых задач"""
+
+    @staticmethod
+    def by_id(deal_id: int, user: bool = False, items: bool = False, jobs: bool = False) -> Select:
+        """Сделка по id с перечисленными связями"""
+        return _with_relations(select(Deal).where(Deal.id == deal_id), user, items, jobs)
+
+    @staticmethod
+    def get(db: Session, deal_id: int, user: bool = False, items: bool = False, jobs: bool = False) -> Optional[models.Deal]:
+        return db.scalar(DealRepository.by_id(deal_id, user, items, jobs))
+
+    @staticmethod
+    def by_user(user_id: int) -> Select:
+        """Сделки пользователя со скинами (GET /api/deals)"""
+        return _with_relations(select(Deal).where(Deal.user_id == user_id), items=True)
+
+    @staticmethod
+    def by_trade_offer(trade_offer_id: str) -> Select:
+        """Сделка по id трейда Steam — одним JOIN вместо трейд -> сделка"""
+        return (
+            select(Deal)
+            .join(models.SteamTrade, models.SteamTrade.deal_id == Deal.id)
+            .where(models.SteamTrade.trade_offer_id == trade_offer_id)
+            .limit(1)
+        )
+
+    @staticmethod
+    def first_pending() -> Select:
+        """Самая старая ожидающая сделка и число её скинов (без загрузки всех PENDING)"""
+        return (
+            select(
+                Deal.id,
+                select(func.count(models.DealItem.id))
+                .where(models.DealItem.deal_id == Deal.id)
+                .scalar_subquery()
+                .label("items_count")
+            )
+            .where(Deal.deal_status == models.DealStatus.PENDING)
+            .order_by(Deal.id)
+            .limit(1)
+        )
+
+    @staticmethod
+    def pending(items: bool = False) -> Select:
+        """Ожидающие сделки (админка)"""
+        return _with_relations(
+            select(Deal).where(Deal.deal_status == models.DealStatus.PENDING).order_by(Deal.id),
+            items=items
+        )
+
+    @staticmethod
+    def detail_stamps(deal_id: int) -> Select:
+        """
+        Отметки изменений всего, из чего собран GET /api/deals/{id}: сделка,
+        пользователь, задачи — одним запросом без загрузки связей
+        """
+        job = models.BackgroundJob
+        return (
+            select(
+                Deal.updated_at,
+                Deal.deal_status,
+                Deal.option_expiry,
+                models.User.last_login,
+                func.count(job.id),
+                func.max(func.coalesce(job.updated_at, job.created_at))
+            )
+            .join(Deal.user)
+            .outerjoin(Deal.jobs)
+            .where(Deal.id == deal_id)
+            .group_by(Deal.id, models.User.id)
+        )
+
+    @staticmethod
+    def detail_version(
+        updated_at: Optional[datetime],
+        deal_status: models.DealStatus,
+        option_expiry: datetime,
+        user_last_login: Optional[datetime],
+        jobs_count: int,
+        jobs_changed_at: Optional[datetime],
+        now: datetime
+    ) -> str:
+        """Версия ответа GET /api/deals/{id} (ETag): меняется с любой отметкой и с днями до конца опциона"""
+        days_left = "expired" if now > option_expiry else (option_expiry - now).days
+        return "|".join(str(part) for part in (
+            updated_at, deal_status.value, days_left, user_last_login, jobs_count, jobs_changed_at
+        ))
+
+    @staticmethod
+    def loaded_detail_version(deal: models.Deal, now: datetime) -> str:
+        """detail_version по загруженной сделке (user и jobs загружены)"""
+        changed = [stamp for stamp in (job.updated_at or job.created_at for job in deal.jobs) if stamp]
+        return DealRepository.detail_version(
+            deal.updated_at, deal.deal_status, deal.option_expiry, deal.user.last_login,
+            len(deal.jobs), max(changed) if changed else None, now
+        )
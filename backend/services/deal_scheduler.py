@@ -0,0 +1,408 @@
+"""
+Планировщик сроков сделок
+
+Вместо cron-эндпоинтов, которые каждый раз перебирают все ACTIVE сделки,
+держим в памяти кучу таймеров по option_expiry и спим до ближайшего.
+При срабатывании переходы применяются bulk UPDATE с условием на статус,
+поэтому каждое событие (предупреждение за 24ч, дефолт) случается ровно один
+раз — даже если сделка попала в кучу дважды или работают два процесса.
+После рестарта куча восстанавливается индексным запросом
+(ix_deals_status_expiry).
+
+Сделки активирует API, а планировщик может работать в отдельном воркере
+(jobs_in_api=False): раз в RESYNC_SECONDS он дочитывает тем же индексом
+сделки, чьи таймеры наступят до следующей дочитки. schedule() только
+ускоряет срабатывание в процессе, где работает цикл, и без него ничего не
+делает. Запросы к БД идут в потоке, чтобы не блокировать event loop.
+"""
+import asyncio
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import Boolean, func, select, update
+from sqlalchemy.orm import Session
+
+import models
+import money
+from config import get_settings
+from database import SessionLocal
+from services.deal_pipeline import DealPipeline
+from services.job_queue import job_runner
+from services.stats_service import StatsService
+
+EXPIRY = "expiry"
+WARNING = "warning"
+
+EXPIRY_BATCH_SIZE = 1000  # Сделок на один UPDATE ... RETURNING
+MAX_SLEEP_SECONDS = 3600.0  # Перепроверка раз в час на случай сдвига часов
+RETRY_SECONDS = 30.0  # Повтор при ошибке БД
+RESYNC_SECONDS = 60.0  # Дочитка сделок, активированных другим процессом
+
+
+class DealLifecycle:
+    """Массовые переходы по срокам (без загрузки сделок в Python)"""
+
+    @staticmethod
+    def expire_deals(
+        db: Session,
+        deal_ids: Optional[Iterable[int]] = None,
+        now: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[int]:
+        """
+        Перевести просроченные ACTIVE сделки в DEFAULT
+
+        Один UPDATE ... RETURNING на пачку, аудит и уведомления — по INSERT
+        на пачку (без загрузки сделок в ORM).
+
+        Args:
+            deal_ids: Ограничить этими сделками (None — все просроченные)
+            now: Текущее время (UTC)
+            limit: Не больше стольких сделок за вызов (только без deal_ids)
+
+        Returns:
+            ID сделок, переведённых в дефолт именно этим вызовом
+        """
+        now = now or datetime.utcnow()
+        if deal_ids is None:
+            return DealLifecycle._expire_batch(db, now, limit=limit)
+
+        expired = []
+        deal_ids = list(deal_ids)
+        for start in range(0, len(deal_ids), EXPIRY_BATCH_SIZE):
+            expired.extend(DealLifecycle._expire_batch(db, now, deal_ids=deal_ids[start:start + EXPIRY_BATCH_SIZE]))
+        return expired
+
+    @staticmethod
+    def _expire_batch(
+        db: Session,
+        now: datetime,
+        deal_ids: Optional[List[int]] = None,
+        limit: Optional[int] = None
+    ) -> List[int]:
+        due = (
+            models.Deal.deal_status == models.DealStatus.ACTIVE,
+            models.Deal.option_expiry <= now
+        )
+        recheck = due
+        if db.get_bind().dialect.name == "sqlite":
+            # Без ANALYZE SQLite берёт ix_deals_status_expiry и для UPDATE по списку id —
+            # просмотр всего диапазона на каждую пачку; likely() оставляет поиск по первичному ключу
+            recheck = tuple(func.likely(condition, type_=Boolean) for condition in due)
+
+        stmt = update(models.Deal).where(*recheck)
+        if deal_ids is not None:
+            stmt = stmt.where(models.Deal.id.in_(deal_ids))
+        elif limit is not None:
+            # UPDATE ... LIMIT есть не во всех БД — пачка через подзапрос по ix_deals_status_expiry
+            stmt = stmt.where(models.Deal.id.in_(
+                select(models.Deal.id).where(*due).order_by(models.Deal.option_expiry).limit(limit)
+            ))
+
+        rows = db.execute(
+            stmt.values(deal_status=models.DealStatus.DEFAULT)
+            .returning(
+                models.Deal.id, models.Deal.user_id, models.Deal.option_expiry,
+                models.Deal.loan_amount, models.Deal.buyback_price
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not rows:
+            return []
+
+        # Массовый UPDATE мимо ORM — статистику обновляем явно
+        StatsService.record_transitions(db.connection(), [
+            (user_id, models.DealStatus.ACTIVE, models.DealStatus.DEFAULT,
+             money.to_kopecks(loan_amount), money.to_kopecks(buyback_price))
+            for _, user_id, _, loan_amount, buyback_price in rows
+        ])
+        db.execute(models.AuditLog.__table__.insert(), [
+            {
+                "user_id": user_id,
+                "deal_id": deal_id,
+                "action": "deal_defaulted",
+                "details": {
+                    "deal_id": deal_id,
+                    "reason": "option_expired",
+                    "expired_at": option_expiry.isoformat()
+                }
+            }
+            for deal_id, user_id, option_expiry, *_ in rows
+        ])
+
+        expired = [row[0] for row in rows]
+        items_count = dict(db.execute(
+            select(models.DealItem.deal_id, func.count(models.DealItem.id))
+            .where(models.DealItem.deal_id.in_(expired))
+            .group_by(models.DealItem.deal_id)
+        ).all())
+        DealPipeline.enqueue_default_jobs(db, {deal_id: items_count.get(deal_id, 0) for deal_id in expired})
+        return expired
+
+    @staticmethod
+    def expire_all(
+        session_factory: Callable[[], Session] = SessionLocal,
+        now: Optional[datetime] = None,
+        batch_size: int = EXPIRY_BATCH_SIZE
+    ) -> List[int]:
+        """
+        Перевести в дефолт все просроченные сделки пачками, commit после каждой
+
+        Транзакции короткие: блокировки строк и память не растут с числом
+        сделок, прерванный проход продолжится со следующей пачки.
+
+        Returns:
+            ID сделок, переведённых в дефолт
+        """
+        now = now or datetime.utcnow()
+        expired: List[int] = []
+        while True:
+            db = session_factory()
+            try:
+                batch = DealLifecycle.expire_deals(db, now=now, limit=batch_size)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+            expired.extend(batch)
+            if batch:
+                job_runner.wake()
+            if len(batch) < batch_size:
+                return expired
+
+    @staticmethod
+    def send_expiry_warnings(db: Session, deal_ids: Optional[Iterable[int]] = None, now: Optional[datetime] = None) -> List[int]:
+        """
+        Отметить и поставить в очередь предупреждения об окончании опциона
+
+        Returns:
+            ID сделок, по которым предупреждение отправлено этим вызовом
+        """
+        now = now or datetime.utcnow()
+        window = timedelta(hours=get_settings().expiry_warning_hours)
+        stmt = update(models.Deal).where(
+            models.Deal.deal_status == models.DealStatus.ACTIVE,
+            models.Deal.expiry_warning_sent_at.is_(None),
+            models.Deal.option_expiry > now,
+            models.Deal.option_expiry <= now + window
+        )
+        if deal_ids is not None:
+            stmt = stmt.where(models.Deal.id.in_(list(deal_ids)))
+
+        rows = db.execute(
+            stmt.values(expiry_warning_sent_at=now)
+            .returning(models.Deal.id, models.Deal.buyback_price, models.Deal.option_expiry)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        for deal_id, buyback_price, option_expiry in rows:
+            DealPipeline.enqueue_expiry_warning(db, deal_id, buyback_price, option_expiry)
+
+        return [row[0] for row in rows]
+
+
+def _utc(value: datetime) -> datetime:
+    """Время таймера в aware UTC: PostgreSQL отдаёт aware, SQLite и utcnow() — naive UTC"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class DealScheduler:
+    """Куча таймеров по срокам активных сделок (время — aware UTC)"""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._timers: Set[Tuple[int, str]] = set()  # Уже в куче: дочитка не дублирует
+        self._lock = threading.Lock()  # Куча меняется и в потоке (fire_due), и в event loop (schedule)
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        """Запустить планировщик (из lifespan приложения или воркера)"""
+        if self._loop_task is None:
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, deal_id: int, option_expiry: datetime, warning_sent: bool = False):
+        """
+        Поставить таймеры сделки (после перехода в ACTIVE)
+
+        Без цикла в этом процессе ничего не делает: сделку дочитает
+        планировщик воркера (sync_window).
+        """
+        if self._loop_task is None:
+            return
+        self._push(deal_id, option_expiry, warning_sent)
+        self._wakeup.set()
+
+    def _push(self, deal_id: int, option_expiry: datetime, warning_sent: bool):
+        option_expiry = _utc(option_expiry)
+        warning_at = option_expiry - timedelta(hours=get_settings().expiry_warning_hours)
+        with self._lock:
+            if not warning_sent and (deal_id, WARNING) not in self._timers:
+                self._timers.add((deal_id, WARNING))
+                heapq.heappush(self._heap, (warning_at, deal_id, WARNING))
+            if (deal_id, EXPIRY) not in self._timers:
+                self._timers.add((deal_id, EXPIRY))
+                heapq.heappush(self._heap, (option_expiry, deal_id, EXPIRY))
+
+    def _active_deals(self, until: Optional[datetime] = None) -> List[Tuple[int, datetime, Optional[datetime]]]:
+        db = self.session_factory()
+        try:
+            query = db.query(
+                models.Deal.id, models.Deal.option_expiry, models.Deal.expiry_warning_sent_at
+            ).filter(
+                models.Deal.deal_status == models.DealStatus.ACTIVE
+            )
+            if until is not None:
+                query = query.filter(models.Deal.option_expiry <= until)
+            return query.order_by(models.Deal.option_expiry).all()
+        finally:
+            db.close()
+
+    def rebuild(self) -> int:
+        """
+        Восстановить кучу из БД (при старте)
+
+        Returns:
+            Количество активных сделок
+        """
+        rows = self._active_deals()
+
+        heap, timers = [], set()
+        warning_delta = timedelta(hours=get_settings().expiry_warning_hours)
+        for deal_id, option_expiry, warning_sent_at in rows:
+            option_expiry = _utc(option_expiry)
+            if warning_sent_at is None:
+                heap.append((option_expiry - warning_delta, deal_id, WARNING))
+                timers.add((deal_id, WARNING))
+            heap.append((option_expiry, deal_id, EXPIRY))
+            timers.add((deal_id, EXPIRY))
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap, self._timers = heap, timers
+
+        print(f"[SCHEDULER] Активных сделок: {len(rows)}, таймеров: {len(heap)}")
+        return len(rows)
+
+    def sync_window(self, now: Optional[datetime] = None) -> int:
+        """
+        Дочитать сделки, активированные после rebuild() (в том числе другим процессом)
+
+        Берутся только ACTIVE сделки, чьи таймеры наступят до следующей
+        дочитки (диапазон по ix_deals_status_expiry); уже поставленные
+        таймеры не дублируются.
+
+        Returns:
+            Количество новых таймеров
+        """
+        now = _utc(now or datetime.utcnow()).replace(tzinfo=None)
+        horizon = now + timedelta(hours=get_settings().expiry_warning_hours, seconds=2 * RESYNC_SECONDS)
+        before = len(self._heap)
+        for deal_id, option_expiry, warning_sent_at in self._active_deals(until=horizon):
+            self._push(deal_id, option_expiry, warning_sent_at is not None)
+        return len(self._heap) - before
+
+    def _seconds_until_next(self, now: datetime) -> float:
+        if not self._heap:
+            return MAX_SLEEP_SECONDS
+        delay = (self._heap[0][0] - _utc(now)).total_seconds()
+        return min(max(delay, 0.0), MAX_SLEEP_SECONDS)
+
+    def fire_due(self, now: Optional[datetime] = None) -> Dict[str, List[int]]:
+        """
+        Обработать сработавшие таймеры одной транзакцией
+
+        Returns:
+            {"expired": [...], "warned": [...]} — сделки, изменённые этим вызовом
+        """
+        now_utc = _utc(now or datetime.utcnow())
+        now = now_utc.replace(tzinfo=None)  # В запросы — naive UTC, как в остальном коде сделок
+        due: List[Tuple[datetime, int, str]] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now_utc:
+                _, deal_id, event = timer = heapq.heappop(self._heap)
+                self._timers.discard((deal_id, event))
+                due.append(timer)
+
+        if not due:
+            return {"expired": [], "warned": []}
+
+        expiry_ids = {deal_id for _, deal_id, event in due if event == EXPIRY}
+        warning_ids = {deal_id for _, deal_id, event in due if event == WARNING} - expiry_ids
+
+        db = self.session_factory()
+        try:
+            expired = DealLifecycle.expire_deals(db, expiry_ids, now) if expiry_ids else []
+            warned = DealLifecycle.send_expiry_warnings(db, warning_ids, now) if warning_ids else []
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Вернуть таймеры и повторить позже
+            retry_at = now_utc + timedelta(seconds=RETRY_SECONDS)
+            with self._lock:
+                for _, deal_id, event in due:
+                    if (deal_id, event) not in self._timers:
+                        self._timers.add((deal_id, event))
+                        heapq.heappush(self._heap, (retry_at, deal_id, event))
+            raise
+        finally:
+            db.close()
+
+        if expired or warned:
+            print(f"[SCHEDULER] Дефолт: {len(expired)}, предупреждений: {len(warned)}")
+            job_runner.wake()
+
+        return {"expired": expired, "warned": warned}
+
+    async def _run_loop(self):
+        loaded = False
+        next_sync = 0.0
+
+        while True:
+            try:
+                # rebuild — тоже в цикле: ошибка БД при старте не должна останавливать планировщик
+                if not loaded:
+                    await asyncio.to_thread(self.rebuild)
+                    loaded = True
+                    next_sync = time.monotonic() + RESYNC_SECONDS
+                elif time.monotonic() >= next_sync:
+                    await asyncio.to_thread(self.sync_window)
+                    next_sync = time.monotonic() + RESYNC_SECONDS
+                await asyncio.to_thread(self.fire_due)
+                timeout = min(
+                    self._seconds_until_next(datetime.utcnow()),
+                    max(next_sync - time.monotonic(), 0.0)
+                )
+            except Exception as e:
+                # Цикл не должен умирать: иначе сроки больше не обрабатываются до рестарта
+                print(f"[SCHEDULER] Ошибка обработки сроков: {e}")
+                timeout = RETRY_SECONDS
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+# Общий экземпляр для приложения
+deal_scheduler = DealScheduler()
@@ -0,0 +1,233 @@
+"""
+Проверки зависимостей в фоне для /health
+
+/health не ходит во внешние системы: каждая проверка (Probe) выполняется
+в фоне по своему расписанию и с таймаутом, результат и гистограмма задержек
+лежат в памяти, эндпоинт отдаёт готовый снимок.
+  - critical — ошибка проверки переводит сервис в degraded;
+  - результат старше stale_after (проверка зависла или монитор не запущен
+    в этом процессе) — статус stale, для critical тоже degraded.
+Интервалы — health_probe_intervals в настройках.
+"""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from cache import cache
+from config import get_settings
+from database import async_engine
+from services.http_clients import http_clients
+from services.market_csgo_service import MarketCSGOService
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+OK = "ok"
+ERROR = "error"
+UNKNOWN = "unknown"
+STALE = "stale"
+
+
+@dataclass
+class Probe:
+    name: str
+    check: Callable[[], Awaitable[Optional[Dict]]]  # Исключение — ошибка; dict — подробности
+    interval: float
+    timeout: float = 5.0
+    critical: bool = False
+
+    @property
+    def stale_after(self) -> float:
+        return max(self.interval * 3, self.interval + self.timeout * 2)
+
+
+class ProbeState:
+    """Последний результат проверки и гистограмма её задержек"""
+
+    def __init__(self):
+        self.status = UNKNOWN
+        self.error: Optional[str] = None
+        self.details: Dict = {}
+        self.checked_at: Optional[datetime] = None
+        self.checked_monotonic: Optional[float] = None
+        self.latency_seconds = 0.0
+        self.consecutive_failures = 0
+        self.count = 0
+        self.latency_seconds_total = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # Последний — больше всех границ
+        self._lock = threading.Lock()
+
+    def observe(self, latency: float, error: Optional[str], details: Optional[Dict]):
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound), len(LATENCY_BUCKETS))
+        with self._lock:
+            self.status = OK if error is None else ERROR
+            self.error = error
+            self.details = details or {}
+            self.checked_at = datetime.utcnow()
+            self.checked_monotonic = time.monotonic()
+            self.latency_seconds = latency
+            self.consecutive_failures = 0 if error is None else self.consecutive_failures + 1
+            self.count += 1
+            self.latency_seconds_total += latency
+            self.buckets[bucket] += 1
+
+    def current_status(self, stale_after: float) -> str:
+        if self.checked_monotonic is None:
+            return UNKNOWN
+        if time.monotonic() - self.checked_monotonic > stale_after:
+            return STALE
+        return self.status
+
+    def snapshot(self, stale_after: float) -> Dict:
+        with self._lock:
+            return {
+                "status": self.current_status(stale_after),
+                "error": self.error,
+                "latency_ms": round(self.latency_seconds * 1000, 3),
+                "checked_at": self.checked_at.isoformat() if self.checked_at else None,
+                "consecutive_failures": self.consecutive_failures,
+                **self.details
+            }
+
+    def histogram(self) -> Dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum_ms": round(self.latency_seconds_total * 1000, 3),
+                "buckets": dict(zip([*map(str, LATENCY_BUCKETS), "+Inf"], self.buckets)),
+            }
+
+
+class HealthMonitor:
+    """Фоновые проверки: по задаче на зависимость, снимок для /health"""
+
+    def __init__(self, probes: List[Probe] = ()):
+        self.probes: Dict[str, Probe] = {}
+        self.states: Dict[str, ProbeState] = {}
+        self._tasks: List[asyncio.Task] = []
+        for probe in probes:
+            self.register(probe)
+
+    def register(self, probe: Probe):
+        self.probes[probe.name] = probe
+        self.states[probe.name] = ProbeState()
+
+    async def run_probe(self, name: str) -> ProbeState:
+        """Выполнить проверку один раз и запомнить результат"""
+        probe = self.probes[name]
+        error = None
+        details = None
+        started = time.perf_counter()
+        try:
+            details = await asyncio.wait_for(probe.check(), probe.timeout)
+        except asyncio.TimeoutError:
+            error = f"timeout {probe.timeout:g} s"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        state = self.states[name]
+        state.observe(time.perf_counter() - started, error, details)
+        if error is not None and state.consecutive_failures == 1:
+            print(f"[HEALTH] {name}: {error}")
+        return state
+
+    async def _run_loop(self, probe: Probe):
+        while True:
+            await self.run_probe(probe.name)
+            await asyncio.sleep(probe.interval)
+
+    def start(self):
+        """Запустить проверки (из lifespan приложения)"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run_loop(probe)) for probe in self.probes.values()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def report(self) -> Dict:
+        """Снимок для /health — без обращений к зависимостям"""
+        probes = {name: self.states[name].snapshot(probe.stale_after) for name, probe in self.probes.items()}
+        critical = [probes[name]["status"] for name, probe in self.probes.items() if probe.critical]
+        if any(status in (ERROR, STALE) for status in critical):
+            status = "degraded"
+        elif any(status == UNKNOWN for status in critical):
+            status = "starting"
+        else:
+            status = "ok"
+        return {
+            "status": status,
+            "timestamp": datetime.utcnow().isoformat(),
+            "checks": {name: probe["status"] for name, probe in probes.items()},
+            "probes": probes,
+        }
+
+    def latency(self) -> Dict[str, Dict]:
+        """Гистограммы задержек проверок по зависимостям"""
+        return {name: state.histogram() for name, state in self.states.items()}
+
+
+# ---------- Проверки ----------
+
+async def check_database() -> None:
+    async with async_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+async def check_redis() -> Dict:
+    if not cache.redis_url:
+        return {"enabled": False}
+    if not await cache.ping():
+        raise ConnectionError("Redis недоступен, кэш работает только на L1")
+    return {"enabled": True}
+
+
+async def check_steam_api() -> None:
+    async with http_clients.borrow("steam") as client:
+        response = await client.get("https://api.steampowered.com/ISteamWebAPIUtil/GetServerInfo/v1/")
+        response.raise_for_status()
+
+
+async def check_steam_bot() -> Dict:
+    async with http_clients.borrow("steam_bot") as client:
+        response = await client.get(f"{get_settings().steam_bot_url}/health")
+        response.raise_for_status()
+        return {"steam_connected": response.json().get("steam_connected")}
+
+
+async def check_market_csgo() -> Dict:
+    # HEAD: доступность прайс-листа без загрузки всех цен
+    async with http_clients.borrow("market_csgo") as client:
+        response = await client.head("https://market.csgo.com/api/v2/prices/RUB.json")
+        response.raise_for_status()
+    return {"prices": MarketCSGOService.get_cache_stats()}
+
+
+def default_probes() -> List[Probe]:
+    settings = get_settings()
+    intervals = settings.get_health_probe_intervals()
+    timeout = settings.health_probe_timeout_seconds
+    checks = [
+        ("database", check_database, True),
+        ("redis", check_redis, False),
+        ("steam_bot", check_steam_bot, False),
+        ("steam_api", check_steam_api, True),
+        ("market_csgo", check_market_csgo, False),
+    ]
+    return [
+        Probe(name, check, intervals[name], timeout, critical)
+        for name, check, critical in checks
+        if name in intervals
+    ]
+
+
+health_monitor = HealthMonitor(default_probes())
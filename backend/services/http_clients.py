@@ -0,0 +1,198 @@
+"""
+Общие HTTP-клиенты внешних систем
+
+Один httpx.AsyncClient на внешнюю систему (upstream) со своим пулом
+соединений, таймаутами и keep-alive: запросы переиспользуют открытые
+TCP/TLS-соединения вместо нового рукопожатия на каждый вызов. Имена
+upstream совпадают с target фоновых задач (steam_bot, yookassa, telegram).
+
+HTTP/2 включается, если установлен пакет h2 (httpx[http2]) и upstream его
+поддерживает; иначе — HTTP/1.1 с keep-alive.
+
+Клиенты создаются в lifespan (http_clients.start) и закрываются при
+остановке; вне приложения (воркер, скрипты) — при первом обращении.
+Соединения пула привязаны к event loop, поэтому в другом loop клиент
+создаётся заново. Клиенты не хранят cookies: авторизация — заголовками
+конкретного запроса.
+"""
+import asyncio
+import threading
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from config import get_settings
+from metrics import upstream_duration
+from tracing import TracingTransport
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@dataclass(frozen=True)
+class Upstream:
+    """Параметры клиента внешней системы"""
+    timeout: float
+    connect_timeout: float = 5.0
+    max_connections: int = 10
+    max_keepalive: int = 5
+    http2: bool = True
+    follow_redirects: bool = False
+    propagate_trace: bool = False  # Передавать traceparent (только свои сервисы)
+
+
+UPSTREAMS: Dict[str, Upstream] = {
+    # steamcommunity.com и api.steampowered.com: инвентари, профили, OpenID
+    "steam": Upstream(timeout=30.0, max_connections=20, max_keepalive=10, follow_redirects=True),
+    "market_csgo": Upstream(timeout=60.0),
+    "yookassa": Upstream(timeout=30.0),
+    "telegram": Upstream(timeout=10.0),
+    "sms": Upstream(timeout=10.0, max_connections=5, max_keepalive=2),
+    "kyc": Upstream(timeout=30.0, max_connections=5, max_keepalive=2),
+    "sbp": Upstream(timeout=30.0, max_connections=5, max_keepalive=2),
+    # Сторонние агрегаторы цен (pricempire, csgobackpack, steamapis)
+    "prices": Upstream(timeout=15.0),
+    # Локальный бот по http — HTTP/2 без TLS не согласуется
+    "steam_bot": Upstream(timeout=30.0, http2=False, propagate_trace=True),
+}
+
+
+class ClientMetrics:
+    """Запросы и новые соединения клиента: доля переиспользованных соединений"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.connect_seconds_total = 0.0
+        self.http_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    async def on_request(self, request: httpx.Request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._connection_trace()
+        request.extensions["started"] = time.perf_counter()
+
+    def _connection_trace(self):
+        """Трассировка httpcore одного запроса: открытие TCP и TLS-рукопожатие"""
+        step_started = {}
+
+        async def trace(event_name: str, info: Dict):
+            if event_name == "connection.connect_tcp.started":
+                step_started["at"] = time.perf_counter()
+            elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                now = time.perf_counter()
+                with self._lock:
+                    if event_name == "connection.connect_tcp.complete":
+                        self.connections += 1
+                    else:
+                        self.tls_handshakes += 1
+                    self.connect_seconds_total += now - step_started.get("at", now)
+                step_started["at"] = now
+
+        return trace
+
+    async def on_response(self, response: httpx.Response):
+        started = response.request.extensions.get("started")
+        if started is not None:
+            upstream_duration.observe(time.perf_counter() - started, upstream=self.name, status=response.status_code)
+        with self._lock:
+            self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            reused = max(self.requests - self.connections, 0)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections,
+                "tls_handshakes": self.tls_handshakes,
+                "reused_requests": reused,
+                "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+                "connect_avg_ms": round(self.connect_seconds_total / self.connections * 1000, 3) if self.connections else 0.0,
+                "http_versions": dict(self.http_versions),
+            }
+
+
+class HttpClientRegistry:
+    """Реестр клиентов по upstream (см. UPSTREAMS)"""
+
+    def __init__(self, upstreams: Optional[Dict[str, Upstream]] = None):
+        self.upstreams = upstreams if upstreams is not None else UPSTREAMS
+        self.metrics: Dict[str, ClientMetrics] = {name: ClientMetrics(name) for name in self.upstreams}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._loops: Dict[str, asyncio.AbstractEventLoop] = {}
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        upstream = self.upstreams[name]
+        metrics = self.metrics[name]
+        settings = get_settings()
+        transport = httpx.AsyncHTTPTransport(
+            http2=upstream.http2 and settings.http2_enabled and HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=upstream.max_connections,
+                max_keepalive_connections=upstream.max_keepalive,
+                keepalive_expiry=settings.http_keepalive_expiry_seconds
+            )
+        )
+        return httpx.AsyncClient(
+            transport=TracingTransport(transport, name, propagate=upstream.propagate_trace),
+            timeout=httpx.Timeout(upstream.timeout, connect=upstream.connect_timeout),
+            follow_redirects=upstream.follow_redirects,
+            # Клиент общий для всех пользователей: Set-Cookie одного ответа не должен уйти в чужой запрос
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+            event_hooks={"request": [metrics.on_request], "response": [metrics.on_response]}
+        )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Клиент upstream (вызывать внутри event loop)
+
+        Raises:
+            KeyError: upstream не описан в UPSTREAMS
+        """
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(name)
+        if client is None or client.is_closed or self._loops.get(name) is not loop:
+            if name not in self.upstreams:
+                raise KeyError(f"Неизвестный upstream: {name}")
+            client = self._clients[name] = self._create(name)
+            self._loops[name] = loop
+        return client
+
+    @asynccontextmanager
+    async def borrow(self, name: str) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        Клиент upstream в блоке async with
+
+        Клиент общий: на выходе из блока не закрывается, соединения остаются в пуле.
+        """
+        yield self.get(name)
+
+    async def start(self):
+        """Создать клиенты всех upstream (lifespan приложения)"""
+        for name in self.upstreams:
+            self.get(name)
+        print(f"[HTTP] Клиенты: {', '.join(self.upstreams)} (HTTP/2: {'да' if HTTP2_AVAILABLE else 'нет, нет пакета h2'})")
+
+    async def aclose(self):
+        """Закрыть клиенты и их соединения"""
+        clients, self._clients = self._clients, {}
+        self._loops = {}
+        for client in clients.values():
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Переиспользование соединений по upstream (для мониторинга)"""
+        return {name: metrics.snapshot() for name, metrics in self.metrics.items()}
+
+
+http_clients = HttpClientRegistry()
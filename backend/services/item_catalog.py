@@ -0,0 +1,199 @@
+"""
+Каталог предметов
+
+market_hash_name, иконка, редкость и тип скина хранятся один раз в
+item_catalog; прайс-лист, deal_items и steam_trades ссылаются на предмет
+по целому item_id. В памяти процесса — интернированная карта
+market_hash_name -> item_id и статичные данные по id (загружается при старте,
+дополняется по мере появления новых предметов).
+
+Новые имена добавляются INSERT ... ON CONFLICT DO NOTHING, поэтому
+несколько процессов не создают дубликатов. В память попадают только
+закоммиченные строки (load при старте, ensure_names для прайс-листа):
+id из транзакции, которая ещё может откатиться, там не кешируется.
+"""
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+import models
+
+STEAM_ICON_CDN = "https://community.cloudflare.steamstatic.com/economy/image/"
+
+# Ограничение числа параметров в одном IN / INSERT (SQLite — 32766)
+CHUNK_SIZE = 500
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogEntry:
+    """Статичные данные предмета"""
+    id: int
+    market_hash_name: str
+    icon_path: Optional[str]
+    rarity: Optional[str]
+    item_type: Optional[str]
+
+    @property
+    def icon_url(self) -> Optional[str]:
+        return f"{STEAM_ICON_CDN}{self.icon_path}" if self.icon_path else None
+
+
+def _icon_path(icon_url: Optional[str]) -> Optional[str]:
+    """Полный URL иконки Steam -> хэш (адрес CDN одинаковый у всех)"""
+    if not icon_url:
+        return None
+    if icon_url.startswith(STEAM_ICON_CDN):
+        return icon_url[len(STEAM_ICON_CDN):] or None
+    return icon_url
+
+
+def _chunks(values: List, size: int = CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class ItemCatalog:
+    """Интернированная карта market_hash_name -> item_id"""
+
+    _ids: Dict[str, int] = {}
+    _entries: Dict[int, CatalogEntry] = {}
+
+    @staticmethod
+    def _remember(rows: Iterable):
+        for row in rows:
+            name = sys.intern(row.market_hash_name)
+            ItemCatalog._ids[name] = row.id
+            ItemCatalog._entries[row.id] = CatalogEntry(
+                row.id, name, row.icon_path,
+                sys.intern(row.rarity) if row.rarity else None,
+                sys.intern(row.item_type) if row.item_type else None
+            )
+
+    @staticmethod
+    def load(db: Session) -> int:
+        """
+        Загрузить весь каталог в память (при старте)
+
+        Returns:
+            Количество предметов
+        """
+        table = models.CatalogItem.__table__
+        ItemCatalog._remember(db.execute(select(table)).all())
+        print(f"[CATALOG] Предметов в каталоге: {len(ItemCatalog._ids)}")
+        return len(ItemCatalog._ids)
+
+    @staticmethod
+    def clear():
+        ItemCatalog._ids.clear()
+        ItemCatalog._entries.clear()
+
+    @staticmethod
+    def get_id(market_hash_name: str) -> Optional[int]:
+        return ItemCatalog._ids.get(market_hash_name)
+
+    @staticmethod
+    def entry(item_id: int) -> Optional[CatalogEntry]:
+        return ItemCatalog._entries.get(item_id)
+
+    @staticmethod
+    def size() -> int:
+        return len(ItemCatalog._ids)
+
+    @staticmethod
+    def _insert_ignore(connection: Connection):
+        """INSERT, пропускающий уже существующие market_hash_name"""
+        table = models.CatalogItem.__table__
+        dialect = connection.dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(table).on_conflict_do_nothing(index_elements=["market_hash_name"])
+        if dialect == "sqlite":
+            return sqlite.insert(table).on_conflict_do_nothing(index_elements=["market_hash_name"])
+        return table.insert()
+
+    @staticmethod
+    def ensure(connection: Connection, items: Iterable[Dict], remember: bool = False) -> Dict[str, int]:
+        """
+        Id предметов по market_hash_name, новые добавляются в каталог
+
+        Args:
+            connection: Соединение текущей транзакции
+            items: Словари с market_hash_name и (необязательно) icon_url, rarity, type
+            remember: Запомнить найденные строки в памяти (только если они уже закоммичены)
+
+        Returns:
+            {market_hash_name: item_id}
+        """
+        by_name: Dict[str, Dict] = {}
+        for item in items:
+            by_name.setdefault(item.get("market_hash_name") or "", item)
+
+        result = {name: ItemCatalog._ids[name] for name in by_name if name in ItemCatalog._ids}
+        missing = [name for name in by_name if name not in result]
+        if not missing:
+            return result
+
+        table = models.CatalogItem.__table__
+
+        # Могли добавить другие процессы
+        for chunk in _chunks(missing):
+            rows = connection.execute(select(table).where(table.c.market_hash_name.in_(chunk))).all()
+            if remember:
+                ItemCatalog._remember(rows)
+            result.update((row.market_hash_name, row.id) for row in rows)
+
+        new = [name for name in missing if name not in result]
+        if new:
+            for chunk in _chunks(new):
+                connection.execute(ItemCatalog._insert_ignore(connection), [
+                    {
+                        "market_hash_name": name,
+                        "icon_path": _icon_path(by_name[name].get("icon_url")),
+                        "rarity": by_name[name].get("rarity"),
+                        "item_type": by_name[name].get("type")
+                    }
+                    for name in chunk
+                ])
+                result.update(connection.execute(
+                    select(table.c.market_hash_name, table.c.id).where(table.c.market_hash_name.in_(chunk))
+                ).all())
+
+        return result
+
+    @staticmethod
+    def ensure_names(session_factory, names: Iterable[str]) -> int:
+        """
+        Добавить имена в каталог отдельной транзакцией (прайс-лист)
+
+        Returns:
+            Размер каталога в памяти
+        """
+        missing = [{"market_hash_name": name} for name in names if name not in ItemCatalog._ids]
+        if missing:
+            db = session_factory()
+            try:
+                ItemCatalog.ensure(db.connection(), missing)
+                db.commit()
+                ItemCatalog.ensure(db.connection(), missing, remember=True)
+            finally:
+                db.close()
+        return len(ItemCatalog._ids)
+
+
+@event.listens_for(Session, "before_flush")
+def _intern_deal_items(session: Session, flush_context, instances):
+    """Новые DealItem: market_hash_name -> item_id из каталога"""
+    pending = [
+        obj for obj in session.new
+        if isinstance(obj, models.DealItem) and obj.item_id is None and obj.pending_item is not None
+    ]
+    if not pending:
+        return
+
+    ids = ItemCatalog.ensure(session.connection(), [obj.pending_item for obj in pending])
+    for obj in pending:
+        obj.item_id = ids[obj.pending_item["market_hash_name"]]
@@ -0,0 +1,526 @@
+"""
+Outbox фоновых задач с хранением в БД
+
+Задача пишется в background_jobs в той же транзакции, что и изменение сделки,
+поэтому после commit она не теряется. JobRunner разбирает очередь пулом
+корутин с лимитом на каждую внешнюю систему (target), повторяет упавшие
+задачи с экспоненциальной паузой и подхватывает незавершённые задачи упавших
+процессов.
+
+Задача в работе арендована процессом (locked_by, locked_at): пока она
+выполняется, аренда продлевается каждые job_lease_seconds / 3. В очередь
+возвращаются только задачи с истёкшей арендой — задачи, которые прямо сейчас
+выполняет API или другой воркер, повторно не запускаются.
+
+Если аренду всё же потеряли (процесс завис дольше аренды, задачу забрал
+другой), итог задачи записывается только при locked_by = worker_id, иначе
+результат отбрасывается (rollback). Обработчики с внешними побочными
+эффектами перед ними вызывают ensure_lease().
+
+Отдельный воркер (без API): python -m services.job_queue — очередь и планировщик сроков сделок
+"""
+import asyncio
+import contextvars
+import os
+import random
+import socket
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import create_engine, func, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from config import get_settings
+from database import SessionLocal
+from services.audit_log import audit_sink
+from services.http_clients import http_clients
+from tracing import CONSUMER, TRACEPARENT, parse_traceparent, tracer
+
+JobHandler = Callable[[Session, models.BackgroundJob], Awaitable[None]]
+
+# Обработчики по job_type
+_handlers: Dict[str, JobHandler] = {}
+
+RETRY_BASE_DELAY_SECONDS = 10  # Пауза перед повтором: 10с, 20с, 40с, ... (с разбросом)
+RETRY_MAX_DELAY_SECONDS = 3600
+POLL_INTERVAL_SECONDS = 5.0
+DEFAULT_TARGET = "local"
+
+
+# worker_id, арендовавший выполняемую задачу (задаётся JobRunner на время обработчика)
+_lease_owner: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("job_lease_owner", default=None)
+
+
+class LeaseLost(Exception):
+    """Задачу вернули в очередь и, возможно, уже выполняет другой процесс"""
+
+
+def ensure_lease(db: Session, job: models.BackgroundJob):
+    """
+    Проверить, что задача всё ещё арендована этим обработчиком
+
+    Вызывать перед неидемпотентным побочным эффектом (трейд, выплата, уведомление).
+    Вне JobRunner (прямой вызов обработчика) аренды нет — проверять нечего.
+
+    Raises:
+        LeaseLost: Аренда перешла к другому процессу или снята
+    """
+    owner = _lease_owner.get()
+    if owner is None:
+        return
+    locked_by = db.query(models.BackgroundJob.locked_by).filter(
+        models.BackgroundJob.id == job.id,
+        models.BackgroundJob.status == models.JobStatus.RUNNING
+    ).scalar()
+    if locked_by != owner:
+        raise LeaseLost(f"Аренда задачи #{job.id} потеряна")
+
+
+def job_handler(job_type: str):
+    """Зарегистрировать обработчик задачи"""
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Пауза перед следующей попыткой
+
+    Экспонента с потолком и случайным разбросом 50-100%, чтобы упавшие
+    одновременно задачи не били во внешний API одной волной.
+    """
+    delay = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _with_trace(payload: Optional[Dict]) -> Dict:
+    """Payload с traceparent текущего трейса: задача продолжит трейс запроса"""
+    payload = dict(payload or {})
+    context = tracer.current()
+    if context is not None:
+        payload.setdefault(TRACEPARENT, context.traceparent)
+    return payload
+
+
+def enqueue(
+    db: Session,
+    job_type: str,
+    deal_id: Optional[int] = None,
+    payload: Optional[Dict] = None,
+    max_attempts: int = 5,
+    target: str = DEFAULT_TARGET,
+    idempotency_key: Optional[str] = None
+) -> models.BackgroundJob:
+    """
+    Добавить задачу в текущую транзакцию (commit делает вызывающий код)
+
+    Args:
+        target: Внешняя система, к которой обращается задача
+        idempotency_key: Повторный enqueue с тем же ключом вернёт существующую задачу
+
+    Returns:
+        Созданная (или уже существующая) задача
+    """
+    if idempotency_key:
+        for obj in db.new:
+            if isinstance(obj, models.BackgroundJob) and obj.idempotency_key == idempotency_key:
+                return obj
+        existing = db.query(models.BackgroundJob).filter(
+            models.BackgroundJob.idempotency_key == idempotency_key
+        ).first()
+        if existing:
+            return existing
+
+    job = models.BackgroundJob(
+        deal_id=deal_id,
+        job_type=job_type,
+        payload=_with_trace(payload),
+        target=target,
+        idempotency_key=idempotency_key,
+        status=models.JobStatus.PENDING,
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow()
+    )
+    db.add(job)
+    return job
+
+
+def enqueue_many(
+    db: Session,
+    job_type: str,
+    jobs: Iterable[Tuple[Optional[int], Optional[Dict], str]],
+    max_attempts: int = 5,
+    target: str = DEFAULT_TARGET
+) -> int:
+    """
+    Добавить пачку однотипных задач одним INSERT (массовые переходы)
+
+    Ключи идемпотентности обязательны: уже существующие задачи пропускаются
+    (ON CONFLICT DO NOTHING) без запроса на каждую.
+
+    Args:
+        jobs: [(deal_id, payload, idempotency_key), ...]
+
+    Returns:
+        Количество добавленных задач
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            "deal_id": deal_id,
+            "job_type": job_type,
+            "payload": _with_trace(payload),
+            "target": target,
+            "idempotency_key": idempotency_key,
+            "status": models.JobStatus.PENDING,
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "run_after": now
+        }
+        for deal_id, payload, idempotency_key in jobs
+    ]
+    if not rows:
+        return 0
+
+    db.flush()  # Задачи из enqueue в этой же сессии — до INSERT мимо ORM
+    table = models.BackgroundJob.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table).on_conflict_do_nothing(index_elements=["idempotency_key"])
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table).on_conflict_do_nothing(index_elements=["idempotency_key"])
+    else:
+        stmt = table.insert()
+    return max(db.execute(stmt, rows).rowcount, 0)
+
+
+class JobRunner:
+    """Пул обработчиков фоновых задач"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+        max_concurrent: Optional[int] = None,
+        target_limits: Optional[Dict[str, int]] = None
+    ):
+        settings = get_settings()
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.max_concurrent = max_concurrent or settings.job_max_concurrent
+        self.target_limits = target_limits if target_limits is not None else settings.get_job_target_limits()
+        self.lease_seconds = settings.job_lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._last_requeue = 0.0
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._in_flight: Dict[int, asyncio.Task] = {}
+        self._target_in_flight: Counter = Counter()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._semaphores_loop = None
+
+    @classmethod
+    def in_memory(cls, **kwargs) -> "JobRunner":
+        """Очередь в SQLite в памяти процесса (тесты и локальные скрипты)"""
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        models.Base.metadata.create_all(bind=engine)
+        return cls(session_factory=sessionmaker(autocommit=False, autoflush=False, bind=engine), **kwargs)
+
+    def start(self):
+        """Запустить цикл обработки (из lifespan приложения)"""
+        if self._loop_task is None:
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        """Остановить цикл и дождаться выполняющихся задач"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+
+    def wake(self):
+        """Разбудить цикл сразу после commit новых задач"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run_loop(self):
+        while True:
+            try:
+                # Аренды упавших процессов — не только при старте: другой процесс может упасть в любой момент
+                if time.monotonic() - self._last_requeue >= self.lease_seconds / 2:
+                    self._last_requeue = time.monotonic()
+                    self.requeue_interrupted()
+                self._spawn_due_jobs()
+            except Exception as e:
+                print(f"[JOBS] Ошибка выборки задач: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def requeue_interrupted(self) -> int:
+        """Вернуть в очередь задачи упавших процессов: RUNNING с истёкшей арендой (или без неё)"""
+        expired_before = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        db = self.session_factory()
+        try:
+            count = db.query(models.BackgroundJob).filter(
+                models.BackgroundJob.status == models.JobStatus.RUNNING,
+                or_(models.BackgroundJob.locked_at.is_(None), models.BackgroundJob.locked_at < expired_before)
+            ).update({
+                models.BackgroundJob.status: models.JobStatus.PENDING,
+                models.BackgroundJob.locked_by: None,
+                models.BackgroundJob.locked_at: None
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+        if count:
+            print(f"[JOBS] Возвращено в очередь (аренда истекла): {count}")
+        return count
+
+    def _renew_lease(self, job_id: int) -> bool:
+        """Продлить аренду задачи; False — её уже вернули в очередь"""
+        db = self.session_factory()
+        try:
+            renewed = db.query(models.BackgroundJob).filter(
+                models.BackgroundJob.id == job_id,
+                models.BackgroundJob.locked_by == self.worker_id
+            ).update({models.BackgroundJob.locked_at: datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        return bool(renewed)
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not self._renew_lease(job_id):
+                    print(f"[JOBS] ⚠️ Аренда задачи #{job_id} потеряна")
+                    return
+            except Exception as e:
+                print(f"[JOBS] Ошибка продления аренды #{job_id}: {e}")
+
+    def in_flight_by_target(self) -> Dict[str, int]:
+        """Задачи, выполняемые этим процессом, по внешней системе (для мониторинга)"""
+        return {target or DEFAULT_TARGET: count for target, count in self._target_in_flight.items() if count}
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Задачи в очереди и в работе во всех процессах (для мониторинга)"""
+        db = self.session_factory()
+        try:
+            rows = db.query(models.BackgroundJob.status, func.count()).filter(
+                models.BackgroundJob.status.in_([models.JobStatus.PENDING, models.JobStatus.RUNNING])
+            ).group_by(models.BackgroundJob.status).all()
+        finally:
+            db.close()
+
+        depth = {models.JobStatus.PENDING.value: 0, models.JobStatus.RUNNING.value: 0}
+        depth.update({status.value: count for status, count in rows})
+        return depth
+
+    def _target_limit(self, target: Optional[str]) -> int:
+        return self.target_limits.get(target or DEFAULT_TARGET, self.max_concurrent)
+
+    def _semaphore(self, target: Optional[str]) -> asyncio.Semaphore:
+        # Семафоры привязаны к event loop; в тестах каждый asyncio.run — новый loop
+        loop = asyncio.get_running_loop()
+        if self._semaphores_loop is not loop:
+            self._semaphores = {}
+            self._semaphores_loop = loop
+
+        target = target or DEFAULT_TARGET
+        if target not in self._semaphores:
+            self._semaphores[target] = asyncio.Semaphore(self._target_limit(target))
+        return self._semaphores[target]
+
+    def _due_jobs(self, limit: int) -> List[Tuple[int, Optional[str]]]:
+        db = self.session_factory()
+        try:
+            rows = db.query(models.BackgroundJob.id, models.BackgroundJob.target).filter(
+                models.BackgroundJob.status == models.JobStatus.PENDING,
+                models.BackgroundJob.run_after <= datetime.utcnow()
+            ).order_by(models.BackgroundJob.id).limit(limit + len(self._in_flight)).all()
+        finally:
+            db.close()
+
+        return [(job_id, target) for job_id, target in rows if job_id not in self._in_flight]
+
+    def _spawn_due_jobs(self):
+        free_slots = self.max_concurrent - len(self._in_flight)
+        if free_slots <= 0:
+            return
+
+        # Задачи к занятой системе не занимают общие слоты — ждут следующего прохода
+        for job_id, target in self._due_jobs(free_slots * 4):
+            if free_slots <= 0:
+                break
+            if self._target_in_flight[target] >= self._target_limit(target):
+                continue
+
+            task = asyncio.create_task(self.run_job(job_id))
+            self._in_flight[job_id] = task
+            self._target_in_flight[target] += 1
+            task.add_done_callback(lambda _, job_id=job_id, target=target: self._on_job_done(job_id, target))
+            free_slots -= 1
+
+    def _on_job_done(self, job_id: int, target: Optional[str]):
+        self._in_flight.pop(job_id, None)
+        self._target_in_flight[target] -= 1
+        self.wake()
+
+    async def run_due_jobs(self) -> int:
+        """Выполнить все готовые задачи и дождаться их (для тестов и скриптов)"""
+        job_ids = [job_id for job_id, _ in self._due_jobs(self.max_concurrent)]
+        await asyncio.gather(*(self.run_job(job_id) for job_id in job_ids))
+        return len(job_ids)
+
+    async def run_job(self, job_id: int) -> Optional[models.JobStatus]:
+        """
+        Выполнить одну задачу
+
+        Returns:
+            Итоговый статус задачи или None, если её уже забрал другой обработчик
+        """
+        db = self.session_factory()
+        try:
+            target = db.query(models.BackgroundJob.target).filter(
+                models.BackgroundJob.id == job_id
+            ).scalar()
+            db.rollback()
+
+            async with self._semaphore(target):
+                return await self._claim_and_run(db, job_id)
+        finally:
+            db.close()
+
+    async def _claim_and_run(self, db: Session, job_id: int) -> Optional[models.JobStatus]:
+        # Атомарно забираем задачу: второй обработчик (или воркер) получит 0 строк
+        claimed = db.query(models.BackgroundJob).filter(
+            models.BackgroundJob.id == job_id,
+            models.BackgroundJob.status == models.JobStatus.PENDING
+        ).update({
+            models.BackgroundJob.status: models.JobStatus.RUNNING,
+            models.BackgroundJob.attempts: models.BackgroundJob.attempts + 1,
+            models.BackgroundJob.locked_by: self.worker_id,
+            models.BackgroundJob.locked_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+
+        if not claimed:
+            return None
+
+        job = db.get(models.BackgroundJob, job_id)
+        handler = _handlers.get(job.job_type)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        lease = _lease_owner.set(self.worker_id)
+
+        try:
+            if handler is None:
+                raise LookupError(f"Нет обработчика для {job.job_type}")
+            parent = parse_traceparent((job.payload or {}).get(TRACEPARENT))
+            with tracer.span(f"job {job.job_type}", CONSUMER, parent, **{"job.id": job.id, "job.attempt": job.attempts}):
+                await handler(db, job)
+        except Exception as e:
+            db.rollback()
+            job = db.get(models.BackgroundJob, job_id)
+            result = {models.BackgroundJob.last_error: f"{type(e).__name__}: {e}"}
+
+            if job.attempts >= job.max_attempts:
+                result[models.BackgroundJob.status] = models.JobStatus.FAILED
+                result[models.BackgroundJob.finished_at] = datetime.utcnow()
+            else:
+                result[models.BackgroundJob.status] = models.JobStatus.PENDING
+                result[models.BackgroundJob.run_after] = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+        else:
+            result = {
+                models.BackgroundJob.status: models.JobStatus.DONE,
+                models.BackgroundJob.finished_at: datetime.utcnow(),
+                models.BackgroundJob.last_error: None
+            }
+        finally:
+            heartbeat.cancel()
+            _lease_owner.reset(lease)
+
+        job_type, deal_id, attempts, max_attempts = job.job_type, job.deal_id, job.attempts, job.max_attempts
+
+        # Итог — только пока аренда наша: иначе задачу уже забрал другой процесс
+        result.update({models.BackgroundJob.locked_by: None, models.BackgroundJob.locked_at: None})
+        updated = db.query(models.BackgroundJob).filter(
+            models.BackgroundJob.id == job_id,
+            models.BackgroundJob.locked_by == self.worker_id
+        ).update(result, synchronize_session=False)
+        if not updated:
+            db.rollback()
+            print(f"[JOBS] ⚠️ {job_type} #{job_id}: аренда потеряна, результат отброшен")
+            return None
+        db.commit()
+
+        status = result[models.BackgroundJob.status]
+        if status == models.JobStatus.FAILED:
+            print(f"[JOBS] ❌ {job_type} #{job_id} (сделка #{deal_id}) не выполнена: {result[models.BackgroundJob.last_error]}")
+        elif status == models.JobStatus.PENDING:
+            print(f"[JOBS] ⚠️ {job_type} #{job_id} попытка {attempts}/{max_attempts}: {result[models.BackgroundJob.last_error]}")
+        return status
+
+
+# Общий экземпляр для приложения
+job_runner = JobRunner()
+
+
+async def _run_worker():
+    # Сроки сделок — здесь же: при jobs_in_api=False API планировщик не запускает,
+    # а сделки, активированные API, воркер дочитывает (DealScheduler.sync_window)
+    from services.deal_scheduler import deal_scheduler
+
+    audit_sink.start()
+    job_runner.start()
+    deal_scheduler.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await deal_scheduler.stop()
+        await job_runner.stop()
+        await audit_sink.stop()
+        await http_clients.aclose()
+
+
+def main():
+    """Отдельный воркер очереди и сроков сделок"""
+    # Импорт через пакет: при запуске через -m этот модуль — __main__ со своим реестром
+    import services.deal_pipeline  # noqa: F401  (регистрация обработчиков)
+    from services import job_queue
+
+    runner = job_queue.job_runner
+    print(f"[JOBS] Воркер запущен (max_concurrent={runner.max_concurrent}, limits={runner.target_limits})")
+    try:
+        asyncio.run(job_queue._run_worker())
+    except KeyboardInterrupt:
+        print("[JOBS] Воркер остановлен")
+
+
+if __name__ == "__main__":
+    main()
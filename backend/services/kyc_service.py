@@ -1,11 +1,11 @@
 """
 Сервис KYC проверки паспортов
 """
-import httpx
 import asyncio
 from typing import Dict, Optional
 from datetime import datetime
 from config import get_settings
+from services.http_clients import http_clients
 
 
 class KYCService:
@@ -88,7 +88,7 @@ class KYCService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with http_clients.borrow("kyc") as client:
                 response = await client.post(url, headers=headers, json=payload)
                 
                 if response.status_code == 201:
@@ -114,8 +114,8 @@ class KYCService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(url, headers=headers)
+            async with http_clients.borrow("kyc") as client:
+                response = await client.get(url, headers=headers, timeout=10.0)
                 
                 if response.status_code == 200:
                     result = response.json()
@@ -2,12 +2,17 @@
 Профессиональный сервис получения live цен из Steam Market
 Использует несколько надежных источников
 """
-import httpx
 import asyncio
 import json
 from typing import Dict, List
 from datetime import datetime, timedelta
 
+from services.http_clients import http_clients
+from logger import debug_sampled, get_logger
+from metrics import cache_lookup
+
+log = get_logger("live_prices")
+
 
 class LivePriceService:
     """Получение актуальных цен из надежных источников"""
@@ -38,11 +43,12 @@ class LivePriceService:
             else:
                 uncached.append(name)
         
+        cache_lookup("live_prices", hits=len(prices), misses=len(uncached))
         if not uncached:
-            print(f"[LIVE PRICES] Все {len(prices)} цен из кеша")
+            log.debug("Все цены из кеша", extra={"cached": len(prices)})
             return prices
         
-        print(f"[LIVE PRICES] Загружаем {len(uncached)} цен")
+        log.debug("Загружаем цены", extra={"cached": len(prices), "uncached": len(uncached)})
         
         # Пробуем Pricempire (лучший источник)
         pricempire_prices = await LivePriceService._get_pricempire_prices(uncached)
@@ -55,7 +61,7 @@ class LivePriceService:
         
         # Если остались без цены, пробуем CSGOBackpack
         if uncached and len(uncached) < 50:
-            print(f"[LIVE PRICES] Пробуем CSGOBackpack для {len(uncached)} предметов")
+            log.debug("Пробуем CSGOBackpack", extra={"uncached": len(uncached)})
             backpack_prices = await LivePriceService._get_csgobackpack_prices(uncached)
             for name, price in backpack_prices.items():
                 if price > 0:
@@ -70,7 +76,7 @@ class LivePriceService:
                 prices[name] = 0.0
         
         successful = len([p for p in prices.values() if p > 0])
-        print(f"[LIVE PRICES] Получено {successful}/{len(market_hash_names)} цен")
+        log.debug("Цены получены", extra={"requested": len(market_hash_names), "found": successful})
         
         return prices
     
@@ -98,8 +104,8 @@ class LivePriceService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0, headers=headers) as client:
-                response = await client.get(url, params=params)
+            async with http_clients.borrow("prices") as client:
+                response = await client.get(url, params=params, headers=headers, timeout=30.0)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -112,14 +118,14 @@ class LivePriceService:
                             
                             if price > 0:
                                 prices[name] = float(price)
-                                print(f"[PRICEMPIRE] {name}: {price} ₽")
+                                debug_sampled(log, "Цена Pricempire", item=name, price=price)
                     
-                    print(f"[PRICEMPIRE] Получено {len(prices)} цен")
+                    log.debug("Цены Pricempire получены", extra={"requested": len(names), "found": len(prices)})
                 else:
-                    print(f"[PRICEMPIRE] Ошибка {response.status_code}")
+                    log.warning("Pricempire вернул ошибку", extra={"status": response.status_code})
                     
         except Exception as e:
-            print(f"[PRICEMPIRE] Ошибка: {e}")
+            log.warning("Ошибка Pricempire", extra={"error": str(e)})
         
         return prices
     
@@ -138,12 +144,12 @@ class LivePriceService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=15.0, headers=headers) as client:
+            async with http_clients.borrow("prices") as client:
                 for name in names[:20]:  # Ограничиваем количество
                     try:
                         # CSGOBackpack требует URL-encoded название
                         item_url = f"{url}{name}"
-                        response = await client.get(item_url)
+                        response = await client.get(item_url, headers=headers)
                         
                         if response.status_code == 200:
                             data = response.json()
@@ -154,16 +160,16 @@ class LivePriceService:
                                 if price_usd > 0:
                                     price_rub = price_usd * 90  # Курс USD->RUB
                                     prices[name] = price_rub
-                                    print(f"[CSGOBACKPACK] {name}: ${price_usd} = {price_rub} ₽")
+                                    debug_sampled(log, "Цена CSGOBackpack", item=name, price_usd=price_usd, price=price_rub)
                         
                         await asyncio.sleep(0.5)  # Rate limiting
                         
                     except Exception as e:
-                        print(f"[CSGOBACKPACK] Ошибка для {name}: {e}")
+                        debug_sampled(log, "Ошибка CSGOBackpack для предмета", item=name, error=str(e))
                         continue
                         
         except Exception as e:
-            print(f"[CSGOBACKPACK] Общая ошибка: {e}")
+            log.warning("Ошибка CSGOBackpack", extra={"error": str(e)})
         
         return prices
     
@@ -185,4 +191,4 @@ class LivePriceService:
     def clear_cache():
         """Очистить кеш"""
         LivePriceService._cache.clear()
-        print("[LIVE PRICES] Кеш очищен")
+        log.info("Кеш live-цен очищен")
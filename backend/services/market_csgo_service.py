@@ -1,22 +1,42 @@
 """
 Интеграция с market.csgo.com для получения instant цен
 ОПТИМИЗИРОВАНО: Загружаем весь прайс-лист один раз и кэшируем
+
+Кэш цен хранится по item_id из каталога предметов (services.item_catalog),
+а не по строкам market_hash_name из каждого нового ответа API.
+
+Загрузивший прайс-лист воркер кладёт цены и в общий кэш (cache.py, ключ
+на предмет): остальные воркеры берут нужные цены одним MGET, не скачивая
+весь прайс-лист сами.
 """
-import httpx
 import asyncio
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 
+from cache import cache
+from config import get_settings
+from database import SessionLocal
+from services.http_clients import http_clients
+from services.item_catalog import ItemCatalog
+from logger import get_logger
+from metrics import cache_lookup, timed
+
+log = get_logger("market_csgo")
+
 
 class MarketCSGOService:
     """Сервис для получения цен с market.csgo.com"""
     
     API_URL = "https://market.csgo.com/api/v2"
     
-    # Глобальный кэш всех цен (загружается один раз)
-    _all_prices: Dict[str, float] = {}
+    # Глобальный кэш всех цен: item_id -> цена (загружается один раз)
+    _all_prices: Dict[int, float] = {}
     _all_prices_loaded_at: Optional[datetime] = None
-    _cache_ttl = timedelta(hours=1)
+    _cache_ttl = timedelta(seconds=get_settings().market_prices_cache_ttl_seconds)
+    
+    # Общий кэш: цена предмета и время загрузки прайс-листа
+    SHARED_PRICE_PREFIX = "price:market_csgo:"
+    SHARED_LOADED_KEY = "price:market_csgo:loaded_at"
     
     @staticmethod
     async def get_prices(market_hash_names: List[str]) -> Dict[str, float]:
@@ -26,33 +46,79 @@ class MarketCSGOService:
         Returns:
             Dict[market_hash_name, price_rub]
         """
-        # Загружаем все цены если кэш пустой или устарел
-        await MarketCSGOService._ensure_prices_loaded()
+        prices, _ = await MarketCSGOService.lookup_prices(market_hash_names)
+        
+        successful = len([p for p in prices.values() if p > 0])
+        log.debug("Цены из прайс-листа", extra={"requested": len(market_hash_names), "found": successful})
+        
+        return prices
+    
+    @staticmethod
+    async def lookup_prices(market_hash_names: List[str]) -> Tuple[Dict[str, float], Optional[str]]:
+        """
+        Цены по прайс-листу без логов на каждый вызов (массовые запросы)
+        
+        Свежий прайс-лист процесса — поиск по item_id в памяти; иначе, если
+        прайс-лист загрузил другой воркер, — одним MGET из общего кэша;
+        иначе прайс-лист загружается.
+        
+        Returns:
+            (Dict[market_hash_name, price_rub], версия прайс-листа — время загрузки)
+        """
+        if MarketCSGOService._is_stale():
+            cache_lookup("market_csgo_local", misses=1)
+            # Прайс-лист уже загрузил другой воркер — только нужные цены из общего кэша
+            shared_version = await cache.get(MarketCSGOService.SHARED_LOADED_KEY)
+            cache_lookup("market_csgo_shared", hits=int(shared_version is not None), misses=int(shared_version is None))
+            if shared_version is not None:
+                prefix = MarketCSGOService.SHARED_PRICE_PREFIX
+                found = await cache.get_many([f"{prefix}{name}" for name in market_hash_names])
+                # Ни одной цены — ключи цен уже истекли (метка ещё в L1): загружаем прайс-лист сами
+                if found or not market_hash_names:
+                    return {name: found.get(f"{prefix}{name}", 0.0) for name in market_hash_names}, shared_version
+            
+            # Загружаем все цены если кэш пустой или устарел
+            await MarketCSGOService._ensure_prices_loaded()
+        else:
+            cache_lookup("market_csgo_local", hits=1)
         
         # Быстро достаём нужные цены из кэша
+        get_id = ItemCatalog.get_id
+        all_prices = MarketCSGOService._all_prices
         prices = {}
         for name in market_hash_names:
-            price = MarketCSGOService._all_prices.get(name, 0.0)
-            prices[name] = price
-        
-        successful = len([p for p in prices.values() if p > 0])
-        print(f"[MARKET.CSGO] Найдено {successful}/{len(market_hash_names)} цен в кэше")
+            item_id = get_id(name)
+            prices[name] = all_prices.get(item_id, 0.0) if item_id is not None else 0.0
         
-        return prices
+        return prices, MarketCSGOService._local_version()
+    
+    @staticmethod
+    async def prices_version() -> Optional[str]:
+        """Версия прайс-листа, по которому сейчас отвечает lookup_prices (None — не загружен)"""
+        if not MarketCSGOService._is_stale():
+            return MarketCSGOService._local_version()
+        return await cache.get(MarketCSGOService.SHARED_LOADED_KEY)
+    
+    @staticmethod
+    def _local_version() -> Optional[str]:
+        loaded_at = MarketCSGOService._all_prices_loaded_at
+        return loaded_at.isoformat() if loaded_at else None
+    
+    @staticmethod
+    def _is_stale() -> bool:
+        loaded_at = MarketCSGOService._all_prices_loaded_at
+        return loaded_at is None or datetime.now() - loaded_at > MarketCSGOService._cache_ttl
     
     @staticmethod
     async def _ensure_prices_loaded():
         """Загрузить все цены если нужно"""
-        now = datetime.now()
-        
         # Проверяем нужно ли обновить кэш
-        if (MarketCSGOService._all_prices_loaded_at is None or 
-            now - MarketCSGOService._all_prices_loaded_at > MarketCSGOService._cache_ttl):
-            
-            print("[MARKET.CSGO] Загружаем прайс-лист...")
+        if MarketCSGOService._is_stale():
+            log.info("Загружаем прайс-лист")
             await MarketCSGOService._load_all_prices()
     
     @staticmethod
+    @timed("market_csgo.load_price_list")
     async def _load_all_prices():
         """Загрузить весь прайс-лист с API"""
         url = f"{MarketCSGOService.API_URL}/prices/RUB.json"
@@ -62,8 +128,8 @@ class MarketCSGOService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=60.0, headers=headers) as client:
-                response = await client.get(url)
+            async with http_clients.borrow("market_csgo") as client:
+                response = await client.get(url, headers=headers)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -71,36 +137,52 @@ class MarketCSGOService:
                     # Формат: {"items": [{"market_hash_name": "...", "price": 123}]}
                     items = data.get("items", [])
                     
-                    # Очищаем старый кэш
-                    MarketCSGOService._all_prices.clear()
-                    
-                    # Загружаем все цены
+                    loaded = {}
                     for item in items:
                         market_name = item.get("market_hash_name")
                         price = float(item.get("price", 0))
                         if market_name and price > 0:
-                            MarketCSGOService._all_prices[market_name] = price
+                            loaded[market_name] = price
+                    
+                    # Новые предметы — в каталог (обычно только при первой загрузке)
+                    await asyncio.to_thread(ItemCatalog.ensure_names, SessionLocal, loaded.keys())
+                    
+                    get_id = ItemCatalog.get_id
+                    MarketCSGOService._all_prices = {
+                        get_id(name): price for name, price in loaded.items()
+                    }
                     
                     MarketCSGOService._all_prices_loaded_at = datetime.now()
-                    print(f"[MARKET.CSGO] ✅ Загружено {len(MarketCSGOService._all_prices)} цен")
+                    log.info("Прайс-лист загружен", extra={"prices": len(MarketCSGOService._all_prices)})
+                    
+                    # Для остальных воркеров: цены одним конвейером, L1 не засоряем всем прайс-листом
+                    ttl = MarketCSGOService._cache_ttl.total_seconds()
+                    prefix = MarketCSGOService.SHARED_PRICE_PREFIX
+                    await cache.set_many({f"{prefix}{name}": price for name, price in loaded.items()}, ttl, local=False)
+                    # Метка живёт меньше цен (с запасом на её копии в L1 воркеров): по метке цены ещё есть
+                    marker_ttl = max(ttl - 2 * cache.l1_ttl, ttl / 2)
+                    await cache.set(MarketCSGOService.SHARED_LOADED_KEY, MarketCSGOService._local_version(), marker_ttl)
                     
                 else:
-                    print(f"[MARKET.CSGO] ❌ Ошибка {response.status_code}")
+                    log.warning("Прайс-лист не получен", extra={"status": response.status_code})
                     
         except Exception as e:
-            print(f"[MARKET.CSGO] ❌ Ошибка загрузки: {e}")
+            log.error("Ошибка загрузки прайс-листа", extra={"error": str(e)})
     
     @staticmethod
     def get_cached_price(name: str) -> float:
         """Получить цену из кэша (синхронно)"""
-        return MarketCSGOService._all_prices.get(name, 0.0)
+        item_id = ItemCatalog.get_id(name)
+        if item_id is None:
+            return 0.0
+        return MarketCSGOService._all_prices.get(item_id, 0.0)
     
     @staticmethod
     def clear_cache():
         """Очистить кэш"""
         MarketCSGOService._all_prices.clear()
         MarketCSGOService._all_prices_loaded_at = None
-        print("[MARKET.CSGO] Кэш очищен")
+        log.info("Кэш прайс-листа очищен")
     
     @staticmethod
     def get_cache_stats() -> dict:
@@ -108,6 +190,5 @@ class MarketCSGOService:
         return {
             "items_count": len(MarketCSGOService._all_prices),
             "loaded_at": MarketCSGOService._all_prices_loaded_at.isoformat() if MarketCSGOService._all_prices_loaded_at else None,
-            "is_stale": MarketCSGOService._all_prices_loaded_at is None or 
-                        datetime.now() - MarketCSGOService._all_prices_loaded_at > MarketCSGOService._cache_ttl
+            "is_stale": MarketCSGOService._is_stale()
         }
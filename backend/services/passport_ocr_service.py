@@ -3,33 +3,46 @@
 Использует pytesseract (Tesseract OCR) для локального распознавания
 Улучшенная версия с продвинутой предобработкой изображения
 """
+from __future__ import annotations
+
 import re
 import base64
+import importlib.util
+import os
 from typing import Optional, Dict, List, Tuple
 from io import BytesIO
 from dataclasses import dataclass
 
-# Попробуем импортировать зависимости
-try:
+from metrics import timed
+
+# PIL и pytesseract загружаются при первом распознавании, а не при старте API:
+# при импорте только проверяем, что пакеты установлены
+OCR_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("PIL", "pytesseract"))
+if not OCR_AVAILABLE:
+    print("[OCR] Установите: pip install pytesseract pillow")
+
+Image = ImageEnhance = ImageFilter = ImageOps = pytesseract = None
+
+# Путь к Tesseract на Windows
+TESSERACT_PATHS = [
+    r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+    r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
+    r'C:\Tesseract-OCR\tesseract.exe',
+]
+
+
+def _load_ocr():
+    """Импортировать PIL и pytesseract (один раз, при первом распознавании)"""
+    global Image, ImageEnhance, ImageFilter, ImageOps, pytesseract
+    if pytesseract is not None:
+        return
     from PIL import Image, ImageEnhance, ImageFilter, ImageOps
     import pytesseract
     
-    # Путь к Tesseract на Windows
-    import os
-    tesseract_paths = [
-        r'C:\Program Files\Tesseract-OCR\tesseract.exe',
-        r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
-        r'C:\Tesseract-OCR\tesseract.exe',
-    ]
-    for path in tesseract_paths:
+    for path in TESSERACT_PATHS:
         if os.path.exists(path):
             pytesseract.pytesseract.tesseract_cmd = path
             break
-    
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
-    print("[OCR] Установите: pip install pytesseract pillow")
 
 
 @dataclass
@@ -67,12 +80,15 @@ class PassportOCRService:
     }
     
     @classmethod
+    @timed("kyc.passport_ocr")
     def extract_from_base64(cls, base64_image: str) -> PassportData:
         """Извлечь данные паспорта из base64 изображения"""
         if not OCR_AVAILABLE:
             return PassportData(raw_text="OCR не доступен")
         
         try:
+            _load_ocr()
+            
             # Убираем data:image/... префикс
             if ',' in base64_image:
                 base64_image = base64_image.split(',')[1]
@@ -379,6 +395,7 @@ class PassportOCRService:
 
 if __name__ == "__main__":
     if OCR_AVAILABLE:
+        _load_ocr()
         print("✓ OCR доступен")
         print(f"  Tesseract: {pytesseract.get_tesseract_version()}")
     else:
@@ -1,8 +1,10 @@
-import httpx
 import uuid
 from typing import Dict, Optional
 from config import get_settings
+from services.http_clients import http_clients
 from datetime import datetime
+import money
+from metrics import timed
 
 settings = get_settings()
 
@@ -12,11 +14,13 @@ class PaymentService:
     BASE_URL = "https://api.yookassa.ru/v3"
     
     @staticmethod
+    @timed("payment.create_payout")
     async def create_payout(
         phone: str,
         amount: float,
         description: str,
-        deal_id: int
+        deal_id: int,
+        idempotence_key: Optional[str] = None
     ) -> Optional[str]:
         """
         Создать выплату клиенту через СБП/ЮKassa
@@ -26,6 +30,7 @@ class PaymentService:
             amount: Сумма выплаты
             description: Описание платежа
             deal_id: ID сделки
+            idempotence_key: Ключ идемпотентности (повтор с тем же ключом не создаёт вторую выплату)
         
         Returns:
             ID транзакции или None при ошибке
@@ -39,7 +44,7 @@ class PaymentService:
         
         payload = {
             "amount": {
-                "value": f"{amount:.2f}",
+                "value": money.format_rub(money.to_kopecks(amount)),
                 "currency": "RUB"
             },
             "payout_destination_data": {
@@ -53,13 +58,13 @@ class PaymentService:
         }
         
         headers = {
-            "Idempotence-Key": str(uuid.uuid4()),
+            "Idempotence-Key": idempotence_key or str(uuid.uuid4()),
             "Content-Type": "application/json"
         }
         
         auth = (settings.yookassa_shop_id, settings.yookassa_secret_key)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http_clients.borrow("yookassa") as client:
             try:
                 response = await client.post(
                     url,
@@ -80,6 +85,7 @@ class PaymentService:
                 return None
     
     @staticmethod
+    @timed("payment.create_payment")
     async def create_payment(
         amount: float,
         description: str,
@@ -104,7 +110,7 @@ class PaymentService:
         
         payload = {
             "amount": {
-                "value": f"{amount:.2f}",
+                "value": money.format_rub(money.to_kopecks(amount)),
                 "currency": "RUB"
             },
             "confirmation": {
@@ -125,7 +131,7 @@ class PaymentService:
         
         auth = (settings.yookassa_shop_id, settings.yookassa_secret_key)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http_clients.borrow("yookassa") as client:
             try:
                 response = await client.post(
                     url,
@@ -147,6 +153,7 @@ class PaymentService:
                 return None
     
     @staticmethod
+    @timed("payment.check_payment_status")
     async def check_payment_status(payment_id: str) -> Optional[str]:
         """
         Проверить статус платежа
@@ -163,7 +170,7 @@ class PaymentService:
         url = f"{PaymentService.BASE_URL}/payments/{payment_id}"
         auth = (settings.yookassa_shop_id, settings.yookassa_secret_key)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http_clients.borrow("yookassa") as client:
             try:
                 response = await client.get(url, auth=auth)
                 response.raise_for_status()
@@ -0,0 +1,378 @@
+"""
+Monte Carlo симулятор экономической модели ломбарда
+
+Прогоняет миллионы синтетических сделок и показывает распределение прибыли
+для кандидатных loan_tiers / buyback_terms. Нужен, чтобы проверять изменения
+политики офлайн, а не подбирать коэффициенты вручную в markdown-файлах.
+
+Запуск:
+cd backend
+python -m services.policy_simulator --deals 2000000 --workers 4
+python -m services.policy_simulator --loan-tiers "500:0.35,inf:0.40" --buyback-rate 0.6 --json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from config import Settings, get_settings
+
+
+# Комиссия площадки при продаже залога после дефолта (как в PricingService)
+SALE_COMMISSION = 0.04
+
+# Размер пачки сделок на одну итерацию воркера (ограничивает память)
+BATCH_SIZE = 1_000_000
+
+
+@dataclass
+class SimulationParams:
+    """Параметры симуляции"""
+    deals: int = 1_000_000
+    workers: int = 1
+    seed: Optional[int] = None
+    items_per_deal: float = 3.0  # Среднее число предметов в сделке (1 + Poisson)
+    buyback_rate: float = 0.5  # Базовая вероятность выкупа
+    buyback_elasticity: float = 0.0  # Чувствительность выкупа к изменению цены
+    volatility: float = 0.6  # Годовая волатильность цен скинов
+    drift: float = 0.0  # Годовой дрейф цен скинов
+    sale_commission: float = SALE_COMMISSION
+
+
+@dataclass
+class PolicyConfig:
+    """Кандидатная политика: пороги выдачи и условия выкупа"""
+    loan_tiers: List[Dict]
+    buyback_terms: Dict[int, Dict]
+
+    @classmethod
+    def from_strings(cls, loan_tiers: str, buyback_terms: str) -> "PolicyConfig":
+        """Собрать политику из строк в формате Settings"""
+        settings = Settings(loan_tiers=loan_tiers, buyback_terms=buyback_terms)
+        return cls(
+            loan_tiers=settings.get_loan_tiers(),
+            buyback_terms=settings.get_buyback_terms()
+        )
+
+
+@dataclass
+class SimulationReport:
+    """Результат симуляции"""
+    deals: int
+    buyback_rate: float
+    default_rate: float
+    mean_profit: float
+    std_profit: float
+    percentiles: Dict[str, float]
+    loss_probability: float
+    total_loan: float
+    total_profit: float
+    roi_percent: float
+    elapsed_seconds: float
+    deals_per_second: float
+    by_term: Dict[int, Dict] = field(default_factory=dict)
+
+
+def load_price_sample(source: str = "db", prices_file: Optional[str] = None,
+                      min_price: float = 0.0) -> List[float]:
+    """
+    Загрузить выборку цен предметов для сэмплирования
+
+    Args:
+        source: "db" (instant_price скинов прошлых сделок, deal_items),
+                "file" (прайс-лист market.csgo в JSON) или "demo"
+        prices_file: Путь к JSON для source="file"
+        min_price: Отбросить предметы дешевле порога приёма
+
+    Returns:
+        Список цен в рублях
+    """
+    prices: List[float] = []
+
+    if source == "file":
+        with open(prices_file, encoding="utf-8") as f:
+            data = json.load(f)
+        # Формат market.csgo: {"items": [{"market_hash_name": "...", "price": 123}]}
+        if isinstance(data, dict) and "items" in data:
+            prices = [float(item.get("price", 0)) for item in data["items"]]
+        elif isinstance(data, dict):
+            prices = [float(p) for p in data.values()]
+        else:
+            prices = [float(p) for p in data]
+
+    elif source == "db":
+        from database import SessionLocal
+        import models
+        import money
+
+        db = SessionLocal()
+        try:
+            for (kopecks,) in db.query(models.DealItem.instant_price_kopecks).yield_per(10000):
+                prices.append(money.to_rubles(kopecks))
+        finally:
+            db.close()
+
+        if not prices:
+            print("[SIMULATOR] В БД нет истории сделок, используем демо-цены")
+            source = "demo"
+
+    if source == "demo":
+        from services.demo_prices import get_all_demo_prices
+        prices = [float(p) for p in get_all_demo_prices().values()]
+
+    return [p for p in prices if p >= min_price and p > 0]
+
+
+def _tier_arrays(loan_tiers: List[Dict]):
+    """Пороги и проценты выдачи в виде отсортированных массивов"""
+    tiers = sorted(loan_tiers, key=lambda t: t["max"])
+    bounds = np.array([t["max"] for t in tiers], dtype=np.float64)
+    percents = np.array([t["percent"] for t in tiers], dtype=np.float64)
+    return bounds, percents
+
+
+def _simulate_batch(rng, prices, policy: PolicyConfig, params: SimulationParams, n: int):
+    """
+    Смоделировать n сделок векторно
+
+    Returns:
+        (profit, loan, is_buyback, term_days) — массивы длины n
+    """
+    # Состав сделки: 1 + Poisson(mean - 1) предметов
+    counts = 1 + rng.poisson(max(params.items_per_deal - 1.0, 0.0), size=n)
+    total_items = int(counts.sum())
+    offsets = np.zeros(n, dtype=np.int64)
+    np.cumsum(counts[:-1], out=offsets[1:])
+
+    item_prices = prices[rng.integers(0, len(prices), size=total_items)]
+
+    # Процент выдачи по порогу цены предмета (как loan_tiers в Settings)
+    bounds, percents = _tier_arrays(policy.loan_tiers)
+    tier_idx = np.minimum(np.searchsorted(bounds, item_prices, side="left"), len(percents) - 1)
+    item_loans = item_prices * percents[tier_idx]
+
+    market = np.add.reduceat(item_prices, offsets)
+    loan = np.add.reduceat(item_loans, offsets)
+
+    # Срок сделки — равномерно из доступных сроков политики
+    term_keys = np.array(sorted(policy.buyback_terms.keys()), dtype=np.int64)
+    interest = np.array([policy.buyback_terms[d]["interest"] for d in term_keys])
+    premium = np.array([policy.buyback_terms[d]["premium"] for d in term_keys])
+    term_idx = rng.integers(0, len(term_keys), size=n)
+    term_days = term_keys[term_idx]
+
+    buyback_price = loan * (1 + interest[term_idx]) * (1 + premium[term_idx])
+
+    # Цена на момент окончания опциона: геометрическое броуновское движение
+    t = term_days / 365.0
+    sigma = params.volatility
+    shock = rng.standard_normal(n)
+    market_at_expiry = market * np.exp((params.drift - 0.5 * sigma ** 2) * t + sigma * np.sqrt(t) * shock)
+
+    # Вероятность выкупа растёт, если предметы подорожали относительно цены выкупа
+    p = params.buyback_rate
+    if params.buyback_elasticity and 0 < p < 1:
+        logit = math.log(p / (1 - p)) + params.buyback_elasticity * (market_at_expiry / buyback_price - 1)
+        p = 1.0 / (1.0 + np.exp(-logit))
+    is_buyback = rng.random(n) < p
+
+    default_profit = market_at_expiry * (1 - params.sale_commission) - loan
+    buyback_profit = buyback_price - loan
+    profit = np.where(is_buyback, buyback_profit, default_profit)
+
+    return profit, loan, is_buyback, term_days
+
+
+def _run_worker(seed_seq, prices, policy: PolicyConfig, params: SimulationParams, n: int):
+    """Воркер: прогнать n сделок пачками по BATCH_SIZE"""
+    rng = np.random.default_rng(seed_seq)
+    prices = np.asarray(prices, dtype=np.float64)
+
+    profits, loans, buybacks, terms = [], [], [], []
+    remaining = n
+    while remaining > 0:
+        size = min(BATCH_SIZE, remaining)
+        profit, loan, is_buyback, term_days = _simulate_batch(rng, prices, policy, params, size)
+        profits.append(profit.astype(np.float32))
+        loans.append(loan.astype(np.float32))
+        buybacks.append(is_buyback)
+        terms.append(term_days.astype(np.int16))
+        remaining -= size
+
+    return (np.concatenate(profits), np.concatenate(loans),
+            np.concatenate(buybacks), np.concatenate(terms))
+
+
+def run_simulation(prices: List[float], policy: PolicyConfig,
+                   params: SimulationParams) -> SimulationReport:
+    """
+    Прогнать Monte Carlo симуляцию политики
+
+    Args:
+        prices: Выборка цен предметов (см. load_price_sample)
+        policy: Кандидатные loan_tiers / buyback_terms
+        params: Параметры модели поведения клиентов и рынка
+
+    Returns:
+        SimulationReport с распределением прибыли
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("Для симуляции установите: pip install numpy")
+    if not prices:
+        raise ValueError("Пустая выборка цен")
+    if params.deals < 1:
+        raise ValueError(f"Число сделок должно быть не меньше 1: {params.deals}")
+
+    started = time.perf_counter()
+
+    workers = max(1, min(params.workers, params.deals))
+    chunk_sizes = [params.deals // workers + (1 if i < params.deals % workers else 0) for i in range(workers)]
+    seeds = np.random.SeedSequence(params.seed).spawn(workers)
+
+    if workers == 1:
+        results = [_run_worker(seeds[0], prices, policy, params, chunk_sizes[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_run_worker, seeds[i], prices, policy, params, chunk_sizes[i])
+                for i in range(workers)
+            ]
+            results = [f.result() for f in futures]
+
+    profit = np.concatenate([r[0] for r in results]).astype(np.float64)
+    loan = np.concatenate([r[1] for r in results]).astype(np.float64)
+    is_buyback = np.concatenate([r[2] for r in results])
+    term_days = np.concatenate([r[3] for r in results])
+
+    elapsed = time.perf_counter() - started
+    total_loan = float(loan.sum())
+    total_profit = float(profit.sum())
+    percentile_points = [1, 5, 25, 50, 75, 95, 99]
+    percentile_values = np.percentile(profit, percentile_points)
+
+    by_term = {}
+    for days in sorted(policy.buyback_terms.keys()):
+        mask = term_days == days
+        if mask.any():
+            term_loan = float(loan[mask].sum())
+            by_term[int(days)] = {
+                "deals": int(mask.sum()),
+                "mean_profit": round(float(profit[mask].mean()), 2),
+                "roi_percent": round(float(profit[mask].sum()) / term_loan * 100, 2) if term_loan > 0 else 0.0
+            }
+
+    return SimulationReport(
+        deals=int(profit.size),
+        buyback_rate=round(float(is_buyback.mean()), 4),
+        default_rate=round(1 - float(is_buyback.mean()), 4),
+        mean_profit=round(float(profit.mean()), 2),
+        std_profit=round(float(profit.std()), 2),
+        percentiles={f"p{p}": round(float(v), 2) for p, v in zip(percentile_points, percentile_values)},
+        loss_probability=round(float((profit < 0).mean()), 4),
+        total_loan=round(total_loan, 2),
+        total_profit=round(total_profit, 2),
+        roi_percent=round(total_profit / total_loan * 100, 2) if total_loan > 0 else 0.0,
+        elapsed_seconds=round(elapsed, 3),
+        deals_per_second=round(profit.size / elapsed) if elapsed > 0 else 0.0,
+        by_term=by_term
+    )
+
+
+def _print_report(report: SimulationReport, policy: PolicyConfig):
+    """Вывести отчёт в консоль"""
+    print("=" * 60)
+    print("MONTE CARLO: ПРИБЫЛЬНОСТЬ ПОЛИТИКИ")
+    print("=" * 60)
+    print("\nПороги выдачи:")
+    for tier in policy.loan_tiers:
+        print(f"  до {tier['max']:>10} ₽: {tier['percent'] * 100:.0f}%")
+    print("\nУсловия выкупа:")
+    for days, term in sorted(policy.buyback_terms.items()):
+        print(f"  {days:>2} дней: проценты {term['interest'] * 100:.0f}%, премия {term['premium'] * 100:.0f}%")
+
+    print(f"\nСделок: {report.deals:,} за {report.elapsed_seconds} с ({report.deals_per_second:,.0f} сделок/с)")
+    print(f"Выкуп: {report.buyback_rate * 100:.1f}%, дефолт: {report.default_rate * 100:.1f}%")
+    print(f"Средняя прибыль: {report.mean_profit:,.2f} ₽ (σ = {report.std_profit:,.2f} ₽)")
+    print(f"Вероятность убытка: {report.loss_probability * 100:.2f}%")
+    print(f"Выдано: {report.total_loan:,.0f} ₽, прибыль: {report.total_profit:,.0f} ₽, ROI: {report.roi_percent:.2f}%")
+
+    print("\nРаспределение прибыли на сделку:")
+    for name, value in report.percentiles.items():
+        print(f"  {name:>4}: {value:>12,.2f} ₽")
+
+    print("\nПо срокам:")
+    for days, term in report.by_term.items():
+        print(f"  {days:>2} дней: {term['deals']:>10,} сделок, прибыль {term['mean_profit']:>10,.2f} ₽, ROI {term['roi_percent']:.2f}%")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """CLI для офлайн-оценки изменений политики"""
+    from services.pricing_service import PricingService
+    from services.price_aggregator import PriceAggregator
+
+    settings = get_settings()
+    defaults = SimulationParams()
+
+    parser = argparse.ArgumentParser(description="Monte Carlo симуляция выкупов и дефолтов")
+    parser.add_argument("--deals", type=int, default=defaults.deals)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--loan-tiers", default=f"inf:{PricingService.get_purchase_coefficient(0)}",
+                        help="Формат Settings.loan_tiers (по умолчанию — текущий коэффициент PricingService)")
+    parser.add_argument("--buyback-terms", default=settings.buyback_terms,
+                        help="Формат Settings.buyback_terms")
+    parser.add_argument("--source", choices=["db", "file", "demo"], default="db")
+    parser.add_argument("--prices-file", default=None)
+    parser.add_argument("--min-price", type=float, default=PriceAggregator.MIN_PRICE)
+    parser.add_argument("--items-per-deal", type=float, default=defaults.items_per_deal)
+    parser.add_argument("--buyback-rate", type=float, default=defaults.buyback_rate)
+    parser.add_argument("--buyback-elasticity", type=float, default=defaults.buyback_elasticity)
+    parser.add_argument("--volatility", type=float, default=defaults.volatility)
+    parser.add_argument("--drift", type=float, default=defaults.drift)
+    parser.add_argument("--json", action="store_true", help="Вывести отчёт в JSON")
+    args = parser.parse_args(argv)
+
+    if args.source == "file" and not args.prices_file:
+        parser.error("--source file требует --prices-file")
+    if args.deals < 1:
+        parser.error("--deals должно быть не меньше 1")
+    if not NUMPY_AVAILABLE:
+        print("[SIMULATOR] Установите: pip install numpy")
+        return 1
+
+    policy = PolicyConfig.from_strings(args.loan_tiers, args.buyback_terms)
+    params = SimulationParams(
+        deals=args.deals,
+        workers=args.workers,
+        seed=args.seed,
+        items_per_deal=args.items_per_deal,
+        buyback_rate=args.buyback_rate,
+        buyback_elasticity=args.buyback_elasticity,
+        volatility=args.volatility,
+        drift=args.drift
+    )
+
+    prices = load_price_sample(args.source, args.prices_file, args.min_price)
+    report = run_simulation(prices, policy, params)
+
+    if args.json:
+        print(json.dumps(asdict(report), ensure_ascii=False, indent=2))
+    else:
+        _print_report(report, policy)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,11 @@ from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 
+from logger import get_logger
+from metrics import timed
+
+log = get_logger("prices")
+
 
 @dataclass
 class PriceData:
@@ -16,6 +21,8 @@ class PriceData:
     instant_price: float  # = market_csgo_price (для залога)
     is_acceptable: bool  # Можно ли принять предмет
     timestamp: datetime
+    instant_price_kopecks: int = 0  # instant_price в копейках
+    loan_price_kopecks: int = 0  # Сумма выдачи за предмет в копейках
 
 
 class PriceAggregator:
@@ -25,6 +32,7 @@ class PriceAggregator:
     LIS_SKINS_MARKUP = 1.10  # Lis-Skins обычно на 10% дороже
     
     @staticmethod
+    @timed("prices.get_prices")
     async def get_prices(market_hash_names: List[str]) -> Dict[str, PriceData]:
         """
         Получить цены для списка предметов
@@ -37,9 +45,9 @@ class PriceAggregator:
         Returns:
             Dict[market_hash_name, PriceData]
         """
+        import money
         from services.market_csgo_service import MarketCSGOService
-        
-        print(f"[PRICES] Получаем цены для {len(market_hash_names)} предметов")
+        from services.pricing_service import PricingService
         
         # Получаем цены с market.csgo (кэшируется на 1 час)
         market_prices = await MarketCSGOService.get_prices(market_hash_names)
@@ -58,22 +66,30 @@ class PriceAggregator:
             if is_acceptable:
                 acceptable_count += 1
             
+            # Копейки считаются один раз на предмет и дальше переносятся как есть
+            instant_kopecks = money.to_kopecks(market_price)
+            
             result[name] = PriceData(
                 market_csgo_price=market_price,
                 lis_skins_estimate=lis_estimate,
                 instant_price=market_price,  # Для залога используем market.csgo
                 is_acceptable=is_acceptable,
-                timestamp=datetime.now()
+                timestamp=datetime.now(),
+                instant_price_kopecks=instant_kopecks,
+                loan_price_kopecks=PricingService.calculate_item_loan_kopecks(instant_kopecks)
             )
         
-        print(f"[PRICES] ✅ Принимаем {acceptable_count}/{len(market_hash_names)} предметов (цена >= {PriceAggregator.MIN_PRICE}₽)")
+        log.debug("Цены получены", extra={"requested": len(market_hash_names), "acceptable": acceptable_count, "min_price": PriceAggregator.MIN_PRICE})
         
         return result
     
     @staticmethod
     def calculate_loan(price: float) -> float:
-        """Рассчитать сумму залога (40% от цены)"""
-        return price * 0.40
+        """Рассчитать сумму залога (40% от цены, с точностью до копейки)"""
+        import money
+        from services.pricing_service import PricingService
+        
+        return money.to_rubles(PricingService.calculate_item_loan_kopecks(money.to_kopecks(price)))
     
     @staticmethod
     def calculate_profit_on_default(market_csgo_price: float) -> dict:
@@ -1,9 +1,12 @@
 """
 Сервис расчёта условий сделки с конфигурируемыми параметрами
 """
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime, timedelta
+from functools import lru_cache
 from config import get_settings
+import money
+from metrics import timed
 
 
 class PricingService:
@@ -92,10 +95,71 @@ class PricingService:
         }
     
     @staticmethod
+    @lru_cache(maxsize=65536)
+    def calculate_item_loan_kopecks(instant_kopecks: int) -> int:
+        """
+        Сумма выдачи за один предмет в копейках
+        
+        Кэшируется по цене: в инвентарях одни и те же цены повторяются
+        
+        Args:
+            instant_kopecks: Instant цена предмета в копейках
+            
+        Returns:
+            Сумма выдачи в копейках (округление half-up)
+        """
+        loan_percent = PricingService.get_loan_percent(instant_kopecks / money.KOPECKS_PER_RUBLE)
+        return money.apply_rate(instant_kopecks, money.rate_to_ppm(loan_percent))
+    
+    @staticmethod
+    def get_item_kopecks(instant_price: float, price_data: Optional[Dict] = None) -> Dict[str, int]:
+        """
+        Копейки для предмета: из данных PriceAggregator, если цена не менялась
+        (fallback по редкости), иначе пересчёт
+        
+        Returns:
+            {"instant_price_kopecks": int, "loan_price_kopecks": int}
+        """
+        if (price_data and "loan_price_kopecks" in price_data
+                and price_data.get("instant_price") == instant_price):
+            return {
+                "instant_price_kopecks": price_data["instant_price_kopecks"],
+                "loan_price_kopecks": price_data["loan_price_kopecks"]
+            }
+        
+        instant_kopecks = money.to_kopecks(instant_price)
+        return {
+            "instant_price_kopecks": instant_kopecks,
+            "loan_price_kopecks": PricingService.calculate_item_loan_kopecks(instant_kopecks)
+        }
+    
+    @staticmethod
+    def calculate_buyback_kopecks(loan_kopecks: int, term_config: Dict) -> Dict[str, int]:
+        """
+        Разложить сумму выкупа на слагаемые в копейках
+
+        Каждое слагаемое округляется отдельно, поэтому
+        loan + interest + premium == buyback без расхождений.
+        """
+        interest = money.apply_rate(loan_kopecks, money.rate_to_ppm(term_config["interest"]))
+        premium = money.apply_rate(loan_kopecks + interest, money.rate_to_ppm(term_config["premium"]))
+        return {
+            "interest": interest,
+            "premium": premium,
+            "buyback": loan_kopecks + interest + premium
+        }
+    
+    @staticmethod
+    @timed("pricing.calculate_quote")
     def calculate_quote(items: List[Dict], option_days: int) -> Dict:
         """
         Рассчитать условия сделки
         
+        Суммы считаются в копейках. Если предмет уже несёт
+        instant_price_kopecks / loan_price_kopecks (их проставляет
+        PriceAggregator), они используются как есть. Дальше те же значения
+        идут в items_snapshot, договор и выплату.
+        
         Args:
             items: Список предметов с ценами
             option_days: Срок опциона (7-30 дней)
@@ -104,45 +168,58 @@ class PricingService:
             Dict с условиями сделки
         """
         # Рассчитываем для каждого предмета
-        market_total = 0.0
-        loan_total = 0.0
+        market_kopecks = 0
+        loan_kopecks = 0
         
         items_with_loan = []
+        calculate_item_loan = PricingService.calculate_item_loan_kopecks
+        get_loan_percent = PricingService.get_loan_percent
         
         for item in items:
-            instant_price = item.get("instant_price", 0.0)
+            # Копейки приходят из PriceAggregator; float-цена — только для старых вызовов
+            instant_kopecks = item.get("instant_price_kopecks")
+            if instant_kopecks is None:
+                instant_kopecks = money.to_kopecks(item.get("instant_price", 0.0))
             
-            if instant_price > 0:
-                # Процент выдачи зависит от цены
-                loan_percent = PricingService.get_loan_percent(instant_price)
-                loan_price = instant_price * loan_percent
+            if instant_kopecks > 0:
+                # Уже посчитанная сумма выдачи переносится как есть
+                loan_price_kopecks = item.get("loan_price_kopecks")
+                if loan_price_kopecks is None:
+                    loan_price_kopecks = calculate_item_loan(instant_kopecks)
                 
-                items_with_loan.append({
-                    **item,
-                    "loan_percent": loan_percent,
-                    "loan_price": loan_price
-                })
+                items_with_loan.append(dict(
+                    item,
+                    loan_percent=get_loan_percent(instant_kopecks / money.KOPECKS_PER_RUBLE),
+                    instant_price_kopecks=instant_kopecks,
+                    loan_price_kopecks=loan_price_kopecks,
+                    loan_price=money.to_rubles(loan_price_kopecks)
+                ))
                 
-                market_total += instant_price
-                loan_total += loan_price
+                market_kopecks += instant_kopecks
+                loan_kopecks += loan_price_kopecks
         
         # Рассчитываем выкуп
         term_config = PricingService.get_term_config(option_days)
-        
-        base_buyback = loan_total * (1 + term_config["interest"])
-        buyback_price = base_buyback * (1 + term_config["premium"])
+        buyback = PricingService.calculate_buyback_kopecks(loan_kopecks, term_config)
         
         # Дата окончания
         option_expiry = datetime.now() + timedelta(days=option_days)
         
         return {
-            "market_total": round(market_total, 2),
-            "loan_amount": round(loan_total, 2),
-            "buyback_price": round(buyback_price, 2),
+            "market_total": money.to_rubles(market_kopecks),
+            "loan_amount": money.to_rubles(loan_kopecks),
+            "buyback_price": money.to_rubles(buyback["buyback"]),
             "option_days": option_days,
             "option_expiry": option_expiry,
             "term_config": term_config,
-            "items": items_with_loan
+            "items": items_with_loan,
+            "breakdown": {
+                "market_total_kopecks": market_kopecks,
+                "loan_amount_kopecks": loan_kopecks,
+                "interest_kopecks": buyback["interest"],
+                "premium_kopecks": buyback["premium"],
+                "buyback_price_kopecks": buyback["buyback"]
+            }
         }
     
     @staticmethod
@@ -8,6 +8,11 @@ from typing import Dict, List
 from datetime import datetime, timedelta
 import os
 
+from services.http_clients import http_clients
+from logger import get_logger
+
+log = get_logger("market_csgo")
+
 
 class RealMarketCSGOService:
     """Production сервис для market.csgo с реальными запросами"""
@@ -31,41 +36,42 @@ class RealMarketCSGOService:
         # Проверяем кеш всех цен
         cached_prices, cached_time = RealMarketCSGOService._all_prices_cache
         if datetime.now() - cached_time < RealMarketCSGOService._cache_ttl:
-            print(f"[MARKET.CSGO] Используем кеш ({len(cached_prices)} предметов)")
+            log.debug("Прайс-лист из кеша", extra={"prices": len(cached_prices)})
             return cached_prices
         
-        print("[MARKET.CSGO] Загружаем ВСЕ цены...")
+        log.info("Загружаем прайс-лист")
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with http_clients.borrow("market_csgo") as client:
                 response = await client.get(
                     f"{RealMarketCSGOService.API_URL}/prices/RUB.json",
-                    headers={"User-Agent": "CyberLombard/1.0"}
+                    headers={"User-Agent": "CyberLombard/1.0"},
+                    timeout=30.0
                 )
                 
                 if response.status_code == 200:
                     data = response.json()
                     
                     if not data.get("success"):
-                        print("[MARKET.CSGO] API вернул success=false")
+                        log.warning("API вернул success=false")
                         return {}
                     
                     items = data.get("items", {})
-                    print(f"[MARKET.CSGO] Получено {len(items)} цен")
+                    log.info("Прайс-лист загружен", extra={"prices": len(items)})
                     
                     # Кешируем
                     RealMarketCSGOService._all_prices_cache = (items, datetime.now())
                     
                     return items
                 else:
-                    print(f"[MARKET.CSGO] HTTP {response.status_code}")
+                    log.warning("Прайс-лист не получен", extra={"status": response.status_code})
                     return {}
         
         except httpx.TimeoutException:
-            print("[MARKET.CSGO] Timeout")
+            log.warning("Таймаут загрузки прайс-листа")
             return {}
         except Exception as e:
-            print(f"[MARKET.CSGO] Ошибка: {e}")
+            log.error("Ошибка загрузки прайс-листа", extra={"error": str(e)})
             return {}
     
     @staticmethod
@@ -83,7 +89,7 @@ class RealMarketCSGOService:
         all_prices = await RealMarketCSGOService.get_all_prices()
         
         if not all_prices:
-            print("[MARKET.CSGO] Не удалось получить цены")
+            log.warning("Не удалось получить цены", extra={"requested": len(market_hash_names)})
             return {name: 0.0 for name in market_hash_names}
         
         # Извлекаем нужные
@@ -98,7 +104,7 @@ class RealMarketCSGOService:
                 result[name] = 0.0
         
         found = len([p for p in result.values() if p > 0])
-        print(f"[MARKET.CSGO] Найдено {found}/{len(market_hash_names)} цен")
+        log.debug("Цены из прайс-листа", extra={"requested": len(market_hash_names), "found": found})
         
         return result
     
@@ -114,11 +120,11 @@ class RealMarketCSGOService:
             Dict[market_hash_name, details]
         """
         if not RealMarketCSGOService.API_KEY:
-            print("[MARKET.CSGO] API ключ не установлен")
+            log.warning("API ключ market.csgo не установлен")
             return {}
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with http_clients.borrow("market_csgo") as client:
                 # Формируем параметры
                 params = {"key": RealMarketCSGOService.API_KEY}
                 for name in market_hash_names:
@@ -126,18 +132,19 @@ class RealMarketCSGOService:
                 
                 response = await client.get(
                     f"{RealMarketCSGOService.API_URL}/get-list-items-info",
-                    params=params
+                    params=params,
+                    timeout=30.0
                 )
                 
                 if response.status_code == 200:
                     data = response.json()
                     return data.get("data", {})
                 else:
-                    print(f"[MARKET.CSGO] Детали: HTTP {response.status_code}")
+                    log.warning("Детали предметов не получены", extra={"status": response.status_code})
                     return {}
         
         except Exception as e:
-            print(f"[MARKET.CSGO] Ошибка деталей: {e}")
+            log.error("Ошибка получения деталей предметов", extra={"error": str(e)})
             return {}
     
     @staticmethod
@@ -145,4 +152,4 @@ class RealMarketCSGOService:
         """Очистить весь кеш"""
         RealMarketCSGOService._price_cache.clear()
         RealMarketCSGOService._all_prices_cache = ({}, datetime.min)
-        print("[MARKET.CSGO] Кеш очищен")
+        log.info("Кеш прайс-листа очищен")
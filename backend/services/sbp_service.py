@@ -1,10 +1,10 @@
 """
 Сервис выплат через СБП
 """
-import httpx
 from typing import Dict, Optional
 from datetime import datetime
 from config import get_settings
+from services.http_clients import http_clients
 
 
 class SBPService:
@@ -83,7 +83,7 @@ class SBPService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with http_clients.borrow("sbp") as client:
                 response = await client.post(url, headers=headers, json=payload)
                 
                 if response.status_code == 200:
@@ -109,8 +109,8 @@ class SBPService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(url, headers=headers)
+            async with http_clients.borrow("sbp") as client:
+                response = await client.get(url, headers=headers, timeout=10.0)
                 
                 if response.status_code == 200:
                     result = response.json()
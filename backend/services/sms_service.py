@@ -1,12 +1,12 @@
 """
 Сервис отправки SMS с поддержкой разных провайдеров
 """
-import httpx
 import hashlib
 import secrets
 from typing import Optional
 from datetime import datetime, timedelta
 from config import get_settings
+from services.http_clients import http_clients
 
 
 class SMSService:
@@ -83,7 +83,7 @@ class SMSService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_clients.borrow("sms") as client:
                 response = await client.get(url, params=params)
                 data = response.json()
                 
@@ -112,7 +112,7 @@ class SMSService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_clients.borrow("sms") as client:
                 response = await client.get(url, params=params)
                 data = response.json()
                 
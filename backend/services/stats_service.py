@@ -0,0 +1,262 @@
+"""
+Статистика сделок
+
+Чтение — одна строка deal_stats по первичному ключу (O(1)). Строки
+обновляются инкрементально в той же транзакции, что и переход статуса:
+ORM-изменения Deal ловит before_flush, массовые UPDATE (дефолт по сроку)
+передают переходы явно через record_transitions. Пересчёт с нуля —
+один GROUP BY по deals (rebuild).
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, event, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, attributes
+
+import models
+import money
+
+GLOBAL_STATS_ID = 0
+
+STATUS_COLUMNS = {
+    models.DealStatus.PENDING: "pending_count",
+    models.DealStatus.ACTIVE: "active_count",
+    models.DealStatus.BUYBACK: "buyback_count",
+    models.DealStatus.DEFAULT: "default_count",
+    models.DealStatus.CANCELLED: "cancelled_count",
+}
+AMOUNT_COLUMNS = ("loan_total_kopecks", "buyback_paid_kopecks")
+
+# Ограничение числа параметров в одном IN
+ROWS_CHUNK_SIZE = 500
+
+# (user_id, старый статус | None, новый статус | None, выдача в копейках, выкуп в копейках)
+Transition = Tuple[int, Optional[models.DealStatus], Optional[models.DealStatus], int, int]
+
+
+def _empty_stats() -> Dict[str, int]:
+    return {column: 0 for column in (*STATUS_COLUMNS.values(), *AMOUNT_COLUMNS)}
+
+
+class StatsService:
+    """Материализованная статистика пользователей и сервиса"""
+
+    @staticmethod
+    def aggregate_query(user_id: Optional[int] = None):
+        """
+        Один запрос статистики: GROUP BY deal_status с суммами
+
+        Returns:
+            select (deal_status, count, loan_total, buyback_paid)
+        """
+        stmt = select(
+            models.Deal.deal_status,
+            func.count(models.Deal.id),
+            func.coalesce(func.sum(models.Deal.loan_amount), 0),
+            func.coalesce(func.sum(case(
+                (models.Deal.deal_status == models.DealStatus.BUYBACK, models.Deal.buyback_price),
+                else_=0
+            )), 0)
+        ).group_by(models.Deal.deal_status)
+
+        if user_id is not None:
+            stmt = stmt.where(models.Deal.user_id == user_id)
+        return stmt
+
+    @staticmethod
+    def from_aggregate(rows: Iterable) -> Dict[str, int]:
+        """Строки aggregate_query -> значения колонок deal_stats"""
+        stats = _empty_stats()
+        for status, count, loan_total, buyback_paid in rows:
+            stats[STATUS_COLUMNS[models.DealStatus(status)]] += count
+            stats["loan_total_kopecks"] += money.to_kopecks(loan_total)
+            stats["buyback_paid_kopecks"] += money.to_kopecks(buyback_paid)
+        return stats
+
+    @staticmethod
+    def record_transitions(connection: Connection, transitions: Iterable[Transition]):
+        """
+        Применить переходы статусов к deal_stats (строки пользователя и сервиса)
+
+        Вызывается в транзакции, которая меняет сделки.
+        """
+        deltas: Dict[int, Dict[str, int]] = defaultdict(_empty_stats)
+
+        for user_id, old_status, new_status, loan_kopecks, buyback_kopecks in transitions:
+            for row_id in (user_id, GLOBAL_STATS_ID):
+                delta = deltas[row_id]
+                if old_status is not None:
+                    delta[STATUS_COLUMNS[old_status]] -= 1
+                    if old_status == models.DealStatus.BUYBACK:
+                        delta["buyback_paid_kopecks"] -= buyback_kopecks
+                else:
+                    delta["loan_total_kopecks"] += loan_kopecks  # Новая сделка
+
+                if new_status is not None:
+                    delta[STATUS_COLUMNS[new_status]] += 1
+                    if new_status == models.DealStatus.BUYBACK:
+                        delta["buyback_paid_kopecks"] += buyback_kopecks
+                else:
+                    delta["loan_total_kopecks"] -= loan_kopecks  # Сделка удалена
+
+        # Один executemany UPDATE на набор изменённых колонок (а не запрос на пользователя)
+        by_columns: Dict[Tuple[str, ...], List[Dict]] = defaultdict(list)
+        for row_id, delta in deltas.items():
+            changes = {column: value for column, value in delta.items() if value}
+            if changes:
+                by_columns[tuple(sorted(changes))].append(
+                    {"row_id": row_id, **{f"delta_{column}": value for column, value in changes.items()}}
+                )
+        if not by_columns:
+            return
+
+        table = models.DealStats.__table__
+        row_ids = sorted({params["row_id"] for rows in by_columns.values() for params in rows})
+        StatsService._ensure_rows(connection, row_ids)
+
+        for columns, rows in by_columns.items():
+            connection.execute(
+                table.update()
+                .where(table.c.user_id == bindparam("row_id"))
+                .values({column: table.c[column] + bindparam(f"delta_{column}") for column in columns}),
+                rows
+            )
+
+    @staticmethod
+    def _ensure_rows(connection: Connection, row_ids: List[int]):
+        """
+        Пустые строки deal_stats для пользователей, у которых их ещё нет
+
+        INSERT ... ON CONFLICT DO NOTHING: первые сделки пользователя в двух
+        параллельных транзакциях не падают на первичном ключе.
+        """
+        table = models.DealStats.__table__
+        dialect = connection.dialect.name
+        if dialect == "postgresql":
+            stmt = postgresql.insert(table).on_conflict_do_nothing(index_elements=["user_id"])
+        elif dialect == "sqlite":
+            stmt = sqlite.insert(table).on_conflict_do_nothing(index_elements=["user_id"])
+        else:
+            existing = set()
+            for start in range(0, len(row_ids), ROWS_CHUNK_SIZE):
+                existing.update(connection.execute(
+                    select(table.c.user_id).where(table.c.user_id.in_(row_ids[start:start + ROWS_CHUNK_SIZE]))
+                ).scalars())
+            row_ids = [row_id for row_id in row_ids if row_id not in existing]
+            stmt = table.insert()
+        if row_ids:
+            connection.execute(stmt, [{"user_id": row_id, **_empty_stats()} for row_id in row_ids])
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """
+        Пересчитать deal_stats с нуля одним GROUP BY по deals
+
+        Returns:
+            Количество строк статистики
+        """
+        rows = db.execute(
+            StatsService.aggregate_query()
+            .add_columns(models.Deal.user_id)
+            .group_by(models.Deal.user_id)
+        ).all()
+
+        by_user: Dict[int, List] = defaultdict(list)
+        for *aggregate, user_id in rows:
+            by_user[user_id].append(aggregate)
+            by_user[GLOBAL_STATS_ID].append(aggregate)
+
+        table = models.DealStats.__table__
+        db.execute(table.delete())
+        values = [
+            {"user_id": user_id, **StatsService.from_aggregate(aggregates)}
+            for user_id, aggregates in by_user.items()
+        ]
+        values = values or [{"user_id": GLOBAL_STATS_ID, **_empty_stats()}]
+        db.execute(table.insert(), values)
+        return len(values)
+
+    @staticmethod
+    def ensure_initialized(db: Session) -> bool:
+        """Заполнить deal_stats, если таблица пустая (новая БД после create_all)"""
+        if db.get(models.DealStats, GLOBAL_STATS_ID) is not None:
+            return False
+        StatsService.rebuild(db)
+        db.commit()
+        print("[STATS] deal_stats пересчитана")
+        return True
+
+    @staticmethod
+    def public_view(stats: Optional[models.DealStats]) -> Dict:
+        """Ответ /api/stats/public"""
+        counts = {column: getattr(stats, column, 0) or 0 for column in STATUS_COLUMNS.values()}
+        total_deals = sum(counts.values())
+        total_volume = money.to_rubles(getattr(stats, "loan_total_kopecks", 0) or 0)
+
+        return {
+            "total_deals": total_deals,
+            "active_deals": counts["active_count"],
+            "total_volume": round(total_volume, 2),
+            "avg_deal_amount": round(total_volume / total_deals, 2) if total_deals else 0,
+            "buyback_rate": round(counts["buyback_count"] / total_deals * 100, 2) if total_deals else 0
+        }
+
+    @staticmethod
+    def user_view(stats: Optional[models.DealStats]) -> Dict:
+        """Ответ /api/stats/user/{steam_id} (без member_since)"""
+        counts = {column: getattr(stats, column, 0) or 0 for column in STATUS_COLUMNS.values()}
+
+        return {
+            "total_deals": sum(counts.values()),
+            "active_deals": counts["active_count"],
+            "buyback_count": counts["buyback_count"],
+            "default_count": counts["default_count"],
+            "total_received": round(money.to_rubles(getattr(stats, "loan_total_kopecks", 0) or 0), 2),
+            "total_paid_back": round(money.to_rubles(getattr(stats, "buyback_paid_kopecks", 0) or 0), 2)
+        }
+
+
+@event.listens_for(models.Deal.deal_status, "set", active_history=True)
+def _load_previous_status(target, value, oldvalue, initiator):
+    """
+    active_history: перед присвоением ORM подгружает прежний статус,
+    даже если атрибут истёк после commit — иначе переход не виден в before_flush
+    """
+
+
+@event.listens_for(Session, "before_flush")
+def _track_deal_transitions(session: Session, flush_context, instances):
+    """Переходы статусов Deal через ORM -> deal_stats в той же транзакции"""
+    transitions: List[Transition] = []
+
+    for obj in session.new:
+        if isinstance(obj, models.Deal):
+            transitions.append((
+                obj.user_id, None, obj.deal_status or models.DealStatus.PENDING,
+                money.to_kopecks(obj.loan_amount), money.to_kopecks(obj.buyback_price)
+            ))
+
+    for obj in session.dirty:
+        if not isinstance(obj, models.Deal):
+            continue
+        history = attributes.get_history(obj, "deal_status")
+        if not history.added or not history.deleted:
+            continue
+        old_status, new_status = history.deleted[0], history.added[0]
+        if old_status != new_status:
+            transitions.append((
+                obj.user_id, old_status, new_status,
+                money.to_kopecks(obj.loan_amount), money.to_kopecks(obj.buyback_price)
+            ))
+
+    for obj in session.deleted:
+        if isinstance(obj, models.Deal):
+            transitions.append((
+                obj.user_id, obj.deal_status, None,
+                money.to_kopecks(obj.loan_amount), money.to_kopecks(obj.buyback_price)
+            ))
+
+    if transitions:
+        StatsService.record_transitions(session.connection(), transitions)
@@ -1,7 +1,8 @@
 import re
 import urllib.parse
 from typing import Optional, Dict
-import httpx
+
+from services.http_clients import http_clients
 
 class SteamAuthService:
     """Сервис для Steam OpenID авторизации"""
@@ -59,7 +60,7 @@ class SteamAuthService:
         verification_params = dict(params)
         verification_params["openid.mode"] = "check_authentication"
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http_clients.borrow("steam") as client:
             try:
                 response = await client.post(
                     SteamAuthService.STEAM_OPENID_URL,
@@ -7,6 +7,8 @@ import asyncio
 from typing import List, Dict, Optional
 import json
 
+from services.http_clients import http_clients
+
 
 class SteamAuthenticatedInventory:
     """
@@ -56,19 +58,21 @@ class SteamAuthenticatedInventory:
             'Sec-Ch-Ua-Platform': '"Windows"',
         }
         
-        # Cookies для авторизации
+        # Cookies для авторизации — заголовком: общий клиент Steam не хранит cookies
         cookies = {}
         if session_id:
             cookies['sessionid'] = session_id
         if steam_login_secure:
             cookies['steamLoginSecure'] = steam_login_secure
+        if cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in cookies.items())
         
         params = {
             'l': 'english'
             # Убрали count=5000 - Steam возвращает 400 с этим параметром
         }
         
-        async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
+        async with http_clients.borrow("steam") as client:
             try:
                 # Задержка для избежания rate limit
                 await asyncio.sleep(1)
@@ -76,8 +80,8 @@ class SteamAuthenticatedInventory:
                 response = await client.get(
                     url,
                     headers=headers,
-                    cookies=cookies,
-                    params=params
+                    params=params,
+                    timeout=60.0
                 )
                 
                 print(f"[AUTH_INVENTORY] Status: {response.status_code} for {steam_id}")
@@ -89,7 +93,7 @@ class SteamAuthenticatedInventory:
                 if response.status_code == 429:
                     print(f"[AUTH_INVENTORY] Rate limit, ждем 5 секунд...")
                     await asyncio.sleep(5)
-                    response = await client.get(url, headers=headers, cookies=cookies, params=params)
+                    response = await client.get(url, headers=headers, params=params, timeout=60.0)
                 
                 if response.status_code != 200:
                     print(f"[AUTH_INVENTORY] Ошибка {response.status_code}: {response.text[:200]}")
@@ -188,7 +192,7 @@ class SteamAuthenticatedInventory:
         }
         
         for attempt in range(retry_count):
-            async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
+            async with http_clients.borrow("steam") as client:
                 try:
                     # Задержка между попытками
                     if attempt > 0:
@@ -198,7 +202,7 @@ class SteamAuthenticatedInventory:
                     else:
                         await asyncio.sleep(1)
                     
-                    response = await client.get(url, headers=headers, params=params)
+                    response = await client.get(url, headers=headers, params=params, timeout=60.0)
                     
                     print(f"[PUBLIC_INVENTORY] Status: {response.status_code} for {steam_id}")
                     
@@ -1,9 +1,9 @@
 """
 Помощник для загрузки Steam инвентаря через различные методы
 """
-import httpx
 import asyncio
 from typing import List, Dict, Optional
+from services.http_clients import http_clients
 from services.steam_real_inventory import SteamRealInventory
 
 
@@ -58,8 +58,8 @@ class SteamInventoryHelper:
         try:
             await asyncio.sleep(2)  # Задержка для избежания rate limit
             
-            async with httpx.AsyncClient(timeout=30.0, headers=headers) as client:
-                response = await client.get(url, params=params)
+            async with http_clients.borrow("steam") as client:
+                response = await client.get(url, params=params, headers=headers)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -86,8 +86,8 @@ class SteamInventoryHelper:
         try:
             await asyncio.sleep(2)
             
-            async with httpx.AsyncClient(timeout=30.0, headers=headers) as client:
-                response = await client.get(url, params=params)
+            async with http_clients.borrow("steam") as client:
+                response = await client.get(url, params=params, headers=headers)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -103,7 +103,7 @@ class SteamInventoryHelper:
     async def _method_bot(steam_id: str) -> List[Dict]:
         """Загрузка через Steam Bot"""
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with http_clients.borrow("steam_bot") as client:
                 response = await client.get(f"http://localhost:3001/api/inventory/{steam_id}")
                 
                 if response.status_code == 200:
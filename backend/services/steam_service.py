@@ -1,12 +1,16 @@
 import httpx
 from typing import List, Dict, Optional
+from cache import cache
 from config import get_settings
+from services.http_clients import http_clients
 import asyncio
-from services.steam_inventory_loader import SteamInventoryLoader
 from services.steam_inventory_helper import SteamInventoryHelper
 from services.steam_authenticated_inventory import SteamAuthenticatedInventory
+from logger import get_logger
+from metrics import cache_lookup, timed
 
 settings = get_settings()
+log = get_logger("steam")
 
 class SteamService:
     """Сервис для работы с Steam API и маркетами"""
@@ -21,29 +25,43 @@ class SteamService:
     }
     
     @staticmethod
+    @timed("steam.get_inventory")
     async def get_inventory(steam_id: str) -> List[Dict]:
-        """Получить CS2 инвентарь пользователя"""
+        """
+        Получить CS2 инвентарь пользователя
+        
+        Загруженный из Steam инвентарь кэшируется (cache, inventory_cache_ttl_seconds):
+        повторные запросы не ждут Steam и не расходуют его лимит. Демо-данные не кэшируются.
+        """
+        cache_key = SteamService._inventory_key(steam_id)
+        items = await cache.get(cache_key)
+        if items is not None:
+            cache_lookup("inventory", hits=1)
+            log.debug("Инвентарь из кэша", extra={"steam_id": steam_id, "items": len(items)})
+            return items
         
-        print(f"[STEAM] Загрузка инвентаря для {steam_id}")
+        cache_lookup("inventory", misses=1)
+        log.info("Загрузка инвентаря", extra={"steam_id": steam_id})
         
         # Метод 1: Улучшенный публичный метод с retry
-        print(f"[STEAM] Пробуем улучшенный публичный метод...")
         items = await SteamAuthenticatedInventory.get_inventory_public(steam_id, retry_count=3)
         
         if len(items) > 0:
-            print(f"[STEAM] ✅ Загружено {len(items)} предметов через публичный API")
+            log.info("Инвентарь загружен", extra={"steam_id": steam_id, "items": len(items), "method": "public"})
+            await cache.set(cache_key, items, settings.inventory_cache_ttl_seconds)
             return items
         
         # Метод 2: Multi-method helper (старые методы)
-        print(f"[STEAM] Пробуем альтернативные методы...")
+        log.debug("Публичный метод не вернул предметы, пробуем альтернативные", extra={"steam_id": steam_id})
         items = await SteamInventoryHelper.get_inventory_multi_method(steam_id)
         
         if len(items) > 0:
-            print(f"[STEAM] ✅ Загружено {len(items)} предметов через альтернативные методы")
+            log.info("Инвентарь загружен", extra={"steam_id": steam_id, "items": len(items), "method": "multi"})
+            await cache.set(cache_key, items, settings.inventory_cache_ttl_seconds)
             return items
         
         # Если ничего не сработало - возвращаем тестовые данные
-        print(f"[STEAM] ⚠️ Все методы не сработали, возвращаем тестовые данные")
+        log.warning("Все методы не сработали, возвращаем тестовые данные", extra={"steam_id": steam_id})
         return SteamService._get_demo_inventory()
         
         # Старый код (оставляем как fallback)
@@ -60,27 +78,27 @@ class SteamService:
             "Accept-Language": "en-US,en;q=0.9"
         }
         
-        async with httpx.AsyncClient(timeout=60.0, headers=headers, follow_redirects=True) as client:
+        async with http_clients.borrow("steam") as client:
             try:
                 # Добавляем задержку чтобы избежать rate limiting
                 await asyncio.sleep(1)
                 
-                response = await client.get(url, params=params)
+                response = await client.get(url, params=params, headers=headers, timeout=60.0)
                 response.raise_for_status()
                 data = response.json()
                 
-                print(f"[STEAM] Response for {steam_id}: success={data.get('success')}, rwgrsn={data.get('rwgrsn')}")
+                log.debug("Ответ Steam", extra={"steam_id": steam_id, "success": data.get("success"), "rwgrsn": data.get("rwgrsn")})
                 
                 if not data.get("success"):
-                    print(f"[STEAM] Инвентарь недоступен для {steam_id}")
+                    log.warning("Инвентарь недоступен", extra={"steam_id": steam_id})
                     return []
                 
                 # Проверка на rate limiting или другие проблемы
                 if data.get("rwgrsn") == -2:
-                    print(f"[STEAM] Rate limiting или проблема доступа для {steam_id}")
+                    log.warning("Rate limiting или проблема доступа", extra={"steam_id": steam_id})
                     # Попробуем еще раз через 2 секунды
                     await asyncio.sleep(2)
-                    response = await client.get(url, params=params)
+                    response = await client.get(url, params=params, headers=headers, timeout=60.0)
                     data = response.json()
                 
                 assets = data.get("assets", [])
@@ -115,25 +133,34 @@ class SteamService:
                             "amount": int(asset.get("amount", 1))
                         })
                 
-                print(f"[STEAM] Загружено {len(items)} предметов для {steam_id}")
+                log.info("Инвентарь загружен", extra={"steam_id": steam_id, "items": len(items)})
                 
                 # Если инвентарь пустой, возвращаем тестовые данные для демонстрации
                 if len(items) == 0:
-                    print(f"[STEAM] Инвентарь пустой, возвращаем тестовые данные")
+                    log.info("Инвентарь пустой, возвращаем тестовые данные", extra={"steam_id": steam_id})
                     return SteamService._get_demo_inventory()
                 
                 return items
                 
             except httpx.HTTPStatusError as e:
                 if e.response.status_code == 403:
-                    print(f"[STEAM] Инвентарь приватный для {steam_id}, возвращаем тестовые данные")
+                    log.warning("Инвентарь приватный, возвращаем тестовые данные", extra={"steam_id": steam_id})
                 else:
-                    print(f"[STEAM] HTTP ошибка {e.response.status_code}: {e}, возвращаем тестовые данные")
+                    log.warning("HTTP ошибка Steam, возвращаем тестовые данные", extra={"steam_id": steam_id, "status": e.response.status_code})
                 return SteamService._get_demo_inventory()
             except Exception as e:
-                print(f"[STEAM] Ошибка загрузки инвентаря: {e}, возвращаем тестовые данные")
+                log.error("Ошибка загрузки инвентаря, возвращаем тестовые данные", extra={"steam_id": steam_id, "error": str(e)})
                 return SteamService._get_demo_inventory()
-    
+
+    @staticmethod
+    def _inventory_key(steam_id: str) -> str:
+        return f"inventory:{steam_id}"
+
+    @staticmethod
+    async def invalidate_inventory(steam_id: str):
+        """Сбросить кэш инвентаря во всех воркерах (скины ушли в сделку)"""
+        await cache.delete(SteamService._inventory_key(steam_id))
+
     @staticmethod
     def _get_demo_inventory() -> List[Dict]:
         """Вернуть тестовый инвентарь для демонстрации (расширенный)"""
@@ -325,6 +352,7 @@ class SteamService:
         return None
     
     @staticmethod
+    @timed("steam.get_market_prices")
     async def get_market_prices(items: List[Dict]) -> Dict[str, Dict]:
         """
         Получить рыночные цены для списка предметов
@@ -343,7 +371,7 @@ class SteamService:
         # Группируем запросы по market_hash_name
         unique_names = list(set(item["market_hash_name"] for item in items))
         
-        print(f"[PRICES] Получаем цены для {len(unique_names)} уникальных предметов")
+        log.debug("Цены для инвентаря", extra={"items": len(items), "unique": len(unique_names)})
         
         # Используем новый агрегатор цен
         price_data_objects = await PriceAggregator.get_prices(unique_names)
@@ -356,6 +384,8 @@ class SteamService:
                 "lis_skins_estimate": price_data.lis_skins_estimate,
                 "instant_price": price_data.instant_price,
                 "is_acceptable": price_data.is_acceptable,
+                "instant_price_kopecks": price_data.instant_price_kopecks,
+                "loan_price_kopecks": price_data.loan_price_kopecks,
                 "timestamp": price_data.timestamp.isoformat()
             }
         
@@ -364,6 +394,7 @@ class SteamService:
 
     
     @staticmethod
+    @timed("steam.get_user_info")
     async def get_user_info(steam_id: str) -> Optional[Dict]:
         """Получить информацию о пользователе Steam"""
         url = f"{SteamService.BASE_URL}/ISteamUser/GetPlayerSummaries/v2/"
@@ -373,7 +404,7 @@ class SteamService:
             "steamids": steam_id
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http_clients.borrow("steam") as client:
             try:
                 response = await client.get(url, params=params)
                 response.raise_for_status()
@@ -392,5 +423,5 @@ class SteamService:
                 return None
                 
             except Exception as e:
-                print(f"Error fetching user info: {e}")
+                log.warning("Ошибка получения профиля Steam", extra={"steam_id": steam_id, "error": str(e)})
                 return None
@@ -3,11 +3,16 @@
 Бесплатно: 10,000 запросов/день
 Регистрация: https://steamapis.com/
 """
-import httpx
 import asyncio
 from typing import Dict, List
 from datetime import datetime, timedelta
 
+from services.http_clients import http_clients
+from logger import debug_sampled, get_logger
+from metrics import cache_lookup
+
+log = get_logger("steamapis")
+
 
 class SteamAPIsPriceService:
     """
@@ -50,11 +55,12 @@ class SteamAPIsPriceService:
             else:
                 uncached.append(name)
         
+        cache_lookup("steamapis", hits=len(prices), misses=len(uncached))
         if not uncached:
-            print(f"[STEAMAPIS] Все {len(prices)} цен из кеша")
+            log.debug("Все цены из кеша", extra={"cached": len(prices)})
             return prices
         
-        print(f"[STEAMAPIS] Загружаем {len(uncached)} цен")
+        log.debug("Загружаем цены", extra={"cached": len(prices), "uncached": len(uncached)})
         
         # Получаем цены пачками (по 50 за раз)
         batch_size = 50
@@ -77,7 +83,7 @@ class SteamAPIsPriceService:
                 prices[name] = 0.0
         
         successful = len([p for p in prices.values() if p > 0])
-        print(f"[STEAMAPIS] Получено {successful}/{len(market_hash_names)} цен")
+        log.debug("Цены получены", extra={"requested": len(market_hash_names), "found": successful})
         
         return prices
     
@@ -95,7 +101,7 @@ class SteamAPIsPriceService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0, headers=headers) as client:
+            async with http_clients.borrow("steam") as client:
                 # Запрашиваем цены по одному предмету (Steam не поддерживает batch)
                 for name in names:
                     try:
@@ -105,7 +111,7 @@ class SteamAPIsPriceService:
                             "market_hash_name": name
                         }
                         
-                        response = await client.get(base_url, params=params)
+                        response = await client.get(base_url, params=params, headers=headers)
                         
                         if response.status_code == 200:
                             data = response.json()
@@ -121,7 +127,7 @@ class SteamAPIsPriceService:
                                     price_rub = float(price_str)
                                     if price_rub > 0:
                                         prices[name] = price_rub
-                                        print(f"[STEAM_MARKET] {name}: {price_rub:.2f} ₽")
+                                        debug_sampled(log, "Цена Steam Market", item=name, price=price_rub)
                                 except ValueError:
                                     pass
                         
@@ -129,13 +135,13 @@ class SteamAPIsPriceService:
                         await asyncio.sleep(3.5)
                         
                     except Exception as e:
-                        print(f"[STEAM_MARKET] Ошибка для {name}: {e}")
+                        debug_sampled(log, "Ошибка Steam Market для предмета", item=name, error=str(e))
                         continue
                 
-                print(f"[STEAM_MARKET] Получено {len(prices)}/{len(names)} цен")
+                log.debug("Пачка цен Steam Market", extra={"requested": len(names), "found": len(prices)})
                     
         except Exception as e:
-            print(f"[STEAM_MARKET] Общая ошибка: {e}")
+            log.warning("Ошибка Steam Market", extra={"error": str(e)})
         
         return prices
     
@@ -161,8 +167,8 @@ class SteamAPIsPriceService:
             headers["X-API-KEY"] = SteamAPIsPriceService.API_KEY
         
         try:
-            async with httpx.AsyncClient(timeout=15.0, headers=headers) as client:
-                response = await client.get(url)
+            async with http_clients.borrow("prices") as client:
+                response = await client.get(url, headers=headers)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -175,7 +181,7 @@ class SteamAPIsPriceService:
                         return price_rub
                         
         except Exception as e:
-            print(f"[STEAMAPIS] Ошибка для {market_hash_name}: {e}")
+            log.warning("Ошибка SteamAPIs", extra={"item": market_hash_name, "error": str(e)})
         
         return 0.0
     
@@ -197,10 +203,10 @@ class SteamAPIsPriceService:
     def clear_cache():
         """Очистить кеш"""
         SteamAPIsPriceService._cache.clear()
-        print("[STEAMAPIS] Кеш очищен")
+        log.info("Кеш SteamAPIs очищен")
     
     @staticmethod
     def set_api_key(api_key: str):
         """Установить API ключ"""
         SteamAPIsPriceService.API_KEY = api_key
-        print(f"[STEAMAPIS] API ключ установлен")
+        log.info("API ключ SteamAPIs установлен")
@@ -2,10 +2,11 @@
 Telegram уведомления для админов
 """
 
-import httpx
 import os
 from typing import Optional
 
+from services.http_clients import http_clients
+
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 ADMIN_CHAT_IDS = os.getenv("TELEGRAM_ADMIN_IDS", "").split(",")
 SITE_URL = os.getenv("SITE_URL", "http://localhost:3000")
@@ -19,7 +20,7 @@ async def send_telegram_message(chat_id: str, text: str, reply_markup: dict = No
         print(f"[TG] No token, skip: {text[:50]}...")
         return False
     
-    async with httpx.AsyncClient(timeout=10.0) as client:
+    async with http_clients.borrow("telegram") as client:
         payload = {
             "chat_id": chat_id,
             "text": text,
@@ -37,9 +38,18 @@ async def send_telegram_message(chat_id: str, text: str, reply_markup: dict = No
             return False
 
 
+async def broadcast(text: str, reply_markup: dict = None) -> bool:
+    """Отправить сообщение всем админам (False если хотя бы одно не ушло)"""
+    sent = True
+    for admin_id in ADMIN_CHAT_IDS:
+        if admin_id.strip():
+            sent = await send_telegram_message(admin_id.strip(), text, reply_markup) and sent
+    return sent
+
+
 async def notify_new_deal(deal_id: int, loan_amount: float, items_count: int, 
-                          user_name: str = "Клиент", phone: str = "Не указан"):
-    """Уведомить админов о новой сделке"""
+                          user_name: str = "Клиент", phone: str = "Не указан") -> bool:
+    """Уведомить админов о новой сделке (False если хотя бы одно сообщение не ушло)"""
     
     text = f"""
 🆕 <b>Новая сделка #{deal_id}</b>
@@ -64,12 +74,10 @@ async def notify_new_deal(deal_id: int, loan_amount: float, items_count: int,
         ]
     }
     
-    for admin_id in ADMIN_CHAT_IDS:
-        if admin_id.strip():
-            await send_telegram_message(admin_id.strip(), text, keyboard)
+    return await broadcast(text, keyboard)
 
 
-async def notify_trade_accepted(deal_id: int, payout_amount: float):
+async def notify_trade_accepted(deal_id: int, payout_amount: float) -> bool:
     """Уведомить о получении трейда и выплате"""
     
     text = f"""
@@ -79,12 +87,10 @@ async def notify_trade_accepted(deal_id: int, payout_amount: float):
 📤 Деньги отправлены клиенту
 """
     
-    for admin_id in ADMIN_CHAT_IDS:
-        if admin_id.strip():
-            await send_telegram_message(admin_id.strip(), text)
+    return await broadcast(text)
 
 
-async def notify_buyback(deal_id: int, amount: float):
+async def notify_buyback(deal_id: int, amount: float) -> bool:
     """Уведомить о выкупе"""
     
     text = f"""
@@ -94,12 +100,23 @@ async def notify_buyback(deal_id: int, amount: float):
 📦 Отправить скины клиенту!
 """
     
-    for admin_id in ADMIN_CHAT_IDS:
-        if admin_id.strip():
-            await send_telegram_message(admin_id.strip(), text)
+    return await broadcast(text)
+
+
+async def notify_expiring(deal_id: int, buyback_price: float, option_expiry: str) -> bool:
+    """Уведомить о скором окончании опциона"""
+    
+    text = f"""
+⏳ <b>Истекает опцион #{deal_id}</b>
+
+💰 Цена выкупа: {buyback_price:,.0f} ₽
+📅 Окончание: {option_expiry}
+"""
+    
+    return await broadcast(text)
 
 
-async def notify_default(deal_id: int, items_count: int):
+async def notify_default(deal_id: int, items_count: int) -> bool:
     """Уведомить о дефолте"""
     
     text = f"""
@@ -109,6 +126,4 @@ async def notify_default(deal_id: int, items_count: int):
 💎 Можно продавать!
 """
     
-    for admin_id in ADMIN_CHAT_IDS:
-        if admin_id.strip():
-            await send_telegram_message(admin_id.strip(), text)
+    return await broadcast(text)
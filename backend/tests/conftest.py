@@ -0,0 +1,19 @@
+import pytest
+
+import models
+from database import engine
+from response_cache import response_cache
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database_schema():
+    """Схема тестовой БД по моделям (приложение таблицы при импорте не создаёт)"""
+    models.Base.metadata.create_all(bind=engine)
+    yield
+
+
+@pytest.fixture(autouse=True)
+def cold_response_cache():
+    """Ответы из кэша не переходят между тестами (у тестов свои БД)"""
+    response_cache.clear()
+    yield
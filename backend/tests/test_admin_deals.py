@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from services.admin_deals_service import AdminDealsService, InvalidCursor
+import services.item_catalog  # noqa: F401 — item_id для новых DealItem
+
+NOW = datetime(2026, 6, 1, 12, 0)
+
+
+def _session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    users = [models.User(steam_id=f"7656119800000000{i}", steam_username=f"user{i}") for i in range(3)]
+    db.add_all(users)
+    db.flush()
+    statuses = [models.DealStatus.ACTIVE, models.DealStatus.PENDING, models.DealStatus.BUYBACK]
+    for i in range(25):
+        db.add(models.Deal(
+            user_id=users[i % 3].id,
+            market_total=1000.0,
+            loan_amount=100.0 * (i + 1),
+            buyback_price=120.0 * (i + 1),
+            # Пары сделок с одинаковым created_at — порядок задаёт id
+            created_at=NOW - timedelta(hours=i // 2),
+            option_expiry=NOW + timedelta(days=7),
+            deal_status=statuses[i % 3],
+            items_snapshot=[{"market_hash_name": "AK-47"}] * (i % 4),
+            kyc_snapshot={"full_name": f"Клиент {i}", "phone": "+79990000000", "passport_number": "123456"}
+        ))
+    db.commit()
+    return db
+
+
+def _pages(db, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        rows = db.execute(AdminDealsService.page_query(limit=limit, cursor=cursor, **filters)).all()
+        deals, cursor = AdminDealsService.build_page(rows, limit)
+        pages.append(deals)
+        if cursor is None:
+            return pages
+
+
+def test_keyset_pages_cover_all_deals_once():
+    """Страницы идут по (created_at, id) убыванию без пропусков и повторов"""
+    db = _session()
+    pages = _pages(db, limit=7)
+
+    assert [len(page) for page in pages] == [7, 7, 7, 4]
+    ids = [deal["id"] for page in pages for deal in page]
+    expected = [deal.id for deal in db.query(models.Deal).order_by(
+        models.Deal.created_at.desc(), models.Deal.id.desc())]
+    assert ids == expected
+
+    first = pages[0][0]
+    assert first["items_count"] == (first["id"] - 1) % 4
+    assert first["client_name"] == f"Клиент {first['id'] - 1}"
+    assert "kyc_snapshot" not in first and "items_snapshot" not in first
+
+
+def test_filters_and_page_users():
+    """Фильтры статуса, пользователя, дат и суммы; пользователи — только со страницы"""
+    db = _session()
+    user = db.query(models.User).filter(models.User.steam_username == "user1").one()
+
+    deals = [deal for page in _pages(db, limit=3, status=models.DealStatus.PENDING) for deal in page]
+    assert len(deals) == 8 and {deal["deal_status"] for deal in deals} == {"PENDING"}
+
+    deals = [deal for page in _pages(
+        db, limit=50, user_id=user.id, min_amount=500, max_amount=2000,
+        created_from=NOW - timedelta(hours=8), created_to=NOW
+    ) for deal in page]
+    assert [deal["loan_amount"] for deal in deals] == [500.0, 800.0, 1100.0, 1400.0, 1700.0]
+
+    rows = db.execute(AdminDealsService.users_query(deal["user_id"] for deal in deals)).all()
+    assert [entry["steam_username"] for entry in AdminDealsService.user_entries(rows)] == ["user1"]
+
+    details = db.execute(AdminDealsService.details_query(deals[0]["id"])).one()
+    assert details.kyc_snapshot["passport_number"] == "123456"
+
+
+def test_invalid_cursor():
+    with pytest.raises(InvalidCursor):
+        AdminDealsService.page_query(cursor="not-a-cursor")
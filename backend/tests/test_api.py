@@ -1,14 +1,38 @@
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
+
+import main
 from main import app
+from services.health import HealthMonitor, default_probes
 
 client = TestClient(app)
 
-def test_health_check():
-    """Тест health check endpoint"""
+def test_health_check(monkeypatch):
+    """Тест health check endpoint: starting до первых проверок, ok после критичных"""
+    monitor = HealthMonitor(default_probes())
+    monkeypatch.setattr(main, "health_monitor", monitor)
+
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json()["status"] == "starting"  # Фоновые проверки ещё не выполнялись
+
+    async def steam_api_ok():
+        return None
+
+    monitor.probes["steam_api"].check = steam_api_ok  # Steam API в тестах недоступен
+
+    async def run_critical():
+        for name, probe in monitor.probes.items():
+            if probe.critical:
+                await monitor.run_probe(name)
+
+    asyncio.run(run_critical())
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json()["status"] == "ok"
+    assert response.json()["checks"]["database"] == "ok"
 
 def test_verify_steam_user():
     """Тест верификации Steam пользователя"""
@@ -47,3 +71,27 @@ def test_get_inventory():
     data = response.json()
     assert "steam_id" in data
     assert "items" in data
+
+def test_user_endpoints_async_session():
+    """Пользователь, его сделки и статистика через AsyncSession"""
+    steam_id = "76561198000000001"
+    response = client.post(
+        "/api/user/trade-url",
+        params={
+            "steam_id": steam_id,
+            "trade_url": "https://steamcommunity.com/tradeoffer/new/?partner=39734273&token=abc123"
+        }
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/deals", params={"steam_id": steam_id})
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
+
+    response = client.get(f"/api/stats/user/{steam_id}")
+    assert response.status_code == 200
+    assert response.json()["total_deals"] >= 0
+
+    response = client.get("/api/stats/public")
+    assert response.status_code == 200
+    assert "buyback_rate" in response.json()
@@ -0,0 +1,129 @@
+import json
+import os
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from services.audit_log import AuditSink, month_partitions
+
+
+def _sink(tmp_path):
+    """Sink с SQLite в памяти и спулом во временном каталоге"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    return AuditSink(bind=engine, spool_dir=str(tmp_path), batch_size=3, flush_interval=60)
+
+
+def _actions(sink):
+    with sink.bind.connect() as connection:
+        return connection.execute(
+            select(models.AuditLog.action).order_by(models.AuditLog.id)
+        ).scalars().all()
+
+
+def test_events_written_in_one_batch(tmp_path):
+    """События копятся в спуле и пишутся одной пачкой, спул затем удаляется"""
+    sink = _sink(tmp_path)
+    for i in range(5):
+        sink.record(f"action_{i}", user_id=i, details={"n": i})
+
+    assert _actions(sink) == []
+    assert sink.pending() == 5
+    assert len(os.listdir(tmp_path)) == 1
+
+    assert sink.flush() == 5
+    assert _actions(sink) == [f"action_{i}" for i in range(5)]
+    assert sink.pending() == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_spool_replayed_after_crash(tmp_path):
+    """Сегмент упавшего процесса дочитывается; повтор уже записанных не дублирует"""
+    sink = _sink(tmp_path)
+    event_id = sink.record("steam_login", user_id=1)
+    sink.flush()
+
+    # Спул упавшего процесса: уже записанное событие, новое и недописанная строка
+    lines = [
+        {"event_id": event_id, "created_at": _created_at(sink, event_id), "action": "steam_login", "user_id": 1},
+        {"event_id": "f" * 32, "created_at": "2026-10-01T12:00:00", "action": "kyc_verification", "user_id": 2},
+    ]
+    with open(tmp_path / "audit-99999-000001.spool", "w", encoding="utf-8") as file:
+        file.writelines(json.dumps(line) + "\n" for line in lines)
+        file.write('{"event_id": "tru')
+
+    restarted = AuditSink(bind=sink.bind, spool_dir=str(tmp_path), batch_size=3, flush_interval=60)
+    assert restarted.recover() == 2
+    assert restarted.flush() == 1
+    assert _actions(sink) == ["steam_login", "kyc_verification"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_new_events_not_appended_to_recovered_segment(tmp_path):
+    """После рестарта с тем же PID новые события пишутся в свой сегмент, а не в дочитываемый"""
+    leftover = {"event_id": "e" * 32, "created_at": "2026-10-01T12:00:00", "action": "steam_login", "user_id": 1}
+    with open(tmp_path / f"audit-{os.getpid()}-000001.spool", "w", encoding="utf-8") as file:
+        file.write(json.dumps(leftover) + "\n")
+
+    sink = _sink(tmp_path)
+    assert sink.recover() == 1
+    # Файл с именем, которое выберет sink, уже есть (чужой) — берётся следующее
+    (tmp_path / f"audit-{os.getpid()}-{sink._boot_id}-000001.spool").write_text("", encoding="utf-8")
+    sink.record("deal_activated", deal_id=1)
+    assert sink._current.path.endswith("-000002.spool")
+
+    assert sink.flush() == 2
+    assert _actions(sink) == ["steam_login", "deal_activated"]
+    assert sink.pending() == 0
+
+
+def test_failed_flush_keeps_spool(tmp_path):
+    """БД недоступна: события остаются в спуле до следующей попытки"""
+    sink = _sink(tmp_path)
+    sink.record("deal_activated", deal_id=1)
+    models.AuditLog.__table__.drop(sink.bind)
+
+    with pytest.raises(OperationalError):
+        sink.flush()
+    assert sink.pending() == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+    models.AuditLog.__table__.create(sink.bind)
+    assert sink.flush() == 1
+    assert _actions(sink) == ["deal_activated"]
+
+
+def test_record_on_commit(tmp_path):
+    """Событие транзакции попадает в буфер только после commit"""
+    sink = _sink(tmp_path)
+    db = sessionmaker(bind=sink.bind)()
+
+    sink.record_on_commit(db, "kyc_verification", user_id=1)
+    db.rollback()
+    assert sink.pending() == 0
+
+    sink.record_on_commit(db, "kyc_verification", user_id=1)
+    db.commit()
+    db.close()
+    assert sink.pending() == 1
+
+
+def test_month_partitions():
+    assert month_partitions(date(2026, 11, 15), 3) == [
+        ("audit_logs_y2026m11", date(2026, 11, 1), date(2026, 12, 1)),
+        ("audit_logs_y2026m12", date(2026, 12, 1), date(2027, 1, 1)),
+        ("audit_logs_y2027m01", date(2027, 1, 1), date(2027, 2, 1)),
+    ]
+
+
+def _created_at(sink, event_id):
+    with sink.bind.connect() as connection:
+        created_at = connection.execute(
+            select(models.AuditLog.created_at).where(models.AuditLog.event_id == event_id)
+        ).scalar_one()
+    return created_at.isoformat()
@@ -0,0 +1,90 @@
+import asyncio
+import gzip
+from datetime import datetime
+
+import pytest
+
+from cache import TieredCache, loads
+from services import market_csgo_service
+from services.bulk_prices import BulkPriceService, TooManyNames, MAX_NAMES
+from services.item_catalog import ItemCatalog
+from services.market_csgo_service import MarketCSGOService
+
+
+@pytest.fixture
+def price_index(monkeypatch):
+    """Загруженный прайс-лист: 2000 предметов по 10.00 ₽ + i"""
+    names = [f"Item {i}" for i in range(2000)]
+    monkeypatch.setattr(ItemCatalog, "_ids", {name: i for i, name in enumerate(names)})
+    monkeypatch.setattr(MarketCSGOService, "_all_prices", {i: 10.0 + i for i in range(2000)})
+    monkeypatch.setattr(MarketCSGOService, "_all_prices_loaded_at", datetime.now())
+    return names
+
+
+def test_rows_and_columnar_formats(price_index):
+    names = ["Item 50", "Unknown", "Item 50", "Item 5"]
+
+    rows = loads(asyncio.run(BulkPriceService.lookup(names)).body)
+    columnar = loads(asyncio.run(BulkPriceService.lookup(names, fmt="columnar")).body)
+
+    assert list(rows["prices"]) == ["Item 50", "Unknown", "Item 5"]
+    assert rows["prices"]["Item 50"] == {
+        "market_csgo_price": 60.0,
+        "lis_skins_estimate": pytest.approx(66.0),
+        "instant_price": 60.0,
+        "is_acceptable": True,
+        "instant_price_kopecks": 6000,
+        "loan_price_kopecks": rows["prices"]["Item 50"]["loan_price_kopecks"],
+    }
+    assert rows["prices"]["Unknown"]["instant_price_kopecks"] == 0
+    assert rows["timestamp"] == MarketCSGOService._all_prices_loaded_at.isoformat()
+
+    assert columnar["names"] == ["Item 50", "Unknown", "Item 5"]
+    assert columnar["instant_price_kopecks"] == [6000, 0, 1500]
+    assert columnar["loan_price_kopecks"] == [rows["prices"][name]["loan_price_kopecks"] for name in columnar["names"]]
+    assert columnar["acceptable"] == [True, False, False]
+
+
+def test_etag_not_modified_and_gzip(price_index):
+    first = asyncio.run(BulkPriceService.lookup(price_index, fmt="columnar", accept_encoding="gzip, br"))
+
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert loads(gzip.decompress(first.body))["names"] == price_index
+    assert first.headers["Cache-Control"].startswith("public")
+
+    repeated = asyncio.run(BulkPriceService.lookup(price_index, fmt="columnar", if_none_match=first.headers["ETag"]))
+    assert repeated.status_code == 304 and repeated.body == b""
+
+    # Новый прайс-лист — новый ETag
+    MarketCSGOService._all_prices_loaded_at = datetime(2030, 1, 1)
+    refreshed = asyncio.run(BulkPriceService.lookup(price_index, fmt="columnar", if_none_match=first.headers["ETag"]))
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != first.headers["ETag"]
+    assert "Content-Encoding" not in refreshed.headers
+
+
+def test_request_size_limit(price_index):
+    with pytest.raises(TooManyNames):
+        asyncio.run(BulkPriceService.lookup([f"Item {i}" for i in range(MAX_NAMES + 1)]))
+
+
+def test_shared_marker_without_prices_reloads(monkeypatch):
+    """Метка прайс-листа пережила цены в общем кэше — прайс-лист загружается, а не нули по всем предметам"""
+    shared = TieredCache(redis_url="")
+    monkeypatch.setattr(market_csgo_service, "cache", shared)
+    monkeypatch.setattr(ItemCatalog, "_ids", {"Item 0": 0})
+    monkeypatch.setattr(MarketCSGOService, "_all_prices_loaded_at", None)
+
+    async def load():
+        MarketCSGOService._all_prices = {0: 42.0}
+        MarketCSGOService._all_prices_loaded_at = datetime.now()
+
+    monkeypatch.setattr(MarketCSGOService, "_all_prices", {})
+    monkeypatch.setattr(MarketCSGOService, "_load_all_prices", load)
+
+    async def run():
+        await shared.set(MarketCSGOService.SHARED_LOADED_KEY, "2026-01-01T00:00:00", 60)
+        return await MarketCSGOService.lookup_prices(["Item 0"])
+
+    prices, _ = asyncio.run(run())
+    assert prices == {"Item 0": 42.0}
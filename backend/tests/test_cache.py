@@ -0,0 +1,144 @@
+import asyncio
+import fnmatch
+import time
+
+from cache import LocalCache, TieredCache, dumps, loads
+
+
+class FakeRedis:
+    """Минимальный Redis в памяти: команды, которыми пользуется TieredCache"""
+
+    def __init__(self):
+        self.data = {}
+        self.published = []
+        self.calls = []
+
+    async def mget(self, keys):
+        self.calls.append(("mget", len(keys)))
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=False):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                return False
+
+            def set(self, key, value, px=None):
+                self.commands.append((key, value))
+
+            async def execute(self):
+                redis.calls.append(("pipeline", len(self.commands)))
+                redis.data.update(self.commands)
+
+        return Pipeline()
+
+    async def unlink(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def scan_iter(self, match, count):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+def _cache(redis=None, **kwargs):
+    cache = TieredCache(redis_url="redis://test" if redis else "", **kwargs)
+    if redis is not None:
+        cache._client = lambda: redis
+    return cache
+
+
+def test_local_cache_lru_and_ttl():
+    l1 = LocalCache(max_items=2)
+    l1.set("a", 1, ttl=60)
+    l1.set("b", 2, ttl=60)
+    l1.get("a")  # a — недавно использованный, вытесняется b
+    l1.set("c", 3, ttl=60)
+    assert l1.get("b", None) is None
+    assert l1.get("a") == 1 and l1.get("c") == 3
+
+    l1.set("short", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert l1.get("short", None) is None
+
+
+def test_batch_lookup_uses_single_mget():
+    """Промахи L1 — одним MGET, найденное в Redis попадает в L1"""
+    redis = FakeRedis()
+    writer, reader = _cache(redis), _cache(redis)
+
+    async def run():
+        await writer.set_many({f"price:{i}": i * 1.5 for i in range(10)}, ttl=60, local=False)
+        first = await reader.get_many([f"price:{i}" for i in range(12)])
+        second = await reader.get_many([f"price:{i}" for i in range(10)])
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == {f"price:{i}": i * 1.5 for i in range(10)}
+    assert second == first
+    assert redis.calls == [("pipeline", 10), ("mget", 12)]  # Второй запрос — целиком из L1
+    assert reader.stats["l2_hits"] == 10 and reader.stats["l1_hits"] == 10
+    assert len(writer.l1) == 0  # local=False
+
+
+def test_invalidation_scans_and_notifies_other_workers():
+    redis = FakeRedis()
+    worker_a, worker_b = _cache(redis), _cache(redis)
+
+    async def run():
+        await worker_a.set_many({"inventory:1": [1], "inventory:2": [2], "price:x": 3.0}, ttl=60)
+        await worker_b.get_many(["inventory:1", "price:x"])
+        removed = await worker_a.invalidate("inventory:*")
+        # Сообщение из канала приходит воркеру B
+        for _, message in redis.published:
+            worker_b.apply_invalidation(message)
+        return removed
+
+    removed = asyncio.run(run())
+
+    assert removed == 2
+    assert set(redis.data) == {"cl:price:x"}
+    assert worker_b.l1.get("inventory:1", None) is None
+    assert worker_b.l1.get("price:x") == 3.0
+
+
+def test_own_invalidation_message_ignored():
+    cache = _cache()
+    cache.l1.set("inventory:1", [1], ttl=60)
+    cache.apply_invalidation(dumps({"keys": ["inventory:1"], "origin": cache.instance_id}))
+    assert cache.l1.get("inventory:1") == [1]
+
+
+def test_works_without_redis():
+    """Redis недоступен: только L1, повторное подключение не на каждый запрос"""
+    cache = TieredCache(redis_url="redis://127.0.0.1:1")
+
+    async def run():
+        await cache.set("key", {"a": 1}, ttl=60)
+        started = time.perf_counter()
+        value = await cache.get("key")
+        missing = await cache.get("other")
+        return value, missing, time.perf_counter() - started
+
+    value, missing, elapsed = asyncio.run(run())
+
+    assert value == {"a": 1} and missing is None
+    assert cache.stats["redis_errors"] == 1
+    assert cache.info()["redis"] == "down"
+    assert elapsed < 0.1
+
+
+def test_serialization_roundtrip():
+    value = {"items": [{"assetid": "1", "price": 12.5}], 5: "int key"}
+    assert loads(dumps(value)) == {"items": [{"assetid": "1", "price": 12.5}], "5": "int key"}
@@ -0,0 +1,118 @@
+import importlib.util
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from services.item_catalog import STEAM_ICON_CDN, ItemCatalog
+from services.pricing_service import PricingService
+
+
+def _session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    ItemCatalog.clear()
+    return sessionmaker(bind=engine)()
+
+
+QUOTE_ITEMS = [
+    {
+        "assetid": "101", "market_hash_name": "AK-47 | Redline (Field-Tested)", "float_value": 0.25,
+        "icon_url": f"{STEAM_ICON_CDN}-9a81dlWLwJ2UUGcVs_nsVtzdOEdtWwKGZZLQHTxDZ7I56KU0Zwwo4NUX4oFJZEHLbXH5ApeO4YmlhxYQknCRvCo04DEVlxkKgpot7HxfDhjxszJemkV09-5lpKKqPrxN7LEmyVQ7MEpiLuSrYmnjQO3-UdsZGHyd4_Bd1RvNQ7T_FDrw-_ng5Pu75iY1zI97bhLxLJk/360fx360f",
+        "rarity": "Classified", "type": "Rifle",
+        "instant_price": 1234.56, "instant_price_kopecks": 123456, "loan_price_kopecks": 49382
+    },
+    # Старый снимок: только рубли
+    {"assetid": "102", "market_hash_name": "AWP | Asiimov (Field-Tested)", "instant_price": 10.005, "loan_price": 4.0},
+]
+
+
+def test_items_snapshot_roundtrip_and_lazy_load():
+    """Снимок из расчёта сделки -> строки deal_items -> тот же формат ответа; грузится только по обращению"""
+    db = _session()
+    user = models.User(steam_id="76561198000000001")
+    db.add(user)
+    db.flush()
+    deal = models.Deal(
+        user_id=user.id, market_total=1244.57, loan_amount=497.82, buyback_price=600.0,
+        option_expiry=datetime.utcnow() + timedelta(days=7), items_snapshot=QUOTE_ITEMS
+    )
+    db.add(deal)
+    db.commit()
+    deal_id = deal.id
+    db.expunge_all()
+
+    deal = db.get(models.Deal, deal_id)
+    unloaded = inspect(deal).unloaded
+    assert "items" in unloaded and "legacy_items_snapshot" in unloaded
+
+    snapshot = deal.items_snapshot
+    assert [item["assetid"] for item in snapshot] == ["101", "102"]
+    assert snapshot[0]["instant_price_kopecks"] == 123456
+    assert snapshot[0]["loan_price"] == 493.82
+    assert snapshot[1]["instant_price_kopecks"] == 1001
+    assert snapshot[1]["loan_price_kopecks"] == 400
+    assert "icon_url" not in snapshot[0]
+
+
+def test_deals_by_skin():
+    """Скин записан в каталог один раз; сделки с ним — по item_id без разбора JSON"""
+    db = _session()
+    user = models.User(steam_id="76561198000000002")
+    db.add(user)
+    db.flush()
+    for i in range(3):
+        db.add(models.Deal(
+            user_id=user.id, market_total=1.0, loan_amount=1.0, buyback_price=1.0,
+            option_expiry=datetime.utcnow(), items_snapshot=QUOTE_ITEMS[i % 2:]
+        ))
+    db.commit()
+
+    catalog = db.scalars(select(models.CatalogItem).order_by(models.CatalogItem.id)).all()
+    assert [item.market_hash_name for item in catalog] == [QUOTE_ITEMS[0]["market_hash_name"], QUOTE_ITEMS[1]["market_hash_name"]]
+    assert catalog[0].icon_path.endswith("/360fx360f") and not catalog[0].icon_path.startswith("https://")
+    assert (catalog[0].rarity, catalog[0].item_type) == ("Classified", "Rifle")
+
+    deal_ids = db.scalars(
+        select(models.DealItem.deal_id)
+        .where(models.DealItem.item_id == catalog[0].id)
+        .order_by(models.DealItem.deal_id)
+    ).all()
+    assert deal_ids == [1, 3]
+
+
+def test_catalog_memory_holds_only_committed_ids():
+    """Id из незакоммиченной транзакции не кешируются; ensure_names кеширует после коммита"""
+    db = _session()
+    factory = sessionmaker(bind=db.get_bind())
+
+    ids = ItemCatalog.ensure(db.connection(), [{"market_hash_name": "Glock-18 | Fade (Factory New)"}])
+    assert ItemCatalog.get_id("Glock-18 | Fade (Factory New)") is None
+    db.rollback()
+
+    assert ItemCatalog.ensure_names(factory, ["Glock-18 | Fade (Factory New)", "P250 | Sand Dune (Field-Tested)"]) == 2
+    item_id = ItemCatalog.get_id("Glock-18 | Fade (Factory New)")
+    assert item_id is not None and ids
+    assert ItemCatalog.entry(item_id).market_hash_name == "Glock-18 | Fade (Factory New)"
+
+    ItemCatalog.clear()
+    assert ItemCatalog.load(db) == 2
+
+
+def test_baseline_snapshot_without_loan_price():
+    """Снимок базовой create_deal (только market_price и instant_price): выдача считается по тарифу, не 0"""
+    item = {"assetid": "103", "market_hash_name": "M4A4 | Howl (Field-Tested)", "market_price": 20.0, "instant_price": 15.0}
+    expected = PricingService.calculate_item_loan_kopecks(1500)
+    assert expected > 0
+
+    assert models.DealItem.from_snapshot(item).loan_price_kopecks == expected
+
+    path = os.path.join(os.path.dirname(models.__file__), "alembic", "versions", "b8e2f4a6c913_deal_items.py")
+    spec = importlib.util.spec_from_file_location("deal_items_migration", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    row = migration._item_row(1, 0, item)
+    assert row["instant_price_kopecks"] == 1500 and row["loan_price_kopecks"] == expected
@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import models
+import services.deal_scheduler as deal_scheduler_module
+from services.deal_scheduler import DealLifecycle, DealScheduler
+import services.item_catalog  # noqa: F401 — item_id для новых DealItem
+from services.job_queue import JobRunner
+
+
+def _setup(expiries):
+    """Активные сделки с заданными сроками в SQLite в памяти"""
+    factory = JobRunner.in_memory().session_factory
+    db = factory()
+    user = models.User(steam_id="76561198000000001")
+    db.add(user)
+    db.flush()
+
+    deal_ids = []
+    for expiry in expiries:
+        deal = models.Deal(
+            user_id=user.id,
+            market_total=1000.0,
+            loan_amount=400.0,
+            buyback_price=488.0,
+            option_expiry=expiry,
+            items_snapshot=[{"assetid": "1"}],
+            deal_status=models.DealStatus.ACTIVE
+        )
+        db.add(deal)
+        db.flush()
+        deal_ids.append(deal.id)
+    db.commit()
+    db.close()
+    return factory, deal_ids
+
+
+def _statuses(factory):
+    db = factory()
+    try:
+        return {d.id: d.deal_status for d in db.query(models.Deal).all()}
+    finally:
+        db.close()
+
+
+def test_expiry_fires_once():
+    """Просроченная сделка уходит в дефолт ровно один раз"""
+    now = datetime(2026, 1, 10, 12, 0)
+    factory, (soon, later) = _setup([now + timedelta(hours=1), now + timedelta(days=5)])
+
+    scheduler = DealScheduler(session_factory=factory)
+    assert scheduler.rebuild() == 2
+
+    result = scheduler.fire_due(now + timedelta(hours=2))
+    assert result["expired"] == [soon]
+    assert _statuses(factory) == {soon: models.DealStatus.DEFAULT, later: models.DealStatus.ACTIVE}
+
+    # Повторная постановка в кучу не даёт второго дефолта
+    scheduler._push(soon, now + timedelta(hours=1), warning_sent=True)
+    assert scheduler.fire_due(now + timedelta(hours=3))["expired"] == []
+
+    db = factory()
+    assert db.query(models.AuditLog).filter(models.AuditLog.action == "deal_defaulted").count() == 1
+    assert db.query(models.BackgroundJob).filter(
+        models.BackgroundJob.idempotency_key == f"telegram_default:deal:{soon}"
+    ).count() == 1
+    db.close()
+
+
+def test_expire_all_in_batches():
+    """Массовый дефолт пачками: каждая сделка — один раз, с аудитом и уведомлением"""
+    now = datetime(2026, 1, 10, 12, 0)
+    factory, deal_ids = _setup([now - timedelta(hours=i) for i in range(1, 6)] + [now + timedelta(days=1)])
+
+    expired = DealLifecycle.expire_all(factory, now, batch_size=2)
+    assert sorted(expired) == sorted(deal_ids[:5])
+    assert DealLifecycle.expire_all(factory, now, batch_size=2) == []
+
+    db = factory()
+    assert db.query(models.AuditLog).filter(models.AuditLog.action == "deal_defaulted").count() == 5
+    assert db.query(models.BackgroundJob).filter(models.BackgroundJob.job_type == "telegram").count() == 5
+    assert db.get(models.Deal, deal_ids[5]).deal_status == models.DealStatus.ACTIVE
+    db.close()
+
+
+def test_warning_survives_restart():
+    """Предупреждение за 24ч отправляется один раз и после рестарта не повторяется"""
+    now = datetime(2026, 1, 10, 12, 0)
+    factory, (deal_id,) = _setup([now + timedelta(hours=30)])
+
+    scheduler = DealScheduler(session_factory=factory)
+    scheduler.rebuild()
+    assert scheduler.fire_due(now) == {"expired": [], "warned": []}
+    assert scheduler.fire_due(now + timedelta(hours=7))["warned"] == [deal_id]
+
+    # "Рестарт": новая куча из БД содержит только таймер дефолта
+    restarted = DealScheduler(session_factory=factory)
+    restarted.rebuild()
+    assert len(restarted) == 1
+    assert restarted.fire_due(now + timedelta(hours=8))["warned"] == []
+    assert restarted.fire_due(now + timedelta(hours=31))["expired"] == [deal_id]
+
+
+def test_aware_expiries_mix_with_naive_now():
+    """Сроки из PostgreSQL (aware) и из SQLite (naive) в одной куче; now — naive utcnow()"""
+    now = datetime(2026, 1, 10, 12, 0)
+    factory, (stored, scheduled) = _setup([now + timedelta(hours=1), now + timedelta(hours=2)])
+
+    scheduler = DealScheduler(session_factory=factory)
+    scheduler.rebuild()  # SQLite: naive
+    scheduler._push(scheduled, (now + timedelta(hours=2)).replace(tzinfo=timezone.utc), warning_sent=True)
+
+    assert scheduler._seconds_until_next(now) == 0.0  # Предупреждение за 24ч уже наступило
+    assert sorted(scheduler.fire_due(now + timedelta(hours=3))["expired"]) == [stored, scheduled]
+
+
+def test_worker_picks_up_deals_activated_elsewhere():
+    """Сделку активировал API без цикла планировщика — воркер дочитывает её по окну сроков"""
+    now = datetime(2026, 1, 10, 12, 0)
+    factory, (deal_id,) = _setup([now + timedelta(days=3)])
+
+    worker = DealScheduler(session_factory=factory)
+    worker.rebuild()
+    api = DealScheduler(session_factory=factory)
+
+    # Активация после старта воркера
+    db = factory()
+    deal = db.get(models.Deal, deal_id)
+    activated = models.Deal(
+        user_id=deal.user_id, market_total=1000.0, loan_amount=400.0, buyback_price=488.0,
+        option_expiry=now + timedelta(hours=30), items_snapshot=[{"assetid": "2"}],
+        deal_status=models.DealStatus.ACTIVE
+    )
+    distant = models.Deal(
+        user_id=deal.user_id, market_total=1000.0, loan_amount=400.0, buyback_price=488.0,
+        option_expiry=now + timedelta(days=10), items_snapshot=[{"assetid": "3"}],
+        deal_status=models.DealStatus.ACTIVE
+    )
+    db.add_all([activated, distant])
+    db.commit()
+    activated_id, distant_id = activated.id, distant.id
+    db.close()
+    api.schedule(activated_id, now + timedelta(hours=30))
+    assert len(api) == 0  # Цикла в процессе API нет — куча не растёт
+
+    assert worker.sync_window(now) == 0  # Предупреждение через 6ч — ещё за окном
+    assert worker.sync_window(now + timedelta(hours=6)) == 2  # Предупреждение и дефолт; дальняя сделка — позже
+    assert worker.sync_window(now + timedelta(hours=6)) == 0  # Повторная дочитка не дублирует таймеры
+    assert worker.fire_due(now + timedelta(hours=7))["warned"] == [activated_id]
+
+    worker.sync_window(now + timedelta(days=9))
+    assert worker.fire_due(now + timedelta(days=11))["expired"] == sorted([deal_id, activated_id, distant_id])
+
+
+def test_loop_survives_db_error_at_startup(monkeypatch):
+    """Ошибка БД в rebuild() при старте не останавливает цикл: повтор через RETRY_SECONDS"""
+    factory, (deal_id,) = _setup([datetime.utcnow() - timedelta(minutes=1)])
+    calls = []
+
+    def flaky_factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("БД недоступна")
+        return factory()
+
+    monkeypatch.setattr(deal_scheduler_module, "RETRY_SECONDS", 0.01)
+    scheduler = DealScheduler(session_factory=flaky_factory)
+
+    async def run():
+        scheduler.start()
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if _statuses(factory)[deal_id] == models.DealStatus.DEFAULT:
+                break
+        await scheduler.stop()
+
+    asyncio.run(run())
+    assert _statuses(factory)[deal_id] == models.DealStatus.DEFAULT
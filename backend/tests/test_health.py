@@ -0,0 +1,93 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import main
+from services.health import HealthMonitor, Probe
+
+
+def _monitor(calls):
+    async def database():
+        calls["database"] += 1
+
+    async def steam_api():
+        raise ConnectionError("steam down")
+
+    async def market():
+        await asyncio.sleep(1)
+
+    return HealthMonitor([
+        Probe("database", database, interval=5, critical=True),
+        Probe("steam_api", steam_api, interval=30, critical=False),
+        Probe("market_csgo", market, interval=60, timeout=0.05),
+    ])
+
+
+def test_probe_results_and_latency_histograms():
+    calls = {"database": 0}
+    monitor = _monitor(calls)
+    assert monitor.report()["status"] == "starting"
+
+    async def run():
+        for name in monitor.probes:
+            await monitor.run_probe(name)
+        await monitor.run_probe("steam_api")
+
+    asyncio.run(run())
+    report = monitor.report()
+
+    assert report["status"] == "ok"  # Упали только некритичные
+    assert report["checks"] == {"database": "ok", "steam_api": "error", "market_csgo": "error"}
+    assert report["probes"]["steam_api"]["consecutive_failures"] == 2
+    assert report["probes"]["market_csgo"]["error"] == "timeout 0.05 s"
+
+    latency = monitor.latency()
+    assert latency["steam_api"]["count"] == 2
+    assert latency["market_csgo"]["buckets"]["0.1"] == 1  # Таймаут — задержка около 50 мс
+
+    # Критичная проверка давно не обновлялась — degraded
+    monitor.states["database"].checked_monotonic -= 60
+    assert monitor.report()["checks"]["database"] == "stale"
+    assert monitor.report()["status"] == "degraded"
+
+
+def test_health_endpoint_serves_cached_report(monkeypatch):
+    calls = {"database": 0}
+    monitor = _monitor(calls)
+    asyncio.run(monitor.run_probe("database"))
+    monkeypatch.setattr(main, "health_monitor", monitor)
+    client = TestClient(main.app)
+
+    responses = [client.get("/health") for _ in range(3)]
+
+    assert calls["database"] == 1  # Запрос к /health зависимости не проверяет
+    assert all(response.json()["checks"]["database"] == "ok" for response in responses)
+    assert client.get("/health/latency").json()["probes"]["database"]["count"] == 1
+
+
+def test_critical_probe_failure_degrades(monkeypatch):
+    """Ошибка критичной проверки — degraded; некритичные на статус не влияют"""
+    async def database():
+        raise ConnectionError("database down")
+
+    async def steam_api():
+        return None
+
+    monitor = HealthMonitor([
+        Probe("database", database, interval=5, critical=True),
+        Probe("steam_api", steam_api, interval=30, critical=True),
+    ])
+
+    async def run():
+        for name in monitor.probes:
+            await monitor.run_probe(name)
+
+    asyncio.run(run())
+    monkeypatch.setattr(main, "health_monitor", monitor)
+    response = TestClient(main.app).get("/health")
+
+    assert response.status_code == 200
+    report = response.json()
+    assert report["status"] == "degraded"
+    assert report["checks"] == {"database": "error", "steam_api": "ok"}
+    assert report["probes"]["database"]["error"] == "ConnectionError: database down"
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.http_clients import HttpClientRegistry, Upstream
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.send_header("Set-Cookie", "sessionid=secret; Path=/")
+        self.send_header("X-Request-Cookie", self.headers.get("Cookie", ""))
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_connections_reused_without_cookies(server):
+    """Запросы идут по одному соединению, Set-Cookie не попадает в следующие запросы"""
+    registry = HttpClientRegistry({"local": Upstream(timeout=5.0, http2=False)})
+
+    async def run():
+        responses = []
+        for _ in range(5):
+            async with registry.borrow("local") as client:
+                responses.append(await client.get(server))
+        await registry.aclose()
+        return responses
+
+    responses = asyncio.run(run())
+
+    assert all(response.status_code == 200 for response in responses)
+    assert all(response.headers["X-Request-Cookie"] == "" for response in responses)
+    stats = registry.stats()["local"]
+    assert stats["requests"] == 5
+    assert stats["connections_opened"] == 1
+    assert stats["reuse_ratio"] == 0.8
+
+
+def test_client_per_event_loop(server):
+    """В новом event loop создаётся свой клиент (соединения loop не переносятся)"""
+    registry = HttpClientRegistry({"local": Upstream(timeout=5.0, http2=False)})
+
+    async def request():
+        client = registry.get("local")
+        assert registry.get("local") is client
+        await client.get(server)
+        return client
+
+    first = asyncio.run(request())
+    second = asyncio.run(request())
+
+    assert first is not second
+    assert registry.stats()["local"]["connections_opened"] == 2
+
+    async def unknown():
+        registry.get("missing")
+
+    with pytest.raises(KeyError):
+        asyncio.run(unknown())
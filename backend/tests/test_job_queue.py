@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import models
+from services import job_queue
+from services.job_queue import JobRunner, enqueue, ensure_lease, job_handler
+
+
+calls = {"ok": 0, "broken": 0, "active": 0, "max_active": 0, "side_effect": 0}
+
+
+@job_handler("test_ok")
+async def _ok_job(db, job):
+    calls["ok"] += 1
+
+
+@job_handler("test_broken")
+async def _broken_job(db, job):
+    calls["broken"] += 1
+    raise RuntimeError("бот недоступен")
+
+
+@job_handler("test_slow")
+async def _slow_job(db, job):
+    calls["active"] += 1
+    calls["max_active"] = max(calls["max_active"], calls["active"])
+    await asyncio.sleep(0.01)
+    calls["active"] -= 1
+
+
+def _steal_lease(db, job):
+    """Аренду вернули в очередь, задачу забрал другой воркер"""
+    db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job.id).update(
+        {models.BackgroundJob.locked_by: "other-worker"}, synchronize_session=False
+    )
+    db.commit()
+
+
+@job_handler("test_stolen")
+async def _stolen_job(db, job):
+    _steal_lease(db, job)
+    job.last_error = "изменение этого обработчика"
+
+
+@job_handler("test_stolen_side_effect")
+async def _stolen_side_effect_job(db, job):
+    _steal_lease(db, job)
+    ensure_lease(db, job)
+    calls["side_effect"] += 1
+
+
+def _enqueue(runner, job_type, **kwargs):
+    db = runner.session_factory()
+    job = enqueue(db, job_type, **kwargs)
+    db.commit()
+    job_id = job.id
+    db.close()
+    return job_id
+
+
+def test_job_done_and_not_repeated():
+    """Успешная задача выполняется один раз"""
+    runner = JobRunner.in_memory()
+    job_id = _enqueue(runner, "test_ok")
+
+    calls["ok"] = 0
+    assert asyncio.run(runner.run_job(job_id)) == models.JobStatus.DONE
+    assert asyncio.run(runner.run_job(job_id)) is None
+    assert calls["ok"] == 1
+
+
+def test_failed_job_retried_until_max_attempts(monkeypatch):
+    """Упавшая задача повторяется и после max_attempts помечается FAILED"""
+    monkeypatch.setattr(job_queue, "retry_delay", lambda attempts: 0)
+    runner = JobRunner.in_memory()
+    job_id = _enqueue(runner, "test_broken", max_attempts=3)
+
+    calls["broken"] = 0
+    statuses = [asyncio.run(runner.run_job(job_id)) for _ in range(4)]
+
+    assert statuses == [models.JobStatus.PENDING, models.JobStatus.PENDING, models.JobStatus.FAILED, None]
+    assert calls["broken"] == 3
+
+    db = runner.session_factory()
+    job = db.get(models.BackgroundJob, job_id)
+    assert job.attempts == 3
+    assert "бот недоступен" in job.last_error
+    db.close()
+
+
+def test_retry_delay_grows_exponentially():
+    """Пауза удваивается с каждой попыткой и ограничена сверху"""
+    assert 5 <= job_queue.retry_delay(1) <= 10
+    assert 20 <= job_queue.retry_delay(3) <= 40
+    assert job_queue.retry_delay(50) <= job_queue.RETRY_MAX_DELAY_SECONDS
+
+
+def test_idempotency_key_deduplicates():
+    """Повторный enqueue с тем же ключом возвращает ту же задачу"""
+    runner = JobRunner.in_memory()
+    first = _enqueue(runner, "test_ok", idempotency_key="payout:deal:1")
+    second = _enqueue(runner, "test_ok", idempotency_key="payout:deal:1")
+    assert first == second
+
+    db = runner.session_factory()
+    a = enqueue(db, "test_ok", idempotency_key="payout:deal:2")
+    b = enqueue(db, "test_ok", idempotency_key="payout:deal:2")
+    assert a is b
+    db.close()
+
+
+def test_target_concurrency_limit():
+    """Одновременно к одной системе выполняется не больше target_limits задач"""
+    runner = JobRunner.in_memory(target_limits={"steam_bot": 2})
+    for _ in range(6):
+        _enqueue(runner, "test_slow", target="steam_bot")
+
+    calls["active"] = calls["max_active"] = 0
+    assert asyncio.run(runner.run_due_jobs()) == 6
+    assert calls["max_active"] == 2
+
+
+def test_interrupted_jobs_requeued():
+    """После рестарта задачи в статусе RUNNING возвращаются в очередь"""
+    runner = JobRunner.in_memory()
+    db = runner.session_factory()
+    job = enqueue(db, "test_ok")
+    job.status = models.JobStatus.RUNNING
+    db.commit()
+    db.close()
+
+    assert runner.requeue_interrupted() == 1
+    assert asyncio.run(runner.run_due_jobs()) == 1
+
+
+def test_only_expired_leases_requeued():
+    """Задачу с живой арендой (её выполняет другой процесс) повторно не запускаем"""
+    runner = JobRunner.in_memory()
+    db = runner.session_factory()
+    live = enqueue(db, "test_ok", idempotency_key="live")
+    stale = enqueue(db, "test_ok", idempotency_key="stale")
+    for job, locked_at in ((live, datetime.utcnow()), (stale, datetime.utcnow() - timedelta(seconds=runner.lease_seconds + 1))):
+        job.status = models.JobStatus.RUNNING
+        job.locked_by = "other-worker"
+        job.locked_at = locked_at
+    db.commit()
+    live_id, stale_id = live.id, stale.id
+    db.close()
+
+    assert runner.requeue_interrupted() == 1
+    db = runner.session_factory()
+    assert db.get(models.BackgroundJob, live_id).status == models.JobStatus.RUNNING
+    assert db.get(models.BackgroundJob, stale_id).status == models.JobStatus.PENDING
+    db.close()
+
+    assert asyncio.run(runner.run_job(stale_id)) == models.JobStatus.DONE
+    db = runner.session_factory()
+    done = db.get(models.BackgroundJob, stale_id)
+    assert done.locked_by is None and done.locked_at is None
+    db.close()
+
+
+def test_lost_lease_result_discarded():
+    """Итог задачи с потерянной арендой не перезаписывает состояние нового владельца"""
+    runner = JobRunner.in_memory()
+    calls["side_effect"] = 0
+
+    for job_type in ("test_stolen", "test_stolen_side_effect"):
+        job_id = _enqueue(runner, job_type)
+        assert asyncio.run(runner.run_job(job_id)) is None
+
+        db = runner.session_factory()
+        job = db.get(models.BackgroundJob, job_id)
+        assert job.status == models.JobStatus.RUNNING and job.locked_by == "other-worker"
+        assert job.last_error is None
+        db.close()
+
+    assert calls["side_effect"] == 0  # ensure_lease остановил побочный эффект
@@ -0,0 +1,50 @@
+import json
+import logging
+
+import logger
+from logger import JsonFormatter, debug_sampled, get_logger
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_json_record_carries_extra_fields():
+    record = logging.LogRecord("cyberlombard.prices", logging.INFO, __file__, 1, "Цены получены", (), None)
+    record.requested = 5
+    record.found = 3
+
+    payload = json.loads(JsonFormatter().format(record))
+
+    assert payload["level"] == "INFO" and payload["logger"] == "cyberlombard.prices"
+    assert payload["msg"] == "Цены получены"
+    assert payload["requested"] == 5 and payload["found"] == 3
+
+
+def test_debug_sampled_writes_share_of_records(monkeypatch):
+    log = get_logger("test_sampling")
+    handler = ListHandler()
+    log.addHandler(handler)
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    try:
+        monkeypatch.setattr(logger, "SAMPLE_RATE", 0.0)
+        for i in range(100):
+            debug_sampled(log, "Цена предмета", item=f"item {i}", price=i)
+        assert handler.records == []
+
+        monkeypatch.setattr(logger, "SAMPLE_RATE", 1.0)
+        debug_sampled(log, "Цена предмета", item="AK-47", price=100.0)
+        assert handler.records[0].item == "AK-47"
+        assert handler.records[0].sample_rate == 1.0
+
+        log.setLevel(logging.INFO)  # debug выключен — выборка не считается
+        debug_sampled(log, "Цена предмета", item="M4A1", price=50.0)
+        assert len(handler.records) == 1
+    finally:
+        log.removeHandler(handler)
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+from metrics import MetricsRegistry, timed
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    latency = registry.histogram("op_seconds", "Время", ("operation",), buckets=(0.1, 1.0))
+    errors = registry.counter("op_errors", "Ошибки", ("operation",))
+    latency.observe(0.05, operation="quote")
+    latency.observe(2.0, operation="quote")
+    errors.inc(operation='say "hi"')
+
+    text = registry.render()
+
+    assert "# TYPE cyberlombard_op_seconds histogram" in text
+    assert 'cyberlombard_op_seconds_bucket{operation="quote",le="0.1"} 1' in text
+    assert 'cyberlombard_op_seconds_bucket{operation="quote",le="+Inf"} 2' in text
+    assert 'cyberlombard_op_seconds_count{operation="quote"} 2' in text
+    assert "# TYPE cyberlombard_op_errors_total counter" in text
+    assert 'cyberlombard_op_errors_total{operation="say \\"hi\\""} 1' in text
+
+
+def test_timed_records_sync_and_async_calls():
+    @timed("test.sync")
+    def compute(value):
+        return value * 2
+
+    @timed("test.async")
+    async def fail():
+        raise ValueError("нет цены")
+
+    before = metrics.operation_duration.count(operation="test.async")
+    assert compute(21) == 42
+    with pytest.raises(ValueError):
+        asyncio.run(fail())
+
+    assert metrics.operation_duration.count(operation="test.sync") >= 1
+    assert metrics.operation_duration.count(operation="test.async") == before + 1
+    assert metrics.operation_errors.value(operation="test.async", error="ValueError") >= 1
+
+
+def test_metrics_endpoint_labels_routes_by_template():
+    client = TestClient(main.app)
+    client.get("/api/stats/public")
+    client.get("/api/stats/public")  # Из кэша ответов, без маршрутизации
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'cyberlombard_http_request_duration_seconds_count{method="GET",route="/api/stats/public",status="200"}' in text
+    assert 'cyberlombard_response_cache_requests_total{result="hits"}' in text
+    assert 'cyberlombard_jobs_queued{status="PENDING"}' in text
+    assert "cyberlombard_db_pool_wait_seconds_bucket" in text
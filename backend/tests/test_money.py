@@ -0,0 +1,64 @@
+import money
+from services.pricing_service import PricingService
+from services.contract_service import ContractService
+
+
+def test_to_kopecks_rounds_half_up():
+    """Округление half-up с учётом ошибки представления float"""
+    assert money.to_kopecks(1.005) == 101
+    assert money.to_kopecks(0.125) == 13
+    assert money.to_kopecks(1234.56) == 123456
+    assert money.to_kopecks("99.99") == 9999
+    assert money.to_kopecks(None) == 0
+    assert money.format_rub(123405) == "1234.05"
+
+
+def test_apply_rate_half_up():
+    """Ставка применяется с округлением до копейки"""
+    assert money.apply_rate(1001, money.rate_to_ppm(0.40)) == 400  # 400.4
+    assert money.apply_rate(1004, money.rate_to_ppm(0.40)) == 402  # 401.6
+    assert money.apply_rate(125, money.rate_to_ppm(0.50)) == 63  # 62.5
+
+
+def test_quote_totals_match_item_sums():
+    """Итог выдачи = сумме по предметам, выкуп = выдача + проценты + премия"""
+    items = [{"market_hash_name": f"Item {i}", "instant_price": 10.01 + i * 0.37} for i in range(50)]
+    quote = PricingService.calculate_quote(items, option_days=10)
+    breakdown = quote["breakdown"]
+
+    assert sum(item["loan_price_kopecks"] for item in quote["items"]) == breakdown["loan_amount_kopecks"]
+    assert money.to_kopecks(quote["loan_amount"]) == breakdown["loan_amount_kopecks"]
+    assert (breakdown["loan_amount_kopecks"] + breakdown["interest_kopecks"] + breakdown["premium_kopecks"]
+            == breakdown["buyback_price_kopecks"])
+    assert money.to_kopecks(quote["buyback_price"]) == breakdown["buyback_price_kopecks"]
+
+
+def test_quote_reuses_carried_item_values():
+    """Посчитанные ранее суммы выдачи переносятся без пересчёта"""
+    item = {"market_hash_name": "AK-47 | Redline (Field-Tested)", "instant_price": 3500.0,
+            "instant_price_kopecks": 350000, "loan_price_kopecks": 140000}
+    quote = PricingService.calculate_quote([item], option_days=14)
+
+    assert quote["items"][0]["loan_price_kopecks"] == 140000
+    assert quote["loan_amount"] == 1400.0
+
+
+def test_contract_uses_quote_amounts():
+    """Договор показывает те же суммы, что и квота"""
+    items = [{"market_hash_name": "Item", "instant_price": 333.33}] * 3
+    quote = PricingService.calculate_quote(items, option_days=14)
+    deal = {
+        "id": 1,
+        "loan_amount": quote["loan_amount"],
+        "buyback_price": quote["buyback_price"],
+        "option_days": 14,
+        "option_expiry": quote["option_expiry"],
+        "created_at": quote["option_expiry"],
+        "items": quote["items"],
+        "term_config": quote["term_config"],
+        "breakdown": quote["breakdown"],
+    }
+    html = ContractService.generate_contract_html(deal, {"full_name": "Клиент", "phone": "+79990000000"})
+
+    assert f"{money.format_rub(quote['items'][0]['loan_price_kopecks'])} ₽" in html
+    assert f"{money.format_rub(quote['breakdown']['interest_kopecks'])} ₽" in html
@@ -0,0 +1,47 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from services.policy_simulator import PolicyConfig, SimulationParams, main, run_simulation
+
+
+POLICY = PolicyConfig.from_strings("500:0.60,inf:0.40", "7:0.10:0.05,30:0.25:0.10")
+
+
+def test_all_buyback_profit_is_deterministic():
+    """При 100% выкупе прибыль = loan * ((1 + interest) * (1 + premium) - 1)"""
+    params = SimulationParams(deals=10_000, seed=42, items_per_deal=1.0, buyback_rate=1.0)
+    report = run_simulation([1000.0], POLICY, params)
+
+    assert report.buyback_rate == 1.0
+    assert report.loss_probability == 0.0
+    # loan = 1000 * 0.40 = 400
+    assert report.by_term[7]["mean_profit"] == pytest.approx(400 * (1.10 * 1.05 - 1), abs=0.01)
+    assert report.by_term[30]["mean_profit"] == pytest.approx(400 * (1.25 * 1.10 - 1), abs=0.01)
+
+
+def test_loan_tiers_applied_per_item():
+    """Дешёвые предметы выдаются по своему порогу"""
+    params = SimulationParams(deals=1_000, seed=1, items_per_deal=1.0, buyback_rate=1.0)
+    report = run_simulation([100.0], POLICY, params)
+
+    assert report.total_loan == pytest.approx(1_000 * 60.0, rel=1e-6)
+
+
+def test_seeded_runs_are_reproducible_across_workers():
+    """Один seed даёт один результат; воркеры делят выборку без пересечений"""
+    params = SimulationParams(deals=20_000, workers=2, seed=7, buyback_rate=0.5)
+    first = run_simulation([50.0, 500.0, 5000.0], POLICY, params)
+    second = run_simulation([50.0, 500.0, 5000.0], POLICY, params)
+
+    assert first.deals == 20_000
+    assert first.mean_profit == second.mean_profit
+    assert 0.45 < first.buyback_rate < 0.55
+
+
+def test_zero_deals_rejected():
+    """deals=0 — ошибка аргументов, а не падение np.concatenate"""
+    with pytest.raises(ValueError):
+        run_simulation([100.0], POLICY, SimulationParams(deals=0))
+    with pytest.raises(SystemExit):
+        main(["--deals", "0", "--source", "demo"])
@@ -0,0 +1,263 @@
+"""
+Число SQL-запросов на эндпоинт сделок
+
+Каждый эндпоинт вызывается для сделки с одним скином и с пятью: число
+запросов должно совпасть (нет N+1 по скинам и задачам) и не превышать
+бюджет. Новая ленивая загрузка в обработчике превысит бюджет и уронит тест.
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import get_async_db, get_async_read_db, get_db, get_read_db
+from main import app
+from response_cache import response_cache
+from services import deal_pipeline
+from services.audit_log import audit_sink
+from services.deal_pipeline import DealPipeline
+from services.item_catalog import ItemCatalog
+from services.payment_service import PaymentService
+from services.steam_service import SteamService
+from services.stats_service import StatsService
+
+# Бюджет запросов (SELECT/INSERT/UPDATE) на вызов
+BUDGETS = {
+    "get_deal": 3,               # сделка + пользователь, скины, задачи
+    "get_user_deals": 3,         # пользователь, сделки, скины
+    "verify_trade": 1,           # первая ожидающая сделка с числом скинов
+    "accept": 8,                 # сделка, ключи 2 задач, статистика (2), UPDATE, 2 INSERT
+    "buyback_complete": 8,
+    "trade_webhook": 8,          # сделка по трейду одним JOIN, далее как accept
+    "public_stats": 1,
+    "admin_deals": 3,            # страница, пользователи страницы, статистика
+    "admin_deal_details": 2,
+    "admin_pending": 1,
+    "notify_new_deal_job": 2,    # сделка + пользователь, скины
+}
+
+
+class QueryCounter:
+    def __init__(self, *engines):
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def measure(self, fn):
+        response_cache.clear()  # Холодный кэш ответов: считаются запросы обработчика
+        started = self.count
+        fn()
+        return self.count - started
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'queries.db'}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'queries.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    ItemCatalog.clear()
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_factory = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+    def sync_session():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def async_session():
+        async with async_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = sync_session
+    app.dependency_overrides[get_read_db] = sync_session
+    app.dependency_overrides[get_async_db] = async_session
+    app.dependency_overrides[get_async_read_db] = async_session
+    monkeypatch.setattr(audit_sink, "spool_dir", str(tmp_path / "audit"))
+
+    yield factory, QueryCounter(engine, async_engine.sync_engine)
+
+    app.dependency_overrides.clear()
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+def _deals(factory, items_count, statuses):
+    """Пользователь со сделками в заданных статусах, у каждой items_count скинов"""
+    db = factory()
+    user = models.User(steam_id=f"7656119800000{items_count:04d}", steam_username="user", phone=f"+7999000{items_count:04d}")
+    db.add(user)
+    db.flush()
+    deals = []
+    for i, status in enumerate(statuses):
+        deal = models.Deal(
+            user_id=user.id,
+            market_total=1000.0,
+            loan_amount=400.0,
+            buyback_price=488.0,
+            option_expiry=datetime.utcnow() + timedelta(days=7),
+            deal_status=status,
+            items_snapshot=[{"assetid": f"{items_count}{i}{n}", "market_hash_name": f"Skin {n}"} for n in range(items_count)],
+            kyc_snapshot={"full_name": "Клиент", "phone": "+79990000000"}
+        )
+        db.add(deal)
+        db.flush()
+        DealPipeline.enqueue_creation_jobs(db, deal, 14, {})
+        db.add(models.SteamTrade(deal_id=deal.id, trade_offer_id=f"offer-{deal.id}", is_incoming=True))
+        deals.append(deal.id)
+    StatsService.rebuild(db)
+    db.commit()
+    steam_id = user.steam_id
+    db.close()
+    return steam_id, deals
+
+
+def _run_handler(factory, job):
+    db = factory()
+    asyncio.run(deal_pipeline.notify_new_deal(db, job))
+    db.close()
+
+
+def _requests(client, factory, items_count):
+    """{эндпоинт: функция вызова} для новых сделок с items_count скинами"""
+    statuses = [models.DealStatus.PENDING, models.DealStatus.ACTIVE, models.DealStatus.PENDING]
+    steam_id, (pending_id, active_id, webhook_id) = _deals(factory, items_count, statuses)
+
+    def ok(response):
+        assert response.status_code == 200, response.text
+        return response
+
+    db = factory()
+    job = db.query(models.BackgroundJob).filter_by(
+        deal_id=pending_id, job_type=deal_pipeline.NOTIFY_NEW_DEAL
+    ).one()
+    db.close()
+
+    # Задача загружена выше — считаются только запросы обработчика
+    return {
+        "get_deal": lambda: ok(client.get(f"/api/deals/{pending_id}")),
+        "get_user_deals": lambda: ok(client.get("/api/deals", params={"steam_id": steam_id})),
+        "verify_trade": lambda: ok(client.get("/api/trades/verify/any")),
+        "accept": lambda: ok(client.post(f"/api/deals/{pending_id}/accept")),
+        "buyback_complete": lambda: ok(client.post(
+            f"/api/deals/{active_id}/buyback/complete", params={"payment_id": "pay-1"}
+        )),
+        "trade_webhook": lambda: ok(client.post(
+            f"/api/trades/offer-{webhook_id}/status", json={"status": "ACCEPTED"}
+        )),
+        "public_stats": lambda: ok(client.get("/api/stats/public")),
+        "admin_deals": lambda: ok(client.get("/api/admin/deals")),
+        "admin_deal_details": lambda: ok(client.get(f"/api/admin/deals/{active_id}/details")),
+        "admin_pending": lambda: ok(client.get("/api/admin/deals/pending")),
+        "notify_new_deal_job": lambda: _run_handler(factory, job),
+    }
+
+
+def test_deal_endpoints_within_query_budget(env, monkeypatch):
+    factory, counter = env
+
+    async def succeeded(payment_id):
+        return "succeeded"
+
+    monkeypatch.setattr(PaymentService, "check_payment_status", staticmethod(succeeded))
+    monkeypatch.setattr(deal_pipeline.telegram_service, "BOT_TOKEN", "")
+    client = TestClient(app)
+
+    counts = {}
+    for items_count in (1, 5):
+        calls = _requests(client, factory, items_count)
+        counts[items_count] = {name: counter.measure(call) for name, call in calls.items()}
+
+    over = {name: count for name, count in counts[5].items() if count > BUDGETS[name]}
+    assert not over, f"Превышен бюджет запросов: {over} (бюджет {BUDGETS})"
+    assert counts[1] == counts[5], "Число запросов зависит от числа скинов (N+1)"
+
+
+def test_create_deal_in_async_session(env, monkeypatch):
+    """POST /api/deals через AsyncSession: сделка, скины, задачи outbox и статистика — одной транзакцией"""
+    factory, _ = env
+    db = factory()
+    db.add(models.User(steam_id="76561198000000042", phone="+79990000000", phone_verified=True))
+    StatsService.rebuild(db)
+    db.commit()
+    db.close()
+
+    inventory = [
+        {"assetid": str(n), "market_hash_name": f"Skin {n}", "rarity": "Mil-Spec", "type": "Rifle"}
+        for n in range(3)
+    ]
+
+    async def get_inventory(steam_id):
+        return inventory
+
+    async def get_market_prices(items):
+        return {item["market_hash_name"]: {"instant_price": 1000.0} for item in items}
+
+    async def invalidate_inventory(steam_id):
+        pass
+
+    monkeypatch.setattr(SteamService, "get_inventory", staticmethod(get_inventory))
+    monkeypatch.setattr(SteamService, "get_market_prices", staticmethod(get_market_prices))
+    monkeypatch.setattr(SteamService, "invalidate_inventory", staticmethod(invalidate_inventory))
+
+    response = TestClient(app).post("/api/deals", json={
+        "quote_request": {"steam_id": "76561198000000042", "asset_ids": ["0", "2"], "option_days": 14},
+        "sms_code": "123456",
+        "skip_verification": True
+    })
+
+    assert response.status_code == 200, response.text
+    deal = response.json()
+    assert [item["assetid"] for item in deal["items_snapshot"]] == ["0", "2"]
+    db = factory()
+    assert {job.job_type for job in db.query(models.BackgroundJob).filter_by(deal_id=deal["id"])} == {
+        deal_pipeline.CONTRACT_PDF, deal_pipeline.TRADE_OFFER, deal_pipeline.NOTIFY_NEW_DEAL
+    }
+    assert db.get(models.DealStats, 0).pending_count == 1
+    db.close()
+
+
+
+def test_cached_deal_revalidated_with_one_query(env):
+    """Повтор GET /api/deals/{id} — один запрос отметок вместо загрузки сделки"""
+    factory, counter = env
+    client = TestClient(app)
+    _, (deal_id,) = _deals(factory, 3, [models.DealStatus.PENDING])
+    url = f"/api/deals/{deal_id}"
+
+    first = client.get(url)
+    etag = first.headers["ETag"]
+
+    def repeat(**headers):
+        started = counter.count
+        response = client.get(url, headers=headers)
+        return response, counter.count - started
+
+    cached, cached_queries = repeat()
+    not_modified, not_modified_queries = repeat(**{"If-None-Match": etag})
+
+    assert cached.json() == first.json() and cached.headers["ETag"] == etag
+    assert cached_queries == 1
+    assert not_modified.status_code == 304 and not_modified_queries == 1
+
+    # Изменилась задача сделки — новая версия и новый ответ
+    db = factory()
+    job = db.query(models.BackgroundJob).filter_by(deal_id=deal_id).first()
+    job.last_error = "timeout"
+    job.updated_at = datetime.utcnow() + timedelta(seconds=5)
+    db.commit()
+    db.close()
+
+    changed, _ = repeat(**{"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
@@ -0,0 +1,126 @@
+"""
+Регрессия планов запросов: горячие запросы жизненного цикла сделок
+идут по индексам, а не полным сканом deals (1M сделок в SQLite).
+"""
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+import models
+from services.admin_deals_service import AdminDealsService
+
+DEALS = int(os.getenv("QUERY_PLAN_DEALS", "1000000"))
+USERS = 20_000
+NOW = datetime(2026, 6, 1, 12, 0)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {USERS})
+            INSERT INTO users (id, steam_id, created_at)
+            SELECT n, '7656119' || printf('%010d', n), '2026-01-01 00:00:00' FROM seq
+        """)
+        # Реалистичное распределение: большинство сделок закрыто, ACTIVE ~3%, PENDING ~0.5%
+        conn.exec_driver_sql(f"""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {DEALS})
+            INSERT INTO deals (id, user_id, market_total, loan_amount, buyback_price,
+                               created_at, option_expiry, deal_status, items_snapshot)
+            SELECT n, 1 + n % {USERS}, 1000.0, 400.0, 488.0,
+                   datetime('2026-06-01 12:00:00', '-' || (n % 400) || ' days'),
+                   datetime('2026-06-01 12:00:00', ((n * 7919) % 60 - 30) || ' days'),
+                   CASE WHEN n % 1000 < 5 THEN 'PENDING'
+                        WHEN n % 1000 < 35 THEN 'ACTIVE'
+                        WHEN n % 1000 < 600 THEN 'BUYBACK'
+                        WHEN n % 1000 < 900 THEN 'DEFAULT'
+                        ELSE 'CANCELLED' END,
+                   '[]'
+            FROM seq
+        """)
+        conn.exec_driver_sql("ANALYZE")
+    print(f"\n[PLAN] {DEALS:,} сделок за {time.perf_counter() - started:.1f} с")
+
+    yield engine
+    engine.dispose()
+
+
+def _plan(engine, stmt):
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+Deal = models.Deal
+ACTIVE = models.DealStatus.ACTIVE
+PENDING = models.DealStatus.PENDING
+BUYBACK = models.DealStatus.BUYBACK
+
+HOT_QUERIES = {
+    # GET /api/deals
+    "user_deals": select(Deal).where(Deal.user_id == 42),
+    # GET /api/stats/user/{steam_id}
+    "user_stats_count": select(func.count(Deal.id)).where(Deal.user_id == 42, Deal.deal_status == ACTIVE),
+    "user_stats_sum": select(func.sum(Deal.buyback_price)).where(Deal.user_id == 42, Deal.deal_status == BUYBACK),
+    # DealLifecycle.expire_deals / check-expired
+    "expired": select(Deal.id).where(Deal.deal_status == ACTIVE, Deal.option_expiry <= NOW),
+    # DealLifecycle.expire_all (пачка)
+    "expired_batch": select(Deal.id).where(
+        Deal.deal_status == ACTIVE, Deal.option_expiry <= NOW
+    ).order_by(Deal.option_expiry).limit(1000),
+    # DealLifecycle.send_expiry_warnings / notifications/expiring-deals
+    "expiring": select(Deal.id).where(
+        Deal.deal_status == ACTIVE,
+        Deal.expiry_warning_sent_at.is_(None),
+        Deal.option_expiry > NOW,
+        Deal.option_expiry <= NOW + timedelta(hours=24)
+    ),
+    # DealScheduler.rebuild
+    "scheduler_rebuild": select(Deal.id, Deal.option_expiry).where(
+        Deal.deal_status == ACTIVE
+    ).order_by(Deal.option_expiry),
+    # verify_trade, /api/admin/deals/pending
+    "pending": select(Deal).where(Deal.deal_status == PENDING),
+    # Выборки по сделке
+    "audit_by_deal": select(models.AuditLog).where(models.AuditLog.deal_id == 42),
+    "trades_by_deal": select(models.SteamTrade).where(models.SteamTrade.deal_id == 42),
+    "trade_by_offer": select(models.SteamTrade).where(models.SteamTrade.trade_offer_id == "123"),
+    # GET /api/admin/deals (первая и следующая страница, фильтр статуса)
+    "admin_page": AdminDealsService.page_query(),
+    "admin_page_cursor": AdminDealsService.page_query(cursor=AdminDealsService.encode_cursor(NOW, 500_000)),
+    "admin_page_status": AdminDealsService.page_query(
+        status=ACTIVE, cursor=AdminDealsService.encode_cursor(NOW - timedelta(days=30), 500_000)
+    ),
+    # Скины сделки и сделки по скину (deal_items)
+    "items_by_deal": select(models.DealItem).where(models.DealItem.deal_id == 42).order_by(models.DealItem.position),
+    "deals_by_item": select(models.DealItem.deal_id).where(models.DealItem.item_id == 42),
+    "catalog_by_name": select(models.CatalogItem.id).where(
+        models.CatalogItem.market_hash_name == "AK-47 | Redline (Field-Tested)"
+    ),
+    "jobs_by_deal": select(models.BackgroundJob).where(models.BackgroundJob.deal_id == 42),
+}
+
+# Первая страница без курсора: проход по индексу в порядке ORDER BY, останавливается на LIMIT
+INDEX_ORDERED_SCANS = {"admin_page": "SCAN deals USING INDEX ix_deals_created_id"}
+
+
+@pytest.mark.parametrize("name", list(HOT_QUERIES))
+def test_hot_query_uses_index(engine, name):
+    """Запрос ищет по индексу (SEARCH ... USING INDEX), без полного скана"""
+    plan = _plan(engine, HOT_QUERIES[name])
+
+    assert plan, name
+    for step in plan:
+        if step == INDEX_ORDERED_SCANS.get(name):
+            continue
+        assert not step.startswith("SCAN"), f"{name}: {plan}"
+        if step.startswith("SEARCH"):
+            assert "INDEX" in step or "PRIMARY KEY" in step, f"{name}: {plan}"
+    assert not any("TEMP B-TREE" in step for step in plan), f"{name}: {plan}"
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import main
+from rate_limit import RateLimited, RateLimiter, gcra
+
+STEAM_ID = "76561198000000002"
+
+
+def _request(ip="10.0.0.1"):
+    return SimpleNamespace(client=SimpleNamespace(host=ip))
+
+
+class FakeRedis:
+    """run_script как у TieredCache: тот же GCRA по общему словарю (Redis для нескольких воркеров)"""
+
+    def __init__(self):
+        self.tat = {}
+        self.calls = 0
+
+    async def run_script(self, script, keys, args):
+        self.calls += 1
+        interval, tolerance, cost, wanted = args
+        now = time.monotonic() * 1000
+        granted, self.tat[keys[0]], rest = gcra(self.tat.get(keys[0], now), now, interval, tolerance, cost, wanted)
+        return [granted, rest]
+
+
+class NoRedis:
+    async def run_script(self, script, keys, args):
+        return None
+
+
+def _spend(limiter, route, steam_id, times, ip="10.0.0.1"):
+    async def run():
+        allowed = 0
+        for _ in range(times):
+            try:
+                await limiter.hit(route, steam_id, _request(ip))
+                allowed += 1
+            except RateLimited:
+                pass
+        return allowed
+    return asyncio.run(run())
+
+
+def test_costs_share_one_budget_per_user():
+    limiter = RateLimiter(cache=NoRedis(), capacity=20, ip_capacity=1000, period=60, costs={"quote": 3, "deals": 12})
+
+    assert _spend(limiter, "deals", STEAM_ID, 1) == 1
+    assert _spend(limiter, "quote", STEAM_ID, 5) == 2  # 20 - 12 = 8 единиц: два расчёта
+    assert _spend(limiter, "quote", "76561198000000003", 5) == 5  # Другой пользователь — свой бюджет
+
+
+def test_workers_share_budget_and_hot_user_served_locally():
+    redis = FakeRedis()
+    workers = [
+        RateLimiter(cache=redis, capacity=30, ip_capacity=1000, period=60, costs={"quote": 3}, lease_units=6, lease_seconds=5)
+        for _ in range(2)
+    ]
+
+    allowed = sum(_spend(worker, "quote", STEAM_ID, 10) for worker in workers)
+
+    assert allowed == 10  # 30 единиц на оба воркера, а не на каждый
+    assert redis.calls < 40  # Два бюджета на запрос, часть оплачена авансом без Redis
+
+
+def test_ip_budget_caps_steam_id_cycling():
+    """Перебор SteamID с одного адреса упирается в бюджет IP; чужой адрес не тратит бюджет владельца"""
+    limiter = RateLimiter(cache=NoRedis(), capacity=30, ip_capacity=60, period=60, costs={"quote": 3})
+
+    cycled = sum(_spend(limiter, "quote", f"7656119800000{i:04d}", 1) for i in range(50))
+    assert cycled == 20  # 60 единиц на адрес
+
+    assert _spend(limiter, "quote", STEAM_ID, 20, ip="10.0.0.2") == 10  # Чужой SteamID с другого адреса
+    assert _spend(limiter, "quote", STEAM_ID, 20, ip="10.0.0.3") == 10  # Бюджет владельца цел
+
+
+def test_exhausted_budget_returns_429(monkeypatch):
+    limiter = RateLimiter(cache=NoRedis(), capacity=4, period=60, costs={"inventory": 5})
+    monkeypatch.setattr(main, "rate_limiter", limiter)
+    client = TestClient(main.app)
+
+    response = client.get(f"/api/inventory/{STEAM_ID}")
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
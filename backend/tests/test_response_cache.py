@@ -0,0 +1,83 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI, Request
+
+from response_cache import ResponseCache, ResponseCacheMiddleware, set_cache_version
+
+
+def _app(calls, version):
+    """Приложение с двумя кэшируемыми маршрутами: по TTL и с версией"""
+    cache = ResponseCache(max_items=100)
+    app = FastAPI()
+
+    @app.get("/stats")
+    async def stats():
+        calls["stats"] += 1
+        await asyncio.sleep(0.05)
+        return {"deals": 42}
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int, request: Request):
+        calls["item"] += 1
+        set_cache_version(request, version["value"])
+        return {"id": item_id, "version": version["value"]}
+
+    async def item_version(request, params):
+        calls["version"] += 1
+        return version["value"]
+
+    cache.route("GET", "/stats", ttl=60, cache_control="public, max-age=60")
+    cache.route("GET", "/items/{item_id:int}", ttl=60, version=item_version)
+    app.add_middleware(ResponseCacheMiddleware, cache=cache)
+    return app, cache
+
+
+def _client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_concurrent_requests_share_one_computation():
+    calls = {"stats": 0, "item": 0, "version": 0}
+    app, cache = _app(calls, {"value": "v1"})
+
+    async def run():
+        async with _client(app) as client:
+            responses = await asyncio.gather(*[client.get("/stats") for _ in range(20)])
+            revalidated = await client.get("/stats", headers={"If-None-Match": responses[0].headers["etag"]})
+        return responses, revalidated
+
+    responses, revalidated = asyncio.run(run())
+
+    assert calls["stats"] == 1
+    assert all(response.json() == {"deals": 42} for response in responses)
+    assert {response.headers["etag"] for response in responses} == {responses[0].headers["etag"]}
+    assert responses[0].headers["cache-control"] == "public, max-age=60"
+    assert revalidated.status_code == 304
+    assert cache.stats["coalesced"] == 19
+
+
+def test_version_answers_304_without_handler():
+    calls = {"stats": 0, "item": 0, "version": 0}
+    version = {"value": "v1"}
+    app, _ = _app(calls, version)
+
+    async def run():
+        async with _client(app) as client:
+            first = await client.get("/items/7")
+            cached = await client.get("/items/7")
+            not_modified = await client.get("/items/7", headers={"If-None-Match": first.headers["etag"]})
+            version["value"] = "v2"
+            changed = await client.get("/items/7", headers={"If-None-Match": first.headers["etag"]})
+            other = await client.get("/items/8")
+        return first, cached, not_modified, changed, other
+
+    first, cached, not_modified, changed, other = asyncio.run(run())
+
+    assert cached.json() == first.json() and not_modified.status_code == 304
+    assert changed.status_code == 200 and changed.json()["version"] == "v2"
+    assert changed.headers["etag"] != first.headers["etag"]
+    assert other.headers["etag"] != changed.headers["etag"]  # ETag зависит и от ключа
+    # Обработчик: первый запрос, смена версии, другой предмет; первый запрос без проверки версии
+    assert calls["item"] == 3
+    assert calls["version"] == 3
@@ -0,0 +1,41 @@
+"""
+Бюджет старта: импорт main не трогает БД и Redis и не грузит необязательные пакеты
+
+Импорт — в отдельном процессе (в процессе тестов main уже импортирован).
+"""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "3.0"))
+
+# Грузятся при первом использовании или в lifespan
+LAZY_MODULES = ("redis", "PIL", "pytesseract", "reportlab")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({"elapsed": elapsed, "loaded": [name for name in %r if name in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def test_import_main_within_budget(tmp_path):
+    database = tmp_path / "startup.db"
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": BACKEND_DIR, "DATABASE_URL": f"sqlite:///{database}"},
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert probe["loaded"] == []
+    assert not database.exists(), "Импорт main обратился к БД (схема — через migrate.py)"
+    assert probe["elapsed"] < IMPORT_BUDGET_SECONDS, f"Импорт main: {probe['elapsed']:.2f} с"
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from services.deal_scheduler import DealLifecycle
+from services.stats_service import GLOBAL_STATS_ID, STATUS_COLUMNS, AMOUNT_COLUMNS, StatsService
+
+
+def _session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _materialized(db, user_id):
+    row = db.get(models.DealStats, user_id)
+    return {column: getattr(row, column) for column in (*STATUS_COLUMNS.values(), *AMOUNT_COLUMNS)}
+
+
+def _aggregated(db, user_id=None):
+    return StatsService.from_aggregate(db.execute(StatsService.aggregate_query(user_id)).all())
+
+
+def test_stats_follow_deal_transitions():
+    """Инкрементальная статистика совпадает с пересчётом одним GROUP BY"""
+    db = _session()
+    now = datetime.utcnow()
+    users = [models.User(steam_id=f"7656119800000000{i}") for i in range(2)]
+    db.add_all(users)
+    db.flush()
+
+    deals = []
+    for i in range(6):
+        deal = models.Deal(
+            user_id=users[i % 2].id,
+            market_total=1000.0,
+            loan_amount=400.10 + i,
+            buyback_price=488.55 + i,
+            option_expiry=now + timedelta(days=1 if i < 3 else -1),
+            items_snapshot=[],
+        )
+        db.add(deal)
+        deals.append(deal)
+    db.commit()
+
+    # Активация, выкуп, отмена (ORM) и дефолт по сроку (bulk UPDATE)
+    for deal in deals[1:]:
+        deal.deal_status = models.DealStatus.ACTIVE
+    db.commit()
+    deals[1].deal_status = models.DealStatus.BUYBACK
+    deals[0].deal_status = models.DealStatus.CANCELLED
+    db.commit()
+    assert len(DealLifecycle.expire_deals(db, now=now)) == 3
+    db.commit()
+
+    for user in users:
+        assert _materialized(db, user.id) == _aggregated(db, user.id)
+    assert _materialized(db, GLOBAL_STATS_ID) == _aggregated(db)
+
+    public = StatsService.public_view(db.get(models.DealStats, GLOBAL_STATS_ID))
+    assert public["total_deals"] == 6
+    assert public["active_deals"] == 1
+    assert public["buyback_rate"] == round(100 / 6, 2)
+
+    user_stats = StatsService.user_view(db.get(models.DealStats, deals[1].user_id))
+    assert user_stats["total_paid_back"] == 489.55
+
+
+def test_rebuild_matches_incremental():
+    """rebuild восстанавливает ту же статистику"""
+    db = _session()
+    user = models.User(steam_id="76561198000000009")
+    db.add(user)
+    db.flush()
+    db.add_all([
+        models.Deal(user_id=user.id, market_total=100.0, loan_amount=40.0 + i, buyback_price=50.0 + i,
+                    option_expiry=datetime.utcnow(), items_snapshot=[], deal_status=status)
+        for i, status in enumerate(models.DealStatus)
+    ])
+    db.commit()
+
+    before = _materialized(db, user.id), _materialized(db, GLOBAL_STATS_ID)
+    assert StatsService.rebuild(db) == 2
+    db.commit()
+    assert (_materialized(db, user.id), _materialized(db, GLOBAL_STATS_ID)) == before
+
+
+def test_missing_rows_inserted_without_check_then_insert():
+    """Строки deal_stats создаются INSERT ... ON CONFLICT DO NOTHING: уже созданная другой транзакцией не мешает"""
+    db = _session()
+    connection = db.connection()
+    StatsService._ensure_rows(connection, [7])
+    connection.execute(models.DealStats.__table__.update().values(active_count=3))
+
+    statements = []
+    event.listen(connection, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    StatsService._ensure_rows(connection, [7, 8])
+
+    assert len(statements) == 1 and statements[0].lstrip().upper().startswith("INSERT")
+    assert _materialized(db, 7)["active_count"] == 3
+    assert _materialized(db, 8) == {column: 0 for column in (*STATUS_COLUMNS.values(), *AMOUNT_COLUMNS)}
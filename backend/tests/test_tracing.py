@@ -0,0 +1,88 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from response_cache import response_cache
+from services.job_queue import JobRunner, enqueue, job_handler
+from tracing import InMemoryExporter, TracingTransport, parse_traceparent, tracer
+
+INCOMING = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+@pytest.fixture
+def spans():
+    exporter = InMemoryExporter()
+    tracer.configure(exporter)
+    yield exporter
+    tracer.configure(None)
+
+
+@job_handler("test_traced")
+async def _traced_job(db, job):
+    pass
+
+
+def test_parse_traceparent():
+    context = parse_traceparent(INCOMING)
+
+    assert context.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert context.span_id == "00f067aa0ba902b7" and context.sampled
+    assert context.traceparent == INCOMING
+    assert parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+    assert parse_traceparent("мусор") is None
+
+
+def test_request_continues_incoming_trace(spans):
+    response_cache.clear()
+    client = TestClient(main.app)
+
+    response = client.get("/api/stats/public", headers={"traceparent": INCOMING})
+
+    assert response.status_code == 200
+    [server] = spans.named("GET /api/stats/public")
+    assert server.context.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert server.parent_id == "00f067aa0ba902b7"
+    assert server.attributes["http.response.status_code"] == 200
+    queries = spans.named("db.query")
+    assert queries and all(span.context.trace_id == server.context.trace_id for span in queries)
+
+
+def test_job_runs_in_trace_of_enqueuing_request(spans):
+    runner = JobRunner.in_memory()
+    db = runner.session_factory()
+    with tracer.span("POST /api/deals") as request_span:
+        job = enqueue(db, "test_traced")
+    db.commit()
+    job_id = job.id
+    db.close()
+
+    asyncio.run(runner.run_job(job_id))
+
+    [job_span] = spans.named("job test_traced")
+    assert job_span.context.trace_id == request_span.context.trace_id
+    assert job_span.parent_id == request_span.context.span_id
+
+
+def test_traceparent_sent_only_to_internal_upstreams(spans):
+    seen = {}
+
+    def handler(request):
+        seen[request.url.host] = request.headers.get("traceparent")
+        return httpx.Response(200)
+
+    async def call():
+        with tracer.span("request") as span:
+            for host, propagate in (("bot.local", True), ("market.csgo.com", False)):
+                transport = TracingTransport(httpx.MockTransport(handler), host, propagate=propagate)
+                async with httpx.AsyncClient(transport=transport) as client:
+                    await client.get(f"http://{host}/api")
+        return span
+
+    span = asyncio.run(call())
+
+    assert parse_traceparent(seen["bot.local"]).trace_id == span.context.trace_id
+    assert seen["market.csgo.com"] is None
+    assert len(spans.named("GET bot.local")) == 1
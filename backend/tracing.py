@@ -0,0 +1,475 @@
+"""
+Трассировка запросов: спаны в модели OpenTelemetry, контекст — W3C traceparent
+
+Один трейс на запрос API:
+  - серверный спан — TracingMiddleware (родитель — заголовок traceparent
+    входящего запроса, если есть);
+  - вызовы сервисов — instrument(SteamService, "steam") и @traced;
+  - SQL — события движков (database.make_engine);
+  - внешние HTTP-вызовы — TracingTransport в services/http_clients.py;
+    traceparent уходит только во внутренние системы (steam_bot);
+  - фоновые задачи — traceparent сохраняется в payload задачи при enqueue,
+    задача выполняется в спане того же трейса.
+steam-bot на каждый входящий трейд создаёт traceparent и передаёт его и в
+/api/trades/verify, и в вебхук /api/trades/{id}/status: оба запроса в backend
+попадают в один трейс.
+
+Экспорт (tracing_exporter): "none" — выключено (спаны не создаются),
+"console" — JSON в лог, "memory" — список в памяти (тесты, локальная
+отладка), "otlp" — OTLP/HTTP JSON в коллектор OpenTelemetry пачками из
+фонового потока.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+
+from config import get_settings
+from metrics import route_label
+
+TRACEPARENT = "traceparent"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+INTERNAL = "internal"
+SERVER = "server"
+CLIENT = "client"
+CONSUMER = "consumer"
+_OTLP_KINDS = {INTERNAL: 1, SERVER: 2, CLIENT: 3, CONSUMER: 5}
+
+MAX_STATEMENT_LENGTH = 500
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Контекст из заголовка traceparent (None — нет или некорректный)"""
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1))
+
+
+def _random_id(length: int) -> str:
+    return os.urandom(length // 2).hex()
+
+
+class Span:
+    """Операция трейса; завершается end() (в tracer.span — автоматически)"""
+
+    __slots__ = ("name", "context", "parent_id", "kind", "start_ns", "end_ns", "attributes", "error", "_tracer")
+
+    def __init__(self, tracer, name: str, context: SpanContext, parent_id: Optional[str], kind: str, attributes: Dict):
+        self._tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            exporter = self._tracer.exporter
+            if self.context.sampled and exporter is not None:
+                exporter.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Спан при выключенной трассировке: вызовы ничего не делают"""
+    context = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, error):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar("trace_context", default=None)
+
+
+class Tracer:
+    """Создание спанов и текущий контекст (contextvars: свой у каждой задачи asyncio)"""
+
+    def __init__(self, exporter=None, sample_ratio: float = 1.0):
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def configure(self, exporter, sample_ratio: float = 1.0):
+        """Сменить экспорт (тесты; None — выключить)"""
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+
+    def current(self) -> Optional[SpanContext]:
+        return _current.get()
+
+    def start_span(self, name: str, kind: str = INTERNAL, parent: Optional[SpanContext] = None, **attributes):
+        """Спан без смены текущего контекста (вложенные вызовы его не увидят); завершить — end()"""
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = parent or _current.get()
+        if parent is None:
+            context = SpanContext(_random_id(32), _random_id(16), random.random() < self.sample_ratio)
+        else:
+            context = SpanContext(parent.trace_id, _random_id(16), parent.sampled)
+        return Span(self, name, context, parent.span_id if parent else None, kind, attributes)
+
+    @contextmanager
+    def span(self, name: str, kind: str = INTERNAL, parent: Optional[SpanContext] = None, **attributes):
+        """Спан на блок with; внутри он текущий (родитель вложенных спанов и traceparent)"""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = self.start_span(name, kind, parent, **attributes)
+        token = _current.set(span.context)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+
+    def inject(self, headers) -> None:
+        """Добавить traceparent текущего контекста в заголовки"""
+        context = _current.get()
+        if context is not None:
+            headers[TRACEPARENT] = context.traceparent
+
+    def shutdown(self):
+        if self.exporter is not None and hasattr(self.exporter, "shutdown"):
+            self.exporter.shutdown()
+
+
+def traced(name: str, kind: str = INTERNAL):
+    """Декоратор: вызов функции в спане name"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await func(*args, **kwargs)
+                with tracer.span(name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument(cls, prefix: str, methods: Optional[List[str]] = None):
+    """
+    Обернуть методы сервиса спанами "<prefix>.<метод>"
+
+    По умолчанию — все публичные async-методы (обращения к БД и внешним
+    системам); синхронные — только перечисленные в methods: мелкие
+    расчёты вызываются на каждый предмет, спан на каждый был бы дороже их.
+    """
+    for attr, raw in list(vars(cls).items()):
+        func = raw.__func__ if isinstance(raw, (staticmethod, classmethod)) else raw
+        if not callable(func) or attr.startswith("_"):
+            continue
+        if methods is not None and attr not in methods:
+            continue
+        if methods is None and not inspect.iscoroutinefunction(func):
+            continue
+        wrapped = traced(f"{prefix}.{attr}")(func)
+        setattr(cls, attr, type(raw)(wrapped) if isinstance(raw, (staticmethod, classmethod)) else wrapped)
+    return cls
+
+
+# ---------- HTTP ----------
+
+class TracingMiddleware:
+    """ASGI middleware: серверный спан запроса; родитель — traceparent клиента"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        with tracer.span(scope["method"], SERVER, parent, **{"url.path": scope["path"]}) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = route_label(scope)
+                span.name = f"{scope['method']} {route}"
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.response.status_code", status["code"])
+                if status["code"] >= 500 and span.error is None:
+                    span.error = f"HTTP {status['code']}"
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Транспорт httpx: клиентский спан на запрос, traceparent — только если propagate"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, upstream: str, propagate: bool = False):
+        self.transport = transport
+        self.upstream = upstream
+        self.propagate = propagate
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not tracer.enabled:
+            return await self.transport.handle_async_request(request)
+        with tracer.span(
+            f"{request.method} {self.upstream}", CLIENT,
+            **{"upstream": self.upstream, "server.address": request.url.host, "url.path": request.url.path}
+        ) as span:
+            if self.propagate:
+                tracer.inject(request.headers)
+            response = await self.transport.handle_async_request(request)
+            span.set_attribute("http.response.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.error = f"HTTP {response.status_code}"
+            return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+# ---------- SQL ----------
+
+def instrument_engine(engine):
+    """Спан на каждый SQL-запрос движка (для async-движка — его sync_engine)"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if tracer.enabled and _current.get() is not None:  # SQL вне трейса (фон, старт) не пишем
+            context._trace_span = tracer.start_span(
+                "db.query", CLIENT,
+                **{"db.system": engine.dialect.name, "db.statement": statement[:MAX_STATEMENT_LENGTH]}
+            )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            context._trace_span = None
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        span = getattr(exception_context.execution_context, "_trace_span", None)
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            span.end()
+
+
+# ---------- Экспорт ----------
+
+class InMemoryExporter:
+    """Завершённые спаны в списке (тесты)"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def named(self, name: str) -> List[Span]:
+        return [span for span in self.spans if span.name == name]
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+
+class ConsoleExporter:
+    """Спан — запись лога (JSON в файлах, key=value в консоли)"""
+
+    def __init__(self):
+        from logger import get_logger
+        self.log = get_logger("tracing")
+
+    def export(self, span: Span):
+        self.log.info(span.name, extra=span.to_dict())
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_span(span: Span) -> Dict:
+    """Спан в OTLP JSON (opentelemetry-proto, trace.v1.Span)"""
+    payload = {
+        "traceId": span.context.trace_id,
+        "spanId": span.context.span_id,
+        "name": span.name,
+        "kind": _OTLP_KINDS.get(span.kind, 1),
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        payload["parentSpanId"] = span.parent_id
+    return payload
+
+
+class OtlpHttpExporter:
+    """
+    Пачки спанов в коллектор OpenTelemetry (OTLP/HTTP, JSON) из фонового потока
+
+    Запрос отдаёт спан в очередь; поток отправляет пачку раз в flush_interval
+    или по batch_size. Очередь ограничена: если коллектор недоступен, лишние
+    спаны отбрасываются (dropped), а не копятся в памяти.
+    """
+
+    def __init__(self, endpoint: str, service_name: str, batch_size: int = 512,
+                 flush_interval: float = 2.0, max_queue: int = 10_000):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, span: Span):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        with httpx.Client(timeout=10.0) as client:
+            stopping = False
+            while not stopping:
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        span = self._queue.get(timeout=max(deadline - time.monotonic(), 0.001))
+                    except queue.Empty:
+                        break
+                    if span is None:
+                        stopping = True
+                        break
+                    batch.append(span)
+                if batch:
+                    self._send(client, batch)
+
+    def _send(self, client: httpx.Client, batch: List[Span]):
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "cyberlombard"}, "spans": [otlp_span(span) for span in batch]}],
+        }]}
+        try:
+            client.post(self.endpoint, json=body).raise_for_status()
+        except Exception as e:
+            self.dropped += len(batch)
+            print(f"[TRACING] Коллектор недоступен ({e}), спанов отброшено: {len(batch)}")
+
+    def shutdown(self):
+        """Отправить оставшиеся спаны (остановка приложения)"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def exporter_from_settings(settings=None):
+    settings = settings or get_settings()
+    kind = settings.tracing_exporter
+    if kind == "console":
+        return ConsoleExporter()
+    if kind == "memory":
+        return InMemoryExporter()
+    if kind == "otlp":
+        return OtlpHttpExporter(settings.tracing_otlp_endpoint, settings.tracing_service_name)
+    return None
+
+
+tracer = Tracer(exporter_from_settings(), get_settings().tracing_sample_ratio)
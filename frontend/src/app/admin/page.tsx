@@ -12,8 +12,9 @@ interface Deal {
   created_at: string
   option_expiry: string
   deal_status: string
-  items_snapshot: any[]
-  kyc_snapshot: any
+  items_count: number
+  client_name: string | null
+  client_phone: string | null
   payout_transaction_id: string | null
 }
 
@@ -32,6 +33,7 @@ export default function AdminPage() {
   const [isAuth, setIsAuth] = useState(false)
   const [filter, setFilter] = useState('all')
   const [stats, setStats] = useState({ total: 0, pending: 0, active: 0, buyback: 0, default: 0 })
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
 
   // Простая авторизация
   const handleLogin = () => {
@@ -49,33 +51,41 @@ export default function AdminPage() {
     }
   }, [])
 
-  useEffect(() => {
-    if (!isAuth) return
+  // Страница сделок (фильтр статуса — на сервере, следующая страница — по курсору)
+  const loadDeals = (cursor: string | null) => {
+    const params = new URLSearchParams({ limit: '50' })
+    if (filter !== 'all') params.set('status', filter.toUpperCase())
+    if (cursor) params.set('cursor', cursor)
 
-    // Загрузить все сделки
-    fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/admin/deals`)
+    setLoading(true)
+    fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/admin/deals?${params}`)
       .then(res => res.json())
       .then(data => {
-        setDeals(data.deals || [])
-        setUsers(data.users || [])
-        
-        // Статистика
-        const s = { total: 0, pending: 0, active: 0, buyback: 0, default: 0 }
-        data.deals?.forEach((d: Deal) => {
-          s.total++
-          if (d.deal_status === 'PENDING') s.pending++
-          if (d.deal_status === 'ACTIVE') s.active++
-          if (d.deal_status === 'BUYBACK') s.buyback++
-          if (d.deal_status === 'DEFAULT') s.default++
+        setDeals(prev => cursor ? [...prev, ...(data.deals || [])] : (data.deals || []))
+        setUsers(prev => cursor ? [...prev, ...(data.users || [])] : (data.users || []))
+        setNextCursor(data.next_cursor || null)
+
+        // Статистика (по всей базе, не по странице)
+        const c = data.status_counts || {}
+        setStats({
+          total: Object.values(c).reduce((sum: number, n) => sum + (n as number), 0),
+          pending: c.PENDING || 0,
+          active: c.ACTIVE || 0,
+          buyback: c.BUYBACK || 0,
+          default: c.DEFAULT || 0
         })
-        setStats(s)
         setLoading(false)
       })
       .catch(err => {
         console.error('Error:', err)
         setLoading(false)
       })
-  }, [isAuth])
+  }
+
+  useEffect(() => {
+    if (!isAuth) return
+    loadDeals(null)
+  }, [isAuth, filter])
 
   const handleAction = async (dealId: number, action: 'accept' | 'reject' | 'default') => {
     const endpoint = action === 'accept' 
@@ -100,11 +110,6 @@ export default function AdminPage() {
 
   const getUser = (userId: number) => users.find(u => u.id === userId)
 
-  const filteredDeals = deals.filter(d => {
-    if (filter === 'all') return true
-    return d.deal_status === filter.toUpperCase()
-  })
-
   if (!isAuth) {
     return (
       <div className="min-h-screen bg-gray-900 flex items-center justify-center">
@@ -186,9 +191,9 @@ export default function AdminPage() {
         </div>
 
         {/* Deals Table */}
-        {loading ? (
+        {loading && deals.length === 0 ? (
           <div className="text-center py-12 text-gray-400">Загрузка...</div>
-        ) : filteredDeals.length === 0 ? (
+        ) : deals.length === 0 ? (
           <div className="text-center py-12 text-gray-400">Нет сделок</div>
         ) : (
           <div className="overflow-x-auto">
@@ -205,21 +210,21 @@ export default function AdminPage() {
                 </tr>
               </thead>
               <tbody>
-                {filteredDeals.map(deal => {
+                {deals.map(deal => {
                   const user = getUser(deal.user_id)
                   return (
                     <tr key={deal.id} className="border-t border-gray-700 hover:bg-gray-750">
                       <td className="px-4 py-3">#{deal.id}</td>
                       <td className="px-4 py-3">
                         <div className="font-medium">{user?.steam_username || 'Unknown'}</div>
-                        <div className="text-xs text-gray-400">{deal.kyc_snapshot?.full_name || user?.steam_id}</div>
-                        {deal.kyc_snapshot?.phone && (
-                          <div className="text-xs text-gray-500">{deal.kyc_snapshot.phone}</div>
+                        <div className="text-xs text-gray-400">{deal.client_name || user?.steam_id}</div>
+                        {deal.client_phone && (
+                          <div className="text-xs text-gray-500">{deal.client_phone}</div>
                         )}
                       </td>
                       <td className="px-4 py-3">
                         <div className="font-bold text-green-400">{deal.loan_amount.toLocaleString('ru-RU')} ₽</div>
-                        <div className="text-xs text-gray-400">{deal.items_snapshot?.length || 0} скинов</div>
+                        <div className="text-xs text-gray-400">{deal.items_count} скинов</div>
                       </td>
                       <td className="px-4 py-3">
                         <div className="text-orange-400">{deal.buyback_price.toLocaleString('ru-RU')} ₽</div>
@@ -280,6 +285,15 @@ export default function AdminPage() {
                 })}
               </tbody>
             </table>
+            {nextCursor && (
+              <button
+                onClick={() => loadDeals(nextCursor)}
+                disabled={loading}
+                className="mt-4 w-full bg-gray-800 hover:bg-gray-700 py-3 rounded-lg"
+              >
+                {loading ? 'Загрузка...' : 'Загрузить ещё'}
+              </button>
+            )}
           </div>
         )}
       </div>
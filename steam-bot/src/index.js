@@ -4,6 +4,7 @@ const TradeOfferManager = require('steam-tradeoffer-manager');
 const SteamCommunity = require('steamcommunity');
 const express = require('express');
 const axios = require('axios');
+const crypto = require('crypto');
 require('dotenv').config();
 
 const app = express();
@@ -55,13 +56,21 @@ client.on('error', (err) => {
   console.error('[BOT] ❌ Ошибка Steam:', err);
 });
 
+// W3C traceparent: проверка и уведомление по одному трейду — один трейс в backend
+function newTraceparent() {
+  return `00-${crypto.randomBytes(16).toString('hex')}-${crypto.randomBytes(8).toString('hex')}-01`;
+}
+
 // Обработка входящих трейдов
 manager.on('newOffer', async (offer) => {
   console.log(`[BOT] 📨 Новый трейд #${offer.id} от ${offer.partner.getSteamID64()}`);
+  const traceparent = newTraceparent();
   
   try {
     // Проверяем, это наш ожидаемый трейд?
-    const response = await axios.get(`${config.apiUrl}/api/trades/verify/${offer.id}`);
+    const response = await axios.get(`${config.apiUrl}/api/trades/verify/${offer.id}`, {
+      headers: { traceparent }
+    });
     
     if (response.data.valid) {
       // Принимаем трейд
@@ -82,7 +91,7 @@ manager.on('newOffer', async (offer) => {
               console.log(`[BOT] ✅ Трейд #${offer.id} подтвержден`);
               
               // Уведомляем backend
-              notifyBackend(offer.id, 'ACCEPTED', response.data.deal_id);
+              notifyBackend(offer.id, 'ACCEPTED', response.data.deal_id, traceparent);
             }
           });
         }
@@ -297,11 +306,13 @@ app.get('/api/trade/status/:tradeOfferId', (req, res) => {
 });
 
 // Уведомить backend об изменении статуса трейда
-async function notifyBackend(tradeOfferId, status, dealId) {
+async function notifyBackend(tradeOfferId, status, dealId, traceparent) {
   try {
     await axios.post(`${config.apiUrl}/api/trades/${tradeOfferId}/status`, {
       status: status,
       deal_id: dealId
+    }, {
+      headers: traceparent ? { traceparent } : {}
     });
     console.log(`[BOT] ✅ Backend уведомлен о трейде #${tradeOfferId}`);
   } catch (error) {